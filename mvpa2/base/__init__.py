@@ -225,6 +225,7 @@ if __debug__:
     debug.register('DS_', "*Dataset (verbose)")
     debug.register('DS_ID', "ID Datasets")
     debug.register('DS_STATS', "Datasets statistics")
+    debug.register('DSC', "Datasets cache")
     debug.register('SPL', "*Splitter")
     debug.register('APERM', "AttributePermutator")
 
@@ -348,6 +349,8 @@ if __debug__:
     debug.register('REP_', "Reports (verbose)")
 
     debug.register('SUITE', "Import of mvpa2.suite")
+    debug.register('BENCH', "Benchmarks")
+    debug.register('TRACE', "Tracing of node calls")
 
     debug.register('ATTRREFER', "Debugging of top-level attribute referencing, "
                    "needed for current refactoring carried out in tent/flexds")
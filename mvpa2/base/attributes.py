@@ -22,6 +22,9 @@ import mvpa2.support.copy as copy
 if __debug__:
     from mvpa2.base import debug
 
+# values which do not need to be copied
+_atomic_types = frozenset((type(None), bool, int, long, float, complex,
+                           str, unicode))
 
 
 ##################################################################
@@ -90,6 +93,20 @@ class IndexedCollectable(Collectable):
         #    debug('COL_RED', 'Returning %s for %s' % (res, self))
         return res
 
+    def __deepcopy__(self, memo):
+        # Collectables of the collection templates are deep-copied for every
+        # new instance of ClassWithCollections, hence bypass the generic (and
+        # much slower) __reduce__-based copying, which also re-runs __init__
+        copied = self.__class__.__new__(self.__class__)
+        memo[id(self)] = copied
+        cdict = copied.__dict__
+        for k, v in self.__dict__.iteritems():
+            if type(v) in _atomic_types:
+                cdict[k] = v
+            else:
+                cdict[k] = copy.deepcopy(v, memo)
+        return copied
+
 
     # XXX had to override due to _isset, init=
     def _set(self, val, init=False):
@@ -97,7 +114,8 @@ class IndexedCollectable(Collectable):
            some logic (drop value in case of ca, or not allow to set value
            for read-only Parameters unless called with init=1) etc)
         """
-        if __debug__: # Since this call is quite often, don't convert
+        if __debug__ and 'COL' in debug.active:
+            # Since this call is quite often, don't convert
             # values to strings here, rely on passing them # withing
             debug("COL", "%s %s to %s ",
                   ({True: 'Initializing', False: 'Setting'}[init],
@@ -191,7 +209,7 @@ class ConditionalAttribute(IndexedCollectable):
             # XXX may be should have left simple assignment
             # self._value = val
             IndexedCollectable._set(self, val)
-        elif __debug__:
+        elif __debug__ and 'COL' in debug.active:
             debug("COL", "Not setting disabled %s to %s ",
                   (self, val))
 
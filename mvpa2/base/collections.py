@@ -485,18 +485,21 @@ class Collection(dict):
                              % str(type(source)))
 
 
+    # Attribute access is routed to the collectables first.  Check membership
+    # explicitly instead of catching KeyError, since raising is expensive and
+    # collection methods (e.g. `is_enabled`) are looked up in hot loops
     def __getattribute__(self, key):
-        try:
+        if key in self:
             return self[key].value
-        except KeyError:
-            return _object_getattribute(self, key)
+        return _object_getattribute(self, key)
 
 
     def __setattr__(self, key, value):
+        if not key in self:
+            _object_setattr(self, key, value)
+            return
         try:
             self[key].value = value
-        except KeyError:
-            _object_setattr(self, key, value)
         except Exception, e:
             # catch any other exception in order to provide a useful error message
             errmsg = "parameter '%s' cannot accept value `%r` (%s)" % (key, value, str(e))
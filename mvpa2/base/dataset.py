@@ -836,8 +836,11 @@ def _stack_add_equal_attributes(merged, datasets, strategy, colname):
     mergedcol = getattr(merged, colname)
 
     if strategy == 'update':
+        # the last dataset providing an attribute determines its value
+        values = {}
         for ds in datasets:
-            mergedcol.update(getattr(ds, colname))
+            values.update(getattr(ds, colname).items())
+        mergedcol.update(values)
 
     elif strategy == 'drop_nonunique':
         # discover those attributes which differ
@@ -847,26 +850,40 @@ def _stack_add_equal_attributes(merged, datasets, strategy, colname):
         for ds in datasets[1:]:
             dscol = getattr(ds, colname)
             for attr, v in dscol.iteritems():
+                if attr in drop:
+                    continue
                 if ((attr not in ds0col) or
-                        np.any(ds0col[attr].value != v.value)):
+                        not _attr_values_equal(ds0col[attr].value, v.value)):
                     drop.add(attr)
             # and ds0 might have some attributes which others don't
             for attr in ds0col:
                 if attr not in dscol:
                     drop.add(attr)
 
-        # now update but only those which to not drop
-        for ds in datasets:
-            mergedcol.update(
-                {attr: v for attr, v in getattr(ds, colname).items()
-                 if attr not in drop}
-            )
+        # now update but only those which to not drop -- all remaining
+        # attributes are identical in all datasets anyway
+        mergedcol.update(
+            {attr: v for attr, v in ds0col.items() if attr not in drop})
 
     else:
         raise ValueError("Unknown strategy %s on how to deal with %s collection"
                          % (strategy, colname))
 
 
+def _attr_values_equal(x, y):
+    """Comparison of attribute values with fast paths for common cases
+
+    Identical objects are equal, and (non-object) arrays are compared with
+    `np.array_equal`.  Anything else is compared with `all_equal`.
+    """
+    if x is y:
+        return True
+    if isinstance(x, np.ndarray) and isinstance(y, np.ndarray):
+        if x.dtype != np.object and y.dtype != np.object:
+            return x.shape == y.shape and bool(np.array_equal(x, y))
+    return all_equal(x, y)
+
+
 def all_equal(x, y):
     '''General function that compares two values. Usually this function
     behaves like x==y and type(x)==type(y), but for numpy arrays it
@@ -886,6 +903,12 @@ def all_equal(x, y):
         in that case True is only returned if all elements are equal
     '''
 
+    if isinstance(x, np.ndarray) and isinstance(y, np.ndarray) \
+            and x.dtype != np.object and y.dtype != np.object \
+            and x.shape == y.shape:
+        # no need to compare numeric arrays element by element
+        return bool(np.array_equal(x, y))
+
     # an equality comparison that also works on numpy arrays
     try:
         eq = x == y
@@ -961,75 +984,255 @@ def _stack_add_equal_dataset_attributes(merged_dataset, datasets, a=None):
         attributes are stored in merged_dataset. True is equivalent to
         'drop_nonunique'. False is equivalent to None.
     """
-    if a is None or a is False:
-        # do nothing
-        return
-    elif a is True:
-        a = 'drop_nonunique'
-
-    if not datasets:
-        # empty - so nothing to do
-        return
-
-    if type(a) is int:
-        base_dataset = datasets[a]
-
-        for key in base_dataset.a.keys():
-            merged_dataset.a[key] = base_dataset.a[key].value
-
-        return
+    merger = _DatasetAttributesMerger(a)
+    for dataset in datasets:
+        merger.add(dataset.a)
+    merger.apply(merged_dataset)
 
-    allowed_values = ['unique', 'uniques', 'drop_nonunique', 'all']
-    if not a in allowed_values:
-        raise ValueError("a should be an int or one of "
-                         "%r" % allowed_values)
 
-    # consider all keys that are present in at least one dataset
-    all_keys = set.union(*[set(dataset.a.keys()) for dataset in datasets])
+class _DatasetAttributesMerger(object):
+    """Incremental merge of dataset attributes of datasets to be stacked
 
-    def _contains(xs, y, comparator=all_equal):
-        for x in xs:
-            if comparator(x, y):
-                return True
-        return False
-
-    for key in all_keys:
-        add_key = True
-        values = []
-        for i, dataset in enumerate(datasets):
-            if not key in dataset.a:
+    See `_stack_add_equal_dataset_attributes` for the meaning of `a`.
+    """
+    _allowed_values = ['unique', 'uniques', 'drop_nonunique', 'all']
+
+    def __init__(self, a):
+        if a is False:
+            a = None
+        elif a is True:
+            a = 'drop_nonunique'
+        if not (a is None or type(a) is int or a in self._allowed_values):
+            raise ValueError("a should be an int or one of "
+                             "%r" % self._allowed_values)
+        self._a = a
+        self._n = 0
+        # all values of each attribute that are to be considered
+        self._values = {}
+        self._dropped = set()
+        if type(a) is int and a < 0:
+            # need to keep the attributes of the last datasets
+            self._last = []
+
+    def add(self, acol):
+        """Consider the dataset attributes collection of another dataset"""
+        a = self._a
+        if a is None:
+            pass
+        elif type(a) is int:
+            if a < 0:
+                self._last.append(dict((k, acol[k].value)
+                                       for k in acol.keys()))
+                if len(self._last) > -a:
+                    del self._last[0]
+            elif a == self._n:
+                self._values = dict((k, acol[k].value) for k in acol.keys())
+        else:
+            for key in acol.keys():
+                value = acol[key].value
                 if a == 'all':
-                    values.append(None)
-                continue
-
-            value = dataset.a[key].value
-
-            if a in ('drop_nonunique', 'unique'):
-                if not values:
-                    values.append(value)
-                elif not _contains(values, value):
+                    self._values.setdefault(key, [None] * self._n).append(value)
+                    continue
+                if key in self._dropped:
+                    continue
+                values = self._values.get(key)
+                if values is None:
+                    self._values[key] = [value]
+                elif not any(_attr_values_equal(v, value) for v in values):
                     if a == 'unique':
                         raise DatasetError("Not unique dataset attribute value "
                                            " for %s: %s and %s"
                                            % (key, values[0], value))
+                    elif a == 'drop_nonunique':
+                        del self._values[key]
+                        self._dropped.add(key)
                     else:
-                        add_key = False
-                        break
-            elif a == 'uniques':
-                if not _contains(values, value):
-                    values.append(value)
-            elif a == 'all':
-                values.append(value)
+                        values.append(value)
+            if a == 'all':
+                # missing values are None
+                for values in self._values.itervalues():
+                    if len(values) == self._n:
+                        values.append(None)
+        self._n += 1
+
+    def apply(self, merged_dataset):
+        """Store the merged attributes in a dataset"""
+        a = self._a
+        if a is None or not self._n:
+            return
+        if type(a) is int:
+            if a < 0:
+                if len(self._last) < -a:
+                    raise IndexError("list index out of range")
+                values = self._last[0]
+            elif a >= self._n:
+                raise IndexError("list index out of range")
             else:
-                raise ValueError("this should not happen: %s" % a)
-
-        if add_key:
+                values = self._values
+            for key, value in values.iteritems():
+                merged_dataset.a[key] = value
+            return
+        for key, values in self._values.iteritems():
             if a in ('drop_nonunique', 'unique'):
                 merged_dataset.a[key] = values[0]
             else:
                 merged_dataset.a[key] = tuple(values)
 
 
+class DatasetStacker(object):
+    """Incremental stacking of datasets.
+
+    Datasets are appended one at a time (e.g. results of cross-validation
+    folds or searchlight blocks) and copied into preallocated arrays that
+    grow geometrically, so that neither the input datasets nor a list of
+    their pieces need to be kept until the end.  The result is identical to
+    `vstack` (or `hstack`) of all appended datasets.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from mvpa2.datasets import Dataset
+    >>> from mvpa2.base.dataset import DatasetStacker
+    >>> stacker = DatasetStacker(a='drop_nonunique')
+    >>> for i in range(3):
+    ...     stacker.append(Dataset(np.ones((2, 4)) * i, sa={'fold': [i, i]}))
+    >>> ds = stacker.get()
+    >>> ds.shape
+    (6, 4)
+    >>> ds.sa.fold
+    array([0, 0, 1, 1, 2, 2])
+    """
+
+    def __init__(self, axis='samples', a=None, attrs='drop_nonunique'):
+        """
+        Parameters
+        ----------
+        axis : {'samples', 'features'}
+          Stack along samples (like `vstack`) or features (like `hstack`).
+        a : see `vstack`
+          Which dataset attributes to store in the stacked dataset.
+        attrs : {'update', 'drop_nonunique'}
+          How to treat the attributes of the other axis, i.e. feature
+          attributes when stacking samples and vice versa.  Same as the `fa`
+          argument of `vstack` (or `sa` of `hstack`).
+        """
+        if not axis in ('samples', 'features'):
+            raise ValueError("Unknown axis %r" % (axis,))
+        if not attrs in ('update', 'drop_nonunique'):
+            raise ValueError("Unknown strategy %s on how to deal with "
+                             "attributes" % (attrs,))
+        self._axis = axis
+        self._strategy = attrs
+        self._merger = _DatasetAttributesMerger(a)
+        self.reset()
+
+    def reset(self):
+        """Discard all appended datasets"""
+        self._cls = None
+        self._n = 0
+        self._ndatasets = 0
+        self._samples = None
+        # stacked attributes
+        self._stacked = None
+        # attributes of the other axis
+        self._other = None
+        self._dropped = set()
+        self._merger = _DatasetAttributesMerger(self._merger._a)
+
+    def __len__(self):
+        """Number of appended datasets"""
+        return self._ndatasets
+
+    def append(self, ds):
+        """Add a dataset to the stack"""
+        if self._axis == 'samples':
+            samples = ds.samples
+            stackcol, othercol = ds.sa, ds.fa
+        else:
+            samples = np.swapaxes(ds.samples, 0, 1)
+            stackcol, othercol = ds.fa, ds.sa
+        n = self._n
+        if self._cls is None:
+            self._cls = ds.__class__
+            self._stacked = dict((k, None) for k in stackcol.keys())
+            self._other = dict(othercol.items())
+        elif sorted(stackcol.keys()) != sorted(self._stacked):
+            raise ValueError("%s collections of to be stacked datasets have "
+                             "varying attributes."
+                             % stackcol.__class__.__name__)
+        self._samples = _append_rows(self._samples, n, samples)
+        for k in self._stacked:
+            self._stacked[k] = _append_rows(self._stacked[k], n,
+                                            stackcol[k].value)
+        if self._ndatasets:
+            other = self._other
+            if self._strategy == 'update':
+                other.update(othercol.items())
+            else:
+                for attr, v in othercol.iteritems():
+                    if attr in self._dropped:
+                        continue
+                    if not attr in other or \
+                            not _attr_values_equal(other[attr].value, v.value):
+                        self._dropped.add(attr)
+                for attr in other:
+                    if not attr in othercol:
+                        self._dropped.add(attr)
+        self._merger.add(ds.a)
+        self._n = n + len(samples)
+        self._ndatasets += 1
+
+    def get(self):
+        """Return the stacked dataset of all appended datasets"""
+        if not self._ndatasets:
+            raise ValueError(
+                'concatenation of zero-length sequences is impossible')
+        n = self._n
+        samples = _trim_rows(self._samples, n)
+        stacked = dict((k, _trim_rows(v, n))
+                       for k, v in self._stacked.iteritems())
+        if self._axis == 'samples':
+            merged = self._cls(samples, sa=stacked)
+            col = merged.fa
+        else:
+            merged = self._cls(np.swapaxes(samples, 0, 1), fa=stacked)
+            col = merged.sa
+        col.update(dict((attr, v) for attr, v in self._other.iteritems()
+                        if not attr in self._dropped))
+        self._merger.apply(merged)
+        return merged
+
+
+def _append_rows(buf, n, values):
+    """Copy values into buf[n:], reallocating the buffer if necessary
+
+    Returns the (possibly new) buffer.
+    """
+    values = np.asanyarray(values)
+    need = n + len(values)
+    if buf is None:
+        return values.copy()
+    if buf.shape[1:] != values.shape[1:]:
+        raise ValueError("all the input array dimensions except for the "
+                         "concatenation axis must match exactly")
+    dtype = np.promote_types(buf.dtype, values.dtype)
+    if need > len(buf) or dtype != buf.dtype:
+        # grow geometrically to have amortized linear cost
+        newbuf = np.empty((max(need, 2 * len(buf)),) + buf.shape[1:],
+                          dtype=dtype)
+        newbuf[:n] = buf[:n]
+        buf = newbuf
+    buf[n:need] = values
+    return buf
+
+
+def _trim_rows(buf, n):
+    """Array with the first n rows of a buffer, which is reused if it fits"""
+    if len(buf) == n:
+        return buf
+    return buf[:n].copy()
+
+
 def _expand_attribute(attr, length, attr_name):
     """Helper function to expand attributes to a desired length.
 
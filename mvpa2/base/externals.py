@@ -728,6 +728,12 @@ def exists(dep, force=False, raise_=False, issueWarning=None,
     else:
         cfg.set('externals', 'have ' + dep, 'no')
 
+    # and for other sessions in the same environment
+    if dep in _CACHED and _cached_results.get(dep) != result:
+        _cached_results[dep] = result
+        if _is_cache_enabled():
+            _save_cache('externals', _cached_results)
+
     return result
 
 # Bind functions for some versions checks
@@ -738,6 +744,139 @@ versions._KNOWN.update({
     })
 
 
+#
+# On-disk cache of the results of the checks
+#
+
+# checks which depend on the session or have side effects (e.g. setting
+# the matplotlib backend) are always run, and so are those which do not
+# (only) import Python modules, but load shared libraries, R packages,
+# compile code or call external binaries
+_NOT_CACHED = set(['running ipython env', 'matplotlib', 'pylab',
+                   'pylab plottable', 'atlas_fsl', 'atlas_pymvpa',
+                   'afni-3dinfo', 'liblapack.so', 'scipy.weave', 'rpy2',
+                   'lars', 'mass', 'elasticnet', 'glmnet', 'cran-energy'])
+_CACHED = set(_KNOWN).difference(_NOT_CACHED)
+_SOURCE = os.path.splitext(os.path.abspath(__file__))[0] + '.py'
+# environment variables affecting where modules, shared libraries and
+# binaries are found
+_FINGERPRINT_ENVIRON = ('PATH', 'PYTHONPATH', 'LD_LIBRARY_PATH',
+                        'DYLD_LIBRARY_PATH', 'R_HOME', 'R_LIBS',
+                        'R_LIBS_USER')
+
+
+def _environment_fingerprint():
+    """Identifies the interpreter and the state of the installed modules
+
+    Installing or removing modules changes the modification time of the
+    directory they are installed in, so the modification times of all
+    directories in `sys.path` (except for the one of the running script)
+    are part of the fingerprint, as well as the one of this file.  Shared
+    libraries used by extension modules (e.g. of shogun) are located via
+    environment variables, which are included as well.
+    """
+    mtimes = []
+    for path in [_SOURCE] + sys.path[1:]:
+        try:
+            mtimes.append((path, os.stat(path or os.curdir).st_mtime))
+        except OSError:
+            pass
+    environ = [(var, os.environ.get(var)) for var in _FINGERPRINT_ENVIRON]
+    return sys.executable, sys.version, _SOURCE, mtimes, environ
+
+
+def _is_cache_enabled():
+    """Whether results of checks for externals are cached on disk"""
+    return cfg.getboolean('externals', 'cache', default='no')
+
+
+def get_cache_filename(kind):
+    """Filename of an on-disk cache for the current environment
+
+    Results of costly operations that only depend on the environment, such
+    as the index of names provided by `mvpa2.suite`, are cached on disk in
+    directory `cache dir` of section `externals` of the configuration
+    (default: `~/.cache/pymvpa2`).  Results of checks for externals can
+    become outdated without any change of the environment visible to
+    PyMVPA (e.g. an updated shared library), hence caching them is disabled
+    by default, and enabled by setting `cache` in that section (e.g. with
+    MVPA_EXTERNALS_CACHE=yes).
+
+    Parameters
+    ----------
+    kind : str
+      What is cached, e.g. 'externals'.
+
+    Returns
+    -------
+    str
+    """
+    import hashlib
+    cachedir = cfg.get('externals', 'cache dir',
+                       default=os.path.join(
+                           os.environ.get('XDG_CACHE_HOME',
+                                          os.path.join('~', '.cache')),
+                           'pymvpa2'))
+    # one file per interpreter and PyMVPA installation, so that they do not
+    # keep overwriting each other's cache
+    env = hashlib.md5(repr(_environment_fingerprint()[:3])).hexdigest()
+    return os.path.join(os.path.expanduser(cachedir),
+                        '%s-%s.pkl' % (kind, env[:16]))
+
+
+def _load_cache(kind):
+    """Cached content, or None if unavailable or outdated"""
+    filename = get_cache_filename(kind)
+    if not os.path.exists(filename):
+        return None
+    import cPickle
+    try:
+        with open(filename, 'rb') as f:
+            fingerprint, content = cPickle.load(f)
+    except Exception, e:
+        if __debug__:
+            debug('EXT', "Ignoring unreadable cache %s: %s" % (filename, e))
+        return None
+    if fingerprint != _environment_fingerprint():
+        if __debug__:
+            debug('EXT', "Ignoring outdated cache %s" % filename)
+        return None
+    return content
+
+
+def _save_cache(kind, content):
+    """Store content in the cache, if possible"""
+    filename = get_cache_filename(kind)
+    import cPickle
+    import tempfile
+    try:
+        dirname = os.path.dirname(filename)
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+        # many processes might use the cache at the same time, so write to
+        # a temporary file and rename (which is atomic)
+        fd, tmpname = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            cPickle.dump((_environment_fingerprint(), content), f,
+                         cPickle.HIGHEST_PROTOCOL)
+        os.rename(tmpname, filename)
+    except (IOError, OSError), e:
+        if __debug__:
+            debug('EXT', "Could not store cache %s: %s" % (filename, e))
+
+
+def _use_cached_results(results):
+    """Results of previous sessions become known, unless set already"""
+    if not cfg.has_section('externals'):
+        cfg.add_section('externals')
+    for dep, result in results.iteritems():
+        if dep in _CACHED and not cfg.has_option('externals', 'have ' + dep):
+            cfg.set('externals', 'have ' + dep, ('no', 'yes')[result])
+
+_cached_results = _is_cache_enabled() and _load_cache('externals') or {}
+_use_cached_results(_cached_results)
+
+
 def check_all_dependencies(force=False, verbosity=1):
     """
     Test for all known dependencies.
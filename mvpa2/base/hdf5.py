@@ -43,7 +43,7 @@ import os.path as osp
 
 import mvpa2
 from mvpa2.base import externals
-from mvpa2.base.types import asobjarray
+from mvpa2.base.types import asobjarray, is_datasetlike
 
 if __debug__:
     from mvpa2.base import debug
@@ -171,6 +171,8 @@ def hdf2obj(hdf, memo=None):
                 # could be used also for storing object ndarrays
                 if 'is_objarray' in hdf.attrs:
                     obj = _hdf_list_to_objarray(hdf, memo)
+                elif 'is_columnar' in hdf.attrs:
+                    obj = _hdf_columnar_to_obj(hdf, memo)
                 else:
                     obj = _hdf_list_to_obj(hdf, memo)
             elif cls_name == 'dict':
@@ -560,6 +562,175 @@ def _seqitems_to_hdf(obj, hdf, memo, noid=False, **kwargs):
         obj2hdf(items, item, name=str(i), memo=memo, noid=noid, **kwargs)
 
 
+def _get_columnar_layout(obj, memo):
+    """Figure out if a list of datasets can be stored in columnar form.
+
+    Columnar storage is possible if all items are datasets of the same class
+    with identical sets of attributes, samples of matching dtype and shape
+    (besides the number of samples), plain (non-object) ndarrays as sample
+    and feature attributes, and dataset attributes that are either the very
+    same object in all datasets or scalars of the same type.
+
+    Returns
+    -------
+    dict or None
+      Layout description with stacked and shared values for each collection,
+      or None if the list has to be stored item by item.
+    """
+    from mvpa2.base.dataset import AttrDataset
+    if type(obj) is not list or len(obj) < 2:
+        return None
+    ds0 = obj[0]
+    cls = type(ds0)
+    if not isinstance(ds0, AttrDataset) \
+            or cls.__reduce__ != AttrDataset.__reduce__:
+        return None
+    ids = [id(ds) for ds in obj]
+    if len(set(ids)) < len(ids) or memo and any(i in memo for i in ids):
+        # identity of the items needs to be tracked one by one
+        return None
+    samples0 = ds0.samples
+    if not isinstance(samples0, np.ndarray) or samples0.dtype == np.object:
+        return None
+    for ds in obj:
+        if type(ds) is not cls \
+                or not isinstance(ds.samples, np.ndarray) \
+                or ds.samples.dtype != samples0.dtype \
+                or ds.samples.shape[1:] != samples0.shape[1:]:
+            return None
+
+    layout = dict(cls=cls, objrefs=np.array(ids, dtype=np.int64))
+    for colname in ('sa', 'fa', 'a'):
+        keys = sorted(getattr(ds0, colname).keys())
+        for k in keys:
+            if not isinstance(k, basestring) or '/' in k:
+                return None
+        for ds in obj:
+            if sorted(getattr(ds, colname).keys()) != keys:
+                return None
+        shared, stacked, pyscalar = {}, {}, set()
+        for k in keys:
+            values = [getattr(ds, colname)[k].value for ds in obj]
+            v0 = values[0]
+            if colname == 'a':
+                if all(v is v0 for v in values):
+                    shared[k] = v0
+                elif np.isscalar(v0) \
+                        and all(type(v) is type(v0) for v in values):
+                    stacked[k] = np.array(values)
+                    if not isinstance(v0, np.generic):
+                        pyscalar.add(k)
+                else:
+                    return None
+                continue
+            if not isinstance(v0, np.ndarray) or v0.dtype == np.object:
+                return None
+            for v in values:
+                if not isinstance(v, np.ndarray) or v.dtype != v0.dtype \
+                        or v.shape[1:] != v0.shape[1:]:
+                    return None
+            if colname == 'sa':
+                stacked[k] = np.concatenate(values, axis=0)
+            else:
+                # all datasets have the same number of features, so feature
+                # attributes get stacked along a new leading axis
+                stacked[k] = np.concatenate(
+                    [v[np.newaxis] for v in values], axis=0)
+        layout[colname] = (shared, stacked, pyscalar)
+
+    layout['samples'] = np.concatenate([ds.samples for ds in obj], axis=0)
+    layout['nsamples'] = np.array([len(ds) for ds in obj], dtype=np.int64)
+    return layout
+
+
+def _columnar_to_hdf(obj, layout, hdf, memo, **kwargs):
+    """Store a list of datasets as a few contiguous arrays
+
+    Instead of a group per dataset (and per attribute collection), samples
+    and attributes of all datasets are concatenated.  Counterpart of
+    `_hdf_columnar_to_obj()`.
+    """
+    # the datasets are stored (and can be referenced by later occurrences),
+    # just as if they were stored item by item
+    for ds in obj:
+        memo[id(ds)] = ds
+    cls = layout['cls']
+    hdf.attrs.create('length', len(layout['nsamples']))
+    hdf.attrs.create('is_columnar', True)
+    hdf.attrs.create('ds_class', cls.__name__)
+    hdf.attrs.create('ds_module', cls.__module__)
+    if __debug__:
+        debug('HDF5', "Store %i datasets of %s in columnar form"
+                      % (len(layout['nsamples']), cls.__name__))
+    hdf.create_dataset('objrefs', data=layout['objrefs'])
+    for k in ('samples', 'nsamples'):
+        obj2hdf(hdf, layout[k], name=k, memo=memo, noid=True, **kwargs)
+    for colname in ('sa', 'fa', 'a'):
+        shared, stacked, pyscalar = layout[colname]
+        grp = hdf.create_group(colname)
+        shared_grp = grp.create_group('shared')
+        for k, v in shared.iteritems():
+            obj2hdf(shared_grp, v, name=k, memo=memo, **kwargs)
+        stacked_grp = grp.create_group('stacked')
+        for k, v in stacked.iteritems():
+            obj2hdf(stacked_grp, v, name=k, memo=memo, noid=True, **kwargs)
+            if k in pyscalar:
+                stacked_grp[k].attrs.create('is_pyscalar', True)
+
+
+def _hdf_columnar_to_obj(hdf, memo, stacked=False):
+    """Reconstruct a list of datasets stored by `_columnar_to_hdf()`
+
+    Parameters
+    ----------
+    stacked : bool
+      If True, a single dataset with all samples is returned instead of
+      the list.  Similar to `vstack()`, feature attributes which differ
+      across datasets as well as dataset attributes are dropped.
+    """
+    mod, cls = _import_from_thin_air(hdf.attrs['ds_module'],
+                                     hdf.attrs['ds_class'])
+    samples = hdf2obj(hdf['samples'], memo)
+    nsamples = hdf2obj(hdf['nsamples'], memo)
+    cols = {}
+    for colname in ('sa', 'fa', 'a'):
+        shared = dict([(k, hdf2obj(v, memo))
+                       for k, v in hdf[colname]['shared'].iteritems()])
+        stacked_ = {}
+        pyscalar = set()
+        for k, v in hdf[colname]['stacked'].iteritems():
+            stacked_[k] = hdf2obj(v, memo)
+            if 'is_pyscalar' in v.attrs:
+                pyscalar.add(k)
+        cols[colname] = (shared, stacked_, pyscalar)
+
+    if stacked:
+        fa = cols['fa'][0].copy()
+        for k, v in cols['fa'][1].iteritems():
+            if not len(v) or np.all(v == v[0]):
+                fa[k] = v[0]
+        return cls(samples, sa=cols['sa'][1], fa=fa)
+
+    objrefs = hdf['objrefs'][()] if 'objrefs' in hdf else None
+    bounds = np.concatenate(([0], np.cumsum(nsamples)))
+    items = []
+    for i in xrange(len(nsamples)):
+        s = slice(bounds[i], bounds[i + 1])
+        sa = dict([(k, v[s]) for k, v in cols['sa'][1].iteritems()])
+        fa = cols['fa'][0].copy()
+        fa.update([(k, v[i]) for k, v in cols['fa'][1].iteritems()])
+        a = cols['a'][0].copy()
+        for k, v in cols['a'][1].iteritems():
+            a[k] = v[i].item() if k in cols['a'][2] else v[i]
+        ds = cls(samples[s], sa=sa, fa=fa, a=a)
+        if objrefs is not None:
+            memo[objrefs[i]] = ds
+        items.append(ds)
+    if __debug__:
+        debug('HDF5', "Loaded %i datasets from columnar storage" % len(items))
+    return items
+
+
 def obj2hdf(hdf, obj, name=None, memo=None, noid=False, **kwargs):
     """Store an object instance in an HDF5 group.
 
@@ -833,7 +1004,12 @@ def obj2hdf(hdf, obj, name=None, memo=None, noid=False, **kwargs):
                     "Can't obj2hdf lambda functions. Got %r" % (obj,))
             grp.attrs.create('name', oname)
         if isinstance(obj, (list, tuple)):
-            _seqitems_to_hdf(obj, grp, memo, **kwargs)
+            layout = None if is_objarray \
+                else _get_columnar_layout(obj, memo)
+            if layout is not None:
+                _columnar_to_hdf(obj, layout, grp, memo, **kwargs)
+            else:
+                _seqitems_to_hdf(obj, grp, memo, **kwargs)
         elif isinstance(obj, dict):
             if __debug__:
                 debug('HDF5', "Store dict as zipped list")
@@ -907,7 +1083,7 @@ def h5save(filename, data, name=None, mode='w', mkdir=True, **kwargs):
         hdf.close()
 
 
-def h5load(filename, name=None):
+def h5load(filename, name=None, stacked=False):
     """Loads the content of an HDF5 file that has been stored by `h5save()`.
 
     This is a convenience wrapper around `hdf2obj()`. Please see its
@@ -919,19 +1095,36 @@ def h5load(filename, name=None):
       Name of the file to open and load its content.
     name : str
       Name of a specific object to load from the file.
+    stacked : bool, optional
+      If True and the stored object is a list of datasets, a single dataset
+      with all samples (as if `vstack()` was applied to the list) is
+      returned.  For lists stored in columnar form this avoids
+      reconstructing each dataset individually.
 
     Returns
     -------
     instance
       An object of whatever has been stored in the file.
     """
+    if stacked:
+        def load(hdf):
+            if 'is_columnar' in hdf.attrs:
+                return _hdf_columnar_to_obj(hdf, {}, stacked=True)
+            obj = hdf2obj(hdf)
+            if isinstance(obj, list) and len(obj) \
+                    and all(is_datasetlike(o) for o in obj):
+                from mvpa2.base.dataset import vstack
+                obj = vstack(obj)
+            return obj
+    else:
+        load = hdf2obj
     hdf = h5py.File(filename, 'r')
     try:
         if name is not None:
             if not name in hdf:
                 raise ValueError("No object of name '%s' in file '%s'."
                                  % (name, filename))
-            obj = hdf2obj(hdf[name])
+            obj = load(hdf[name])
         else:
             if not len(hdf) and not len(hdf.attrs):
                 # there is nothing
@@ -941,14 +1134,14 @@ def h5load(filename, name=None):
                 if isinstance(hdf, h5py.Dataset) \
                         or ('class' in hdf.attrs or 'recon' in hdf.attrs):
                     # this is an object stored at the toplevel
-                    obj = hdf2obj(hdf)
+                    obj = load(hdf)
                 else:
                     # no object into at the top-level, but maybe in the next one
                     # this would happen for plain mat files with arrays
                     if len(hdf) == 1 and '__unnamed__' in hdf:
                         # just a single with special name -> special case:
                         # return as is
-                        obj = hdf2obj(hdf['__unnamed__'])
+                        obj = load(hdf['__unnamed__'])
                     else:
                         # otherwise build dict with content
                         obj = {}
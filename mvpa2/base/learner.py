@@ -15,6 +15,7 @@ import time
 from mvpa2.base.dataset import AttrDataset
 from mvpa2.base.node import Node, ChainNode
 from mvpa2.base.state import ConditionalAttribute
+from mvpa2.base.tracing import tracer
 from mvpa2.base.types import is_datasetlike
 from mvpa2.base.dochelpers import _repr_attrs
 from mvpa2.base.node import CompoundNode, CombinedNode
@@ -126,30 +127,36 @@ class Learner(Node):
                 "Training learner %(lrn)s on dataset %(dataset)s",
                 msgargs={'lrn': self, 'dataset': ds})
 
-        self._pretrain(ds)
-
-        # remember the time when started training
-        t0 = time.time()
-
-        if got_ds:
-            # things might have happened during pretraining
-            if ds.nfeatures > 0:
-                self._train(ds)
+        frame = tracer.enter(self, 'train') if tracer.active else None
+        try:
+            self._pretrain(ds)
+
+            # remember the time when started training
+            t0 = time.time()
+
+            if got_ds:
+                # things might have happened during pretraining
+                if ds.nfeatures > 0:
+                    self._train(ds)
+                else:
+                    warning("Trying to train on dataset with no features "
+                            "present")
+                    if __debug__:
+                        debug("LRN",
+                              "No features present for training, no actual "
+                              "training is called")
             else:
-                warning("Trying to train on dataset with no features present")
-                if __debug__:
-                    debug("LRN",
-                          "No features present for training, no actual training "
-                          "is called")
-        else:
-            # in this case we claim to have no idea and simply try to train
-            self._train(ds)
+                # in this case we claim to have no idea and simply try to train
+                self._train(ds)
 
-        # store timing
-        self.ca.training_time = time.time() - t0
+            # store timing
+            self.ca.training_time = time.time() - t0
 
-        # and post-proc
-        self._posttrain(ds)
+            # and post-proc
+            self._posttrain(ds)
+        finally:
+            if frame is not None:
+                tracer.exit(frame)
 
         # finally flag as trained
         self._set_trained()
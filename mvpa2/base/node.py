@@ -16,6 +16,7 @@ from mvpa2.support import copy
 
 from mvpa2.base.dochelpers import _str, _repr_attrs
 from mvpa2.base.state import ClassWithCollections, ConditionalAttribute
+from mvpa2.base.tracing import tracer
 
 from mvpa2.base.collections import SampleAttributesCollection, \
     FeatureAttributesCollection, DatasetAttributesCollection
@@ -132,10 +133,15 @@ class Node(ClassWithCollections):
         Dataset
         """
         t0 = time.time()                # record the time when call initiated
-
-        self._precall(ds)
-        result = self._call(ds, **(_call_kwargs or self._get_call_kwargs(ds)))
-        result = self._postcall(ds, result)
+        frame = tracer.enter(self) if tracer.active else None
+        try:
+            self._precall(ds)
+            result = self._call(ds,
+                                **(_call_kwargs or self._get_call_kwargs(ds)))
+            result = self._postcall(ds, result)
+        finally:
+            if frame is not None:
+                tracer.exit(frame)
 
         self.ca.calling_time = time.time() - t0  # set the calling_time
         return result
@@ -0,0 +1,48 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the PyMVPA package for the
+#   copyright and license terms.
+#
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Helpers for parallel processing within a single process
+
+Threads only pay off for work which releases the GIL most of the time, such
+as NumPy/SciPy operations on large arrays, or external libraries.
+"""
+
+__docformat__ = 'restructuredtext'
+
+from multiprocessing.pool import ThreadPool
+
+__all__ = ['thread_map']
+
+
+def thread_map(func, items, nproc=1):
+    """Call `func` for every item, in up to `nproc` threads
+
+    Parameters
+    ----------
+    func : callable
+      Called with each item as the only argument.
+    items : sequence
+      Items to process.
+    nproc : int
+      Maximal number of threads.  With 1 (or a single item) everything is
+      processed in the calling thread.
+
+    Returns
+    -------
+    list
+      Results of `func` in the order of `items`.  An exception raised by
+      `func` is re-raised in the calling thread.
+    """
+    if nproc > 1 and len(items) > 1:
+        pool = ThreadPool(min(nproc, len(items)))
+        try:
+            return pool.map(func, items)
+        finally:
+            pool.close()
+            pool.join()
+    return [func(item) for item in items]
@@ -231,13 +231,13 @@ class Parameter(IndexedCollectable):
                   % (self.name, val)
         if (isarray and np.any(different_value)) or \
            ((not isarray) and different_value):
-            if __debug__:
+            if __debug__ and 'COL' in debug.active:
                 debug("COL",
                       "Parameter: setting %s to %s " % (str(self), val))
             self._value = val
             # Set 'isset' only if not called from initialization routine
             self._isset = not init #True
-        elif __debug__:
+        elif __debug__ and 'COL' in debug.active:
             debug("COL",
                   "Parameter: not setting %s since value is the same" \
                   % (str(self)))
@@ -68,6 +68,7 @@ _def_sep = ('`', '')[int(_in_ipython)]
 
 _object_getattribute = object.__getattribute__
 _object_setattr = object.__setattr__
+_dict_setitem = dict.__setitem__
 
 ###################################################################
 # Collections
@@ -109,6 +110,16 @@ class Collection(BaseCollection):
         return res
 
 
+    def __deepcopy__(self, memo):
+        # Equivalent to copying via __reduce__, but avoids the generic
+        # reconstruction of all items (see ClassWithCollections.__new__)
+        anew = self.__class__(name=self.name)
+        memo[id(self)] = anew
+        for key, item in self.iteritems():
+            _dict_setitem(anew, key, copy.deepcopy(item, memo))
+        return anew
+
+
     @borrowdoc(BaseCollection)
     def copy(self, *args, **kwargs):
         # Create a generic copy of the collection
@@ -174,7 +185,7 @@ class Collection(BaseCollection):
         #      % self.__class__.__name__
 
         # YYY lets just check if it is in the keys
-        return key in self.keys()
+        return key in self
 
 
     def _initialize(self, key, value):
@@ -278,16 +289,17 @@ class Collection(BaseCollection):
     def reset(self, key=None):
         """Reset the conditional attribute defined by `key`"""
 
-        if key is not None:
-            keys = [ key ]
+        if not len(self):
+            return
+        # XXX Check if that works as desired
+        reset = self.values()[0].__class__.reset
+        if key is None:
+            # called for all conditional attributes on every training, so
+            # avoid the generic dispatch of _action()
+            for item in self.itervalues():
+                reset(item)
         else:
-            keys = self.keys()
-
-        if len(self):
-            for key in keys:
-                # XXX Check if that works as desired
-                self._action(key, self.values()[0].__class__.reset,
-                             missingok=False)
+            self._action(key, reset, missingok=False)
 
     # XXX RF: not used anywhere / myself -- hence not worth it?
     @property
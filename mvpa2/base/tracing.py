@@ -0,0 +1,423 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the PyMVPA package for the
+#   copyright and license terms.
+#
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Opt-in tracing of calls to processing nodes
+
+When enabled, every call of a :class:`~mvpa2.base.node.Node` (and the training
+of a :class:`~mvpa2.base.learner.Learner`) is recorded by the global
+:data:`tracer`: wall time, CPU time, number of calls, and optionally the peak
+memory usage, aggregated per node instance, together with the nodes that were
+called from within it.  The sequence of calls can be exported as a Chrome
+trace (to be viewed with chrome://tracing or https://ui.perfetto.dev), or as
+"folded" stacks understood by flame graph tools.
+
+Tracing is disabled by default, and the only cost of disabled tracing is a
+single attribute check per call.  It can be enabled programmatically::
+
+  from mvpa2.base.tracing import tracer
+  tracer.enable()
+  cv(ds)
+  tracer.disable()
+  tracer.save_chrome_trace('cv.json')
+
+or for a whole session with the configuration variables ``enabled``,
+``memory`` and ``output`` in the ``[tracing]`` section (or correspondingly
+``MVPA_TRACING_ENABLED`` etc. environment variables).  If ``output`` is set,
+the Chrome trace is stored in that file upon exit.
+
+Only calls in the current process are traced, i.e. calls performed in child
+processes (e.g. by a searchlight with ``nproc > 1``) are not recorded.  Calls
+in other threads (e.g. of meta-classifiers with ``nproc > 1``) are recorded
+as separate root calls of these threads, i.e. they are not nested into the
+call that started the threads.
+"""
+
+from __future__ import absolute_import
+
+__docformat__ = 'restructuredtext'
+
+import os
+import sys
+import time
+import json
+import weakref
+import itertools
+import threading
+from collections import deque
+
+from mvpa2.base import cfg
+
+if __debug__:
+    from mvpa2.base import debug
+
+__all__ = ['NodeTracer', 'tracer']
+
+
+def _get_rss():
+    """Current resident set size of the process in bytes (or None)"""
+    try:
+        # fast, and available on Linux
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+
+
+def _get_max_rss():
+    """Peak resident set size of the process in bytes (or None)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on OSX
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+class _MemoryMonitor(object):
+    """Keep track of the peak memory usage in a background thread"""
+    def __init__(self, interval=0.005):
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._baseline = self._peak = None
+
+    def _sample(self, rss):
+        if rss is not None and rss > self._peak:
+            self._peak = rss
+
+    def _poll(self):
+        while not self._stop.is_set():
+            self._sample(_get_rss())
+            self._stop.wait(self._interval)
+
+    def start(self):
+        self._baseline = self._peak = _get_rss()
+        if self._baseline is not None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._poll)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            # one last look
+            self._sample(_get_rss())
+        else:
+            # can only report the peak of the whole process
+            self._peak = _get_max_rss()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    @property
+    def peak_rss_mb(self):
+        if self._peak is None:
+            return None
+        return self._peak / 2. ** 20
+
+    @property
+    def peak_mem_mb(self):
+        if self._peak is None or self._baseline is None:
+            return None
+        return (self._peak - self._baseline) / 2. ** 20
+
+
+class _FrameMemoryMonitor(_MemoryMonitor):
+    """Updates the peak memory usage of all calls in progress"""
+    def __init__(self, stacks, interval=0.005):
+        _MemoryMonitor.__init__(self, interval=interval)
+        self._stacks = stacks
+
+    def _sample(self, rss):
+        _MemoryMonitor._sample(self, rss)
+        for stack in self._stacks.values():
+            for frame in stack[:]:
+                if rss > frame.peak:
+                    frame.peak = rss
+
+
+def _copy_stats(stats):
+    return dict(stats, children=set(stats['children']))
+
+
+class _Frame(object):
+    """A single call of a node which is in progress"""
+    __slots__ = ('key', 'name', 'path', 'start', 'cpu', 'rss', 'peak',
+                 'child_time', 'children')
+
+    def __init__(self, key, name, path, rss):
+        self.key = key
+        self.name = name
+        self.path = path
+        self.rss = self.peak = rss
+        self.child_time = 0.
+        self.children = set()
+        self.cpu = time.clock()
+        self.start = time.time()
+
+
+class NodeTracer(object):
+    """Records calls of nodes
+
+    Aggregated statistics per node instance are available from
+    :meth:`get_stats`.  Each record is a dict with the keys 'name' (class name
+    of the node, with a suffix for anything else than calls, e.g.
+    'SMLR.train'), 'calls', 'wall' (total wall time in seconds), 'self' (wall
+    time not spent in nested node calls), 'cpu' (CPU time of the whole
+    process), 'peak_mem_mb' (largest increase of the resident memory during
+    a call; None unless memory tracing is enabled) and 'children' (keys of
+    the records of nodes called from within this node).  Records are keyed
+    by a serial number of the node instance (which, unlike its ``id()``, is
+    not reused for other nodes), and the kind of the call.
+
+    Use the global instance :data:`tracer`, which is checked by
+    ``Node.__call__()`` and ``Learner.train()``.
+    """
+    def __init__(self, max_events=100000, interval=0.005):
+        """
+        Parameters
+        ----------
+        max_events : int
+          Maximum number of individual calls kept for export as a Chrome
+          trace.  Older calls are discarded, while the aggregated statistics
+          remain complete.
+        interval : float
+          Time (in seconds) between two samples of the memory usage, if
+          memory is traced.
+        """
+        self.active = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # non-empty stacks of calls in progress, per thread
+        self._stacks = {}
+        self._serials = weakref.WeakKeyDictionary()
+        self._counter = itertools.count()
+        self._monitor = _FrameMemoryMonitor(self._stacks, interval=interval)
+        self.memory = False
+        self._t0 = time.time()
+        self._events = deque(maxlen=max_events)
+        self.reset()
+
+    def reset(self):
+        """Forget all recorded calls"""
+        with self._lock:
+            self._stats = {}
+            self._folded = {}
+            self._events.clear()
+            self._t0 = time.time()
+
+    def enable(self, memory=False):
+        """Start tracing of node calls
+
+        Parameters
+        ----------
+        memory : bool
+          Whether to also sample the memory usage of the process during calls
+          (in a background thread).  Only supported if ``/proc`` is
+          available.
+        """
+        if self.active:
+            self.disable()
+        if memory:
+            self._monitor.start()
+        self.memory = self._monitor.running
+        if __debug__:
+            debug('TRACE', "Enabled tracing of node calls (memory: %s)"
+                  % self.memory)
+        self.active = True
+
+    def disable(self):
+        """Stop tracing of node calls.  Recorded information is kept."""
+        self.active = False
+        if self._monitor.running:
+            self._monitor.stop()
+        if __debug__:
+            debug('TRACE', "Disabled tracing of node calls")
+
+    def _get_stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            stack = self._local.stack = []
+            return stack
+
+    def _get_serial(self, node):
+        """Serial number of a node, which is not reused after its deletion
+        """
+        try:
+            return self._serials[node]
+        except KeyError:
+            with self._lock:
+                serial = self._serials.setdefault(node, next(self._counter))
+            return serial
+        except TypeError:
+            # no weak references to this node possible
+            return id(node)
+
+    def enter(self, node, kind='call'):
+        """Record the start of a call of a node
+
+        Parameters
+        ----------
+        node : Node
+          Called node.
+        kind : str
+          What is done with the node.  Records of the same node are
+          aggregated separately for each kind, e.g. 'call' and 'train'.
+
+        Returns
+        -------
+        frame
+          To be passed to :meth:`exit` upon completion of the call.
+        """
+        name = node.__class__.__name__
+        if kind != 'call':
+            name = '%s.%s' % (name, kind)
+        stack = self._get_stack()
+        if stack:
+            path = '%s;%s' % (stack[-1].path, name)
+        else:
+            path = name
+            # only active threads are visible to the memory monitor
+            self._stacks[threading.current_thread().ident] = stack
+        frame = _Frame((self._get_serial(node), kind), name, path,
+                       _get_rss() if self.memory else None)
+        stack.append(frame)
+        return frame
+
+    def exit(self, frame):
+        """Record the end of a call started with :meth:`enter`"""
+        end = time.time()
+        cpu = time.clock() - frame.cpu
+        wall = end - frame.start
+        stack = self._get_stack()
+        # the frame is the last one, unless an exception skipped some exits
+        while stack:
+            if stack.pop() is frame:
+                break
+        if stack:
+            parent = stack[-1]
+        else:
+            parent = None
+            self._stacks.pop(threading.current_thread().ident, None)
+        if self.memory and frame.rss is not None:
+            frame.peak = max(frame.peak, _get_rss())
+            peak_mem = (frame.peak - frame.rss) / 2. ** 20
+            if parent is not None and frame.peak > parent.peak:
+                parent.peak = frame.peak
+        else:
+            peak_mem = None
+        selftime = wall - frame.child_time
+        if parent is not None:
+            parent.child_time += wall
+            parent.children.add(frame.key)
+        with self._lock:
+            stats = self._stats.get(frame.key)
+            if stats is None:
+                stats = self._stats[frame.key] = dict(
+                    name=frame.name, calls=0, wall=0., self=0., cpu=0.,
+                    peak_mem_mb=peak_mem, children=set())
+            stats['calls'] += 1
+            stats['wall'] += wall
+            stats['self'] += selftime
+            stats['cpu'] += cpu
+            if peak_mem is not None:
+                stats['peak_mem_mb'] = max(stats['peak_mem_mb'], peak_mem)
+            stats['children'].update(frame.children)
+            self._folded[frame.path] = \
+                self._folded.get(frame.path, 0.) + selftime
+            self._events.append((frame.name, frame.key[0], frame.start, wall,
+                                 cpu, peak_mem, threading.current_thread().ident))
+
+    def get_stats(self, node=None, kind='call'):
+        """Aggregated statistics of all traced nodes
+
+        Parameters
+        ----------
+        node : Node, optional
+          If given, only the statistics of this node are returned (or None
+          if it was not called while tracing).
+        kind : str
+          Which statistics of `node` to return.
+
+        Returns
+        -------
+        dict
+          Statistics per node, keyed by the serial number of the node and
+          the kind of the call.
+        """
+        if node is not None:
+            key = (self._get_serial(node), kind)
+        with self._lock:
+            if node is not None:
+                stats = self._stats.get(key)
+                return None if stats is None else _copy_stats(stats)
+            return dict((k, _copy_stats(v)) for k, v in self._stats.iteritems())
+
+    def get_chrome_trace(self):
+        """Recorded calls in the Chrome trace event format
+
+        Returns
+        -------
+        dict
+          Ready to be serialized to JSON.
+        """
+        pid = os.getpid()
+        with self._lock:
+            events = list(self._events)
+            t0 = self._t0
+        trace = []
+        for name, node_id, start, wall, cpu, peak_mem, tid in events:
+            args = dict(node=node_id, cpu=cpu)
+            if peak_mem is not None:
+                args['peak_mem_mb'] = peak_mem
+            trace.append(dict(name=name, cat='node', ph='X', pid=pid, tid=tid,
+                              ts=(start - t0) * 1e6, dur=wall * 1e6,
+                              args=args))
+        return dict(traceEvents=trace, displayTimeUnit='ms')
+
+    def save_chrome_trace(self, filename):
+        """Store recorded calls as a Chrome trace JSON file"""
+        with open(filename, 'w') as f:
+            json.dump(self.get_chrome_trace(), f)
+
+    def get_folded_stacks(self):
+        """Recorded calls as folded stacks for flame graphs
+
+        Returns
+        -------
+        list of str
+          One line per call path, with the names of the nodes separated by
+          ';', followed by the time spent in the last node (excluding nested
+          node calls) in microseconds.
+        """
+        with self._lock:
+            folded = dict(self._folded)
+        return ['%s %i' % (path, int(round(t * 1e6)))
+                for path, t in sorted(folded.iteritems())]
+
+    def save_folded_stacks(self, filename):
+        """Store folded stacks (e.g. for flamegraph.pl) in a file"""
+        with open(filename, 'w') as f:
+            for line in self.get_folded_stacks():
+                f.write(line + '\n')
+
+
+#: Global tracer of all node calls
+tracer = NodeTracer()
+
+if cfg.getboolean('tracing', 'enabled', default=False):
+    tracer.enable(memory=cfg.getboolean('tracing', 'memory', default=False))
+    if cfg.has_option('tracing', 'output'):
+        import atexit
+        atexit.register(tracer.save_chrome_trace, cfg.get('tracing', 'output'))
@@ -0,0 +1,281 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the PyMVPA package for the
+#   copyright and license terms.
+#
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Benchmarks of computationally demanding parts of PyMVPA
+
+Benchmarks are parametrised workloads on synthetic data. Each benchmark
+consists of a setup function (not timed) that creates the data for a
+particular set of parameters, and a function performing the actual work
+(timed). Results comprise timing and peak memory of each run, as well as
+information about the environment, and can be stored as JSON to compare runs
+across revisions or machines.
+
+Available benchmarks are listed by :func:`get_benchmarks`, and can be run with
+:func:`run_benchmarks`, or from the command line via ``pymvpa2 bench``.
+"""
+
+__docformat__ = 'restructuredtext'
+
+import sys
+import gc
+import time
+import json
+import fnmatch
+import platform
+
+import numpy as np
+
+from mvpa2.base import externals, verbose
+from mvpa2.base.info import get_pymvpa_gitversion
+from mvpa2.base.tracing import _MemoryMonitor
+
+if __debug__:
+    from mvpa2.base import debug
+
+__all__ = ['Benchmark', 'benchmark', 'get_benchmarks', 'run_benchmarks',
+           'save_results', 'load_results', 'compare_results']
+
+# registry of all benchmarks (name -> Benchmark)
+_benchmarks = {}
+
+
+class Benchmark(object):
+    """A named, parametrised workload
+
+    The setup function is called with the benchmark parameters as keyword
+    arguments and returns the input for the workload function, which is
+    timed. Benchmarks can require external dependencies, and are skipped if
+    those are not available.
+    """
+    def __init__(self, name, func, setup=None, params=None, requires=None,
+                 descr=None):
+        """
+        Parameters
+        ----------
+        name : str
+          Unique name of the benchmark.
+        func : callable
+          Workload. Called with the return value of `setup`.
+        setup : callable, optional
+          Called with one value for each parameter as keyword arguments.
+          If None, `func` is called with the parameters directly.
+        params : dict, optional
+          Parameter names and the sequences of values to benchmark.
+          All combinations of values are benchmarked.
+        requires : list, optional
+          Names of required externals.
+        descr : str, optional
+          Short description. By default the first line of the docstring
+          of `func`.
+        """
+        self.name = name
+        self.func = func
+        self.setup = setup
+        self.params = params or {}
+        self.requires = requires or []
+        if descr is None and func.__doc__:
+            descr = func.__doc__.strip().split('\n')[0]
+        self.descr = descr
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.name)
+
+    def is_available(self):
+        """Whether all required externals are present"""
+        return all(externals.exists(dep) for dep in self.requires)
+
+    def get_param_sets(self, params=None, quick=False):
+        """All combinations of parameter values
+
+        Parameters
+        ----------
+        params : dict, optional
+          Override values of (some) parameters.
+        quick : bool
+          If True, only the first value of each parameter is used.
+        """
+        allparams = dict(self.params)
+        if params:
+            allparams.update([(k, v) for k, v in params.iteritems()
+                              if k in allparams])
+        psets = [{}]
+        for name in sorted(allparams):
+            values = allparams[name]
+            if quick:
+                values = values[:1]
+            psets = [dict(ps, **{name: v}) for ps in psets for v in values]
+        return psets
+
+    def run(self, params, repeat=3):
+        """Run the benchmark for a single set of parameters
+
+        Returns
+        -------
+        dict
+          With timing ('times' of all repetitions, 'time' as the minimum),
+          and peak memory information ('peak_rss_mb' of the process during
+          the timed runs, and 'peak_mem_mb' as the increase over the memory
+          in use after setup).
+        """
+        if self.setup is None:
+            func = lambda: self.func(**params)
+        else:
+            data = self.setup(**params)
+            func = lambda: self.func(data)
+        times = []
+        gc.collect()
+        monitor = _MemoryMonitor()
+        monitor.start()
+        try:
+            for i in xrange(repeat):
+                t0 = time.time()
+                func()
+                times.append(time.time() - t0)
+        finally:
+            monitor.stop()
+        if __debug__:
+            debug('BENCH', "%s%s: %s" % (self.name, params, times))
+        return dict(name=self.name,
+                    params=params,
+                    times=times,
+                    time=min(times),
+                    peak_rss_mb=monitor.peak_rss_mb,
+                    peak_mem_mb=monitor.peak_mem_mb)
+
+
+def benchmark(name, params=None, setup=None, requires=None):
+    """Decorator to register a workload function as a benchmark
+
+    See :class:`Benchmark` for the arguments.
+    """
+    def _register(func):
+        _benchmarks[name] = Benchmark(name, func, setup=setup, params=params,
+                                      requires=requires)
+        return func
+    return _register
+
+
+def get_benchmarks(patterns=None):
+    """Benchmarks matching any of the given (shell-style) name patterns
+
+    Returns
+    -------
+    list
+      Sorted by name.
+    """
+    # register all known benchmarks
+    from mvpa2.benchmarks import workloads
+    names = sorted(_benchmarks)
+    if patterns:
+        names = [n for n in names
+                 if any(fnmatch.fnmatch(n, p) for p in patterns)]
+    return [_benchmarks[n] for n in names]
+
+
+def get_environment():
+    """Information about the environment the benchmarks are running in"""
+    info = dict(
+        pymvpa=get_pymvpa_gitversion(),
+        python=sys.version.split()[0],
+        platform=platform.platform(),
+        machine=platform.machine(),
+        processor=platform.processor(),
+        node=platform.node(),
+        date=time.strftime('%Y-%m-%d %H:%M:%S'))
+    if info['pymvpa'] is None:
+        import mvpa2
+        info['pymvpa'] = mvpa2.__version__
+    for dep in ('numpy', 'scipy', 'h5py', 'nibabel', 'libsvm', 'skl'):
+        if externals.exists(dep):
+            info[dep] = str(externals.versions[dep])
+    return info
+
+
+def run_benchmarks(patterns=None, params=None, quick=False, repeat=3):
+    """Run benchmarks
+
+    Parameters
+    ----------
+    patterns : list of str, optional
+      Name patterns of benchmarks to run. By default all are run.
+    params : dict, optional
+      Override parameter values of all benchmarks having these parameters.
+      Values are sequences.
+    quick : bool
+      Run only the first value of each parameter.
+    repeat : int
+      Number of timed runs of each workload.
+
+    Returns
+    -------
+    dict
+      Environment information ('environment') and a list of results for all
+      benchmarks and parameter sets ('results').
+    """
+    results = []
+    for bm in get_benchmarks(patterns):
+        if not bm.is_available():
+            verbose(2, "Skipping benchmark %s: requires %s"
+                    % (bm.name, ', '.join(bm.requires)))
+            continue
+        for pset in bm.get_param_sets(params, quick=quick):
+            verbose(2, "Running benchmark %s %s" % (bm.name, pset))
+            res = bm.run(pset, repeat=repeat)
+            verbose(1, "%s %s: %.4fs" % (bm.name, _params2str(pset),
+                                         res['time']))
+            results.append(res)
+    return dict(environment=get_environment(), results=results)
+
+
+def _params2str(params):
+    return ','.join('%s=%s' % (k, params[k]) for k in sorted(params))
+
+
+def _result_key(res):
+    return (res['name'], _params2str(res['params']))
+
+
+def save_results(results, filename):
+    """Store benchmark results as JSON"""
+    with open(filename, 'w') as f:
+        json.dump(results, f, indent=1, sort_keys=True)
+
+
+def load_results(filename):
+    """Load benchmark results from JSON"""
+    with open(filename) as f:
+        return json.load(f)
+
+
+def compare_results(reference, results):
+    """Compare benchmark results with a reference run
+
+    Parameters
+    ----------
+    reference : dict
+      As returned by :func:`run_benchmarks` or :func:`load_results`.
+    results : dict
+      Same.
+
+    Returns
+    -------
+    list
+      Tuples of (name, parameters, reference time, time, ratio) for all
+      benchmarks present in both runs. Ratios larger than one indicate
+      that `results` is slower.
+    """
+    ref = dict((_result_key(r), r) for r in reference['results'])
+    comparison = []
+    for res in results['results']:
+        key = _result_key(res)
+        if not key in ref:
+            continue
+        rtime = ref[key]['time']
+        comparison.append(key + (rtime, res['time'],
+                                 res['time'] / rtime if rtime else np.inf))
+    return comparison
@@ -0,0 +1,375 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the PyMVPA package for the
+#   copyright and license terms.
+#
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Benchmark workloads on synthetic data
+
+The first value of each parameter is meant for a quick run.
+"""
+
+__docformat__ = 'restructuredtext'
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from mvpa2.benchmarks import benchmark
+from mvpa2.misc.data_generators import normal_feature_dataset, \
+        random_affine_transformation
+from mvpa2.generators.partition import NFoldPartitioner
+
+
+def _volume_dataset(nfeatures, perlabel=20, nlabels=2, nchunks=5):
+    """Normal feature dataset with voxel indices of a cubic volume"""
+    ds = normal_feature_dataset(perlabel=perlabel, nlabels=nlabels,
+                                nfeatures=nfeatures, nchunks=nchunks,
+                                nonbogus_features=range(nlabels), snr=3.0)
+    side = int(np.ceil(nfeatures ** (1. / 3)))
+    shape = (side,) * 3
+    ds.fa['voxel_indices'] = np.transpose(np.unravel_index(
+                                np.arange(nfeatures), shape))
+    ds.a['voxel_dim'] = shape
+    ds.a['voxel_eldim'] = (3., 3., 3.)
+    return ds
+
+
+#
+# Searchlights
+#
+def _setup_searchlight(nfeatures, ncenters, radius):
+    ds = _volume_dataset(nfeatures)
+    # evenly spaced, and each feature at most once (i.e. all features if
+    # there are more centers than features)
+    center_ids = np.linspace(0, nfeatures - 1,
+                             min(ncenters, nfeatures)).astype(int)
+    return ds, center_ids, radius
+
+
+@benchmark('searchlight', params=dict(nfeatures=[1000, 20000],
+                                      ncenters=[20, 500],
+                                      radius=[2]),
+           setup=_setup_searchlight)
+def searchlight(data):
+    """Generic sphere searchlight with GNB cross-validation"""
+    from mvpa2.measures.searchlight import sphere_searchlight
+    from mvpa2.measures.base import CrossValidation
+    from mvpa2.clfs.gnb import GNB
+    ds, center_ids, radius = data
+    sl = sphere_searchlight(CrossValidation(GNB(), NFoldPartitioner()),
+                            radius=radius, center_ids=center_ids)
+    return sl(ds)
+
+
+@benchmark('gnbsearchlight', params=dict(nfeatures=[1000, 20000],
+                                         ncenters=[20, 20000],
+                                         radius=[2]),
+           setup=_setup_searchlight)
+def gnbsearchlight(data):
+    """GNBSearchlight"""
+    from mvpa2.measures.gnbsearchlight import sphere_gnbsearchlight
+    from mvpa2.clfs.gnb import GNB
+    ds, center_ids, radius = data
+    sl = sphere_gnbsearchlight(GNB(), NFoldPartitioner(), radius=radius,
+                               center_ids=center_ids)
+    return sl(ds)
+
+
+#
+# Cross-validation
+#
+def _setup_crossval(nfeatures, nsamples):
+    return _volume_dataset(nfeatures, perlabel=nsamples // 2)
+
+
+def _crossval(clf, ds):
+    from mvpa2.measures.base import CrossValidation
+    return CrossValidation(clf, NFoldPartitioner())(ds)
+
+
+@benchmark('crossval_svm', params=dict(nfeatures=[100, 5000],
+                                       nsamples=[40, 200]),
+           setup=_setup_crossval, requires=['libsvm'])
+def crossval_svm(ds):
+    """Cross-validation of a linear C-SVM (libsvm)"""
+    from mvpa2.clfs.svm import LinearCSVMC
+    return _crossval(LinearCSVMC(), ds)
+
+
+@benchmark('crossval_smlr', params=dict(nfeatures=[100, 5000],
+                                        nsamples=[40, 200]),
+           setup=_setup_crossval)
+def crossval_smlr(ds):
+    """Cross-validation of SMLR"""
+    from mvpa2.clfs.smlr import SMLR
+    return _crossval(SMLR(), ds)
+
+
+@benchmark('crossval_knn', params=dict(nfeatures=[100, 5000],
+                                       nsamples=[40, 200]),
+           setup=_setup_crossval)
+def crossval_knn(ds):
+    """Cross-validation of kNN"""
+    from mvpa2.clfs.knn import kNN
+    return _crossval(kNN(k=5), ds)
+
+
+def _setup_multiclass(nlabels, nproc):
+    ds = normal_feature_dataset(perlabel=10, nlabels=nlabels, nfeatures=100,
+                                nchunks=5, nonbogus_features=range(nlabels),
+                                snr=3.0)
+    return ds, nproc
+
+
+@benchmark('multiclass', params=dict(nlabels=[5, 20], nproc=[1, 4]),
+           setup=_setup_multiclass)
+def multiclass(data):
+    """Training and prediction of 1-vs-1 GNB classifiers"""
+    from mvpa2.clfs.meta import MulticlassClassifier
+    from mvpa2.clfs.gnb import GNB
+    ds, nproc = data
+    clf = MulticlassClassifier(GNB(), nproc=nproc)
+    clf.train(ds)
+    return clf.predict(ds)
+
+
+def _setup_mcnulldist(nfeatures, nsamples, npermutations):
+    return _volume_dataset(nfeatures, perlabel=nsamples // 2), npermutations
+
+
+@benchmark('mcnulldist', params=dict(nfeatures=[100, 1000],
+                                     nsamples=[40, 200],
+                                     npermutations=[20, 200]),
+           setup=_setup_mcnulldist)
+def mcnulldist(data):
+    """Monte-Carlo null distribution of a GNB cross-validation"""
+    from mvpa2.measures.base import CrossValidation
+    from mvpa2.clfs.gnb import GNB
+    from mvpa2.clfs.stats import MCNullDist
+    from mvpa2.generators.permutation import AttributePermutator
+    from mvpa2.mappers.fx import mean_sample
+    ds, npermutations = data
+    permutator = AttributePermutator('targets', limit='chunks',
+                                     count=npermutations)
+    cv = CrossValidation(GNB(), NFoldPartitioner(),
+                         postproc=mean_sample(),
+                         null_dist=MCNullDist(permutator, tail='left'))
+    return cv(ds)
+
+
+#
+# Startup
+#
+def _setup_suite_import(lazy):
+    tmpdir = tempfile.mkdtemp(prefix='pymvpa_bench')
+    env = dict(os.environ, MVPA_EXTERNALS_CACHE_DIR=tmpdir,
+               MVPA_SUITE_LAZY=lazy)
+    # the first import determines (and caches) the index of names
+    _run_suite_import(env)
+    return env, _TmpDirCleaner(tmpdir)
+
+
+def _run_suite_import(env):
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call([sys.executable, '-c', 'import mvpa2.suite'],
+                              env=env, stdout=devnull, stderr=devnull)
+
+
+@benchmark('suite_import', params=dict(lazy=['yes', 'no']),
+           setup=_setup_suite_import)
+def suite_import(data):
+    """`import mvpa2.suite` in a new interpreter"""
+    _run_suite_import(data[0])
+
+
+#
+# Per-call overhead
+#
+_tiny_clfs = {
+    'gnb': ('mvpa2.clfs.gnb', 'GNB'),
+    'knn': ('mvpa2.clfs.knn', 'kNN'),
+    'smlr': ('mvpa2.clfs.smlr', 'SMLR'),
+}
+
+
+def _setup_clf_overhead(clf, nfeatures, ncalls):
+    modname, clsname = _tiny_clfs[clf]
+    module = __import__(modname, fromlist=[clsname])
+    # tiny "ROI" dataset as in a searchlight
+    ds = _volume_dataset(nfeatures, perlabel=8, nchunks=4)
+    return getattr(module, clsname), ds, ncalls
+
+
+@benchmark('clf_instantiate', params=dict(clf=['gnb', 'knn', 'smlr'],
+                                          nfeatures=[5], ncalls=[1000]),
+           setup=_setup_clf_overhead)
+def clf_instantiate(data):
+    """Instantiation of `ncalls` classifiers"""
+    clfclass, ds, ncalls = data
+    for i in xrange(ncalls):
+        clfclass()
+
+
+@benchmark('clf_train_predict', params=dict(clf=['gnb', 'knn'],
+                                            nfeatures=[5, 50],
+                                            ncalls=[1000]),
+           setup=_setup_clf_overhead)
+def clf_train_predict(data):
+    """`ncalls` trainings and predictions of a classifier on a tiny ROI"""
+    clfclass, ds, ncalls = data
+    clf = clfclass()
+    for i in xrange(ncalls):
+        clf.train(ds)
+        clf.predict(ds)
+
+
+@benchmark('ca_access', params=dict(ncalls=[100000]))
+def ca_access(ncalls):
+    """`ncalls` assignments to and checks of conditional attributes"""
+    from mvpa2.clfs.gnb import GNB
+    ca = GNB().ca
+    for i in xrange(ncalls):
+        ca.training_time = i        # enabled
+        ca.trained_dataset = i      # disabled
+        ca.is_enabled('estimates')
+
+
+#
+# I/O and datasets
+#
+def _setup_hdf5(nfeatures, nsamples):
+    tmpdir = tempfile.mkdtemp(prefix='pymvpa_bench')
+    ds = _volume_dataset(nfeatures, perlabel=nsamples // 2)
+    return ds, os.path.join(tmpdir, 'ds.hdf5'), _TmpDirCleaner(tmpdir)
+
+
+class _TmpDirCleaner(object):
+    """Removes a temporary directory once the benchmark data is gone"""
+    def __init__(self, path):
+        self.path = path
+
+    def __del__(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+@benchmark('h5save', params=dict(nfeatures=[1000, 50000],
+                                 nsamples=[100, 500]),
+           setup=_setup_hdf5, requires=['h5py'])
+def h5save_(data):
+    """Store a dataset in HDF5"""
+    from mvpa2.base.hdf5 import h5save
+    ds, fname, _ = data
+    h5save(fname, ds)
+
+
+def _setup_h5load(nfeatures, nsamples):
+    from mvpa2.base.hdf5 import h5save
+    data = _setup_hdf5(nfeatures, nsamples)
+    h5save(data[1], data[0])
+    return data
+
+
+@benchmark('h5load', params=dict(nfeatures=[1000, 50000],
+                                 nsamples=[100, 500]),
+           setup=_setup_h5load, requires=['h5py'])
+def h5load_(data):
+    """Load a dataset from HDF5"""
+    from mvpa2.base.hdf5 import h5load
+    return h5load(data[1])
+
+
+def _setup_fmri_dataset(side, nvolumes):
+    import nibabel as nb
+    tmpdir = tempfile.mkdtemp(prefix='pymvpa_bench')
+    shape = (side,) * 3
+    fname = os.path.join(tmpdir, 'bold.nii.gz')
+    nb.Nifti1Image(np.random.normal(size=shape + (nvolumes,)
+                                    ).astype('float32'),
+                   np.eye(4)).to_filename(fname)
+    maskname = os.path.join(tmpdir, 'mask.nii.gz')
+    mask = np.zeros(shape, dtype='int16')
+    mask[1:-1, 1:-1, 1:-1] = 1
+    nb.Nifti1Image(mask, np.eye(4)).to_filename(maskname)
+    return fname, maskname, _TmpDirCleaner(tmpdir)
+
+
+@benchmark('fmri_dataset', params=dict(side=[16, 64], nvolumes=[20, 200]),
+           setup=_setup_fmri_dataset, requires=['nibabel'])
+def fmri_dataset_(data):
+    """Load a (masked) NIfTI timeseries with fmri_dataset"""
+    from mvpa2.datasets.mri import fmri_dataset
+    return fmri_dataset(data[0], mask=data[1])
+
+
+def _setup_vstack(nfeatures, ndatasets):
+    return [_volume_dataset(nfeatures, perlabel=10) for i in xrange(ndatasets)]
+
+
+@benchmark('vstack', params=dict(nfeatures=[1000, 50000],
+                                 ndatasets=[10, 100]),
+           setup=_setup_vstack)
+def vstack_(dss):
+    """Stack datasets along the samples axis"""
+    from mvpa2.base.dataset import vstack
+    return vstack(dss)
+
+
+def _setup_zscore(nfeatures, nsamples):
+    return _volume_dataset(nfeatures, perlabel=nsamples // 2)
+
+
+@benchmark('zscore', params=dict(nfeatures=[1000, 50000],
+                                 nsamples=[100, 500]),
+           setup=_setup_zscore)
+def zscore_(ds):
+    """Chunk-wise ZScoreMapper"""
+    from mvpa2.mappers.zscore import ZScoreMapper
+    zm = ZScoreMapper(chunks_attr='chunks')
+    zm.train(ds)
+    return zm.forward(ds)
+
+
+#
+# Surfaces
+#
+def _setup_voxel_selection(density, radius):
+    from mvpa2.misc.surfing import volgeom, volsurf
+    from mvpa2.support.nibabel import surf
+    side = max(density, 10)
+    vg = volgeom.VolGeom((side,) * 3, np.diag([30. / side] * 3 + [1]))
+    outer = surf.generate_sphere(density) * 12. + 15
+    inner = surf.generate_sphere(density) * 8. + 15
+    return volsurf.VolSurfMaximalMapping(vg, outer, inner), radius
+
+
+@benchmark('voxel_selection', params=dict(density=[10, 40], radius=[5.]),
+           setup=_setup_voxel_selection)
+def voxel_selection(data):
+    """Surface-based voxel selection for all nodes"""
+    from mvpa2.misc.surfing.surf_voxel_selection import voxel_selection
+    vs, radius = data
+    return voxel_selection(vs, radius, nproc=1, eta_step=0)
+
+
+#
+# Hyperalignment
+#
+def _setup_hyperalignment(nfeatures, nsubjects):
+    ds = _volume_dataset(nfeatures, perlabel=50)
+    return [random_affine_transformation(ds) for i in xrange(nsubjects)]
+
+
+@benchmark('hyperalignment', params=dict(nfeatures=[50, 500],
+                                         nsubjects=[3, 10]),
+           setup=_setup_hyperalignment)
+def hyperalignment(dss):
+    """Hyperalignment of randomly transformed datasets"""
+    from mvpa2.algorithms.hyperalignment import Hyperalignment
+    return Hyperalignment()(dss)
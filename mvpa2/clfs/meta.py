@@ -26,6 +26,8 @@ import numpy as np
 from mvpa2.misc.args import group_kwargs
 from mvpa2.base.types import is_sequence_type, asobjarray
 from mvpa2.base.param import Parameter
+from mvpa2.base.parallel import thread_map
+from mvpa2.base.constraints import EnsureInt, EnsureRange
 
 from mvpa2.datasets import Dataset
 
@@ -57,9 +59,19 @@ if __debug__:
 class BoostedClassifier(Classifier):
     """Classifier containing the farm of other classifiers.
 
-    Should rarely be used directly. Use one of its children instead
+    Should rarely be used directly. Use one of its children instead.
+
+    Slave classifiers are independent of each other, and can be trained and
+    queried for predictions concurrently in a pool of threads (see `nproc`).
+    This only pays off if the slave classifiers release the GIL during most
+    of their computation, as NumPy-based implementations and most external
+    libraries do.
     """
 
+    nproc = Parameter(1, constraints=EnsureInt() & EnsureRange(min=1),
+            doc="""Number of threads to train the slave classifiers, and to
+            obtain their predictions, in parallel.""")
+
     # should not be needed if we have prediction_estimates upstairs
     raw_predictions = ConditionalAttribute(enabled=False,
         doc="Predictions obtained from each classifier")
@@ -114,8 +126,8 @@ class BoostedClassifier(Classifier):
     def _train(self, dataset):
         """Train `BoostedClassifier`
         """
-        for clf in self.__clfs:
-            clf.train(dataset)
+        thread_map(lambda clf: clf.train(dataset), self.__clfs,
+                   self.params.nproc)
 
 
     def _posttrain(self, dataset):
@@ -141,7 +153,8 @@ class BoostedClassifier(Classifier):
     def _predict(self, dataset):
         """Predict using `BoostedClassifier`
         """
-        raw_predictions = [ clf.predict(dataset) for clf in self.__clfs ]
+        raw_predictions = thread_map(lambda clf: clf.predict(dataset),
+                                     self.__clfs, self.params.nproc)
         self.ca.raw_predictions = raw_predictions
         assert(len(self.__clfs)>0)
         if self.ca.is_enabled("estimates"):
@@ -401,57 +414,75 @@ class MaximalVote(PredictionsCombiner):
         if len(clfs)==0:
             return []                   # to don't even bother
 
-        all_label_counts = None
+        # sample indices and labels of all votes, the latter also as given
+        # by the classifiers to not alter their types
+        sample_ids = []
+        votes = []
+        all_votes = []
         for clf in clfs:
             # Lets check first if necessary conditional attribute is enabled
             if not clf.ca.is_enabled("predictions"):
                 raise ValueError, "MaximalVote needs classifiers (such as " + \
                       "%s) with state 'predictions' enabled" % clf
             predictions = clf.ca.predictions
-            if all_label_counts is None:
-                all_label_counts = [ {} for i in xrange(len(predictions)) ]
-
-            # for every sample
-            for i in xrange(len(predictions)):
-                prediction = predictions[i]
-                # XXX fishy location due to literal labels,
-                # TODO simplify assumptions and logic
+            nsamples = len(predictions)
+            predictions_ = np.asanyarray(predictions)
+            if predictions_.ndim == 1 and predictions_.dtype != object:
+                # a single label for every sample
+                sample_ids.append(np.arange(nsamples))
+                votes.append(predictions_)
+                all_votes.extend(predictions)
+                continue
+            # XXX fishy location due to literal labels,
+            # TODO simplify assumptions and logic
+            ids, labels = [], []
+            for i, prediction in enumerate(predictions):
                 if isinstance(prediction, basestring) or \
                        not is_sequence_type(prediction):
                     prediction = (prediction,)
-                for label in prediction: # for every label
-                    # XXX we might have multiple labels assigned
-                    # but might not -- don't remember now
-                    if not label in all_label_counts[i]:
-                        all_label_counts[i][label] = 0
-                    all_label_counts[i][label] += 1
-
-        predictions = []
+                # XXX we might have multiple labels assigned
+                # but might not -- don't remember now
+                ids += [i] * len(prediction)
+                labels += list(prediction)
+            sample_ids.append(np.array(ids, dtype=int))
+            votes.append(np.asarray(labels))
+            all_votes.extend(labels)
+
+        if len(set(v.dtype.kind for v in votes)) > 1:
+            # do not let numpy convert labels of different types
+            votes = [v.astype(object) for v in votes]
+        sample_ids = np.concatenate(sample_ids)
+        # sorted labels, so the first of multiple maxima is the first in
+        # sorted order
+        labels, first_ids, label_ids = np.unique(np.concatenate(votes),
+                                                 return_index=True,
+                                                 return_inverse=True)
+        nlabels = len(labels)
+        assert nlabels or not nsamples, \
+               "We should have obtained at least a single key of max label"
+        # votes for each label (columns) and sample (rows)
+        counts = np.bincount(sample_ids * nlabels + label_ids,
+                             minlength=nsamples * nlabels
+                             ).reshape(nsamples, nlabels)
+
         # select maximal vote now for each sample
-        for i in xrange(len(all_label_counts)):
-            label_counts = all_label_counts[i]
-            # lets do explicit search for max so we know
-            # if it is unique
-            maxk = []                   # labels of elements with max vote
-            maxv = -1
-            for k, v in label_counts.iteritems():
-                if v > maxv:
-                    maxk = [k]
-                    maxv = v
-                elif v == maxv:
-                    maxk.append(k)
-
-            assert len(maxk) >= 1, \
-                   "We should have obtained at least a single key of max label"
-
-            if len(maxk) > 1:
-                warning("We got multiple labels %s which have the " % maxk +
-                        "same maximal vote %d. XXX disambiguate. " % maxv +
-                        "Meanwhile selecting the first in sorted order")
-            predictions.append(sorted(maxk)[0])
+        winners = np.argmax(counts, axis=1) if nlabels \
+                  else np.zeros(0, dtype=int)
+        maxv = counts[np.arange(nsamples), winners]
+        for i in np.where(np.sum(counts == maxv[:, None], axis=1) > 1)[0]:
+            warning("We got multiple labels %s which have the "
+                    % labels[counts[i] == maxv[i]].tolist() +
+                    "same maximal vote %d. XXX disambiguate. " % maxv[i] +
+                    "Meanwhile selecting the first in sorted order")
+        # labels as provided by the classifiers
+        labels = [all_votes[i] for i in first_ids]
+        predictions = [labels[i] for i in winners]
 
         ca = self.ca
-        ca.estimates = all_label_counts
+        if ca.is_enabled('estimates'):
+            # label counts for each sample
+            ca.estimates = [dict((l, c) for l, c in zip(labels, row) if c)
+                            for row in counts.tolist()]
         ca.predictions = predictions
         return predictions
 
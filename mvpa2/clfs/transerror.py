@@ -65,6 +65,151 @@ def _p2(x, prec=2, formatting=''):
     return formatting + s
 
 
+def _encode_labels(values):
+    """Unique labels among `values` and integer codes of all values
+
+    Returns
+    -------
+    uniques : list
+      Unique labels (in arbitrary order)
+    codes : ndarray
+      Index into `uniques` for every value
+    """
+    if isinstance(values, np.ndarray) and values.dtype != np.object:
+        uniques, codes = np.unique(values.ravel(), return_inverse=True)
+        return list(uniques), codes
+    # generic sequences might contain anything hashable (e.g. None for
+    # missing predictions), so encode them via a dictionary
+    index = {}
+    codes = np.fromiter((index.setdefault(v, len(index)) for v in values),
+                        dtype=int, count=len(values))
+    return sorted(index, key=index.get), codes
+
+
+def _recode_labels(uniques, codes, rev_map):
+    """Translate codes into indexes of labels in `rev_map`"""
+    return np.array([rev_map[u] for u in uniques], dtype=int)[codes]
+
+
+def confusion_counts(predictions, targets, labels=None):
+    """Count matrices for one or many sets of predictions at once
+
+    A single call computes all confusion matrices of e.g. a set of ROIs or
+    permutations, which is much faster than filling `ConfusionMatrix`
+    instances one by one.
+
+    Parameters
+    ----------
+    predictions : array
+      Predicted labels, either (nsamples,) or (nsets, nsamples).
+    targets : array
+      Target labels, either (nsamples,) or (nsets, nsamples).  A single
+      vector of targets is used for all sets of predictions.
+    labels : list, optional
+      Labels defining rows/columns of the matrices.  By default, sorted
+      unique labels among targets and predictions are used.
+
+    Returns
+    -------
+    counts : ndarray
+      Counts of hits with rows -- predictions, columns -- targets, either
+      (nlabels, nlabels) or (nsets, nlabels, nlabels).
+    labels : list
+      Labels corresponding to rows/columns of the matrices.
+    """
+    # generic sequences are taken as is, so e.g. mixed int and str labels
+    # do not get converted into strings
+    targets, predictions = [
+        x if isinstance(x, np.ndarray)
+        else np.array(x, dtype=object)
+        for x in (targets, predictions)]
+    targets, predictions = np.broadcast_arrays(targets, predictions)
+    if predictions.ndim > 2:
+        raise ValueError("Predictions must be at most 2D (got shape %s)"
+                         % (predictions.shape,))
+    t_uniques, t_codes = _encode_labels(targets.ravel())
+    p_uniques, p_codes = _encode_labels(predictions.ravel())
+    if labels is None:
+        labels = sorted(set(t_uniques).union(p_uniques))
+    else:
+        labels = list(labels)
+    rev_map = dict([(l, i) for i, l in enumerate(labels)])
+    try:
+        t_codes = _recode_labels(t_uniques, t_codes, rev_map)
+        p_codes = _recode_labels(p_uniques, p_codes, rev_map)
+    except KeyError, e:
+        raise ValueError("Known labels %r do not include label %r found in "
+                         "predictions or targets" % (labels, e.args[0]))
+    nlabels = len(labels)
+    # index of each (set, prediction, target) triplet in a flat count
+    # array -- the first ravel()ed dimension of 2D input are the sets
+    nsets = predictions.shape[0] if predictions.ndim == 2 else 1
+    idx = p_codes * nlabels + t_codes
+    if predictions.ndim == 2:
+        idx += np.repeat(np.arange(nsets) * nlabels ** 2,
+                         predictions.shape[1])
+    counts = np.bincount(idx, minlength=nsets * nlabels ** 2)
+    if predictions.ndim == 2:
+        counts = counts.reshape(nsets, nlabels, nlabels)
+    else:
+        counts = counts.reshape(nlabels, nlabels)
+    return counts, labels
+
+
+def confusion_stats(counts):
+    """Performance statistics of (a stack of) confusion matrices
+
+    All statistics are computed in a 1-vs-rest fashion per each target (see
+    `ConfusionMatrix`) along the last two axes of `counts`, so many count
+    matrices (e.g. from `confusion_counts`) are handled at once.
+
+    Parameters
+    ----------
+    counts : ndarray
+      Counts with rows -- predictions, columns -- targets, of shape
+      (..., nlabels, nlabels).
+
+    Returns
+    -------
+    dict
+      Statistics with per label values in the last axis, e.g. 'TPR' of
+      shape (..., nlabels), and overall ones (e.g. 'ACC') of shape (...).
+    """
+    counts = np.asanyarray(counts)
+    TP = np.diagonal(counts, axis1=-2, axis2=-1)
+    stats = {'TP': TP,
+             'FP': np.sum(counts, axis=-1) - TP,
+             'FN': np.sum(counts, axis=-2) - TP}
+
+    stats['CORR'] = np.sum(TP, axis=-1)
+    stats['TN'] = stats['CORR'][..., None] - stats['TP']
+    stats['P'] = stats['TP'] + stats['FN']
+    stats['N'] = np.sum(stats['P'], axis=-1)[..., None] - stats['P']
+    stats["P'"] = stats['TP'] + stats['FP']
+    stats["N'"] = stats['TN'] + stats['FN']
+    stats['TPR'] = stats['TP'] / (1.0*stats['P'])
+    # reset nans in TPRs to 0s whenever there is no entries
+    # for those labels among the targets
+    stats['TPR'][stats['P'] == 0] = 0
+    stats['PPV'] = stats['TP'] / (1.0*stats["P'"])
+    stats['NPV'] = stats['TN'] / (1.0*stats["N'"])
+    stats['FDR'] = stats['FP'] / (1.0*stats["P'"])
+    stats['SPC'] = (stats['TN']) / (1.0*stats['FP'] + stats['TN'])
+    stats['F1'] = 2.*stats['TP'] / (stats["P"] + stats["P'"])
+
+    MCC_denom = np.sqrt(1.0*stats['P']*stats['N']*stats["P'"]*stats["N'"])
+    nz = MCC_denom!=0.0
+    stats['MCC'] = np.zeros(stats['TP'].shape)
+    stats['MCC'][nz] = \
+             (stats['TP'] * stats['TN'] - stats['FP'] * stats['FN'])[nz] \
+              / MCC_denom[nz]
+
+    stats['ACC'] = stats['CORR'] / (1.0*np.sum(stats['P'], axis=-1))
+    # TODO: STD of accuracy and corrected one according to
+    #    Nadeau and Bengio [50]
+    stats['ACC%'] = stats['ACC'] * 100.0
+    return stats
+
 
 class SummaryStatistics(object):
     """Basic class to collect targets/predictions and report summary statistics
@@ -142,18 +287,21 @@ class SummaryStatistics(object):
 
         # enforce labels in predictions to be of the same datatype as in
         # targets, since otherwise we are getting doubles for unknown at a
-        # given moment labels
+        # given moment labels.  Assignment into a typed array would convert
+        # the values back anyways, so only generic sequences are checked
         nonetype = type(None)
-        for i in xrange(len(targets)):
-            t1, t2 = type(targets[i]), type(predictions[i])
-            # if there were no prediction made - leave None, otherwise
-            # convert to appropriate type
-            if t1 != t2 and t2 != nonetype:
-                #warning("Obtained target %s and prediction %s are of " %
-                #       (t1, t2) + "different datatypes.")
-                if isinstance(predictions, tuple):
-                    predictions = list(predictions)
-                predictions[i] = t1(predictions[i])
+        if not isinstance(predictions, np.ndarray) \
+               or predictions.dtype == np.object:
+            for i in xrange(len(targets)):
+                t1, t2 = type(targets[i]), type(predictions[i])
+                # if there were no prediction made - leave None, otherwise
+                # convert to appropriate type
+                if t1 != t2 and t2 != nonetype:
+                    #warning("Obtained target %s and prediction %s are of " %
+                    #       (t1, t2) + "different datatypes.")
+                    if isinstance(predictions, tuple):
+                        predictions = list(predictions)
+                    predictions[i] = t1(predictions[i])
 
         if estimates is not None:
             # assure that we have a copy, or otherwise further in-place
@@ -510,10 +658,10 @@ class ConfusionMatrix(SummaryStatistics):
 
         SummaryStatistics.__init__(self, **kwargs)
 
-        if labels == None:
+        if labels is None:
             labels = []
 
-        self.__labels = labels
+        self.__labels = list(labels)
         """List of known labels"""
         self.__labels_in_custom_order = bool(len(labels))
         """So we know later on either we could resort them"""
@@ -521,6 +669,27 @@ class ConfusionMatrix(SummaryStatistics):
         """Mapping from original into given labels"""
         self.__matrix = None
         """Resultant confusion matrix"""
+        self.__matrices = None
+        """Confusion matrices of all sets (nsets x nlabels x nlabels)"""
+        self.__stats_computed = False
+        """Either statistics were derived from the current matrices"""
+        self.__ROC = None
+        self.__encoded = []
+        """Integer encoded targets and predictions of each set"""
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if not '_ConfusionMatrix__encoded' in state:
+            # instance stored by an earlier version which neither kept
+            # matrices of all sets nor separated statistics from them --
+            # recompute everything from the stored sets on demand
+            self.__dict__.pop('ROC', None)
+            self.__matrices = None
+            self.__stats_computed = False
+            self.__ROC = None
+            self.__encoded = []
+            self._computed = False
 
 
     def __call__(self, predictions, targets, estimates=None, store=False):
@@ -547,20 +716,7 @@ class ConfusionMatrix(SummaryStatistics):
         if labels is None or not len(labels):
             raise RuntimeError("ConfusionMatrix must have labels assigned prior"
                                "__call__()")
-        # verify that we know all the labels
-        labels_set = set(labels)
-        if not (labels_set.issuperset(targets)
-                and labels_set.issuperset(predictions)):
-            raise ValueError("Known labels %r does not include some labels "
-                             "found in predictions %r or targets %r provided"
-                             % (labels_set, set(predictions), set(targets)))
-
-        Nlabels = len(labels_set)
-        cm = np.zeros( (Nlabels, Nlabels), dtype=int )
-
-        rev_map = dict([ (x[1], x[0]) for x in enumerate(labels)])
-        for t,p in zip(targets, predictions):
-            cm[rev_map[p], rev_map[t]] += 1
+        cm, _ = confusion_counts(predictions, targets, labels=labels)
 
         if store:
             self.add(targets=targets, predictions=predictions, estimates=estimates)
@@ -590,14 +746,11 @@ class ConfusionMatrix(SummaryStatistics):
 
         # TODO: BinaryClassifier might spit out a list of predictions for each
         # value need to handle it... for now just keep original labels
-        try:
-            # figure out what labels we have
-            labels = \
-                list(reduce(lambda x, y: x.union(set(y[0]).union(set(y[1]))),
-                            self.sets,
-                            set(self.__labels)))
-        except:
-            labels = self.__labels
+        encoded = self._get_encoded_sets()
+        # figure out what labels we have
+        labels = list(set(self.__labels).union(
+            *[uniques for set_codes in encoded
+                      for uniques, codes in set_codes]))
 
 
         # Check labels_map if it was provided if it covers all the labels
@@ -642,63 +795,57 @@ class ConfusionMatrix(SummaryStatistics):
         if __debug__:
             debug("CM", "Got labels %s" % labels)
 
-        # Create a matrix for all votes
-        mat_all = np.zeros( (Nsets, Nlabels, Nlabels), dtype=int )
-
-        # create total number of samples of each label counts
-        # just for convinience I guess since it can always be
-        # computed from mat_all
-        counts_all = np.zeros( (Nsets, Nlabels) )
-
-        # reverse mapping from label into index in the list of labels
+        # Create a matrix for all votes.  (set, prediction, target) triplets
+        # are counted at once via their index into the flattened matrices
         rev_map = dict([ (x[1], x[0]) for x in enumerate(labels)])
-        for iset, set_ in enumerate(self.sets):
-            for t,p in zip(*set_[:2]):
-                mat_all[iset, rev_map[p], rev_map[t]] += 1
-
+        mat_all = np.zeros(Nsets * Nlabels ** 2, dtype=int)
+        if Nsets:
+            idx = np.concatenate([
+                (iset * Nlabels + _recode_labels(p_uniques, p_codes, rev_map))
+                * Nlabels + _recode_labels(t_uniques, t_codes, rev_map)
+                for iset, ((t_uniques, t_codes), (p_uniques, p_codes))
+                in enumerate(encoded)])
+            mat_all = np.bincount(idx, minlength=Nsets * Nlabels ** 2)
+        mat_all = mat_all.reshape(Nsets, Nlabels, Nlabels)
 
         # for now simply compute a sum of votes across different sets
         # we might do something more sophisticated later on, and this setup
         # should easily allow it
+        self.__matrices = mat_all
         self.__matrix = np.sum(mat_all, axis=0)
         self.__Nsamples = np.sum(self.__matrix, axis=0)
         self.__Ncorrect = sum(np.diag(self.__matrix))
+        # statistics get derived from the matrices only when asked for
+        self.__stats_computed = False
+
+
+    def _get_encoded_sets(self):
+        """(uniques, codes) of targets and predictions for all sets
+
+        Each set is encoded only once, so accumulating many sets (e.g.
+        across folds or permutations) does not require to go through the
+        labels of all previously added sets again.
+        """
+        encoded = self.__encoded
+        sets = self.sets
+        for iset, set_ in enumerate(sets):
+            if iset < len(encoded) and encoded[iset][0] is set_:
+                continue
+            del encoded[iset:]
+            encoded.append((set_, (_encode_labels(set_[0]),
+                                   _encode_labels(set_[1]))))
+        del encoded[len(sets):]
+        return [e[1] for e in encoded]
+
+
+    def _compute_stats(self):
+        """Derive performance statistics from the confusion matrices"""
+        mat_all = self.__matrices
+        Nsets, Nlabels = mat_all.shape[:2]
+
+        stats = confusion_stats(self.__matrix)
+        stats['# of labels'] = Nlabels
 
-        TP = np.diag(self.__matrix)
-        offdiag = self.__matrix - np.diag(TP)
-        stats = {
-            '# of labels' : Nlabels,
-            'TP' : TP,
-            'FP' : np.sum(offdiag, axis=1),
-            'FN' : np.sum(offdiag, axis=0)}
-
-        stats['CORR']  = np.sum(TP)
-        stats['TN']  = stats['CORR'] - stats['TP']
-        stats['P']  = stats['TP'] + stats['FN']
-        stats['N']  = np.sum(stats['P']) - stats['P']
-        stats["P'"] = stats['TP'] + stats['FP']
-        stats["N'"] = stats['TN'] + stats['FN']
-        stats['TPR'] = stats['TP'] / (1.0*stats['P'])
-        # reset nans in TPRs to 0s whenever there is no entries
-        # for those labels among the targets
-        stats['TPR'][stats['P'] == 0] = 0
-        stats['PPV'] = stats['TP'] / (1.0*stats["P'"])
-        stats['NPV'] = stats['TN'] / (1.0*stats["N'"])
-        stats['FDR'] = stats['FP'] / (1.0*stats["P'"])
-        stats['SPC'] = (stats['TN']) / (1.0*stats['FP'] + stats['TN'])
-        stats['F1'] = 2.*stats['TP'] / (stats["P"] + stats["P'"])
-
-        MCC_denom = np.sqrt(1.0*stats['P']*stats['N']*stats["P'"]*stats["N'"])
-        nz = MCC_denom!=0.0
-        stats['MCC'] = np.zeros(stats['TP'].shape)
-        stats['MCC'][nz] = \
-                 (stats['TP'] * stats['TN'] - stats['FP'] * stats['FN'])[nz] \
-                  / MCC_denom[nz]
-
-        stats['ACC'] = np.sum(TP)/(1.0*np.sum(stats['P']))
-        # TODO: STD of accuracy and corrected one according to
-        #    Nadeau and Bengio [50]
-        stats['ACC%'] = stats['ACC'] * 100.0
         if chisquare:
             # indep_rows to assure reasonable handling of disbalanced
             # cases
@@ -708,19 +855,19 @@ class ConfusionMatrix(SummaryStatistics):
             # (e.g. it goes down through splits)
 
             # simple linear regression
-            ACC_per_set = [np.sum(np.diag(m))/np.sum(m).astype(float)
-                           for m in mat_all]
+            ACC_per_set = np.trace(mat_all, axis1=1, axis2=2) \
+                          / np.sum(mat_all, axis=(1, 2)).astype(float)
             stats['LOE(ACC):slope'], stats['LOE(ACC):inter'], \
                 stats['LOE(ACC):r'], stats['LOE(ACC):p'], _ = \
                 linregress(np.arange(Nsets), ACC_per_set)
 
-            TPRs_per_set = [np.diag(m)/np.sum(m, axis=0).astype(float)
-                            for m in mat_all]
-            # Confusion ratios (both TPs or FPs)
-            # we want to divide each column but sum in the column
-            CM_per_set = [np.ravel(m/np.sum(m, axis=0).astype(float)[None, :])
-                          for m in mat_all]
-
+            ## TPRs_per_set = np.diagonal(mat_all, axis1=1, axis2=2) \
+            ##                / np.sum(mat_all, axis=1).astype(float)
+            ## # Confusion ratios (both TPs or FPs)
+            ## # we want to divide each column but sum in the column
+            ## CM_per_set = np.reshape(
+            ##     mat_all / np.sum(mat_all, axis=1).astype(float)[:, None],
+            ##     (Nsets, -1))
             ## stats['Friedman(TPR):chi^2'], stats['Friedman(TPR):p'] = \
             ##                               friedmanchisquare(*TPRs_per_set)
             ## stats['Friedman(CM):chi^2'], stats['Friedman(CM):p'] = \
@@ -728,7 +875,7 @@ class ConfusionMatrix(SummaryStatistics):
 
         #
         # ROC computation if available
-        ROC = ROCCurve(labels=labels, sets=self.sets)
+        ROC = ROCCurve(labels=self.__labels, sets=self.sets)
         aucs = ROC.aucs
         if len(aucs)>0:
             stats['AUC'] = aucs
@@ -736,11 +883,11 @@ class ConfusionMatrix(SummaryStatistics):
                 raise RuntimeError, \
                       "We must got a AUC per label. Got %d instead of %d" % \
                       (len(aucs), Nlabels)
-            self.ROC = ROC
+            self.__ROC = ROC
         else:
             # we don't want to provide ROC if it is bogus
             stats['AUC'] = [np.nan] * Nlabels
-            self.ROC = None
+            self.__ROC = None
 
 
         # compute mean stats
@@ -748,6 +895,31 @@ class ConfusionMatrix(SummaryStatistics):
             stats['mean(%s)' % k] = np.mean(v)
 
         self._stats.update(stats)
+        self.__stats_computed = True
+
+
+    @property
+    def stats(self):
+        self.compute()
+        if not self.__stats_computed:
+            self._compute_stats()
+        return self._stats
+
+
+    @property
+    def ROC(self):
+        """`ROCCurve` of all sets, or None if it could not be computed"""
+        # ROC is computed along with the rest of statistics
+        self.stats
+        return self.__ROC
+
+
+    @property
+    def set_matrices(self):
+        """Confusion matrices of all sets as (nsets x nlabels x nlabels) array
+        """
+        self.compute()
+        return self.__matrices
 
 
     ##REF: Name was automagically refactored
@@ -787,7 +959,7 @@ class ConfusionMatrix(SummaryStatistics):
         Nlabels = len(labels)
         Nsamples = self.__Nsamples.astype(int)
 
-        stats = self._stats
+        stats = self.stats
         if short:
             return "%(# of sets)d sets %(# of labels)d labels " \
                    " ACC:%(ACC).2f" \
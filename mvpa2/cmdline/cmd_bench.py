@@ -0,0 +1,126 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the PyMVPA package for the
+#   copyright and license terms.
+#
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Run performance benchmarks of PyMVPA
+
+Benchmarks are parametrised workloads on synthetic data, covering
+searchlights, cross-validation, permutation testing, I/O, and other
+computationally demanding parts of PyMVPA. For each benchmark and set of
+parameters, the fastest of several runs and the peak memory usage are
+reported.
+
+Results can be stored in a JSON file, and compared to those of a previous
+run, e.g. of another PyMVPA revision or on a different machine.
+
+Examples:
+
+List all available benchmarks with their parameters:
+
+  $ pymvpa2 bench --list
+
+Quickly run all searchlight benchmarks and store the results:
+
+  $ pymvpa2 bench --quick -o results.json '*searchlight'
+
+Run cross-validation benchmarks with custom parameters, and compare to a
+previous run:
+
+  $ pymvpa2 bench --param nfeatures=200,2000 --compare results.json 'crossval*'
+
+"""
+
+# magic line for manpage summary
+# man: -*- % run performance benchmarks
+
+__docformat__ = 'restructuredtext'
+
+import argparse
+from mvpa2.base import verbose
+from mvpa2.benchmarks import get_benchmarks, run_benchmarks, \
+        save_results, load_results, compare_results, _params2str
+
+parser_args = {
+    'formatter_class': argparse.RawDescriptionHelpFormatter,
+}
+
+
+def _param_spec(spec):
+    try:
+        name, values = spec.split('=', 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+                "parameter specification must be NAME=VALUE[,VALUE...]")
+    vals = []
+    for v in values.split(','):
+        for conv in (int, float):
+            try:
+                v = conv(v)
+                break
+            except ValueError:
+                pass
+        vals.append(v)
+    return name, vals
+
+
+def setup_parser(parser):
+    parser.add_argument('benchmarks', nargs='*', metavar='PATTERN',
+                        help="""names of benchmarks to run. Shell-style
+                        wildcards are supported. By default all benchmarks
+                        are run.""")
+    parser.add_argument('--list', action='store_true',
+                        help="""list available benchmarks and their
+                        parameters and exit""")
+    parser.add_argument('--quick', action='store_true',
+                        help="""only run the first (smallest) value of each
+                        parameter""")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="""number of timed runs of each benchmark. The
+                        fastest is reported. Default: 3""")
+    parser.add_argument('--param', type=_param_spec, action='append',
+                        default=[], metavar='NAME=VALUE[,VALUE...]',
+                        help="""override the values of a benchmark parameter
+                        for all benchmarks that have it. Can be given
+                        multiple times.""")
+    parser.add_argument('-o', '--output', metavar='FILENAME',
+                        help="""store results in a JSON file""")
+    parser.add_argument('--compare', metavar='FILENAME',
+                        help="""compare results with those of a previous run
+                        stored in a JSON file""")
+
+
+def run(args):
+    if args.list:
+        for bm in get_benchmarks(args.benchmarks):
+            print '%s: %s%s' % (bm.name, bm.descr,
+                                '' if bm.is_available()
+                                else ' (unavailable: requires %s)'
+                                     % ', '.join(bm.requires))
+            for name in sorted(bm.params):
+                print '  %s: %s' % (name, bm.params[name])
+        return
+    results = run_benchmarks(args.benchmarks, params=dict(args.param),
+                             quick=args.quick, repeat=args.repeat)
+    if args.output:
+        verbose(1, "Saving results to %s" % args.output)
+        save_results(results, args.output)
+    if args.compare:
+        comparison = compare_results(load_results(args.compare), results)
+        print '%-20s %-40s %10s %10s %7s' % ('benchmark', 'parameters',
+                                             'reference', 'time', 'ratio')
+        for name, params, rtime, time, ratio in comparison:
+            print '%-20s %-40s %9.4fs %9.4fs %7.2f' \
+                    % (name, params, rtime, time, ratio)
+    else:
+        print '%-20s %-40s %10s %12s' % ('benchmark', 'parameters', 'time',
+                                         'peak mem')
+        for res in results['results']:
+            mem = res['peak_mem_mb']
+            print '%-20s %-40s %9.4fs %12s' \
+                    % (res['name'], _params2str(res['params']), res['time'],
+                       '%.1f MB' % mem if mem is not None else 'n/a')
+    return results
@@ -8,6 +8,27 @@
 ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
 """Traveling ROI analysis
 
+A searchlight can be distributed across many machines (e.g. the slots of a
+batch scheduler) that only share a filesystem.  With --split K/N only the K-th
+of N shards of all ROI centers is processed and stored as a partial result.
+Shards are interleaved (every N-th ROI center), which balances their workload
+since neighboring ROIs are of similar size, and can be determined without any
+computation.  Once all shards are computed, the 'searchlight-merge' command
+assembles the partial results into the same result that a single searchlight
+run would have produced.
+
+Examples:
+
+Compute the third of 100 shards of a cross-validation searchlight:
+
+  $ pymvpa2 searchlight -i ds.hdf5 --payload cv --neighbors 3 \\
+            --cv-learner gnb --cv-partitioner oddeven:chunks \\
+            --split 3/100 -o sl_part3
+
+and merge all of them:
+
+  $ pymvpa2 searchlight-merge -i sl_part*.hdf5 -o sl
+
 """
 
 # magic line for manpage summary
@@ -32,6 +53,19 @@ parser_args = {
     'formatter_class': argparse.RawDescriptionHelpFormatter,
 }
 
+
+def _arg2split(arg):
+    try:
+        k, n = [int(i) for i in arg.split('/')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+                "split specification must be K/N")
+    if not 1 <= k <= n:
+        raise argparse.ArgumentTypeError(
+                "K must be in the range 1..N in a K/N split specification")
+    return k, n
+
+
 searchlight_opts_grp = ('options for searchlight setup', [
     (('--payload',), dict(required=True,
         help="""switch to select a particular analysis type to be run in a
@@ -65,12 +99,27 @@ searchlight_opts_grp = ('options for searchlight setup', [
         block in case of --nproc > 1. 'native' is pickling/unpickling of
         results, while 'hdf5' uses HDF5 based file storage. 'hdf5' might be more
         time and memory efficient in some cases.""")),
+    (('--split',), dict(type=_arg2split, metavar='K/N',
+        help="""only compute the K-th (starting with 1) of N shards of all ROI
+        centers, and store it as a partial result. The K-th shard comprises
+        every N-th ROI center, starting with the K-th one. Partial results of
+        all N shards can be combined with the 'searchlight-merge'
+        command.""")),
     (('--aggregate-fx',), dict(type=script2obj,
         help="""use a custom result aggregation function for the searchlight
              """)),
     (('--ds-preproc-fx',), dict(type=script2obj,
         help="""custom preprocessing function to be applied immediately after
         loading the data""")),
+    (('--ds-cache',), dict(metavar='DIR',
+        help="""directory of a cache for the loaded (and preprocessed with
+        --ds-preproc-fx) dataset. If the input files and the preprocessing
+        function did not change since a previous run, the dataset is taken
+        from the cache.""")),
+    (('--ds-cache-size',), dict(type=float, metavar='MB',
+        help="""maximal size of the dataset cache in megabytes. Least recently
+        used datasets are removed from the cache whenever it exceeds this
+        size.""")),
 ])
 
 searchlight_constraints_opts_grp = ('options for constraining the searchlight', [
@@ -135,6 +184,77 @@ def _fill_in_scattered_results(sl, dataset, roi_ids, results):
     return result_ds
 
 
+def _get_split_roi_ids(nfeatures, roi_ids, split):
+    """ROI centers of a single shard of a split searchlight
+
+    ROI centers are assigned to the shards in turn, so every shard gets a
+    similar share of large (e.g. central) and small (e.g. border) ROIs,
+    without any need to query the ROIs.
+    """
+    k, n = split
+    if roi_ids is None:
+        roi_ids = np.arange(nfeatures)
+    roi_ids = np.asanyarray(roi_ids)
+    if n > len(roi_ids):
+        raise ValueError("cannot split %i ROIs into %i shards"
+                         % (len(roi_ids), n))
+    return roi_ids[k - 1::n]
+
+
+def _merge_split_results(results):
+    """Assemble the partial results of all shards of a split searchlight"""
+    from mvpa2.datasets import hstack
+    from mvpa2.featsel.base import StaticFeatureSelection
+    from mvpa2.mappers.base import ChainMapper
+    for res in results:
+        if not 'searchlight_split' in res.a:
+            raise ValueError("%s is not a partial result of a split "
+                             "searchlight" % res)
+    first = results[0]
+    nsplits = first.a.searchlight_split[1]
+    roi_ids = first.a.searchlight_roi_ids
+    dshape = tuple(first.a.searchlight_dshape)
+    for res in results[1:]:
+        other_roi_ids = res.a.searchlight_roi_ids
+        if res.a.searchlight_split[1] != nsplits \
+                or tuple(res.a.searchlight_dshape) != dshape \
+                or (roi_ids is None) != (other_roi_ids is None) \
+                or (roi_ids is not None
+                    and not np.array_equal(roi_ids, other_roi_ids)):
+            raise ValueError("partial results are from different searchlights")
+    splits = sorted(res.a.searchlight_split[0] for res in results)
+    if splits != range(1, nsplits + 1):
+        raise ValueError("need the partial results of all %i shards exactly "
+                         "once, got shards %s" % (nsplits, splits))
+    results = sorted(results, key=lambda res: res.a.searchlight_split[0])
+    merged = hstack(results)
+
+    # same order of ROIs as in a single searchlight run
+    all_ids = np.arange(dshape[0]) if roi_ids is None else roi_ids
+    position = np.zeros(dshape[0], dtype=int)
+    position[all_ids] = np.arange(len(all_ids))
+    center_ids = merged.fa.center_ids
+    order = np.argsort(position[center_ids], kind='mergesort')
+    if not np.array_equal(center_ids[order], all_ids):
+        raise ValueError("partial results do not cover all ROI centers")
+    merged = merged[:, order]
+
+    if 'mapper' in first.a:
+        # replace the selection of the shard's ROI centers
+        mapper = first.a.mapper[:-1]
+        if roi_ids is not None:
+            mapper.append(StaticFeatureSelection(roi_ids, dshape=dshape))
+        merged.a['mapper'] = mapper
+    return merged
+
+
+def _load_preprocessed_ds(data, preproc_fx=None):
+    ds = arg2ds(data)
+    if preproc_fx is not None:
+        ds = preproc_fx(ds)
+    return ds
+
+
 def setup_parser(parser):
     from .helpers import parser_add_optgroup_from_def, \
         parser_add_common_attr_opts, single_required_hdf5output, ca_opts_grp
@@ -160,9 +280,15 @@ def run(args):
                     args.cv_avg_datafold_results, args.cv_prob_tail)
     else:
         raise RuntimeError("this should not happen")
-    ds = arg2ds(args.data)
-    if args.ds_preproc_fx is not None:
-        ds = args.ds_preproc_fx(ds)
+    if args.ds_cache is not None:
+        from mvpa2.datasets.cache import DatasetCache
+        max_size = None
+        if args.ds_cache_size is not None:
+            max_size = int(args.ds_cache_size * 2 ** 20)
+        cache = DatasetCache(args.ds_cache, max_size=max_size)
+        ds = cache.call(_load_preprocessed_ds, args.data, args.ds_preproc_fx)
+    else:
+        ds = _load_preprocessed_ds(args.data, args.ds_preproc_fx)
     # setup neighborhood
     # XXX add big switch to allow for setting up surface-based neighborhoods
     from mvpa2.misc.neighborhood import IndexQueryEngine
@@ -209,6 +335,14 @@ def run(args):
             # scattering happened on entire feature-set
             roi_ids = seed_ids
 
+    if args.split is not None:
+        if aggregate_fx is not None:
+            raise ValueError("--split cannot be used with --scatter-rois or "
+                             "--aggregate-fx")
+        all_roi_ids = roi_ids
+        roi_ids = _get_split_roi_ids(ds.nfeatures, roi_ids, args.split)
+        verbose(2, 'Processing shard %i/%i' % args.split)
+
     verbose(3, 'Attempting %i ROI analyses'
                % ((roi_ids is None) and ds.nfeatures or len(roi_ids)))
 
@@ -232,6 +366,11 @@ def run(args):
     if (seed_ids is not None) and ('mapper' in res.a):
         # strip the last mapper link in the chain, which would be the seed ID selection
         res.a['mapper'] = res.a.mapper[:-1]
+    if args.split is not None:
+        # everything needed to assemble the final result
+        res.a['searchlight_split'] = args.split
+        res.a['searchlight_roi_ids'] = all_roi_ids
+        res.a['searchlight_dshape'] = ds.shape[1:]
     # XXX create more output
     # and store
     ds2hdf5(res, args.output, compression=args.hdf5_compression)
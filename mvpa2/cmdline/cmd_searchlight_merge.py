@@ -0,0 +1,49 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the PyMVPA package for the
+#   copyright and license terms.
+#
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Merge partial results of a split searchlight
+
+Partial results computed with 'pymvpa2 searchlight --split K/N' are assembled
+into the result of the full searchlight, with ROIs in their original order, and
+the mapper of the input dataset. The partial results of all N shards have to be
+given (in any order).
+
+Example:
+
+  $ pymvpa2 searchlight-merge -i sl_part*.hdf5 -o sl
+
+"""
+
+# magic line for manpage summary
+# man: -*- % merge partial results of a split searchlight
+
+__docformat__ = 'restructuredtext'
+
+import argparse
+from mvpa2.base import verbose
+from mvpa2.cmdline.helpers import parser_add_common_opt, ds2hdf5, hdf2ds
+from mvpa2.cmdline.cmd_searchlight import _merge_split_results
+
+parser_args = {
+    'formatter_class': argparse.RawDescriptionHelpFormatter,
+}
+
+
+def setup_parser(parser):
+    from .helpers import parser_add_optgroup_from_def, \
+        single_required_hdf5output
+    parser_add_common_opt(parser, 'multidata', required=True)
+    parser_add_optgroup_from_def(parser, single_required_hdf5output)
+
+
+def run(args):
+    results = hdf2ds(args.data)
+    verbose(2, 'Merging %i partial searchlight results' % len(results))
+    res = _merge_split_results(results)
+    ds2hdf5(res, args.output, compression=args.hdf5_compression)
+    return res
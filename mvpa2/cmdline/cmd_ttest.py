@@ -11,6 +11,11 @@
 This is a rudimentary way to perform fixed-effect significance test
 across subjects on e.g. searchlight results maps.
 
+Input maps are read one at a time, and only the sufficient statistics of the
+test are kept in memory, hence the number of input maps is not limited by the
+available memory. Optionally, p-values can be estimated by randomly flipping
+the sign of the input maps (relative to the chance level).
+
 """
 
 # magic line for manpage summary
@@ -32,7 +37,7 @@ if __debug__:
 from mvpa2.cmdline.helpers \
     import parser_add_common_opt
 from mvpa2.datasets.mri import map2nifti, fmri_dataset
-from mvpa2.misc.stats import ttest_1samp
+from mvpa2.misc.stats import StreamingTTest1Samp
 import nibabel as nib
 import scipy.stats as stats
 
@@ -66,6 +71,16 @@ def setup_parser(parser):
                         default=0, type=int, help="""In case of multi sample dataset,
                         which sample to extract to run the ttest on""")
 
+    parser.add_argument('-n', '--permutations', default=0, type=int,
+                        help="""number of random sign-flipping permutations.
+                        If given, p-values (and z-values derived from them)
+                        are computed from the corresponding null distribution
+                        instead of the t-distribution""")
+
+    parser.add_argument('--nproc', default=1, type=int,
+                        help="""number of threads to process blocks of
+                        features in parallel""")
+
 def guess_backend(fn):
     """Guess which filetype we're dealing with"""
     if fn.endswith('.gz'):
@@ -83,15 +98,34 @@ def guess_backend(fn):
 
 def run(args):
     """Run it"""
-    verbose(1, "Loading %d result files" % len(args.data))
+    verbose(1, "Processing %d result files" % len(args.data))
 
     filetype_in = guess_backend(args.data[0])
-
     if filetype_in == 'nifti':
-        dss = [fmri_dataset(f) for f in args.data]
+        load = fmri_dataset
     elif filetype_in == 'hdf5':
-        dss = [h5load(f) for f in args.data]
-    data = np.asarray([d.samples[args.isample] for d in dss])
+        load = h5load
+
+    ttest = StreamingTTest1Samp(popmean=args.chance_level,
+                                alternative=args.alternative,
+                                nperm=getattr(args, 'permutations', 0),
+                                nproc=getattr(args, 'nproc', 1))
+    # first dataset serves as template for the output
+    template = None
+    has_value = None
+    for f in args.data:
+        if __debug__:
+            debug('CMDLINE', "Loading %s" % f)
+        ds = load(f)
+        sample = ds.samples[args.isample]
+        ttest.update(sample)
+        if template is None:
+            # no need to keep all samples around
+            template = ds[args.isample:args.isample + 1]
+            has_value = sample != 0
+        else:
+            has_value |= sample != 0
+        del ds
 
     if args.mask:
         filetype_mask = guess_backend(args.mask)
@@ -102,10 +136,11 @@ def run(args):
         out_of_mask = mask == 0
     else:
         # just take where no voxel had a value
-        out_of_mask = np.sum(data != 0, axis=0)==0
+        out_of_mask = ~has_value
 
-    t, p = ttest_1samp(data, popmean=args.chance_level, axis=0,
-                       alternative=args.alternative)
+    t, p = ttest.ttest()
+    if ttest.nperm:
+        p = ttest.perm_prob()
 
     if args.stat == 'z':
         if args.alternative == 'two-sided':
@@ -132,8 +167,8 @@ def run(args):
     verbose(1, "Saving to %s" % args.output)
     filetype_out = guess_backend(args.output)
     if filetype_out == 'nifti':
-        map2nifti(dss[0], data=s).to_filename(args.output)
+        map2nifti(template, data=s).to_filename(args.output)
     else:  # filetype_out is hdf5
-        s = Dataset(np.atleast_2d(s), fa=dss[0].fa, a=dss[0].a)
+        s = Dataset(np.atleast_2d(s), fa=template.fa, a=template.a)
         h5save(args.output, s)
     return s
@@ -62,7 +62,7 @@ if __debug__:
 
 # nothing in here that works without the base class
 from mvpa2.datasets.base import Dataset, dataset_wizard
-from mvpa2.base.dataset import hstack, vstack
+from mvpa2.base.dataset import hstack, vstack, DatasetStacker
 
 if __debug__:
     debug('INIT', 'mvpa2.datasets end')
@@ -548,7 +548,7 @@ class HollowSamples(object):
 
 def preprocessed_dataset(
         src, raw_loader, ds_converter, preproc_raw=None,
-        preproc_ds=None, add_sa=None, **kwargs):
+        preproc_ds=None, add_sa=None, cache=None, **kwargs):
     """
     Convenience function to load and preprocess data into a dataset.
 
@@ -596,6 +596,11 @@ def preprocessed_dataset(
       Additional sample attributes to assign to the dataset. In case of
       a NumPy record array, all values for each sub-dtype are assigned
       as an attribute under their respective field name.
+    cache : DatasetCache or str or None
+      If not None, the resulting dataset is taken from (or stored in) this
+      :class:`~mvpa2.datasets.cache.DatasetCache` (or a cache in the
+      directory of this name).  The cache key is computed from the content
+      of the source file(s) and all other arguments.
     **kwargs
       Any additional arguments are passed on to ``ds_converter``.
 
@@ -615,6 +620,14 @@ def preprocessed_dataset(
     ...         mask='mvpa2/data/mask.nii.gz',
     ...         preproc_ds=PolyDetrendMapper(polyord=2, auto_train=True))
     """
+    if cache is not None:
+        if isinstance(cache, basestring):
+            from mvpa2.datasets.cache import DatasetCache
+            cache = DatasetCache(cache)
+        return cache.call(preprocessed_dataset, src, raw_loader, ds_converter,
+                          preproc_raw=preproc_raw, preproc_ds=preproc_ds,
+                          add_sa=add_sa, **kwargs)
+
     raw = raw_loader(src)
 
     if preproc_raw is not None:
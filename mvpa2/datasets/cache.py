@@ -0,0 +1,334 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the PyMVPA package for the
+#   copyright and license terms.
+#
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""On-disk cache for (pre-processed) datasets.
+
+Loading data and running the same preprocessing (e.g. detrending, z-scoring,
+masking) for every analysis of a subject is wasteful.  `DatasetCache` stores
+the dataset returned by a loader function in a cache directory, keyed by a
+hash of the function and all its arguments.  Arguments that are names of
+existing files are represented by a checksum of their content, so a changed
+input file results in a cache miss.  PyMVPA objects, such as mappers, are
+represented by their `repr` (i.e. their parameters), and functions by their
+code.
+
+>>> from mvpa2.datasets.cache import DatasetCache
+>>> from mvpa2.datasets.base import preprocessed_dataset
+>>> from mvpa2.datasets.mri import fmri_dataset
+>>> from mvpa2.mappers.detrend import PolyDetrendMapper
+>>> import nibabel as nb
+>>> cache = DatasetCache('/tmp/pymvpa_cache', max_size=2 * 1024 ** 3)
+>>> ds = cache.call(preprocessed_dataset,              # doctest: +SKIP
+...         'mvpa2/data/bold.nii.gz', nb.load, fmri_dataset,
+...         mask='mvpa2/data/mask.nii.gz',
+...         preproc_ds=PolyDetrendMapper(polyord=2, auto_train=True))
+"""
+
+__docformat__ = 'restructuredtext'
+
+import os
+import os.path as osp
+import re
+import sys
+import types
+import tempfile
+import hashlib
+import cPickle
+
+import numpy as np
+
+import mvpa2
+from mvpa2.base import externals, warning
+from mvpa2.base.dataset import AttrDataset
+from mvpa2.base.state import ClassWithCollections
+from mvpa2.base.dochelpers import strip_strid
+
+if __debug__:
+    from mvpa2.base import debug
+
+
+def _update_hash(h, obj, file_checksum):
+    """Feed a stable description of an object into a hash object"""
+    if obj is None or isinstance(obj, (bool, int, long, float, complex)):
+        h.update(repr(obj))
+    elif isinstance(obj, basestring):
+        if osp.isfile(obj):
+            h.update('file:')
+            h.update(file_checksum(obj))
+        else:
+            h.update(repr(obj))
+    elif isinstance(obj, np.ndarray):
+        h.update('%s%s' % (obj.dtype.str, obj.shape))
+        if obj.dtype == np.object:
+            _update_hash(h, obj.tolist(), file_checksum)
+        else:
+            h.update(np.ascontiguousarray(obj).data)
+    elif isinstance(obj, (list, tuple)):
+        h.update('%s%i' % (type(obj).__name__, len(obj)))
+        for o in obj:
+            _update_hash(h, o, file_checksum)
+    elif isinstance(obj, dict):
+        h.update('dict%i' % len(obj))
+        for k in sorted(obj):
+            _update_hash(h, k, file_checksum)
+            _update_hash(h, obj[k], file_checksum)
+    elif isinstance(obj, types.FunctionType):
+        # functions might be defined in scripts and not be picklable -- and
+        # their code is what matters anyway
+        code = obj.func_code
+        h.update('function:%s.%s' % (obj.__module__, obj.__name__))
+        h.update(code.co_code)
+        _update_hash(h, [c for c in code.co_consts
+                         if not isinstance(c, types.CodeType)],
+                     file_checksum)
+        _update_hash(h, obj.func_defaults, file_checksum)
+        if obj.func_closure:
+            _update_hash(h, [c.cell_contents for c in obj.func_closure],
+                         file_checksum)
+    elif isinstance(obj, (types.BuiltinFunctionType, type, types.ClassType)):
+        h.update('%s.%s' % (obj.__module__, obj.__name__))
+    elif isinstance(obj, ClassWithCollections):
+        # PyMVPA objects describe their configuration in their repr, while
+        # their state (e.g. after training) does not matter
+        h.update(_get_full_repr(obj))
+    else:
+        try:
+            h.update(cPickle.dumps(obj, protocol=2))
+        except Exception as e:
+            if __debug__:
+                debug('DSC', "Failed to pickle %s for hashing: %s" % (obj, e))
+            h.update(_get_full_repr(obj))
+
+
+def _get_full_repr(obj):
+    """repr() of an object without truncation and object addresses"""
+    from mvpa2 import cfg
+    if not cfg.has_section('verbose'):
+        cfg.add_section('verbose')
+    truncate = cfg.get('verbose', 'truncate repr', default=None)
+    cfg.set('verbose', 'truncate repr', str(sys.maxint))
+    try:
+        r = repr(obj)
+    finally:
+        if truncate is None:
+            cfg.remove_option('verbose', 'truncate repr')
+        else:
+            cfg.set('verbose', 'truncate repr', truncate)
+    # addresses would make the key unique for each process
+    return re.sub(' at 0x[0-9a-fA-F]+', '', strip_strid(r))
+
+
+class DatasetCache(object):
+    """Cache of datasets in a directory, keyed by content hashes.
+
+    Each cached dataset is stored in its own file in the cache directory.
+    Whenever the total size of all cached datasets exceeds `max_size`, the
+    least recently used entries are removed.
+    """
+
+    def __init__(self, cachedir, max_size=None, backend='hdf5'):
+        """
+        Parameters
+        ----------
+        cachedir : str
+          Directory to store cached datasets in.  It is created if it does
+          not exist yet.
+        max_size : int or None
+          Maximal total size (in bytes) of all cached datasets.  If None,
+          entries are never evicted.
+        backend : {'hdf5', 'npy'}
+          Storage format.  'hdf5' stores complete datasets with `h5save`.
+          'npy' stores the samples as a NumPy array file that is
+          memory-mapped (copy-on-write) when loaded, and all attributes as a
+          pickle.
+        """
+        if not backend in ('hdf5', 'npy'):
+            raise ValueError("Unknown cache backend %r" % (backend,))
+        if backend == 'hdf5':
+            externals.exists('h5py', raise_=True)
+        self.cachedir = cachedir
+        self.max_size = max_size
+        self.backend = backend
+        self._file_checksums = {}
+        if not osp.exists(cachedir):
+            os.makedirs(cachedir)
+
+    def __repr__(self):
+        return "%s(%r, max_size=%r, backend=%r)" \
+               % (self.__class__.__name__, self.cachedir, self.max_size,
+                  self.backend)
+
+    def _file_checksum(self, filename):
+        """SHA1 of a file's content (memoized per file size and mtime)"""
+        st = os.stat(filename)
+        fkey = (osp.realpath(filename), st.st_size, st.st_mtime)
+        if not fkey in self._file_checksums:
+            h = hashlib.sha1()
+            with open(filename, 'rb') as f:
+                for block in iter(lambda: f.read(2 ** 20), ''):
+                    h.update(block)
+            self._file_checksums[fkey] = h.hexdigest()
+        return self._file_checksums[fkey]
+
+    def get_key(self, fx, *args, **kwargs):
+        """Compute the cache key for calling `fx` with the given arguments
+        """
+        h = hashlib.sha1()
+        h.update(mvpa2.__version__)
+        _update_hash(h, fx, self._file_checksum)
+        _update_hash(h, args, self._file_checksum)
+        _update_hash(h, kwargs, self._file_checksum)
+        return h.hexdigest()
+
+    def _get_filenames(self, key):
+        if self.backend == 'hdf5':
+            return [osp.join(self.cachedir, key + '.hdf5')]
+        else:
+            return [osp.join(self.cachedir, key + ext)
+                    for ext in ('.npy', '.pkl')]
+
+    def __contains__(self, key):
+        return all(osp.exists(f) for f in self._get_filenames(key))
+
+    def get(self, key):
+        """Return a cached dataset, or None if there is none for this key"""
+        if not key in self:
+            return None
+        filenames = self._get_filenames(key)
+        if __debug__:
+            debug('DSC', "Loading cached dataset from %s" % filenames[0])
+        if self.backend == 'hdf5':
+            from mvpa2.base.hdf5 import h5load
+            ds = h5load(filenames[0])
+        else:
+            samples = np.load(filenames[0], mmap_mode='c')
+            with open(filenames[1], 'rb') as f:
+                cls, sa, fa, a = cPickle.load(f)
+            ds = cls(samples, sa=sa, fa=fa, a=a)
+        # mark as recently used
+        for f in filenames:
+            os.utime(f, None)
+        return ds
+
+    def store(self, key, ds):
+        """Store a dataset under a key (and evict old entries if necessary)
+        """
+        if not isinstance(ds, AttrDataset):
+            raise ValueError("Can only cache datasets (got %s)" % type(ds))
+        filenames = self._get_filenames(key)
+        if __debug__:
+            debug('DSC', "Storing dataset %s in cache as %s"
+                  % (ds.shape, filenames[0]))
+        # write into temporary files first, so concurrent processes never
+        # see partially written entries
+        tmpfilenames = []
+        try:
+            for fname in filenames:
+                fd, tmpfname = tempfile.mkstemp(dir=self.cachedir,
+                                                suffix='.tmp')
+                os.close(fd)
+                tmpfilenames.append(tmpfname)
+            if self.backend == 'hdf5':
+                from mvpa2.base.hdf5 import h5save
+                h5save(tmpfilenames[0], ds)
+            else:
+                with open(tmpfilenames[0], 'wb') as f:
+                    np.save(f, np.asanyarray(ds.samples))
+                with open(tmpfilenames[1], 'wb') as f:
+                    cPickle.dump((ds.__class__, dict(ds.sa), dict(ds.fa),
+                                  dict(ds.a)),
+                                 f, protocol=2)
+            for tmpfname, fname in zip(tmpfilenames, filenames):
+                os.rename(tmpfname, fname)
+        finally:
+            for tmpfname in tmpfilenames:
+                if osp.exists(tmpfname):
+                    os.unlink(tmpfname)
+        self.evict()
+
+    def call(self, fx, *args, **kwargs):
+        """Call `fx` with the arguments, or return the cached result
+
+        Parameters
+        ----------
+        fx : callable
+          Any callable returning a dataset, e.g. `fmri_dataset` or
+          `preprocessed_dataset`.
+        *args, **kwargs
+          Arguments to call `fx` with.  Together with `fx` they determine
+          the cache key.
+        """
+        key = self.get_key(fx, *args, **kwargs)
+        ds = self.get(key)
+        if ds is not None:
+            if __debug__:
+                debug('DSC', "Cache hit for %s (%s)" % (fx, key))
+            return ds
+        if __debug__:
+            debug('DSC', "Cache miss for %s (%s)" % (fx, key))
+        ds = fx(*args, **kwargs)
+        try:
+            self.store(key, ds)
+        except Exception as e:
+            # a failure to cache must not prevent the analysis
+            warning("Failed to store dataset in cache %s: %s"
+                    % (self.cachedir, e))
+        return ds
+
+    def _get_entries(self):
+        """List of (last use time, size, filename) of all cache files"""
+        entries = []
+        for fname in os.listdir(self.cachedir):
+            if not fname.endswith(('.hdf5', '.npy', '.pkl')):
+                continue
+            path = osp.join(self.cachedir, fname)
+            st = os.stat(path)
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self, max_size=None):
+        """Remove least recently used entries until cache fits into max_size
+
+        Parameters
+        ----------
+        max_size : int or None
+          Maximal size of the cache in bytes.  If None, the size limit of the
+          cache is used.  0 clears the whole cache.
+        """
+        if max_size is None:
+            max_size = self.max_size
+        if max_size is None:
+            return
+        # group files of the same entry
+        entries = {}
+        for mtime, size, path in self._get_entries():
+            key = osp.splitext(osp.basename(path))[0]
+            emtime, esize, epaths = entries.get(key, (0, 0, []))
+            entries[key] = (max(emtime, mtime), esize + size, epaths + [path])
+        total = sum(e[1] for e in entries.values())
+        for key, (mtime, size, paths) in sorted(entries.items(),
+                                                key=lambda x: x[1][0]):
+            if total <= max_size:
+                break
+            if __debug__:
+                debug('DSC', "Evicting cache entry %s (%i bytes)"
+                      % (key, size))
+            for path in paths:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    # might have been removed by a concurrent process
+                    pass
+            total -= size
+
+    def clear(self):
+        """Remove all entries from the cache"""
+        self.evict(max_size=0)
+
+    size = property(fget=lambda self: sum(e[1] for e in self._get_entries()),
+                    doc="Total size of all cached datasets in bytes")
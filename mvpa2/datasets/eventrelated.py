@@ -179,6 +179,43 @@ def _events2dict(events):
                              "events (could not find '%s')" % k)
     return evvars
 
+def _values2idx(values, x, solv):
+    """Vectorized `value2idx()` for ascending `x` (any order is supported)"""
+    x = np.asanyarray(x)
+    values = np.asanyarray(values)
+    if len(x) > 1 and np.any(x[1:] < x[:-1]):
+        # no sorted time stamps -- go the long way
+        return np.array([value2idx(v, x, solv) for v in values], dtype=int)
+    # closest preceding and following element (first one in case of
+    # duplicates, as value2idx() would report)
+    prev = np.searchsorted(x, values, side='right') - 1
+    prev = np.searchsorted(x, x[prev.clip(0)], side='left')
+    next_ = np.searchsorted(x, values, side='left')
+    if solv == 'floor':
+        idx = prev
+        # nothing precedes -> value2idx() yields the first element
+        idx[values < x[0]] = 0
+    elif solv == 'ceil':
+        idx = next_
+        idx[idx == len(x)] = 0
+    elif solv == 'round':
+        next_ = next_.clip(max=len(x) - 1)
+        idx = np.where(np.abs(x[next_] - values) < np.abs(x[prev] - values),
+                       next_, prev)
+    else:
+        raise ValueError("Unkown resolving method '%s'." % solv)
+    return idx
+
+
+def _count_samples_before(x, idx, values):
+    """Number of elements in x[i:] smaller than the value, for all i, value"""
+    x = np.asanyarray(x)
+    if len(x) > 1 and np.any(x[1:] < x[:-1]):
+        return np.array([np.sum(x[i:] < v) for i, v in zip(idx, values)],
+                        dtype=int)
+    return (np.searchsorted(x, values, side='left') - idx).clip(0)
+
+
 def _evvars2ds(ds, evvars, eprefix):
     for a in evvars:
         if eprefix is not None and a in ds.sa:
@@ -193,7 +230,7 @@ def _evvars2ds(ds, evvars, eprefix):
 def extract_boxcar_event_samples(
         ds, events=None, time_attr=None, match='prev',
         event_offset=None, event_duration=None,
-        eprefix='event', event_mapper=None):
+        eprefix='event', event_mapper=None, boxcar_view=False):
     """Segment a dataset by extracting boxcar events
 
     (Multiple) consecutive samples are extracted for each event, and are either
@@ -265,6 +302,12 @@ def extract_boxcar_event_samples(
       e.g. averaging samples within an event boxcar using an FxMapper. Any
       mapper needs to keep the sample axis unchanged, i.e. number and order of
       samples remain the same.
+    boxcar_view : bool
+      If True, the underlying `~mvpa2.mappers.boxcar.BoxcarMapper` yields a
+      read-only strided view on the input samples instead of a copy, whenever
+      all events are equally spaced (see its ``view`` argument). This avoids
+      duplicating the input data if ``event_mapper`` compresses the events
+      anyway (e.g. by averaging).
 
     Returns
     -------
@@ -313,56 +356,46 @@ def extract_boxcar_event_samples(
                      'next': 'ceil',
                      'closest': 'round'}[match]
 
-    if not (event_offset is None and event_duration is None):
-        descr_events = []
-        for ev in events:
-            # do not mess with the input data
-            ev = copy.deepcopy(ev)
-            if event_offset is not None:
-                ev['onset'] += event_offset
-            if event_duration is not None:
-                ev['duration'] = event_duration
-            descr_events.append(ev)
-        events = descr_events
-
-    if time_attr is not None:
-        tvec = ds.sa[time_attr].value
-        # we are asked to convert onset time into sample ids
-        descr_events = []
-        for ev in events:
-            # do not mess with the input data
-            ev = copy.deepcopy(ev)
-            # best matching sample
-            idx = value2idx(ev['onset'], tvec, conv_strategy)
-            # store offset of sample time and real onset
-            ev['orig_offset'] = ev['onset'] - tvec[idx]
-            # rescue the real onset into a new attribute
-            ev['orig_onset'] = ev['onset']
-            ev['orig_duration'] = ev['duration']
-            # figure out how many samples we need
-            ev['duration'] = \
-                    len(tvec[idx:][tvec[idx:] < ev['onset'] + ev['duration']])
-            # new onset is sample index
-            ev['onset'] = idx
-            descr_events.append(ev)
-    else:
-        descr_events = events
     # convert the event specs into the format expected by BoxcarMapper
-    # take the first event as an example of contained keys
-    evvars = _events2dict(descr_events)
+    # take the first event as an example of contained keys -- all further
+    # processing is done on these attribute vectors at once, the input
+    # events remain untouched
+    evvars = _events2dict(events)
+    if event_duration is not None:
+        evvars['duration'] = [event_duration] * len(events)
     # checks
     for p in ['onset', 'duration']:
         if not p in evvars:
             raise ValueError("'%s' is a required property for all events."
                              % p)
-    boxlength = max(evvars['duration'])
+    onsets = np.asanyarray(evvars['onset'])
+    durations = np.asanyarray(evvars['duration'])
+    if event_offset is not None:
+        onsets = onsets + event_offset
+        evvars['onset'] = onsets
+
+    if time_attr is not None:
+        tvec = ds.sa[time_attr].value
+        # we are asked to convert onset time into sample ids
+        # best matching samples
+        idx = _values2idx(onsets, tvec, conv_strategy)
+        # store offset of sample time and real onset
+        evvars['orig_offset'] = onsets - tvec[idx]
+        # rescue the real onset into a new attribute
+        evvars['orig_onset'] = onsets
+        evvars['orig_duration'] = durations
+        # figure out how many samples we need
+        durations = _count_samples_before(tvec, idx, onsets + durations)
+        # new onset is sample index
+        onsets = idx
+    boxlength = max(durations)
     if __debug__:
-        if not max(evvars['duration']) == min(evvars['duration']):
+        if not boxlength == min(durations):
             warning('Boxcar mapper will use maximum boxlength (%i) of all '
                     'provided Events.'% boxlength)
 
     # finally create, train und use the boxcar mapper
-    bcm = BoxcarMapper(evvars['onset'], boxlength, space=eprefix)
+    bcm = BoxcarMapper(onsets, boxlength, space=eprefix, view=boxcar_view)
     bcm.train(ds)
     ds = ds.get_mapped(bcm)
     if event_mapper is None:
@@ -374,10 +407,8 @@ def extract_boxcar_event_samples(
         ds = ds.get_mapped(event_mapper)
     # add samples attributes for the events, simply dump everything as a samples
     # attribute
-    # special case onset and duration in case of conversion into descrete time
-    if time_attr is not None:
-        for attr in ('onset', 'duration'):
-            evvars[attr] = [e[attr] for e in events]
+    # onset and duration are reported as specified (incl. any override), i.e.
+    # not as discrete sample indices in case of a conversion
     ds = _evvars2ds(ds, evvars, eprefix)
 
     return ds
@@ -385,7 +416,8 @@ def extract_boxcar_event_samples(
 
 def fit_event_hrf_model(
         ds, events, time_attr, condition_attr='targets', design_kwargs=None,
-        glmfit_kwargs=None, regr_attrs=None, return_model=False):
+        glmfit_kwargs=None, regr_attrs=None, return_model=False,
+        glm_backend='nipy'):
     """Fit a GLM with HRF regressor and yield a dataset with model parameters
 
     A univariate GLM is fitted for each feature and model parameters are
@@ -416,7 +448,9 @@ def fit_event_hrf_model(
     ``regr_attrs``).
 
     The actual GLM fit is also performed by NiPy and can be fully customized
-    (see ``glmfit_kwargs``).
+    (see ``glmfit_kwargs``). Alternatively, the built-in
+    :class:`~mvpa2.mappers.glm.OLSGLMMapper` can be used (see
+    ``glm_backend``), which is considerably faster for large datasets.
 
     Parameters
     ----------
@@ -441,6 +475,12 @@ def fit_event_hrf_model(
     glmfit_kwargs : dict
       Arbitrary keyword arguments for NiPy's GeneralLinearModel.fit() used for
       estimating model parameter. Choose fitting algorithm: OLS or AR1.
+      For the 'ols' backend, these are parameters of
+      :class:`~mvpa2.mappers.glm.OLSGLMMapper`, where NiPy's ``model``
+      argument is accepted as an alias for ``noise_model``.  As with NiPy,
+      an AR(1) noise model is used by default.  Condition regressors can be
+      referred to by their condition label in ``lss`` and in contrast
+      weights (with multiple ``condition_attr`` joined by '+').
     regr_attrs : list
       List of dataset sample attribute names that shall be extracted from the
       input dataset and used as additional regressors in the design matrix.
@@ -449,6 +489,9 @@ def fit_event_hrf_model(
       For large input data this can be problematic, as the model may contain
       the residuals (same size is input data), hence multiplies the memory
       demand. Off by default.
+    glm_backend : {'nipy', 'ols'}
+      Implementation used for fitting the GLM: NiPy's GeneralLinearModel or
+      :class:`~mvpa2.mappers.glm.OLSGLMMapper`.
 
     Returns
     -------
@@ -459,6 +502,9 @@ def fit_event_hrf_model(
       regressors are included as ``regressors`` sample attribute. If enabled,
       an instance with the fitted NiPy GLM results is included as a dataset
       attribute ``model``, and can be used for computing contrasts subsequently.
+      With LSS, only the single-trial estimates are returned (without
+      ``regressors``), and with contrasts one sample per contrast, named
+      in the ``contrasts`` sample attribute.
 
     Examples
     --------
@@ -493,7 +539,7 @@ def fit_event_hrf_model(
     """
     if externals.exists('nipy', raise_=True):
         from nipy.modalities.fmri.design_matrix import make_dmtx
-        from mvpa2.mappers.glm import NiPyGLMMapper
+        from mvpa2.mappers.glm import NiPyGLMMapper, OLSGLMMapper
 
     # Decide/device condition attribute on which GLM will actually be done
     if isinstance(condition_attr, basestring):
@@ -579,12 +625,54 @@ def fit_event_hrf_model(
         for i, reg in enumerate(design_matrix.names)]
 
     # GLM
-    glm = NiPyGLMMapper([], glmfit_kwargs=glmfit_kwargs,
-            add_regs=glm_regs,
-            return_design=True, return_model=return_model,
-            space=glm_condition_attr)
+    contrasts = None
+    if glm_backend == 'nipy':
+        glm = NiPyGLMMapper([], glmfit_kwargs=glmfit_kwargs,
+                add_regs=glm_regs,
+                return_design=True, return_model=return_model,
+                space=glm_condition_attr)
+    elif glm_backend == 'ols':
+        glmfit_kwargs = dict(glmfit_kwargs or {})
+        if 'model' in glmfit_kwargs:
+            glmfit_kwargs['noise_model'] = glmfit_kwargs.pop('model')
+        # same default as GeneralLinearModel.fit() of NiPy
+        glmfit_kwargs.setdefault('noise_model', 'ar1')
+
+        def get_regressor(name):
+            # condition regressors can be referred to by their label
+            label = 'glm_label_%s' % (name,)
+            if not name in design_matrix.names \
+                    and label in design_matrix.names:
+                return label
+            return name
+
+        lss = glmfit_kwargs.get('lss')
+        if lss is not None:
+            glmfit_kwargs['lss'] = [get_regressor(name) for name in lss]
+        contrasts = glmfit_kwargs.get('contrasts')
+        if contrasts is not None:
+            if isinstance(contrasts, dict):
+                contrasts = sorted(contrasts.items())
+            contrasts = glmfit_kwargs['contrasts'] = [
+                (name, dict((get_regressor(r), v) for r, v in w.iteritems())
+                       if isinstance(w, dict) else w)
+                for name, w in contrasts]
+        # design regressors only match the output if it has one sample
+        # per regressor
+        glm = OLSGLMMapper([],
+                add_regs=glm_regs,
+                return_design=lss is None and contrasts is None,
+                return_model=return_model,
+                space='contrasts' if contrasts is not None
+                                  else glm_condition_attr,
+                **glmfit_kwargs)
+    else:
+        raise ValueError("unknown GLM backend '%s'" % glm_backend)
 
     model_params = glm(ds)
+    if contrasts is not None:
+        # samples do not correspond to regressors or conditions
+        return model_params
 
     # some regressors might be corresponding not to original condition_attr
     # so let's separate them out
@@ -187,7 +187,8 @@ def map2nifti(dataset, data=None, imghdr=None, imgtype=None):
 
 
 def fmri_dataset(samples, targets=None, chunks=None, mask=None,
-                 sprefix='voxel', tprefix='time', add_fa=None,):
+                 sprefix='voxel', tprefix='time', add_fa=None, dtype=None,
+                 runs_as_chunks=False, nproc=1):
     """Create a dataset from an fMRI timeseries image.
 
     The timeseries image serves as the samples data, with each volume becoming
@@ -195,6 +196,10 @@ def fmri_dataset(samples, targets=None, chunks=None, mask=None,
     vectors, optionally being masked (i.e. subset of voxels corresponding to
     non-zero elements in a mask image).
 
+    Whenever possible, images are read in slabs of volumes through NiBabel's
+    array proxies, and the mask is applied to each slab directly, so the full
+    (unmasked) timeseries never needs to be held in memory.
+
     In addition to (optional) samples attributes for targets and chunks the
     returned dataset contains a number of additional attributes:
 
@@ -223,7 +228,7 @@ def fmri_dataset(samples, targets=None, chunks=None, mask=None,
     samples : str or NiftiImage or list
       fMRI timeseries, specified either as a filename (single file 4D image),
       an image instance (4D image), or a list of filenames or image instances
-      (each list item corresponding to a 3D volume).
+      (each list item corresponding to a 3D volume, or a 4D run).
     targets : scalar or sequence
       Label attribute for each volume in the timeseries, or a scalar value that
       is assigned to all samples.
@@ -245,13 +250,58 @@ def fmri_dataset(samples, targets=None, chunks=None, mask=None,
       as feature attributes in the dataset. The dictionary key serves as the
       feature attribute name. Each value might be of any type supported by the
       'mask' argument of this function.
+    dtype : dtype or None
+      Data type of the dataset samples (e.g. 'float32').  Image data is
+      converted slab by slab while loading.  If None, the data type of the
+      (scaled) image data is used.
+    runs_as_chunks : bool
+      If True, `samples` has to be a list, and each item is considered to be
+      a separate run. The `chunks` sample attribute is then set to the index
+      of the run a volume originates from.
+    nproc : int
+      Number of images (runs) to load in parallel.  Requires joblib.
 
     Returns
     -------
     Dataset
     """
-    # load the samples
-    imgdata, imghdr, img = _load_anyimg(samples, ensure=True, enforce_dim=4)
+    if runs_as_chunks:
+        if not isinstance(samples, (list, tuple)):
+            raise ValueError("runs_as_chunks=True requires a list of runs "
+                             "(got %s)" % type(samples))
+        if chunks is not None:
+            raise ValueError("Cannot assign chunks for runs_as_chunks=True")
+    if nproc != 1 and not externals.exists('joblib'):
+        warning("Setting nproc different from 1 requires joblib package, "
+                "which does not seem to exist. Setting nproc to 1.")
+        nproc = 1
+
+    # try to get hold of the images without loading any data
+    imgs = _get_streamable_imgs(samples)
+    if imgs is None:
+        # unknown input or image layout -- load everything at once
+        if runs_as_chunks:
+            runs = [_load_anyimg(s, ensure=True, enforce_dim=4)
+                    for s in samples]
+            nvolumes = [len(r[0]) for r in runs]
+            imgdata = np.vstack([r[0] for r in runs])
+            imghdr, img = runs[0][1:3]
+            del runs
+        else:
+            imgdata, imghdr, img = _load_anyimg(samples, ensure=True,
+                                                enforce_dim=4)
+            nvolumes = [len(imgdata)]
+        spatial_shape = imgdata.shape[1:]
+    else:
+        img = imgs[0]
+        imghdr = _get_streamable_hdr(img)
+        nvolumes = [_get_img_nvolumes(i) for i in imgs]
+        spatial_shape = img.shape[:3]
+        shapes = [i.shape[:3] for i in imgs]
+        if not np.all([s == spatial_shape for s in shapes]):
+            raise ValueError(
+                "Input volumes vary in their shapes: %s" % (shapes,))
+    nsamples = sum(nvolumes)
 
     # figure out what the mask is, but only handle known cases, the rest
     # goes directly into the mapper which maybe knows more
@@ -265,29 +315,42 @@ def fmri_dataset(samples, targets=None, chunks=None, mask=None,
     # compile the samples attributes
     sa = {}
     if targets is not None:
-        sa['targets'] = _expand_attribute(targets, imgdata.shape[0], 'targets')
+        sa['targets'] = _expand_attribute(targets, nsamples, 'targets')
     if chunks is not None:
-        sa['chunks'] = _expand_attribute(chunks, imgdata.shape[0], 'chunks')
+        sa['chunks'] = _expand_attribute(chunks, nsamples, 'chunks')
+    if runs_as_chunks:
+        sa['chunks'] = np.repeat(np.arange(len(nvolumes)), nvolumes)
 
-    # create a dataset
-    ds = Dataset(imgdata, sa=sa)
+    # use a single volume to create the mapper and the feature attributes
+    ds = Dataset(np.zeros((1,) + spatial_shape, dtype=bool))
     if sprefix is None:
         space = None
     else:
         space = sprefix + '_indices'
-    ds = ds.get_mapped(FlattenMapper(shape=imgdata.shape[1:], space=space))
+    ds = ds.get_mapped(FlattenMapper(shape=spatial_shape, space=space))
 
     # now apply the mask if any
+    flatmask = None
     if mask is not None:
         # permit 4D image mask if time dimension is 1
-        if mask.shape == (1,) + imgdata.shape[1:]:
+        if mask.shape == (1,) + spatial_shape:
             mask = mask.reshape(mask.shape[1:])
-        flatmask = ds.a.mapper.forward1(mask)
+        flatmask = ds.a.mapper.forward1(mask) != 0
         # direct slicing is possible, and it is potentially more efficient,
         # so let's use it
         #mapper = StaticFeatureSelection(flatmask)
         #ds = ds.get_mapped(StaticFeatureSelection(flatmask))
-        ds = ds[:, flatmask != 0]
+        ds = ds[:, flatmask]
+
+    if imgs is None:
+        data = imgdata.reshape((nsamples, -1))
+        if flatmask is not None:
+            data = data[:, flatmask]
+        if dtype is not None:
+            data = data.astype(dtype)
+    else:
+        data = _load_masked_imgs(imgs, nvolumes, flatmask, dtype, nproc)
+    ds = Dataset(data, sa=sa, fa=ds.fa, a=ds.a)
 
     # load and store additional feature attributes
     if add_fa is not None:
@@ -306,7 +369,7 @@ def fmri_dataset(samples, targets=None, chunks=None, mask=None,
 
     # If there is a space assigned , store the extent of that space
     if sprefix is not None:
-        ds.a[sprefix + '_dim'] = imgdata.shape[1:]
+        ds.a[sprefix + '_dim'] = spatial_shape
         # 'voxdim' is (x,y,z) while 'samples' are (t,z,y,x)
         ds.a[sprefix + '_eldim'] = _get_voxdim(imghdr)
         # TODO extend with the unit
@@ -319,6 +382,105 @@ def fmri_dataset(samples, targets=None, chunks=None, mask=None,
     return ds
 
 
+# maximal size of a slab of volumes read at once (in bytes)
+_SLAB_NBYTES = 2 ** 26
+
+
+def _get_streamable_imgs(src):
+    """Return a list of images that can be read volume-wise, or None"""
+    import nibabel
+    srcs = src if isinstance(src, (list, tuple)) and len(src) else [src]
+    imgs = []
+    for s in srcs:
+        if isinstance(s, basestring):
+            s = nibabel.load(s)
+        if not isinstance(s, nibabel.spatialimages.SpatialImage) \
+                or not hasattr(s, 'dataobj'):
+            return None
+        shape = s.shape
+        if not (len(shape) in (3, 4)
+                or (len(shape) == 5 and shape[3] == 1)):
+            return None
+        imgs.append(s)
+    return imgs
+
+
+def _get_streamable_hdr(img):
+    """Header of an image with the AFNI-style 5D shape fixed up"""
+    header = img.header
+    s = img.shape
+    if len(s) == 5:
+        # hack to allow loading NIFTI files generated by AFNI
+        # these have time in the fifth dimension while the fourth
+        # dimension is singleton
+        warning('dataset with 5th dimension found but 4th is empty (AFNI '
+                ' NIFTI conversion syndrome) - squeezing data to 4D')
+        header.set_data_shape((s[0], s[1], s[2], s[4]))
+    return header
+
+
+def _get_img_nvolumes(img):
+    """Number of volumes (samples) in a 3D, 4D or AFNI-style 5D image"""
+    return img.shape[-1] if len(img.shape) > 3 else 1
+
+
+def _get_img_slab(img, start, stop):
+    """Read volumes [start, stop) of an image as an (x, y, z, t) array"""
+    ndim = len(img.shape)
+    if ndim == 3:
+        return np.asanyarray(img.dataobj[...])[..., np.newaxis]
+    elif ndim == 4:
+        return np.asanyarray(img.dataobj[..., start:stop])
+    else:
+        return np.asanyarray(img.dataobj[:, :, :, 0, start:stop])
+
+
+def _load_masked_imgs(imgs, nvolumes, flatmask, dtype, nproc=1):
+    """Load volumes of images into a single masked samples array
+
+    Images are read in slabs of volumes, and each slab is masked and
+    converted directly into a preallocated (nsamples x nfeatures) array.
+    """
+    if dtype is None:
+        # probe the (scaled) data type with a single voxel of each image
+        dtype = np.result_type(
+            *[np.asanyarray(
+                img.dataobj[(slice(0, 1),) * len(img.shape)]).dtype
+              for img in imgs])
+    spatial_shape = imgs[0].shape[:3]
+    nvoxels = int(np.prod(spatial_shape))
+    nfeatures = nvoxels if flatmask is None else int(flatmask.sum())
+    if flatmask is not None:
+        volmask = flatmask.reshape(spatial_shape)
+    data = np.empty((sum(nvolumes), nfeatures), dtype=dtype)
+    slab_size = max(1, _SLAB_NBYTES // (nvoxels * 8))
+    offsets = np.cumsum([0] + list(nvolumes))
+
+    def load_img(i):
+        img = imgs[i]
+        for start in xrange(0, nvolumes[i], slab_size):
+            stop = min(start + slab_size, nvolumes[i])
+            slab = _get_img_slab(img, start, stop)
+            if flatmask is None:
+                slab = slab.reshape(nvoxels, -1)
+            else:
+                slab = slab[volmask]
+            data[offsets[i] + start:offsets[i] + stop] = slab.T
+            if __debug__:
+                debug('DS_NIFTI', 'Loaded volumes %i-%i of image %i'
+                      % (start, stop, i))
+
+    if nproc == 1 or len(imgs) == 1:
+        for i in xrange(len(imgs)):
+            load_img(i)
+    else:
+        # threads, so that all runs are placed directly into the same array
+        from joblib import Parallel, delayed
+        Parallel(n_jobs=nproc, backend='threading')(
+            delayed(load_img)(i) for i in xrange(len(imgs)))
+    return data
+
+
 def _get_voxdim(hdr):
     """Get the size of a voxel from some image header format."""
     return hdr.get_zooms()[:-1]
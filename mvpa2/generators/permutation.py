@@ -266,6 +266,151 @@ class AttributePermutator(Node):
             ##     debug('APERM', "%s generating %i-th permutation", (self, i))
             yield self(ds, _call_kwargs=kwargs)
 
+    def generate_indices(self, ds, count=None):
+        """Generate permutations as a matrix of indices
+
+        All permutations are generated at once, which is much faster than
+        generating permuted datasets one at a time and allows for
+        processing all permutations of an attribute in a vectorized way.
+        The same `limit`, `strategy` and `assure` settings are respected,
+        but the resulting permutations differ from the ones produced by
+        `generate()` for the same random seed.
+
+        Parameters
+        ----------
+        ds : Dataset
+          Dataset whose attributes are to be permuted.
+        count : int, optional
+          Number of permutations.  If None, the `count` of the permutator is
+          used.
+
+        Returns
+        -------
+        ndarray
+          Indices of shape (count, nsamples) (or (count, nfeatures) for
+          feature attributes) of type int32, such that
+          ``ds.sa[attr].value[indices[i]]`` is the i-th permuted attribute.
+        """
+        if count is None:
+            count = self.count
+        pattr = self._pattr
+        if isinstance(pattr, str):
+            pattr = (pattr,)
+        collection = ds.get_attr(pattr[0])[1]
+        limit_filter = get_limit_filter(self._limit, collection)
+        rng = get_rng(self.rng)
+        in_pattrs = [ds.get_attr(pa)[0] for pa in pattr]
+
+        try:
+            permute_fx = getattr(self, "_permute_indices_%s" % self.strategy)
+        except AttributeError:
+            raise ValueError("Unknown permutation strategy %r" % self.strategy)
+        permute_kwargs = {'rng': rng}
+        if self.chunk_attr is not None:
+            permute_kwargs['chunks'] = ds.sa[self.chunk_attr].value
+
+        # codes of the groups to permute within, -1 for elements to remain
+        # in place
+        if limit_filter.dtype == np.bool:
+            groups = np.where(limit_filter, 0, -1)
+        else:
+            groups = np.unique(limit_filter, return_inverse=True)[1]
+
+        indices = permute_fx(count, groups, in_pattrs, **permute_kwargs)
+
+        if self._assure_permute:
+            # regenerate permutations which do not alter the attributes
+            def _get_unchanged(indices):
+                unchanged = np.ones(len(indices), dtype=bool)
+                for pa in in_pattrs:
+                    unchanged &= np.all(pa.value[indices] == pa.value, axis=1)
+                return unchanged
+
+            unchanged = _get_unchanged(indices)
+            for i in xrange(10):
+                if not unchanged.any():
+                    break
+                indices[unchanged] = permute_fx(unchanged.sum(), groups,
+                                                in_pattrs, **permute_kwargs)
+                unchanged[unchanged] = _get_unchanged(indices[unchanged])
+            if unchanged.any():
+                raise RuntimeError(
+                    "Cannot assure permutation of %s with limit %r for "
+                    "some reason (dataset %s). Should not happen"
+                    % (pattr, self._limit, ds))
+        return indices
+
+
+    @staticmethod
+    def _shuffle_within_groups(count, groups, rng):
+        """Random permutations of indices within groups of elements
+
+        Elements of a group are shuffled among each other, elements of
+        negative groups are kept in place.
+        """
+        n = len(groups)
+        # sort random keys within groups -- positions of the elements of
+        # each group in (random) order
+        keys = rng.random_sample((count, n))
+        order = np.lexsort((keys, np.tile(groups, (count, 1))))
+        # positions of the elements of each group in original order
+        indices = np.empty((count, n), dtype=np.int32)
+        indices[:, np.argsort(groups, kind='mergesort')] = order
+        keep = groups < 0
+        indices[:, keep] = np.where(keep)[0]
+        return indices
+
+
+    def _permute_indices_simple(self, count, groups, in_pattrs, rng=None):
+        return self._shuffle_within_groups(count, groups, rng)
+
+
+    def _permute_indices_uattrs(self, count, groups, in_pattrs, rng=None):
+        # unique combinations of attribute values within the limit groups
+        combs = np.array([groups]
+                         + [np.unique(pa.value, return_inverse=True)[1]
+                            for pa in in_pattrs])
+        combs, first, comb_idx = np.unique(
+            combs.T.copy().view([('', combs.dtype)] * len(combs)).ravel(),
+            return_index=True, return_inverse=True)
+        comb_groups = groups[first]
+        # permute combinations among each other and assign each element the
+        # values of the representative element of its new combination
+        comb_perm = self._shuffle_within_groups(count, comb_groups, rng)
+        indices = first[comb_perm][:, comb_idx].astype(np.int32)
+        keep = groups < 0
+        indices[:, keep] = np.where(keep)[0]
+        return indices
+
+
+    def _permute_indices_chunks(self, count, groups, in_pattrs, chunks=None,
+                                rng=None):
+        # groups (limit) are doing nothing
+
+        if chunks is None:
+            raise ValueError("Missing 'chunk_attr' for strategy='chunk'")
+
+        uniques, chunk_idx = np.unique(chunks, return_inverse=True)
+        # positions of the elements of each chunk (nchunks x chunksize)
+        order = np.argsort(chunk_idx, kind='mergesort')
+        chunk_sizes = np.bincount(chunk_idx)
+        if np.any(chunk_sizes != chunk_sizes[0]):
+            raise ValueError("Strategy 'chunks' requires the same number of "
+                             "samples in all chunks (got %s)"
+                             % (chunk_sizes,))
+        positions = order.reshape(len(uniques), -1)
+
+        if __debug__ and len(uniques):
+            self._permute_chunks_sanity_check(in_pattrs, chunks, uniques)
+
+        shuffled = np.argsort(rng.random_sample((count, len(uniques))),
+                              axis=1)
+        indices = np.empty((count, len(chunks)), dtype=np.int32)
+        indices[:, positions.ravel()] = \
+            positions[shuffled].reshape(count, -1)
+        return indices
+
+
     def __str__(self):
         return _str(self, self._pattr, n=self.count, limit=self._limit,
                     assure=self._assure_permute)
@@ -11,6 +11,7 @@
 __docformat__ = 'restructuredtext'
 
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 
 from mvpa2.mappers.base import Mapper
 from mvpa2.clfs.base import accepts_dataset_as_samples
@@ -35,7 +36,8 @@ class BoxcarMapper(Mapper):
     #       utility functionality (outside BoxcarMapper) could be used to merge
     #       arbitrary sample attributes into the samples matrix (with
     #       appropriate mapper adjustment, e.g. CombinedMapper).
-    def __init__(self, startpoints, boxlength, offset=0, **kwargs):
+    def __init__(self, startpoints, boxlength, offset=0, view=False,
+                 **kwargs):
         """
         Parameters
         ----------
@@ -47,6 +49,12 @@ class BoxcarMapper(Mapper):
         offset : int
           The offset between the provided starting point and the actual start
           of the boxcar.
+        view : bool
+          If True, forward-mapped data is returned as a read-only strided view
+          on the input data, whenever the startpoints allow for it (i.e. they
+          are equally spaced). Otherwise, and by default, all boxcars are
+          gathered into a single newly allocated array. A view avoids any
+          copying of (large) input data, but shares memory with it.
         """
         Mapper.__init__(self, **kwargs)
         self._outshape = None
@@ -68,24 +76,15 @@ class BoxcarMapper(Mapper):
 
         self.boxlength = int(boxlength)
         self.offset = offset
-        self.__selectors = None
-
-        # build a list of list where each sublist contains the indexes of to be
-        # averaged data elements
-        self.__selectors = [ slice(i + offset, i + offset + boxlength) \
-                             for i in startpoints ]
+        self.view = view
 
 
     def __reduce__(self):
-        # python < 2.6 cannot copy slices, we will use the constructor the get
-        # them back and additionally reapply the stae of the object (except for
-        # the bad bad slices)
+        # use the constructor to get the basic setup back and additionally
+        # reapply the state of the object
         state = self.__dict__.copy()
-        badguy = '_%s__selectors' % self.__class__.__name__
-        if badguy in state:
-            del state[badguy]
         return (self.__class__,
-                    (self.startpoints, self.boxlength, self.offset),
+                    (self.startpoints, self.boxlength, self.offset, self.view),
                     state)
 
 
@@ -106,8 +105,9 @@ class BoxcarMapper(Mapper):
 
     def __repr__(self):
         s = super(BoxcarMapper, self).__repr__()
-        return s.replace("(", "(boxlength=%d, offset=%d, startpoints=%s, " %
-                         (self.boxlength, self.offset, str(self.startpoints)),
+        return s.replace("(", "(boxlength=%d, offset=%d, startpoints=%s, %s" %
+                         (self.boxlength, self.offset, str(self.startpoints),
+                          ('view=True, ', '')[not self.view]),
                          1)
 
 
@@ -128,7 +128,11 @@ class BoxcarMapper(Mapper):
             raise ValueError("Data shape %s does not match sample shape %s."
                              % (data.shape[0], self._outshape[2]))
 
-        return np.vstack([data[np.newaxis]] * self.boxlength)
+        data = np.asanyarray(data)[np.newaxis]
+        if self.view:
+            # read-only broadcast without any copy
+            return np.broadcast_to(data, (self.boxlength,) + data.shape[1:])
+        return np.repeat(data, self.boxlength, axis=0)
 
 
     def _forward_data(self, data):
@@ -145,7 +149,24 @@ class BoxcarMapper(Mapper):
         """
         # NOTE: _forward_dataset() relies on the assumption that the following
         # also works with 1D arrays and still yields sane results
-        return np.vstack([data[box][np.newaxis] for box in self.__selectors])
+        data = np.asanyarray(data)
+        starts = self.startpoints + self.offset
+        if self.view and len(starts) and data.dtype != np.object \
+           and starts[0] >= 0 \
+           and starts[-1] + self.boxlength <= len(data):
+            steps = np.unique(np.diff(starts))
+            if len(steps) < 2 and (not len(steps) or steps[0] >= 0):
+                step = steps[0] if len(steps) else 0
+                if __debug__:
+                    debug('MAP', "Boxcar: returning strided view on data")
+                out = as_strided(
+                    data[starts[0]:],
+                    shape=(len(starts), self.boxlength) + data.shape[1:],
+                    strides=(step * data.strides[0],) + data.strides)
+                out.flags.writeable = False
+                return out
+        # single vectorized gather of all boxcars into one array
+        return data[starts[:, None] + np.arange(self.boxlength)]
 
 
     def _forward_dataset(self, dataset):
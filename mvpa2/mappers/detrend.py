@@ -10,6 +10,8 @@
 
 __docformat__ = 'restructuredtext'
 
+import hashlib
+
 import numpy as np
 from mvpa2.base.types import is_sequence_type
 
@@ -36,6 +38,37 @@ from mvpa2.mappers.base import Mapper
 from ..base.param import Parameter
 from ..base import constraints as cts
 
+# pseudo-inverses of polynomial design matrices shared by all mappers, so that
+# chunks of identical structure (e.g. runs of the same length across subjects)
+# are factorized only once
+_pinv_cache = {}
+_PINV_CACHE_MAXSIZE = 256
+# maximal size of a block of samples processed at once during detrending
+_BLOCK_NBYTES = 2 ** 26
+
+
+def _get_pinv(regs, cache=True):
+    """Pseudo-inverse of a design matrix, optionally from the shared cache"""
+    if not cache:
+        return np.linalg.pinv(regs)
+    regs = np.ascontiguousarray(regs)
+    key = hashlib.sha1(regs.data).hexdigest() + str(regs.shape)
+    pinv = _pinv_cache.get(key)
+    if pinv is None:
+        if len(_pinv_cache) >= _PINV_CACHE_MAXSIZE:
+            _pinv_cache.popitem()
+        pinv = _pinv_cache[key] = np.linalg.pinv(regs)
+    return pinv
+
+
+def _mask2slicer(mask):
+    """Turn a boolean mask into a slice if it selects a contiguous range"""
+    idx = np.flatnonzero(mask)
+    if len(idx) and idx[-1] - idx[0] + 1 == len(idx):
+        return slice(idx[0], idx[-1] + 1)
+    return idx
+
+
 class PolyDetrendMapper(Mapper):
     """Mapper for regression-based removal of polynomial trends.
 
@@ -133,6 +166,9 @@ class PolyDetrendMapper(Mapper):
         # things that come from train()
         self._polycoords = None
         self._regs = None
+        # list of (sample slicer, regressors, pseudo-inverse) for
+        # independently detrended sets of samples
+        self._design = None
 
         # secret switch to perform in-place detrending
         self._secret_inplace_detrend = False
@@ -243,7 +279,12 @@ class PolyDetrendMapper(Mapper):
                 # filled below -- we know that those polycoords are going to
                 # be ints
                 self._polycoords = np.empty(len(ds), dtype='int')
-            for n, chunk in enumerate(uchunks):
+            # all chunk regressors, one set of columns per chunk
+            chunkregs = np.zeros((len(ds), np.sum(np.add(polyord, 1))))
+            reg.append(chunkregs)
+            col = 0
+            design = []
+            for i, chunk in enumerate(uchunks):
                 # get the indices for that chunk
                 cinds = ds.sa[chunks_attr].value == chunk
 
@@ -252,10 +293,14 @@ class PolyDetrendMapper(Mapper):
                 if update_polycoords and polycoords is not None:
                     self._polycoords[cinds] = polycoords
                 # create each polyord with the value for that chunk
-                for n in range(polyord[n] + 1):
-                    newreg = np.zeros((len(ds), 1))
-                    newreg[cinds, 0] = legendre_(n, polycoords_scaled)
-                    reg.append(newreg)
+                creg = np.hstack([legendre_(n, polycoords_scaled)[:, np.newaxis]
+                                  for n in range(polyord[i] + 1)])
+                chunkregs[cinds, col:col + creg.shape[1]] = creg
+                col += creg.shape[1]
+                # without additional regressors all chunks are independent
+                # and only need the factorization of their own regressors
+                if opt_reg is None:
+                    design.append((_mask2slicer(cinds), creg, _get_pinv(creg)))
 
         # if we don't handle in inspace, there is no need to store polycoords
         if inspace is None:
@@ -269,6 +314,13 @@ class PolyDetrendMapper(Mapper):
 
         # combine the regs (time x reg)
         self._regs = np.hstack(reg)
+        if chunks_attr is None or opt_reg is not None:
+            # optional regressors are specific to a dataset, no need to keep
+            # them in the shared cache
+            self._design = [(slice(None), self._regs,
+                             _get_pinv(self._regs, cache=opt_reg is None))]
+        else:
+            self._design = design
 
 
     def _forward_dataset(self, ds):
@@ -321,24 +373,39 @@ class PolyDetrendMapper(Mapper):
                 # let's put that information into the output dataset
                 mds.sa[inspace] = self._polycoords
 
-        # regression for each feature
-        fit = np.linalg.lstsq(regs, ds.samples)
-        # actually we are only interested in the solution
-        # res[0] is (nregr x nfeatures)
-        y = fit[0]
-        # remove all and keep only the residuals
-        if self._secret_inplace_detrend:
-            # if we are in evil mode do evil
-
-            # cast the data to float, since in-place operations below do not
-            # upcast!
-            if np.issubdtype(mds.samples.dtype, np.integer):
-                mds.samples = mds.samples.astype('float')
-
-            mds.samples -= np.dot(regs, y)
-        else:
+        # cast the data to float, since in-place operations below do not
+        # upcast!
+        if not self._secret_inplace_detrend:
             # important to assign to ensure COW behavior
-            mds.samples = ds.samples - np.dot(regs, y)
+            mds.samples = np.array(ds.samples,
+                                   dtype=np.result_type(ds.samples, regs))
+        elif np.issubdtype(mds.samples.dtype, np.integer):
+            mds.samples = mds.samples.astype('float')
+        samples = mds.samples
+
+        design = getattr(self, '_design', None)
+        if design is None:
+            # trained by an earlier version which did not store the design
+            design = self._design = \
+                [(slice(None), self._regs,
+                  _get_pinv(self._regs, cache=self.params.opt_regs is None))]
+
+        # remove the fit for each independent set of samples, with all
+        # features of a block of samples in a single matrix product
+        for slicer, sregs, pinv in design:
+            nsamples = len(sregs)
+            blocksize = max(1, _BLOCK_NBYTES
+                               // max(1, nsamples * samples.itemsize))
+            for start in xrange(0, samples.shape[1], blocksize):
+                fslicer = slice(start, start + blocksize)
+                if isinstance(slicer, slice):
+                    # in-place operation on a view
+                    block = samples[slicer, fslicer]
+                    block -= np.dot(sregs, np.dot(pinv, block))
+                else:
+                    block = samples[slicer, fslicer]
+                    samples[slicer, fslicer] = \
+                            block - np.dot(sregs, np.dot(pinv, block))
 
         return mds
 
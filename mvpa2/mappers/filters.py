@@ -17,16 +17,83 @@ from mvpa2.base import externals
 if externals.exists('scipy', raise_=True):
     from scipy.signal import resample
     from mvpa2.support.scipy.signal import filtfilt
+    if externals.versions['scipy'] >= '0.18':
+        from scipy.signal import sosfiltfilt
+    else:
+        sosfiltfilt = None
 
 from mvpa2.base import warning
+from mvpa2.base.parallel import thread_map
 from mvpa2.base.param import Parameter
-from mvpa2.base.constraints import EnsureChoice, EnsureInt, EnsureNone
+from mvpa2.base.constraints import EnsureChoice, EnsureInt, EnsureNone, \
+        EnsureRange
 from mvpa2.base.dochelpers import _str, borrowkwargs
 from mvpa2.mappers.base import Mapper
 from mvpa2.datasets import Dataset
 from mvpa2.base.dataset import vstack
 from mvpa2.generators.splitters import Splitter
 
+if __debug__:
+    from mvpa2.base import debug
+
+
+def _process_blocks(func, data, nsamples, block_size=None, nproc=1,
+                    out=None):
+    """Apply a function to blocks of features (columns) of an array
+
+    All blocks are processed along the first axis and results are stored in a
+    single preallocated output array. Multiple blocks can be processed in
+    parallel threads, since the SciPy functions used here release the GIL.
+
+    Parameters
+    ----------
+    func : callable
+      Called with a (samples x features) block, returns the processed block
+      with `nsamples` rows.
+    data : array
+      Input data, any dimensionality, all but the first axis are considered
+      features.
+    nsamples : int
+      Number of rows (samples) of the output.
+    block_size : int or None
+      Number of features per block. If None, features are evenly split
+      among `nproc` blocks.
+    nproc : int
+      Number of threads.
+    out : array or None
+      Output array (may be `data` itself, if `nsamples` matches). By default,
+      an output array with the dtype of the input (if floating point, float64
+      otherwise) is created.
+
+    Returns
+    -------
+    array
+    """
+    shape = data.shape
+    data = data.reshape(shape[0], -1)
+    nfeatures = data.shape[1]
+    if out is None:
+        dtype = data.dtype if np.issubdtype(data.dtype, np.floating) \
+                else np.float64
+        out = np.empty((nsamples,) + shape[1:], dtype=dtype)
+    out2d = out.reshape(nsamples, -1)
+    if not np.may_share_memory(out, out2d):
+        raise ValueError("Output array must be contiguous.")
+    if block_size is None:
+        block_size = int(np.ceil(nfeatures / float(nproc))) or 1
+    blocks = [slice(i, min(i + block_size, nfeatures))
+              for i in xrange(0, nfeatures, block_size)]
+    if __debug__:
+        debug('MAP', "Processing %i features in %i blocks with %i threads"
+              % (nfeatures, len(blocks), nproc))
+
+    def _proc(block):
+        out2d[:, block] = func(data[:, block])
+
+    thread_map(_proc, blocks, nproc)
+    return out
+
+
 class FFTResampleMapper(Mapper):
     """Mapper for FFT-based resampling.
 
@@ -38,9 +105,13 @@ class FFTResampleMapper(Mapper):
 
     Pretty much Mapper frontend for scipy.signal.resample
 
+    For large datasets, features can be resampled in blocks (see
+    ``block_size``), which bounds the size of the (complex) intermediate
+    results, optionally in parallel threads (see ``nproc``). In this mode,
+    the output preserves floating point dtypes of the input (e.g. float32).
     """
     def __init__(self, num, window=None, chunks_attr=None, position_attr=None,
-                 attr_strategy='remove', **kwargs):
+                 attr_strategy='remove', block_size=None, nproc=1, **kwargs):
         """
         Parameters
         ----------
@@ -65,6 +136,12 @@ class FFTResampleMapper(Mapper):
           10th), and 'resample' will also apply the actual data resampling
           procedure to the attributes as well (which might not be possible, e.g.
           for literal attributes).
+        block_size : int or None
+          If not None, the number of features to resample at once.
+        nproc : int
+          Number of threads to resample blocks of features in parallel. If
+          larger than one without a ``block_size``, features are split into
+          ``nproc`` blocks.
         """
         Mapper.__init__(self, **kwargs)
 
@@ -73,10 +150,12 @@ class FFTResampleMapper(Mapper):
         self.__chunks_attr = chunks_attr
         self.__position_attr = position_attr
         self.__attr_strategy = attr_strategy
+        self.__block_size = block_size
+        self.__nproc = nproc
 
 
     def __repr__(self):
-        s = super(FFTResamplemapper, self).__repr__()
+        s = super(FFTResampleMapper, self).__repr__()
         return s.replace("(",
                          "(chunks_attr=%s, "
                           % (repr(self.__chunks_attr),),
@@ -87,9 +166,34 @@ class FFTResampleMapper(Mapper):
         return _str(self, chunks_attr=self.__chunks_attr)
 
 
+    def _resample(self, data, t=None):
+        # instances stored by earlier versions lack these attributes
+        block_size = getattr(self, '_FFTResampleMapper__block_size', None)
+        nproc = getattr(self, '_FFTResampleMapper__nproc', 1)
+        if block_size is None and nproc == 1:
+            return resample(data, self.__num, t=t, window=self.__window_args)
+        # new positions are the same for all blocks
+        pos = []
+        def _func(block):
+            if t is None:
+                return resample(block, self.__num, window=self.__window_args)
+            rblock, rt = resample(block, self.__num, t=t,
+                                  window=self.__window_args)
+            pos[:] = [rt]
+            return rblock
+        out = _process_blocks(_func, data, self.__num,
+                              block_size=block_size, nproc=nproc)
+        if t is None:
+            return out
+        if not len(pos):
+            # no features at all
+            pos = [resample(np.zeros(len(data)), self.__num, t=t)[1]]
+        return out, pos[0]
+
+
     def _forward_data(self, data):
         # we cannot have position information without a dataset
-        return resample(data, self.__num, t=None, window=self.__window_args)
+        return self._resample(data)
 
 
     def _forward_dataset(self, ds):
@@ -123,12 +227,10 @@ class FFTResampleMapper(Mapper):
         if self.__position_attr is not None:
             # we know something about sample position
             pos = ds.sa[self.__position_attr].value
-            rsamples, pos = resample(ds.samples, self.__num, t=pos,
-                                     window=self.__window_args)
+            rsamples, pos = self._resample(ds.samples, t=pos)
         else:
             # we know nothing about samples position
-            rsamples = resample(ds.samples, self.__num, t=None,
-                                window=self.__window_args)
+            rsamples = self._resample(ds.samples)
         # new dataset that reuses that feature and dataset attributes of the
         # source
         mds = Dataset(rsamples, fa=ds.fa, a=ds.a)
@@ -195,6 +297,17 @@ class IIRFilterMapper(Mapper):
     >>> b, a = signal.butter(8, 0.125)
     >>> mapper = IIRFilterMapper(b, a, padlen=150)
 
+    Filters can also be specified as second-order sections, which are
+    numerically more stable for high filter orders (using SciPy's
+    sosfiltfilt()):
+
+    >>> sos = signal.butter(8, 0.125, output='sos')
+    >>> mapper = IIRFilterMapper(sos=sos)
+
+    For large datasets, features can be filtered in blocks (see
+    ``block_size``), optionally in parallel threads (see ``nproc``) and in
+    place. In this mode, the output preserves floating point dtypes of the
+    input (e.g. float32).
     """
 
     axis = Parameter(0, constraints='int',
@@ -214,7 +327,22 @@ class IIRFilterMapper(Mapper):
             `x.shape[axis]-1`.  `padlen=0` implies no padding. The default
             value is 3*max(len(a),len(b))""")
 
-    def __init__(self, b, a, **kwargs):
+    block_size = Parameter(None,
+            constraints=(EnsureInt() & EnsureRange(min=1)) | EnsureNone(),
+            doc="""If not None, the number of features to filter at once.
+            Only supported for filtering along the samples axis.""")
+
+    nproc = Parameter(1, constraints=EnsureInt() & EnsureRange(min=1),
+            doc="""Number of threads to filter blocks of features in
+            parallel. If larger than one without a `block_size`, features are
+            split into `nproc` blocks.""")
+
+    inplace = Parameter(False, constraints='bool',
+            doc="""If True, and the input is a floating point array, filtered
+            features are written back into the input array (processing in
+            blocks), instead of allocating a new one.""")
+
+    def __init__(self, b=None, a=None, sos=None, **kwargs):
         """
         All constructor parameters are analogs of filtfilt() or are passed
         on to the Mapper base class.
@@ -226,13 +354,55 @@ class IIRFilterMapper(Mapper):
         a : (N,) array_like
             The denominator coefficient vector of the filter.  If a[0]
             is not 1, then both a and b are normalized by a[0].
+        sos : (n_sections, 6) array_like
+            Alternative specification of the filter as second-order
+            sections, instead of ``b`` and ``a``.
         """
         Mapper.__init__(self, auto_train=True, **kwargs)
+        if sos is None:
+            if b is None or a is None:
+                raise ValueError("IIR filter requires either coefficients "
+                                 "`b` and `a`, or `sos`.")
+        else:
+            if not (b is None and a is None):
+                raise ValueError("IIR filter must be specified by either "
+                                 "`b` and `a`, or `sos`, but not both.")
+            if sosfiltfilt is None:
+                raise RuntimeError("scipy >= 0.18 is required for filtering "
+                                   "second-order sections.")
         self.__iir_num = b
         self.__iir_denom = a
+        self.__sos = sos
 
     def _forward_data(self, data):
         params = self.params
+        # instances stored by earlier versions lack these parameters
+        block_size = getattr(params, 'block_size', None)
+        nproc = getattr(params, 'nproc', 1)
+        inplace = getattr(params, 'inplace', False)
+        if block_size is not None or nproc > 1 or inplace:
+            if not params.axis == 0:
+                raise ValueError("Processing blocks of features is only "
+                                 "supported for filtering along axis 0.")
+            data = np.asanyarray(data)
+            out = None
+            if inplace \
+               and np.issubdtype(data.dtype, np.floating) \
+               and data.flags.writeable \
+               and (data.ndim == 2 or data.flags.c_contiguous):
+                out = data
+            return _process_blocks(self._filter, data, len(data),
+                                   block_size=block_size,
+                                   nproc=nproc, out=out)
+        return self._filter(data)
+
+    def _filter(self, data):
+        params = self.params
+        if getattr(self, '_IIRFilterMapper__sos', None) is not None:
+            return sosfiltfilt(self.__sos, data,
+                               axis=params.axis,
+                               padtype=params.padtype,
+                               padlen=params.padlen)
         try:
             mapped = filtfilt(self.__iir_num,
                               self.__iir_denom,
@@ -206,6 +206,49 @@ class FxMapper(Mapper):
 
 
     def _forward_dataset_grouped(self, ds):
+        if self.__axis == 'samples':
+            col = ds.sa
+            data = ds.samples
+        else:
+            col = ds.fa
+            data = ds.samples.T if ds.samples.ndim == 2 else None
+
+        groups = _get_groups(col, self.__uattrs, self.__order)
+        if groups is None or data is None:
+            # attributes which cannot be sorted, or >2D samples
+            return self._forward_dataset_grouped_combinations(ds)
+        idx, starts, ncombinations = groups
+        if len(starts) < ncombinations:
+            warning('There were no samples for %i out of %i combinations of '
+                    '%s. It might be a sign of a disbalanced dataset %s.'
+                    % (ncombinations - len(starts), ncombinations,
+                       self.__uattrs, ds))
+
+        mdata = None
+        if not len(self.__fxargs):
+            mdata = _segmented_reduce(self.__fx, data[idx], starts)
+        if mdata is None:
+            # arbitrary function -- apply group by group
+            mdata = [self.__smart_apply_along_axis(
+                        ds.samples[gidx] if self.__axis == 'samples'
+                        else ds.samples[:, gidx])
+                     for gidx in np.split(idx, starts[1:])]
+            if self.__axis == 'samples':
+                mdata = np.vstack(mdata)
+            else:
+                mdata = np.vstack(np.transpose(mdata))
+        elif self.__axis == 'features':
+            mdata = mdata.T
+
+        attrs = {}
+        if self.__attrfx is not None:
+            for attr in col:
+                attrs[attr] = _merge_grouped_attr(self.__attrfx,
+                                                  col[attr].value, idx, starts)
+        return mdata, attrs
+
+
+    def _forward_dataset_grouped_combinations(self, ds):
         mdata = [] # list of samples array pieces
         if self.__axis == 'samples':
             col = ds.sa
@@ -528,6 +571,144 @@ def _uniquemerge2literal(attrs):
     else:
         return None
 
+def _get_groups(col, uattrs, order):
+    """Sort collection elements into groups of unique attribute combinations
+
+    Parameters
+    ----------
+    col : Collection
+    uattrs : list
+      Names of the attributes whose unique value combinations define the
+      groups.
+    order : {'uattrs', 'occurrence', None}
+      Order of the groups (see `FxMapper`).
+
+    Returns
+    -------
+    tuple or None
+      Indices of all elements sorted by group (preserving their order within
+      each group), start of each group in this index array, and the total
+      number of possible value combinations.  None if any of the attributes
+      cannot be sorted (e.g. multi-dimensional or object arrays).
+    """
+    keys = []
+    ncombinations = 1
+    for attr in uattrs:
+        value = col[attr].value
+        if not len(value) or value.ndim != 1 or value.dtype == np.object \
+          or (np.issubdtype(value.dtype, np.floating)
+              and np.isnan(value).any()):
+            return None
+        uvalues, codes = np.unique(value, return_inverse=True)
+        keys.append(codes)
+        ncombinations *= len(uvalues)
+    # lexsort uses the last key as the primary one -- just as order='uattrs'
+    # requires, and it is stable
+    idx = np.lexsort(keys)
+    skeys = np.array(keys)[:, idx]
+    boundary = np.any(skeys[:, 1:] != skeys[:, :-1], axis=0)
+    starts = np.concatenate(([0], np.flatnonzero(boundary) + 1))
+    if order == 'occurrence':
+        # first element of each group is its first occurrence
+        rank = np.empty(len(starts), dtype=int)
+        rank[np.argsort(idx[starts])] = np.arange(len(starts))
+        group = np.cumsum(np.concatenate(([False], boundary)))
+        idx = idx[np.argsort(rank[group], kind='mergesort')]
+        counts = np.bincount(rank[group])
+        starts = np.cumsum(counts) - counts
+    return idx, starts, ncombinations
+
+
+# reducing functions with implementations operating on consecutive segments
+_SEGMENTED_REDUCERS = (np.mean, np.sum, np.amax, np.amin, np.std, np.median)
+
+
+def _segmented_reduce(fx, data, starts):
+    """Apply a reducing function to consecutive segments of a 2D array
+
+    Parameters
+    ----------
+    fx : callable
+      One of `np.mean`, `np.sum`, `np.max`, `np.min`, `np.std`, `np.median`.
+    data : array
+      The segments are consecutive along the first axis.
+    starts : array
+      Index of the first element of each segment.
+
+    Returns
+    -------
+    array or None
+      Array with one row per segment, the dtype matching the result of `fx`.
+      None if `fx` or the data is not supported.
+    """
+    if not fx in _SEGMENTED_REDUCERS or data.ndim != 2 \
+      or not (np.issubdtype(data.dtype, np.number)
+              or data.dtype == np.bool_) \
+      or np.issubdtype(data.dtype, np.complexfloating):
+        return None
+    if fx is np.amax:
+        return np.maximum.reduceat(data, starts, axis=0)
+    elif fx is np.amin:
+        return np.minimum.reduceat(data, starts, axis=0)
+
+    dtype = fx(data[:1], axis=0).dtype
+    if fx is np.sum:
+        if np.issubdtype(dtype, np.floating):
+            # accumulate in double precision
+            return np.add.reduceat(data, starts, axis=0,
+                                   dtype=np.float64).astype(dtype)
+        return np.add.reduceat(data, starts, axis=0, dtype=dtype)
+
+    counts = np.diff(np.append(starts, len(data)))
+    if fx is np.median:
+        if np.issubdtype(data.dtype, np.floating) and np.isnan(data).any():
+            # NaNs would be sorted to the end instead of yielding NaN
+            return None
+        segment = np.repeat(np.arange(len(starts)), counts)
+        # sort values within each segment: by value first, then (stably) by
+        # segment
+        order = np.argsort(data, axis=0, kind='mergesort')
+        order = order[np.argsort(segment[order], axis=0, kind='mergesort'),
+                      np.arange(data.shape[1])]
+        sdata = data[order, np.arange(data.shape[1])]
+        lower = sdata[starts + (counts - 1) // 2].astype(np.float64)
+        upper = sdata[starts + counts // 2]
+        return ((lower + upper) / 2).astype(dtype)
+
+    counts = counts[:, None]
+    mean = np.add.reduceat(data, starts, axis=0, dtype=np.float64) / counts
+    if fx is np.mean:
+        return mean.astype(dtype)
+    # std
+    dev = data - np.repeat(mean, counts[:, 0], axis=0)
+    dev *= dev
+    return np.sqrt(np.add.reduceat(dev, starts, axis=0) / counts).astype(dtype)
+
+
+def _merge_grouped_attr(attrfx, value, idx, starts):
+    """Apply an `attrfx` to the groups of an attribute's values
+
+    Returns a sequence with the result for each group.  Merging with the
+    default `_uniquemerge2literal` is done vectorized for all groups with
+    uniform values.
+    """
+    if attrfx is _uniquemerge2literal and value.ndim == 1 \
+      and value.dtype != np.object \
+      and not (np.issubdtype(value.dtype, np.floating)
+               and np.isnan(value).any()):
+        svalue = value[idx]
+        # whether an element differs from the next one in the same group
+        differs = np.concatenate((svalue[1:] != svalue[:-1], [False]))
+        differs[starts[1:] - 1] = False
+        nonuniform = np.add.reduceat(differs, starts) > 0
+        if not nonuniform.any():
+            return svalue[starts]
+        ends = np.append(starts[1:], len(svalue))
+        return [attrfx(svalue[start:end]) if nu else svalue[start:start + 1]
+                for start, end, nu in zip(starts, ends, nonuniform)]
+    return [attrfx(value[gidx]) for gidx in np.split(idx, starts[1:])]
+
+
 def merge2first(attrs):
     """Compress a sequence by discard all but the first element
 
@@ -0,0 +1,324 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the PyMVPA package for the
+#   copyright and license terms.
+#
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""GLMMapper implementation based on NumPy's linear algebra only."""
+
+__docformat__ = 'restructuredtext'
+
+import numpy as np
+
+from mvpa2.datasets import Dataset
+from mvpa2.mappers.glm import GLMMapper
+from mvpa2.base.param import Parameter
+from mvpa2.base.constraints import EnsureChoice, EnsureInt, EnsureRange, \
+        EnsureNone, EnsureListOf
+
+if __debug__:
+    from mvpa2.base import debug
+
+# number of bins for AR(1) coefficient estimates, i.e. features with
+# coefficients rounded to the same value share a single whitened design
+# (same as NiPy)
+_AR1_BINS = 100
+
+
+def _ar1_whiten(x, rho):
+    """Prewhiten a (design or data) matrix along the first axis"""
+    x = np.asanyarray(x, dtype=float)
+    if rho == 0:
+        return x
+    w = x.copy()
+    w[1:] -= rho * x[:-1]
+    w[0] *= np.sqrt(1 - rho ** 2)
+    return w
+
+
+class OLSGLMFit(object):
+    """Results of a model fit with :class:`OLSGLMMapper`
+
+    Parameter estimates and residual variances for all features, as well as
+    everything needed to compute additional contrasts.
+    """
+    def __init__(self, design, beta, mse, dof, cov, rho=None):
+        """
+        Parameters
+        ----------
+        design : array
+          Design matrix (not whitened).
+        beta : array
+          Parameter estimates (regressors x features).
+        mse : array
+          Residual variance for each feature.
+        dof : int
+          Degrees of freedom of the residuals.
+        cov : dict
+          Unscaled covariance matrix of the parameter estimates for each
+          AR(1) coefficient (0 for an OLS model).
+        rho : array or None
+          AR(1) coefficients for all features, if such a noise model was used.
+        """
+        self.design = design
+        self.beta = beta
+        self.mse = mse
+        self.dof = dof
+        self.cov = cov
+        self.rho = rho
+
+    def get_beta(self):
+        return self.beta
+
+    def get_mse(self):
+        return self.mse
+
+    def contrast(self, weights):
+        """Compute effect size and t-statistic of a contrast for all features
+
+        Parameters
+        ----------
+        weights : array
+          Contrast weights, one for each regressor.
+
+        Returns
+        -------
+        (effect, t)
+        """
+        weights = np.asanyarray(weights, dtype=float)
+        effect = np.dot(weights, self.beta)
+        if self.rho is None:
+            var = np.dot(weights, np.dot(self.cov[0], weights))
+        else:
+            var = np.empty(len(self.rho))
+            for rho, cov in self.cov.iteritems():
+                var[self.rho == rho] = np.dot(weights, np.dot(cov, weights))
+        return effect, effect / np.sqrt(var * self.mse)
+
+
+class OLSGLMMapper(GLMMapper):
+    """GLMMapper implementation based on NumPy
+
+    No 3rd-party package is required. The (optionally prewhitened) design
+    matrix is factorized only once, and parameter estimates for all features
+    are computed by matrix products on blocks of features, limiting the memory
+    demand for large datasets. In addition to parameter estimates,
+    t-statistics and contrasts can be computed.
+
+    Besides a regular GLM, a least-squares-separate (LSS) model for
+    single-trial parameter estimates is supported (Mumford et al., 2012,
+    NeuroImage). Each trial's estimate comes from a model comprising the trial
+    regressor, a regressor with the sum of all other trials (of the same group)
+    and the remaining regressors. All these models share a common part that is
+    factorized once, hence the computational cost is about that of a single
+    model fit with one regressor per trial.
+    """
+
+    noise_model = Parameter('ols', constraints=EnsureChoice('ols', 'ar1'),
+            doc="""Noise model. 'ar1' estimates an AR(1) coefficient for each
+            feature from the residuals of an OLS fit, and refits the model
+            with correspondingly prewhitened design and data.  Note that
+            the default is an OLS model, unlike for
+            :class:`~mvpa2.mappers.glm.nipy_glm.NiPyGLMMapper`.""")
+
+    stat = Parameter('beta', constraints=EnsureChoice('beta', 't'),
+            doc="""Statistic to return for each regressor (or contrast, if any
+            are specified): parameter estimates (or contrast effect sizes), or
+            t-statistics.""")
+
+    contrasts = Parameter(None,
+            doc="""Contrasts to be computed instead of parameter estimates for
+            each regressor. Either a dict or a sequence of 2-tuples with the
+            contrast name and its weights. Weights are a sequence with one
+            value for each design matrix column, or a dict mapping regressor
+            names to weights (all others being zero).""")
+
+    lss = Parameter(None, constraints=EnsureListOf(str) | EnsureNone(),
+            doc="""Names of regressors that model single trials. If given,
+            trial-wise parameter estimates are computed with separate models
+            for each trial (least-squares-separate), instead of a single
+            model comprising all regressors.""")
+
+    lss_groups = Parameter(None,
+            doc="""Group labels (e.g. conditions) for the LSS trial
+            regressors. Other trials of each group are modeled by a separate
+            regressor. By default all other trials are modeled by a single
+            regressor.""")
+
+    block_size = Parameter(10000, constraints=EnsureInt() & EnsureRange(min=1),
+            doc="""Maximum number of features to process at once.""")
+
+    def __init__(self, regs, **kwargs):
+        """
+        Parameters
+        ----------
+        regs : list
+          Names of sample attributes to be extracted from an input dataset and
+          used as design matrix columns.
+        """
+        GLMMapper.__init__(self, regs, **kwargs)
+
+    def _get_contrasts(self, reg_names):
+        contrasts = self.params.contrasts
+        if contrasts is None:
+            return None
+        if isinstance(contrasts, dict):
+            contrasts = sorted(contrasts.items())
+        names, weights = [], []
+        for name, w in contrasts:
+            if isinstance(w, dict):
+                unknown = set(w).difference(reg_names)
+                if len(unknown):
+                    raise ValueError("Contrast '%s' refers to unknown "
+                                     "regressors %s" % (name, list(unknown)))
+                w = [w.get(r, 0) for r in reg_names]
+            if not len(w) == len(reg_names):
+                raise ValueError("Contrast '%s' needs %i weights, but got %i"
+                                 % (name, len(reg_names), len(w)))
+            names.append(name)
+            weights.append(w)
+        return names, np.array(weights, dtype=float)
+
+    def _iter_blocks(self, nfeatures, rho):
+        """Yield (AR(1) coefficient, feature selection) for all blocks"""
+        bs = self.params.block_size
+        if rho is None:
+            for start in xrange(0, nfeatures, bs):
+                yield 0, slice(start, min(start + bs, nfeatures))
+            return
+        for r in np.unique(rho):
+            ids = np.where(rho == r)[0]
+            for start in xrange(0, len(ids), bs):
+                yield r, ids[start:start + bs]
+
+    def _estimate_ar1(self, X, Y):
+        pinv = np.linalg.pinv(X)
+        rho = np.empty(Y.shape[1])
+        for r, sel in self._iter_blocks(Y.shape[1], None):
+            y = np.asanyarray(Y[:, sel], dtype=float)
+            resid = y - np.dot(X, np.dot(pinv, y))
+            norm = (resid ** 2).sum(axis=0)
+            norm[norm == 0] = 1
+            rho[sel] = (resid[1:] * resid[:-1]).sum(axis=0) / norm
+        rho = np.round(rho * _AR1_BINS) / _AR1_BINS
+        # stay away from a degenerate whitening
+        return rho.clip(-1 + 1. / _AR1_BINS, 1 - 1. / _AR1_BINS)
+
+    def _fit_model(self, ds, X, reg_names):
+        params = self.params
+        Y = ds.samples
+        X = np.asanyarray(X, dtype=float)
+        if not len(X) == len(Y):
+            raise ValueError("Design matrix (%i rows) does not match the "
+                             "number of samples (%i)." % (len(X), len(Y)))
+        rho = None
+        if params.noise_model == 'ar1':
+            rho = self._estimate_ar1(X, Y)
+        if params.lss is None:
+            return self._fit_glm(Y, X, reg_names, rho)
+        else:
+            return self._fit_lss(Y, X, reg_names, rho)
+
+    def _fit_glm(self, Y, X, reg_names, rho):
+        params = self.params
+        contrasts = self._get_contrasts(reg_names)
+        nfeatures = Y.shape[1]
+        beta = np.empty((X.shape[1], nfeatures))
+        mse = np.empty(nfeatures)
+        covs = {}
+        dof = len(X) - np.linalg.matrix_rank(X)
+        if dof < 1:
+            raise ValueError("Design matrix has no degrees of freedom left "
+                             "for estimating the residual variance.")
+        pinv = Xw = None
+        for r, sel in self._iter_blocks(nfeatures, rho):
+            if not r in covs:
+                # factorize the design once per noise model
+                if __debug__:
+                    debug('MAP', "OLSGLMMapper: factorizing design (rho=%.2f)"
+                          % r)
+                Xw = _ar1_whiten(X, r)
+                pinv = np.linalg.pinv(Xw)
+                covs[r] = np.dot(pinv, pinv.T)
+            y = _ar1_whiten(Y[:, sel], r)
+            b = np.dot(pinv, y)
+            beta[:, sel] = b
+            mse[sel] = ((y - np.dot(Xw, b)) ** 2).sum(axis=0) / dof
+        model = OLSGLMFit(X, beta, mse, dof, covs, rho)
+        if contrasts is None:
+            names = reg_names
+            if params.stat == 'beta':
+                out = beta
+            else:
+                out = np.array([model.contrast(w)[1]
+                                for w in np.identity(len(reg_names))])
+        else:
+            names, weights = contrasts
+            out = np.array([model.contrast(w)[params.stat == 't']
+                            for w in weights])
+        return model, Dataset(out, sa={self.get_space(): names})
+
+    def _fit_lss(self, Y, X, reg_names, rho):
+        params = self.params
+        if not params.stat == 'beta' or params.contrasts is not None:
+            raise ValueError("LSS models only support parameter estimates "
+                             "(stat='beta') without contrasts.")
+        trials = params.lss
+        unknown = set(trials).difference(reg_names)
+        if len(unknown):
+            raise ValueError("Unknown LSS trial regressors %s" % list(unknown))
+        trial_ids = [reg_names.index(t) for t in trials]
+        other_ids = [i for i in xrange(len(reg_names)) if not i in trial_ids]
+        groups = params.lss_groups
+        if groups is None:
+            groups = np.zeros(len(trials), dtype=int)
+        elif not len(groups) == len(trials):
+            raise ValueError("Need one LSS group label per trial regressor "
+                             "(got %i for %i)" % (len(groups), len(trials)))
+        ugroups, groups = np.unique(groups, return_inverse=True)
+        # index of the trial's group regressor in the common design
+        trial_range = np.arange(len(trials))
+        Xt = X[:, trial_ids]
+        # common design: the sum of all trials per group, and all other
+        # regressors. With it, the separate model of each trial (trial and
+        # sum of all other trials in its group) spans the same space as a
+        # model with the trial regressor and the common design. Hence all
+        # separate fits can be obtained from the one of the common design
+        # and the trial regressors residualized with respect to it.
+        Xc = np.hstack([
+            np.vstack([Xt[:, groups == g].sum(axis=1)
+                       for g in xrange(len(ugroups))]).T,
+            X[:, other_ids]])
+        nfeatures = Y.shape[1]
+        beta = np.empty((len(trials), nfeatures))
+        factors = {}
+        for r, sel in self._iter_blocks(nfeatures, rho):
+            if not r in factors:
+                if __debug__:
+                    debug('MAP', "OLSGLMMapper: factorizing LSS common design "
+                          "(rho=%.2f)" % r)
+                Xcw = _ar1_whiten(Xc, r)
+                Xtw = _ar1_whiten(Xt, r)
+                pinv = np.linalg.pinv(Xcw)
+                # trial regressors residualized w.r.t. the common design
+                resid = Xtw - np.dot(Xcw, np.dot(pinv, Xtw))
+                norm = (resid ** 2).sum(axis=0)
+                # trials fully explained by the common design (e.g. single
+                # trial in a group) get the estimate of their group regressor
+                explained = norm <= 1e-10 * (Xtw ** 2).sum(axis=0)
+                norm[explained] = np.inf
+                # contribution of each trial to the estimate of its group
+                # regressor
+                gx = np.dot(pinv, Xtw)[groups, trial_range]
+                factors[r] = (pinv, resid / norm, gx)
+            pinv, resid, gx = factors[r]
+            y = _ar1_whiten(Y[:, sel], r)
+            # trial estimate in the model with the common design
+            a = np.dot(resid.T, y)
+            # plus the estimate of the "other trials" regressor in the
+            # separate model
+            beta[:, sel] = a * (1 - gx[:, None]) + np.dot(pinv[groups], y)
+        model = OLSGLMFit(X, beta, None, None, None, rho)
+        return model, Dataset(beta, sa={self.get_space(): trials})
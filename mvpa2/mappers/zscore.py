@@ -13,6 +13,7 @@ __docformat__ = 'restructuredtext'
 import numpy as np
 
 from mvpa2.base import warning
+from mvpa2.base.learner import DegenerateInputError
 from mvpa2.base.dochelpers import _str, borrowkwargs, _repr_attrs
 from mvpa2.mappers.base import accepts_dataset_as_samples, Mapper
 from mvpa2.datasets.base import Dataset
@@ -20,6 +21,87 @@ from mvpa2.datasets.miscfx import get_nsamples_per_attr, get_samples_by_attr
 from mvpa2.support import copy
 
 
+# maximal size of temporary parameter arrays when z-scoring chunk-wise
+_BLOCK_NBYTES = 2 ** 26
+
+
+def _get_grouped_moments(samples, codes, ngroups):
+    """Per-group number of samples, mean and sum of squared deviations
+
+    Computed in a single pass over the samples sorted by group, with all
+    sums accumulated in double precision.
+
+    Parameters
+    ----------
+    samples : ndarray
+      Samples to compute the statistics for (first axis).
+    codes : ndarray
+      Integer group index (in ``range(ngroups)``) for each sample.
+    ngroups : int
+      Total number of groups.  Groups without samples get NaN estimates.
+    """
+    counts = np.bincount(codes, minlength=ngroups)
+    # stable sort keeps the order of samples within groups
+    order = np.argsort(codes, kind='mergesort')
+    ssamples = np.asanyarray(samples[order])
+    if not np.issubdtype(ssamples.dtype, np.floating):
+        ssamples = ssamples.astype(np.float64)
+    shape = (ngroups,) + ssamples.shape[1:]
+    means = np.empty(shape, dtype=np.float64)
+    m2 = np.empty(shape, dtype=np.float64)
+    nonempty = counts > 0
+    means[~nonempty] = np.nan
+    m2[~nonempty] = np.nan
+    if not len(codes):
+        return counts, means, m2
+    starts = np.cumsum(counts)[nonempty] - counts[nonempty]
+    ncounts = _expand_dims(counts[nonempty], ssamples.ndim)
+    gmeans = np.add.reduceat(ssamples, starts, axis=0, dtype=np.float64)
+    gmeans /= ncounts
+    # deviations from the group means in the (private) sorted copy
+    ssamples -= np.repeat(gmeans, counts[nonempty], axis=0)
+    ssamples *= ssamples
+    means[nonempty] = gmeans
+    m2[nonempty] = np.add.reduceat(ssamples, starts, axis=0,
+                                   dtype=np.float64)
+    return counts, means, m2
+
+
+def _merge_moments(moments1, moments2):
+    """Combine two sets of grouped moments (Chan et al. parallel algorithm)
+    """
+    keys1, n1, mean1, m21 = moments1
+    keys2, n2, mean2, m22 = moments2
+    keys = np.unique(np.concatenate((keys1, keys2)))
+    shape = (len(keys),) + mean1.shape[1:]
+    merged = []
+    for k, n, mean, m2 in ((keys1, n1, mean1, m21), (keys2, n2, mean2, m22)):
+        idx = np.searchsorted(keys, k)
+        fn = np.zeros(len(keys), dtype=n.dtype)
+        fn[idx] = n
+        fmean = np.zeros(shape)
+        fm2 = np.zeros(shape)
+        # groups without samples contribute nothing
+        fmean[idx] = np.where(np.isnan(mean), 0, mean)
+        fm2[idx] = np.where(np.isnan(m2), 0, m2)
+        merged.append((fn, fmean, fm2))
+    (na, meana, m2a), (nb, meanb, m2b) = merged
+    n = na + nb
+    fna = _expand_dims(na, len(shape)).astype(np.float64)
+    fnb = _expand_dims(nb, len(shape)).astype(np.float64)
+    fn = fna + fnb
+    delta = meanb - meana
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = meana + delta * (fnb / fn)
+        m2 = m2a + m2b + delta ** 2 * (fna * fnb / fn)
+    return keys, n, mean, m2
+
+
+def _expand_dims(a, ndim):
+    """Reshape a 1D array to broadcast along the first axis of ndim arrays"""
+    return a.reshape((-1,) + (1,) * (ndim - 1))
+
+
 class ZScoreMapper(Mapper):
     """Mapper to normalize features (Z-scoring).
 
@@ -80,6 +162,7 @@ class ZScoreMapper(Mapper):
         self.__params = params
         self.__param_est = param_est
         self.__params_dict = None
+        self.__moments = None
         self.__dtype = dtype
 
         # secret switch to perform in-place z-scoring
@@ -100,11 +183,8 @@ class ZScoreMapper(Mapper):
 
 
     def _train(self, ds):
-        # local binding
-        chunks_attr = self.__chunks_attr
         params = self.__params
-        param_est = self.__param_est
-
+        self.__moments = None
         # populate a dictionary with tuples of (mean,std) for all chunks, or
         # a global value that is is used for the whole data
         if params is not None:
@@ -113,33 +193,74 @@ class ZScoreMapper(Mapper):
                 # turn into dict, otherwise assume that we have parameters per
                 # chunk
                 params = {'__all__': params}
+            self.__params_dict = params
         else:
             # no parameters given, need to estimate
-            if param_est is not None:
-                est_attr, est_attr_values = param_est
-                # which samples to use for estimation
-                est_ids = set(get_samples_by_attr(ds, est_attr,
-                                                  est_attr_values))
-            else:
-                est_ids = slice(None)
-
-            # now we can either do it one for all, or per chunk
-            if chunks_attr is not None:
-                # per chunk estimate
-                params = {}
-                for c in ds.sa[chunks_attr].unique:
-                    slicer = np.where(ds.sa[chunks_attr].value == c)[0]
-                    if not isinstance(est_ids, slice):
-                        slicer = list(est_ids.intersection(set(slicer)))
-                    params[c] = self._compute_params(ds.samples[slicer])
-            else:
-                # global estimate
-                if isinstance(est_ids, set):
-                    est_ids = list(est_ids)
-                params = {'__all__': self._compute_params(ds.samples[est_ids])}
+            self.__update_estimates(ds)
+
+
+    def _untrain(self):
+        self.__moments = None
 
 
-        self.__params_dict = params
+    def partial_train(self, ds):
+        """Update the parameter estimates with additional samples.
+
+        Allows for estimating Z-scoring parameters from datasets that do not
+        fit into memory at once, by training on consecutive portions of the
+        data (e.g. sets of runs, or blocks of samples).  Statistics of chunks
+        that are present in several portions are combined, and the resulting
+        parameters are identical (up to numerical precision) to those of a
+        single `train()` call on the full dataset.  A call to `train()`
+        discards all previous estimates.
+
+        Parameters
+        ----------
+        ds : Dataset
+          Portion of the training data.
+        """
+        if self.__params is not None:
+            raise RuntimeError("%s has fixed parameters, there is nothing to "
+                               "estimate" % self.__class__.__name__)
+        if ds.nfeatures == 0 or len(ds) == 0:
+            raise DegenerateInputError(
+                "Cannot train learner on degenerate data %s" % ds)
+        self.__update_estimates(ds)
+        self._set_trained()
+
+
+    def __update_estimates(self, ds):
+        """Estimate parameters from `ds` and merge with previous estimates"""
+        chunks_attr = self.__chunks_attr
+        param_est = self.__param_est
+        samples = ds.samples
+
+        if chunks_attr is not None:
+            # per chunk estimate
+            keys, codes = np.unique(ds.sa[chunks_attr].value,
+                                    return_inverse=True)
+        else:
+            # global estimate
+            keys = np.array(['__all__'])
+            codes = np.zeros(len(ds), dtype=int)
+
+        if param_est is not None:
+            est_attr, est_attr_values = param_est
+            # which samples to use for estimation
+            est_mask = np.zeros(len(ds), dtype=bool)
+            est_mask[get_samples_by_attr(ds, est_attr, est_attr_values)] = True
+            samples = samples[est_mask]
+            codes = codes[est_mask]
+
+        moments = (keys,) + _get_grouped_moments(samples, codes, len(keys))
+        if self.__moments is not None:
+            moments = _merge_moments(self.__moments, moments)
+        self.__moments = moments
+
+        keys, counts, means, m2 = moments
+        with np.errstate(divide='ignore', invalid='ignore'):
+            stds = np.sqrt(m2 / _expand_dims(counts, m2.ndim))
+        self.__params_dict = dict(zip(keys, zip(means, stds)))
 
 
     def _forward_dataset(self, ds):
@@ -147,9 +268,18 @@ class ZScoreMapper(Mapper):
         chunks_attr = self.__chunks_attr
         dtype = self.__dtype
 
+        params = self.__params_dict
+        if params is None:
+            raise RuntimeError, \
+                  "ZScoreMapper needs to be trained before call to forward"
+
+        if chunks_attr is not None:
+            chunks, codes = np.unique(ds.sa[chunks_attr].value,
+                                      return_inverse=True)
         if __debug__ and chunks_attr is not None:
-            nsamples_per_chunk = get_nsamples_per_attr(ds, chunks_attr)
-            min_nsamples_per_chunk = np.min(nsamples_per_chunk.values())
+            min_nsamples_per_chunk = np.min(np.bincount(codes))
+            if min_nsamples_per_chunk <= 5:
+                nsamples_per_chunk = get_nsamples_per_attr(ds, chunks_attr)
             if min_nsamples_per_chunk in range(3, 6):
                 warning("Z-scoring chunk-wise having a chunk with only "
                         "%d samples is 'discouraged'. "
@@ -163,11 +293,6 @@ class ZScoreMapper(Mapper):
                         "You have chunks with following number of samples: %s"
                         % (nsamples_per_chunk,))
 
-        params = self.__params_dict
-        if params is None:
-            raise RuntimeError, \
-                  "ZScoreMapper needs to be trained before call to forward"
-
         if self._secret_inplace_zscore:
             mds = ds
         else:
@@ -185,15 +310,14 @@ class ZScoreMapper(Mapper):
             mds.samples = self._zscore(mds.samples, *params['__all__'])
         else:
             # per chunk z-scoring
-            for c in mds.sa[chunks_attr].unique:
+            for c in chunks:
                 if not c in params:
                     raise RuntimeError(
                         "%s has no parameters for chunk '%s'. It probably "
                         "wasn't present in the training dataset!?"
                         % (self.__class__.__name__, c))
-                slicer = np.where(mds.sa[chunks_attr].value == c)[0]
-                mds.samples[slicer] = self._zscore(mds.samples[slicer],
-                                                   *params[c])
+            self._zscore_grouped(mds.samples, codes,
+                                 [params[c] for c in chunks])
 
         return mds
 
@@ -231,8 +355,50 @@ class ZScoreMapper(Mapper):
         return mdata
 
 
-    def _compute_params(self, samples):
-        return (np.mean(samples, axis=0), np.std(samples, axis=0))
+    def _zscore_grouped(self, samples, codes, params):
+        """In-place Z-scoring with a separate parameter set for each group
+
+        Parameters
+        ----------
+        samples : ndarray
+        codes : ndarray
+          Index into `params` for each sample.
+        params : list
+          (mean, std) tuples for all groups.
+        """
+        shape = (len(params),) + samples.shape[1:]
+        # parameters are applied in the dtype of the data, so float32 data
+        # remains float32 without temporary upcasted copies
+        means = np.empty(shape, dtype=samples.dtype)
+        stds = np.empty(shape, dtype=samples.dtype)
+        # groups with a scalar std of 0 are set to zero altogether
+        zero = np.zeros(len(params), dtype=bool)
+        for i, (mean, std) in enumerate(params):
+            if not (np.isscalar(mean) or samples.shape[1] == len(mean)):
+                raise RuntimeError("mean should be a per-feature vector. "
+                                   "Got: %r" % (mean,))
+            if not (np.isscalar(std) or samples.shape[1] == len(std)):
+                raise RuntimeError("std should be a per-feature vector.")
+            means[i] = mean
+            if np.isscalar(std) and std == 0:
+                zero[i] = True
+                stds[i] = 1
+            else:
+                stds[i] = std
+        # invariant features are not scaled
+        stds[stds == 0] = 1
+
+        # process blocks of samples to limit the size of the temporary
+        # per-sample parameter arrays
+        blocksize = max(1, _BLOCK_NBYTES // max(1, samples[:1].nbytes))
+        for start in xrange(0, len(samples), blocksize):
+            block = slice(start, start + blocksize)
+            bcodes = codes[block]
+            samples[block] -= means[bcodes]
+            samples[block] /= stds[bcodes]
+        if zero.any():
+            samples[zero[codes]] = 0
+        return samples
 
 
     def _zscore(self, samples, mean, std):
@@ -449,12 +449,19 @@ class SimpleStatBaseSearchlight(BaseSearchlight):
         # TODO: needs OPT since this is the step consuming 50% of time
         #       or more allow to cache them entirely so this would
         #       not be an unnecessary burden during permutation testing
+        indexsum = self._indexsum
         if not self.reuse_neighbors or self.__roi_fids is None:
             if __debug__:
                 debug('SLC',
                       'Phase 4. Deducing neighbors information for %i ROIs'
                       % (nrois,))
-            roi_fids = [qe.query_byid(f) for f in roi_ids]
+            if indexsum == 'sparse' \
+                    and getattr(qe, 'prefers_bulk_queries', False):
+                # query engine provides all neighborhoods at once, already
+                # in "sparse representation" (see below)
+                roi_fids = qe.query_byids_sparse(roi_ids)
+            else:
+                roi_fids = [qe.query_byid(f) for f in roi_ids]
 
         else:
             if __debug__:
@@ -463,14 +470,23 @@ class SimpleStatBaseSearchlight(BaseSearchlight):
                       % (nrois,))
             roi_fids = self.__roi_fids
 
-        self.ca.roi_feature_ids = roi_fids
-
         roi_sizes = []
         if isinstance(roi_fids, list):
+            self.ca.roi_feature_ids = roi_fids
             nroi_fids = len(roi_fids)
             if self.ca.is_enabled('roi_sizes'):
                 roi_sizes = [len(x) for x in roi_fids]
+        elif externals.exists('scipy') and isinstance(roi_fids, sps.csc_matrix):
+            # directly from the query engine, so cheap to convert
+            nroi_fids = roi_fids.shape[1]
+            indptr, indices = roi_fids.indptr, roi_fids.indices
+            if self.ca.is_enabled('roi_feature_ids'):
+                self.ca.roi_feature_ids = [indices[i:j].tolist() for i, j
+                                           in zip(indptr[:-1], indptr[1:])]
+            if self.ca.is_enabled('roi_sizes'):
+                roi_sizes = np.diff(indptr).tolist()
         elif externals.exists('scipy') and isinstance(roi_fids, sps.spmatrix):
+            self.ca.roi_feature_ids = roi_fids
             nroi_fids = roi_fids.shape[1]
             if self.ca.is_enabled('roi_sizes'):
                 # very expensive operation, so better not to ask over again
@@ -486,9 +502,8 @@ class SimpleStatBaseSearchlight(BaseSearchlight):
         # those via ds.a  but rather assign directly to self.ca
         self.ca.roi_sizes = roi_sizes
 
-        indexsum = self._indexsum
         if indexsum == 'sparse':
-            if not self.reuse_neighbors or self.__roi_fids is None:
+            if not sps.isspmatrix(roi_fids):
                 if __debug__:
                     debug('SLC',
                           'Phase 4b. Converting neighbors to sparse matrix '
@@ -28,6 +28,7 @@ if externals.exists('h5py'):
     from mvpa2.base.hdf5 import h5save, h5load
 
 from mvpa2.datasets import hstack, Dataset
+from mvpa2.base.dataset import _attr_values_equal
 from mvpa2.support import copy
 from mvpa2.featsel.base import StaticFeatureSelection
 from mvpa2.measures.base import Measure
@@ -37,6 +38,119 @@ from mvpa2.mappers.base import ChainMapper
 
 from mvpa2.support.due import due, Doi
 
+_dict_update = dict.update
+
+
+def _get_light_roi(ds, roi_fids, fa):
+    """Light-weight ROI dataset
+
+    Only samples and the feature attributes listed in `fa` are sliced.  Sample
+    and dataset attributes are shared with `ds`, i.e. the mapper is not
+    adjusted to the ROI.
+    """
+    roi = ds.__class__(ds.samples[:, roi_fids])
+    # same number of samples, hence no checks needed
+    _dict_update(roi.sa, ds.sa)
+    _dict_update(roi.a, ds.a)
+    for name in fa:
+        roi.fa[name] = ds.fa[name].value[roi_fids]
+    return roi
+
+
+class _ROIValuesCollector(object):
+    """Collects single-feature results of ROIs into a preallocated array
+
+    Scalar results are treated as datasets with a single sample.  The
+    dataset returned by `get_dataset()` is identical to what `hstack()`
+    would create from the individual results, and carries the per-ROI
+    attributes as lists, along with the number of ROIs ('nrois'), in its
+    dataset attributes.
+    """
+    def __init__(self, template, nrois):
+        if np.isscalar(template):
+            template = Dataset(np.atleast_1d(template))
+        self._template = template
+        self._values = np.empty((len(template), nrois),
+                                dtype=template.samples.dtype)
+        self._drop = set()
+        self._roi_attrs = {}
+        self.n = 0
+
+    @staticmethod
+    def accepts(res, scalars=True):
+        """Whether `res` is a result that can be collected"""
+        if np.isscalar(res):
+            return scalars
+        return is_datasetlike(res) and type(res.samples) is np.ndarray \
+               and res.samples.ndim == 2 and res.nfeatures == 1 \
+               and not len(res.fa)
+
+    def add(self, res, roi_attrs):
+        """Add the result of a ROI
+
+        Returns
+        -------
+        bool
+          False if `res` is not compatible with the previous results, and
+          was not added.
+        """
+        template = self._template
+        if np.isscalar(res):
+            if not (len(template) == 1 and not len(template.sa)
+                    and np.asarray(res).dtype == self._values.dtype):
+                return False
+            self._values[0, self.n] = res
+        elif (self.accepts(res) and res.__class__ is template.__class__
+                and res.samples.dtype == self._values.dtype
+                and len(res) == len(template)):
+            self._values[:, self.n] = res.samples[:, 0]
+        else:
+            return False
+        if self.n and not np.isscalar(res):
+            # as hstack() does -- drop sample attributes that differ
+            tsa = template.sa
+            rsa = res.sa
+            for name in tsa:
+                if name in self._drop:
+                    continue
+                if name not in rsa or \
+                        not _attr_values_equal(tsa[name].value,
+                                               rsa[name].value):
+                    self._drop.add(name)
+        for name, value in roi_attrs.iteritems():
+            self._roi_attrs.setdefault(name, []).append(value)
+        self.n += 1
+        return True
+
+    def get_dataset(self):
+        template = self._template
+        if self.n == 1:
+            # just like a single ROI would have been handled
+            for name, value in self._roi_attrs.iteritems():
+                template.a[name] = value[0]
+            return template
+        out = template.__class__(
+            self._values[:, :self.n],
+            sa=dict((name, attr.value)
+                    for name, attr in template.sa.iteritems()
+                    if name not in self._drop))
+        out.a['nrois'] = self.n
+        for name, value in self._roi_attrs.iteritems():
+            out.a[name] = value
+        return out
+
+
+def _get_roi_attr_values(results, name):
+    """Per-ROI attribute values from individual and collected results"""
+    values = []
+    for r in results:
+        if 'nrois' in r.a:
+            values.extend(r.a[name].value)
+        else:
+            values.append(r.a[name].value)
+    return values
+
+
 class BaseSearchlight(Measure):
     """Base class for searchlights.
 
@@ -232,11 +346,19 @@ class Searchlight(BaseSearchlight):
             debug('SLC', " hstacked shape %s" % (result_ds.shape,))
 
         if sl.ca.is_enabled('roi_feature_ids'):
-            sl.ca.roi_feature_ids = [r.a.roi_feature_ids for r in results]
+            sl.ca.roi_feature_ids = _get_roi_attr_values(results,
+                                                         'roi_feature_ids')
         if sl.ca.is_enabled('roi_sizes'):
-            sl.ca.roi_sizes = [r.a.roi_sizes for r in results]
+            sl.ca.roi_sizes = _get_roi_attr_values(results, 'roi_sizes')
         if sl.ca.is_enabled('roi_center_ids'):
-            sl.ca.roi_center_ids = [r.a.roi_center_ids for r in results]
+            sl.ca.roi_center_ids = _get_roi_attr_values(results,
+                                                        'roi_center_ids')
+        if 'nrois' in result_ds.a:
+            # a single block of collected results was "stacked"
+            for name in ('nrois', 'roi_feature_ids', 'roi_sizes',
+                         'roi_center_ids'):
+                if name in result_ds.a:
+                    del result_ds.a[name]
 
         if 'mapper' in dataset.a:
             # since we know the space we can stick the original mapper into the
@@ -271,6 +393,7 @@ class Searchlight(BaseSearchlight):
                  results_fx=None,
                  tmp_prefix='tmpsl',
                  nblocks=None,
+                 roi_fa=None,
                  **kwargs):
         """
         Parameters
@@ -306,6 +429,15 @@ class Searchlight(BaseSearchlight):
         nblocks : None or int
           Into how many blocks to split the computation (could be larger than
           nproc).  If None -- nproc is used.
+        roi_fa : None or list of str
+          If None, each ROI dataset is a regular slice of the input dataset.
+          Otherwise, ROI datasets are created in a light-weight fashion,
+          which is considerably faster for small ROIs: only the samples and
+          the listed feature attributes are sliced, while sample and dataset
+          attributes are shared with the input dataset (hence the mapper
+          does not reflect the ROI selection).  Use this if `datameasure`
+          does not rely on other feature attributes, nor on the mapper, and
+          does not modify the attributes of its input dataset in place.
         **kwargs
           In addition this class supports all keyword arguments of its
           base-class :class:`~mvpa2.measures.searchlight.BaseSearchlight`.
@@ -321,6 +453,9 @@ class Searchlight(BaseSearchlight):
                           if results_fx is None else results_fx
         self.tmp_prefix = tmp_prefix
         self.nblocks = nblocks
+        if isinstance(roi_fa, basestring):
+            roi_fa = [roi_fa]
+        self.roi_fa = roi_fa
         if isinstance(add_center_fa, str):
             self.__add_center_fa = add_center_fa
         elif add_center_fa:
@@ -337,7 +472,7 @@ class Searchlight(BaseSearchlight):
             + _repr_attrs(self, ['add_center_fa'], default=False)
             + _repr_attrs(self, ['results_postproc_fx'])
             + _repr_attrs(self, ['results_backend'], default='native')
-            + _repr_attrs(self, ['results_fx', 'nblocks'])
+            + _repr_attrs(self, ['results_fx', 'nblocks', 'roi_fa'])
             )
 
 
@@ -431,6 +566,13 @@ class Searchlight(BaseSearchlight):
                               store_roi_sizes,
                               store_roi_center_ids])
 
+        # unless results are handed over individually to custom functions,
+        # single-feature results are collected into a preallocated array
+        collect_values = self.results_fx is Searchlight._concat_results \
+                         and self.results_postproc_fx is None
+        collector = None
+        roi_fa = self.roi_fa
+
         # put rois around all features in the dataset and compute the
         # measure within them
         bar = ProgressBar()
@@ -452,7 +594,10 @@ class Searchlight(BaseSearchlight):
                 roi_fids = roi_specs
 
             # slice the dataset
-            roi = ds[:, roi_fids]
+            if roi_fa is None:
+                roi = ds[:, roi_fids]
+            else:
+                roi = _get_light_roi(ds, roi_fids, roi_fa)
 
             if is_datasetlike(roi_specs):
                 for n, v in roi_specs.fa.iteritems():
@@ -470,17 +615,35 @@ class Searchlight(BaseSearchlight):
             # compute the datameasure and store in results
             res = measure(roi)
 
-            if assure_dataset and not is_datasetlike(res):
-                res = Dataset(np.atleast_1d(res))
+            # roi attributes for later aggregation
+            roi_attrs = {}
             if store_roi_feature_ids:
-                # add roi feature ids to intermediate result dataset for later
-                # aggregation
-                res.a['roi_feature_ids'] = roi_fids
+                roi_attrs['roi_feature_ids'] = roi_fids
             if store_roi_sizes:
-                res.a['roi_sizes'] = roi.nfeatures
+                roi_attrs['roi_sizes'] = roi.nfeatures
             if store_roi_center_ids:
-                res.a['roi_center_ids'] = f
-            results.append(res)
+                roi_attrs['roi_center_ids'] = f
+
+            collected = False
+            if collect_values:
+                if collector is None and \
+                        _ROIValuesCollector.accepts(res, scalars=assure_dataset):
+                    collector = _ROIValuesCollector(res, len(block))
+                collected = collector is not None \
+                            and collector.add(res, roi_attrs)
+                if not collected:
+                    # continue with individual results
+                    if collector is not None:
+                        results.append(collector.get_dataset())
+                        collector = None
+                    collect_values = False
+
+            if not collected:
+                if assure_dataset and not is_datasetlike(res):
+                    res = Dataset(np.atleast_1d(res))
+                for name, value in roi_attrs.iteritems():
+                    res.a[name] = value
+                results.append(res)
 
             if __debug__:
                 msg = 'ROI %i (%i/%i), %i features' % \
@@ -491,6 +654,9 @@ class Searchlight(BaseSearchlight):
             # just to get to new line
             debug('SLC', '')
 
+        if collector is not None:
+            results.append(collector.get_dataset())
+
         if self.results_postproc_fx:
             if __debug__:
                 debug('SLC', "Post-processing %d results in proc_block using %s"
@@ -11,6 +11,7 @@
 __docformat__ = 'restructuredtext'
 
 from mvpa2.base import externals
+from mvpa2.base.parallel import thread_map
 
 if externals.exists('scipy', raise_=True):
     import scipy.stats as st
@@ -218,6 +219,230 @@ def _ttest_finish(df, t, alternative):
     return t, prob
 
 
+class StreamingTTest1Samp(object):
+    """One-sample t-test on observations that are provided one at a time
+
+    Only sufficient statistics are accumulated (count, mean, and sum of
+    squared deviations, using Welford's algorithm), hence the memory demand
+    does not depend on the number of observations, e.g. subject maps in a
+    group analysis. NaN values are ignored, i.e. each feature is tested on
+    the number of observations with a value for it. Results match those of
+    :func:`ttest_1samp` with a corresponding ``mask``.
+
+    Optionally, a null distribution is built from random sign flips of all
+    observations (against ``popmean``), accumulated in the same fashion.
+
+    All accumulators are updated in blocks of features, which can be
+    processed in parallel threads.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from mvpa2.misc.stats import StreamingTTest1Samp, ttest_1samp
+    >>> data = np.random.normal(0.5, size=(10, 4))
+    >>> tt = StreamingTTest1Samp(popmean=0)
+    >>> for obs in data:
+    ...     tt.update(obs)
+    >>> np.allclose(tt.ttest(), ttest_1samp(data))
+    True
+    """
+    def __init__(self, popmean=0, alternative='two-sided', nperm=0,
+                 block_size=None, nproc=1, seed=None):
+        """
+        Parameters
+        ----------
+        popmean : float or array_like
+          Expected value in null hypothesis. If array_like it must have the
+          shape of an observation.
+        alternative : ('two-sided', 'greater', 'less')
+          Alternative hypothesis.
+        nperm : int
+          Number of random sign-flipping permutations to build a null
+          distribution from.
+        block_size : int or None
+          Number of features to update at once. By default, features are
+          evenly split among `nproc` blocks.
+        nproc : int
+          Number of threads to process blocks of features.
+        seed : int or None
+          Seed for the random sign flips. If None, NumPy's global random
+          number generator is used.
+        """
+        self.popmean = popmean
+        self.alternative = alternative
+        self.nperm = nperm
+        self.block_size = block_size
+        self.nproc = nproc
+        self._rng = np.random if seed is None \
+                    else np.random.RandomState(seed)
+        self.nobs = 0
+        self._shape = None
+
+    def _init(self, shape):
+        nfeatures = int(np.prod(shape))
+        self._shape = shape
+        self._popmean = np.asanyarray(self.popmean, dtype=np.float64)
+        if self._popmean.ndim:
+            if not self._popmean.shape == shape:
+                raise ValueError("popmean shape %s does not match the shape "
+                                 "of the observations %s"
+                                 % (self._popmean.shape, shape))
+            self._popmean = self._popmean.ravel()
+        # sufficient statistics
+        self._n = np.zeros(nfeatures, dtype=int)
+        self._mean = np.zeros(nfeatures)
+        self._m2 = np.zeros(nfeatures)
+        # sums of sign-flipped deviations from popmean
+        self._psum = np.zeros((self.nperm, nfeatures))
+        block_size = self.block_size
+        if block_size is None:
+            block_size = int(np.ceil(nfeatures / float(self.nproc))) or 1
+        self._blocks = [slice(i, min(i + block_size, nfeatures))
+                        for i in xrange(0, nfeatures, block_size)]
+
+    def _process(self, func):
+        """Call func for all blocks and return the results"""
+        return thread_map(func, self._blocks, self.nproc)
+
+    def _get_popmean(self, block):
+        if self._popmean.ndim:
+            return self._popmean[block]
+        return self._popmean
+
+    def update(self, x):
+        """Add an observation
+
+        Parameters
+        ----------
+        x : array_like
+          Values for all features. All observations must have the same
+          shape. NaN values are ignored.
+        """
+        x = np.asanyarray(x, dtype=np.float64)
+        if self._shape is None:
+            self._init(x.shape)
+        elif not x.shape == self._shape:
+            raise ValueError("Observation shape %s does not match previous "
+                             "ones %s" % (x.shape, self._shape))
+        x = x.ravel()
+        signs = None
+        if self.nperm:
+            # same flips for all features of an observation
+            signs = self._rng.randint(0, 2, self.nperm) * 2. - 1
+
+        def _update(block):
+            xb = x[block]
+            valid = ~np.isnan(xb)
+            n = self._n[block]
+            mean = self._mean[block]
+            n += valid
+            delta = np.where(valid, xb - mean, 0)
+            mean += delta / np.maximum(n, 1)
+            self._m2[block] += delta * np.where(valid, xb - mean, 0)
+            if signs is not None:
+                dev = np.where(valid, xb - self._get_popmean(block), 0)
+                self._psum[:, block] += signs[:, None] * dev
+
+        self._process(_update)
+        self.nobs += 1
+
+    def _check_nobs(self):
+        if self._shape is None:
+            raise RuntimeError("No observations were added yet.")
+
+    def _tstat(self, block, mean=None):
+        """t-statistics of a block, for the given mean deviations or the
+        actual observations"""
+        n = self._n[block]
+        m2 = self._m2[block]
+        dev = self._mean[block] - self._get_popmean(block)
+        np_err = np.seterr(divide='ignore', invalid='ignore')
+        try:
+            if mean is None:
+                mean = dev
+                v = m2 / (n - 1)
+            else:
+                # sum of squared deviations from popmean is invariant to
+                # sign flips
+                v = (m2 + n * dev ** 2 - n * mean ** 2) / (n - 1)
+                v = np.maximum(v, 0)
+            v[n < 2] = np.nan
+            return mean / np.sqrt(v / n)
+        finally:
+            np.seterr(**np_err)
+
+    def ttest(self):
+        """Compute the t-test on all observations added so far
+
+        Returns
+        -------
+        t : array
+          t-statistic
+        prob : array
+          p-value
+        """
+        self._check_nobs()
+        t = np.concatenate(self._process(self._tstat))
+        t, prob = _ttest_finish(self._n - 1, t, alternative=self.alternative)
+        return t.reshape(self._shape), prob.reshape(self._shape)
+
+    def null_dist(self):
+        """t-statistics of all sign-flipping permutations
+
+        Returns
+        -------
+        array
+          (permutations x shape of the observations)
+        """
+        self._check_nobs()
+        def _null(block):
+            n = self._n[block]
+            np_err = np.seterr(divide='ignore', invalid='ignore')
+            try:
+                mean = self._psum[:, block] / n
+            finally:
+                np.seterr(**np_err)
+            return np.array([self._tstat(block, m) for m in mean])
+        null = np.hstack(self._process(_null)) if len(self._blocks) \
+               else np.zeros((self.nperm, 0))
+        return null.reshape((self.nperm,) + self._shape)
+
+    def perm_prob(self):
+        """p-values from the sign-flipping null distribution
+
+        The fraction of permutations (including the actual observations)
+        with a statistic at least as extreme as the observed one, given the
+        alternative hypothesis.
+        """
+        self._check_nobs()
+        if not self.nperm:
+            raise ValueError("No permutations were requested.")
+        alternative = self.alternative
+        def _count(block):
+            t = self._tstat(block)
+            n = self._n[block]
+            count = np.zeros(len(t), dtype=int)
+            np_err = np.seterr(divide='ignore', invalid='ignore')
+            try:
+                for psum in self._psum[:, block]:
+                    tp = self._tstat(block, psum / n)
+                    if alternative == 'two-sided':
+                        count += np.abs(tp) >= np.abs(t)
+                    elif alternative == 'greater':
+                        count += tp >= t
+                    elif alternative == 'less':
+                        count += tp <= t
+                    else:
+                        raise ValueError("Unknown alternative %r"
+                                         % alternative)
+            finally:
+                np.seterr(**np_err)
+            prob = (count + 1.) / (self.nperm + 1)
+            prob[np.isnan(t)] = np.nan
+            return prob
+        return np.concatenate(self._process(_count)).reshape(self._shape)
+
+
 def binomial_proportion_ci(n, X, alpha=.05, meth='jeffreys'):
     """Compute the confidence interval for a set of Bernoulli trials
 
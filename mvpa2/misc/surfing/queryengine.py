@@ -26,8 +26,12 @@ from mvpa2.base.dochelpers import _repr_attrs, borrowkwargs
 from mvpa2.base.dataset import AttrDataset
 from mvpa2.misc.neighborhood import QueryEngineInterface
 
-from mvpa2.misc.surfing import volgeom, surf_voxel_selection
-from mvpa2.base import warning
+from mvpa2.misc.surfing import volgeom, surf_voxel_selection, \
+                               volume_mask_dict
+from mvpa2.base import warning, externals
+
+if __debug__:
+    from mvpa2.base import debug
 
 
 class SurfaceQueryEngine(QueryEngineInterface):
@@ -41,7 +45,7 @@ class SurfaceQueryEngine(QueryEngineInterface):
     '''
 
     def __init__(self, surface, radius, distance_metric='dijkstra',
-                    fa_node_key='node_indices'):
+                    fa_node_key='node_indices', precompute=False, nproc=1):
         '''Make a new SurfaceQueryEngine
 
         Parameters
@@ -55,6 +59,16 @@ class SurfaceQueryEngine(QueryEngineInterface):
         fa_node_key: str
             Key for feature attribute that contains node indices
             (default: 'node_indices').
+        precompute: bool
+            If True, then the neighborhoods of all vertices are computed
+            at once when training (see compute_neighborhoods). They do not
+            depend on the dataset, so they are kept when training again
+            (e.g. during permutation testing), and can be stored with
+            save_neighborhoods and reused with load_neighborhoods.
+        nproc: int or None
+            Number of processes to compute neighborhoods of many vertices
+            at once (default: 1). Values other than 1 require pprocess; if
+            None, all available cores are used.
 
         Notes
         -----
@@ -65,7 +79,11 @@ class SurfaceQueryEngine(QueryEngineInterface):
         self.radius = radius
         self.distance_metric = distance_metric
         self.fa_node_key = fa_node_key
+        self.precompute = precompute
+        self.nproc = nproc
         self._vertex2feature_map = None
+        self._vertex2feature_csr = None
+        self._neighborhoods = None
 
         allowed_metrics = ('dijkstra', 'euclidean')
         if not self.distance_metric in allowed_metrics:
@@ -86,14 +104,20 @@ class SurfaceQueryEngine(QueryEngineInterface):
                    + _repr_attrs(self, ['distance_metric'],
                                    default='dijkstra')
                    + _repr_attrs(self, ['fa_node_key'],
-                                   default='node_indices'))
+                                   default='node_indices')
+                   + _repr_attrs(self, ['precompute'], default=False)
+                   + _repr_attrs(self, ['nproc'], default=1))
 
     def __reduce__(self):
         return (self.__class__, (self.surface,
                                  self.radius,
                                  self.distance_metric,
-                                 self.fa_node_key),
-                            dict(_vertex2feature_map=self._vertex2feature_map))
+                                 self.fa_node_key,
+                                 self.precompute,
+                                 self.nproc),
+                            dict(_vertex2feature_map=self._vertex2feature_map,
+                                 _vertex2feature_csr=self._vertex2feature_csr,
+                                 _neighborhoods=self._neighborhoods))
 
     def __str__(self):
         return '%s(%s, radius=%s, distance_metric=%s, fa_node_key=%s)' % \
@@ -115,6 +139,7 @@ class SurfaceQueryEngine(QueryEngineInterface):
 
     def untrain(self):
         self._vertex2feature_map = None
+        self._vertex2feature_csr = None
 
     def train(self, ds):
         '''
@@ -153,6 +178,176 @@ class SurfaceQueryEngine(QueryEngineInterface):
         for feature_id, vertex_id in enumerate(vertex_ids):
             v2f[vertex_id].append(feature_id)
 
+        # the same mapping in CSR layout, for many vertices at once
+        counts = np.bincount(vertex_ids.astype(np.int_), minlength=nvertices)
+        self._vertex2feature_csr = (np.hstack(([0], np.cumsum(counts))),
+                                    np.argsort(vertex_ids, kind='mergesort'))
+
+        if self.precompute and self._neighborhoods is None:
+            self._neighborhoods = self.compute_neighborhoods()
+
+    def compute_neighborhoods(self, vertex_ids=None):
+        '''
+        Compute the neighborhoods of many vertices at once
+
+        Parameters
+        ----------
+        vertex_ids: array-like of int or None
+            Indices of center vertices. If None, all vertices are used.
+
+        Returns
+        -------
+        neighborhoods: scipy.sparse.csr_matrix
+            NxP matrix (N==len(vertex_ids), P==self.surface.nvertices) so
+            that the i-th row contains the distances from vertex_ids[i] to
+            the nodes in its neighborhood. Distances of zero are stored
+            explicitly, so that the stored elements of each row are exactly
+            the nodes in the neighborhood.
+
+        Notes
+        -----
+        With nproc > 1 the vertices are split in blocks that are
+        processed in parallel.
+        '''
+        nvertices = self.surface.nvertices
+        if vertex_ids is None:
+            vertex_ids = np.arange(nvertices)
+        else:
+            vertex_ids = self._check_vertex_ids(vertex_ids)
+
+        nproc = self.nproc
+        if nproc is None and externals.exists('pprocess'):
+            import pprocess
+            try:
+                nproc = pprocess.get_number_of_cores() or 1
+            except AttributeError:
+                warning("pprocess version %s has no API to figure out maximal "
+                        "number of cores. Using 1"
+                        % externals.versions['pprocess'])
+                nproc = 1
+
+        if nproc is None or nproc <= 1 or len(vertex_ids) < 2:
+            return _surface_neighborhoods(self.surface, vertex_ids,
+                                          self.radius, self.distance_metric)
+
+        externals.exists('pprocess', raise_=True)
+        import pprocess
+        from scipy import sparse
+
+        if __debug__:
+            debug('SVS', 'Computing neighborhoods of %d vertices using %d '
+                         'processes' % (len(vertex_ids), nproc))
+
+        results = pprocess.Map(limit=nproc)
+        compute = results.manage(pprocess.MakeParallel(
+                                            _surface_neighborhoods))
+        for block in np.array_split(vertex_ids, nproc):
+            compute(self.surface, block, self.radius, self.distance_metric)
+
+        return sparse.vstack(list(results), format='csr')
+
+    @property
+    def prefers_bulk_queries(self):
+        '''Whether to query the neighborhoods of many vertices at once
+
+        True if the neighborhoods were precomputed (or loaded), or are
+        computed in parallel (nproc other than 1). Only then
+        query_byids_sparse is expected to be faster than calling
+        query_byid for each vertex.
+        '''
+        return self._neighborhoods is not None or self.nproc != 1
+
+    def save_neighborhoods(self, fn):
+        '''
+        Store precomputed neighborhoods
+
+        Parameters
+        ----------
+        fn: str
+            Filename (.npz) to store the neighborhoods of all vertices in
+            compressed sparse row (CSR) layout. If the neighborhoods have
+            not been computed yet, they are computed first.
+        '''
+        if self._neighborhoods is None:
+            self._neighborhoods = self.compute_neighborhoods()
+
+        nbrs = self._neighborhoods
+        np.savez(fn, indptr=nbrs.indptr, indices=nbrs.indices,
+                 data=nbrs.data, nvertices=self.surface.nvertices,
+                 radius=self.radius, distance_metric=self.distance_metric)
+
+    def load_neighborhoods(self, fn):
+        '''
+        Use neighborhoods stored by save_neighborhoods
+
+        Parameters
+        ----------
+        fn: str
+            Filename of neighborhoods stored with save_neighborhoods, for a
+            surface with the same number of vertices and with the same
+            radius and distance metric as this instance.
+        '''
+        from scipy import sparse
+
+        stored = np.load(fn)
+        nvertices = self.surface.nvertices
+        params = (int(stored['nvertices']), float(stored['radius']),
+                  str(stored['distance_metric']))
+        if params != (nvertices, self.radius, self.distance_metric):
+            raise ValueError('Neighborhoods in %s were computed for %d '
+                             'vertices with radius=%s and distance_metric=%s, '
+                             'which do not match %s' % ((fn,) + params + (self,)))
+
+        self._neighborhoods = sparse.csr_matrix((stored['data'],
+                                                 stored['indices'],
+                                                 stored['indptr']),
+                                                shape=(nvertices, nvertices))
+
+    def _check_vertex_ids(self, vertex_ids):
+        '''Helper: vertex_ids as array, with KeyError for invalid ids'''
+        ids = np.asarray(vertex_ids).ravel()
+        nvertices = self.surface.nvertices
+
+        if len(ids) and (np.any(ids < 0) or np.any(ids >= nvertices)
+                         or np.any(np.round(ids) != ids)):
+            raise KeyError('vertex_id should be integer in range(%d)' %
+                                                nvertices)
+        return ids.astype(np.int_)
+
+    def _get_neighborhoods(self, vertex_ids):
+        '''Helper: precomputed or newly computed neighborhoods'''
+        if self._neighborhoods is None:
+            return self.compute_neighborhoods(vertex_ids)
+
+        # not through fancy indexing, which drops the explicit zeros
+        from scipy import sparse
+        nbrs = self._neighborhoods
+        rows = self._check_vertex_ids(vertex_ids)
+        counts = nbrs.indptr[rows + 1] - nbrs.indptr[rows]
+        gather = lambda x: volume_mask_dict._csr_gather(nbrs.indptr, x, rows)
+        return sparse.csr_matrix((gather(nbrs.data), gather(nbrs.indices),
+                                  np.hstack(([0], np.cumsum(counts)))),
+                                 shape=(len(rows), nbrs.shape[1]))
+
+    def _circlearound_n2d(self, vertex_id):
+        '''Helper: mapping from nodes near a vertex to their distance'''
+        nbrs = self._neighborhoods
+        if nbrs is None:
+            return self.surface.circlearound_n2d(vertex_id,
+                                                 self.radius,
+                                                 self.distance_metric)
+
+        start, stop = nbrs.indptr[vertex_id:vertex_id + 2]
+        return dict(zip(nbrs.indices[start:stop].tolist(),
+                        nbrs.data[start:stop].tolist()))
+
+    def _select_nodes(self, vertex_ids, nodes, distances):
+        '''Helper: mask of nodes that are part of neighborhoods
+
+        vertex_ids, nodes and distances are arrays with the center vertex,
+        nearby node and its distance for each element of the neighborhoods.
+        '''
+        return np.ones(len(nodes), dtype=np.bool_)
 
     def query(self, **kwargs):
         raise NotImplementedError
@@ -180,13 +375,57 @@ class SurfaceQueryEngine(QueryEngineInterface):
             raise KeyError('vertex_id should be integer in range(%d)' %
                                                 self.surface.nvertices)
 
-        nearby_nodes = self.surface.circlearound_n2d(vertex_id,
-                                                    self.radius,
-                                                    self.distance_metric)
+        nbrs = self._neighborhoods
+        if nbrs is not None:
+            indptr, feature_ids = self._vertex2feature_csr
+            nodes = nbrs.indices[nbrs.indptr[vertex_id]:
+                                 nbrs.indptr[vertex_id + 1]]
+            return volume_mask_dict._csr_gather(indptr, feature_ids,
+                                                nodes).tolist()
+
+        nearby_nodes = self._circlearound_n2d(vertex_id)
 
         v2f = self._vertex2feature_map
         return sum((v2f[node] for node in nearby_nodes), [])
 
+    def query_byids_sparse(self, vertex_ids):
+        '''
+        Return feature ids of features near many vertices as sparse matrix
+
+        Parameters
+        ----------
+        vertex_ids: array-like of int
+            Indices of vertices (i.e. nodes) on the surface
+
+        Returns
+        -------
+        feature_matrix: scipy.sparse.csc_matrix
+            FxN matrix (F==number of features in the training dataset,
+            N==len(vertex_ids)) with ones in column i for the features in
+            the neighborhood of vertex_ids[i], as used by
+            SimpleStatBaseSearchlight to sum over neighborhoods.
+        '''
+        from scipy import sparse
+
+        self._check_trained()
+        vertex_ids = self._check_vertex_ids(vertex_ids)
+        nbrs = self._get_neighborhoods(vertex_ids)
+
+        # flatten neighborhoods to (vertex, node) pairs
+        rows = np.repeat(np.arange(len(vertex_ids)), np.diff(nbrs.indptr))
+        keep = self._select_nodes(vertex_ids[rows], nbrs.indices, nbrs.data)
+        rows, nodes = rows[keep], nbrs.indices[keep]
+
+        # ... and then to (vertex, feature) pairs
+        indptr, feature_ids = self._vertex2feature_csr
+        nfeatures = len(feature_ids)
+        features = volume_mask_dict._csr_gather(indptr, feature_ids, nodes)
+        cols = np.repeat(rows, indptr[nodes + 1] - indptr[nodes])
+
+        return sparse.csc_matrix((np.ones(len(features), dtype=np.int_),
+                                  (features, cols)),
+                                 shape=(nfeatures, len(vertex_ids)))
+
 
 class SurfaceRingQueryEngine(SurfaceQueryEngine):
     '''
@@ -236,7 +475,7 @@ class SurfaceRingQueryEngine(SurfaceQueryEngine):
         return self._vertex2feature_map.keys()
 
     def untrain(self):
-        self._vertex2feature_map = None
+        super(SurfaceRingQueryEngine, self).untrain()
 
     def train(self, ds):
         '''
@@ -251,6 +490,12 @@ class SurfaceRingQueryEngine(SurfaceQueryEngine):
         '''
         super(SurfaceRingQueryEngine, self).train(ds)
 
+    def _select_nodes(self, vertex_ids, nodes, distances):
+        keep = distances > self.inner_radius
+        if self.include_center:
+            keep |= nodes == vertex_ids
+        return keep
+
 
     def query(self, **kwargs):
         raise NotImplementedError
@@ -278,9 +523,7 @@ class SurfaceRingQueryEngine(SurfaceQueryEngine):
             raise KeyError('vertex_id should be integer in range(%d)' %
                                                 self.surface.nvertices)
 
-        nearby_nodes = self.surface.circlearound_n2d(vertex_id,
-                                                    self.radius,
-                                                    self.distance_metric)
+        nearby_nodes = self._circlearound_n2d(vertex_id)
 
         v2f = self._vertex2feature_map
         # Sorting nodes based on distance to center node to work around
@@ -294,6 +537,33 @@ class SurfaceRingQueryEngine(SurfaceQueryEngine):
 
 
 
+def _surface_neighborhoods(surface, vertex_ids, radius, distance_metric):
+    '''Helper: neighborhoods of vertices as sparse matrix with distances
+    (see SurfaceQueryEngine.compute_neighborhoods)'''
+    from scipy import sparse
+
+    if distance_metric == 'dijkstra':
+        return surface.dijkstra_distances(vertex_ids, maxdistance=radius)
+
+    # candidates with a small margin for rounding differences; distances
+    # are computed as in Surface.euclidean_distance
+    vertices = surface.vertices
+    candidates = surface.spatial_index.within_radius(
+                        vertices[vertex_ids], radius * (1 + 1e-8) + 1e-8)
+    counts = np.asarray([len(c) for c in candidates], dtype=np.int_)
+    rows = np.repeat(np.arange(len(vertex_ids)), counts)
+    nodes = np.hstack([np.zeros((0,), dtype=np.int_)] + candidates)
+
+    delta = vertices[nodes] - vertices[vertex_ids[rows]]
+    ds = np.power(np.sum(delta * delta, axis=1), .5)
+
+    keep = ds <= radius
+    counts = np.bincount(rows[keep], minlength=len(vertex_ids))
+    return sparse.csr_matrix((ds[keep], nodes[keep],
+                              np.hstack(([0], np.cumsum(counts)))),
+                             shape=(len(vertex_ids), surface.nvertices))
+
+
 class SurfaceVerticesQueryEngine(QueryEngineInterface):
     '''
     Query-engine that maps center nodes to indices of features
@@ -756,10 +1026,12 @@ def disc_surface_queryengine(radius, volume, white_surf, pial_surf,
         distance from any node within the volume are still assigned
         associated voxels. If outside_node_margin is True, then a node is
         always assigned voxels regardless of its position in the volume.
-    results_backend : 'native' or 'hdf5' or None (default).
+    results_backend : 'native' or 'hdf5' or 'memmap' or None (default).
         Specifies the way results are provided back from a processing block
         in case of nproc > 1. 'native' is pickling/unpickling of results by
         pprocess, while 'hdf5' would use h5save/h5load functionality.
+        'memmap' stores results as memory-mapped NumPy arrays (see
+        voxel_selection).
         'hdf5' might be more time and memory efficient in some cases.
         If None, then 'hdf5' if used if available, else 'native'.
     tmp_prefix : str, optional
@@ -31,6 +31,9 @@ import operator
 import datetime
 import math
 import os
+import os.path as osp
+import shutil
+import tempfile
 
 import numpy as np
 
@@ -50,12 +53,109 @@ LINEAR_VOXEL_INDICES = "linear_voxel_indices"
 CENTER_DISTANCES = "center_distances"
 GREY_MATTER_POSITION = "grey_matter_position"
 
+# number of center nodes for which distances are computed at once
+_PRECOMPUTE_NCENTERS = 2048
+
 from mvpa2.base import debug
 if __debug__:
     if not "SVS" in debug.registered:
         debug.register("SVS", "Surface-based voxel selection "
                        " (a.k.a. 'surfing')")
 
+class _NodeVoxelArrays(object):
+    '''Mapping from nodes to voxels stored in flat arrays
+
+    This is the array-based equivalent of the output of
+    VolSurfMapping.get_node2voxels_mapping: voxels[indptr[i]:indptr[i + 1]]
+    are the linear indices of voxels associated with node i, and
+    positions[indptr[i]:indptr[i + 1]] their relative positions in the grey
+    matter; inside[i] is False if node i is outside the volume.
+    Because it consists of arrays only, it can be shared between processes
+    by memory-mapping.
+    '''
+    _names = ('indptr', 'voxels', 'positions', 'inside')
+
+    def __init__(self, indptr, voxels, positions, inside):
+        self.indptr = indptr
+        self.voxels = voxels
+        self.positions = positions
+        self.inside = inside
+
+    @classmethod
+    def from_dict(cls, n2v, nnodes=None):
+        '''Convert a mapping as returned by get_node2voxels_mapping'''
+        if nnodes is None:
+            nnodes = max(n2v) + 1 if n2v else 0
+
+        inside = np.zeros((nnodes,), dtype=np.bool_)
+        counts = np.zeros((nnodes,), dtype=np.int64)
+        for nd, v2p in n2v.iteritems():
+            if v2p is not None:
+                inside[nd] = True
+                counts[nd] = len(v2p)
+
+        indptr = np.zeros((nnodes + 1,), dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        voxels = np.zeros((indptr[-1],), dtype=np.int64)
+        positions = np.zeros((indptr[-1],), dtype=np.float64)
+        for nd, v2p in n2v.iteritems():
+            if v2p:
+                vxs = sorted(v2p)
+                start, stop = indptr[nd], indptr[nd + 1]
+                voxels[start:stop] = vxs
+                positions[start:stop] = [v2p[vx] for vx in vxs]
+
+        return cls(indptr, voxels, positions, inside)
+
+    def is_inside(self, nd):
+        '''Whether voxels are associated with a node'''
+        return isinstance(nd, (int, long, np.integer)) \
+                    and 0 <= nd < len(self.inside) and bool(self.inside[nd])
+
+    def save(self, dirname):
+        for name in self._names:
+            np.save(osp.join(dirname, 'n2v_%s.npy' % name),
+                    getattr(self, name))
+
+    @classmethod
+    def load(cls, dirname, mmap_mode='r'):
+        return cls(*[np.load(osp.join(dirname, 'n2v_%s.npy' % name),
+                             mmap_mode=mmap_mode)
+                     for name in cls._names])
+
+    def voxel_attributes(self, n2d):
+        '''Equivalent of VoxelSelector.nodes2voxel_attributes
+
+        Voxels with the same distance are sorted by linear voxel index.'''
+        nnodes = len(self.inside)
+        nds = [nd for nd in n2d if self.is_inside(nd)]
+        nds_arr = np.asarray(nds, dtype=np.int64)
+        ds = np.asarray([n2d[nd] for nd in nds], dtype=np.float64)
+
+        starts = self.indptr[nds_arr]
+        lengths = self.indptr[nds_arr + 1] - starts
+        idxs = volume_mask_dict._csr_gather(self.indptr,
+                                            np.arange(len(self.voxels)),
+                                            nds_arr)
+        vxs = self.voxels[idxs]
+        pos = self.positions[idxs]
+        ds = np.repeat(ds, lengths)
+
+        # for each voxel, the minimal (distance, position) tuple
+        order = np.lexsort((pos, ds, vxs))
+        vxs, ds, pos = vxs[order], ds[order], pos[order]
+        first = np.ones((len(vxs),), dtype=np.bool_)
+        first[1:] = vxs[1:] != vxs[:-1]
+        vxs, ds, pos = vxs[first], ds[first], pos[first]
+
+        # sort by distance to center node
+        order = np.argsort(ds, kind='mergesort')
+
+        return {LINEAR_VOXEL_INDICES: vxs[order].astype(np.int32),
+                CENTER_DISTANCES: ds[order].astype(np.float32),
+                GREY_MATTER_POSITION: pos[order].astype(np.float32)}
+
+
 class VoxelSelector(object):
     '''Voxel selection for surface-based searchlights'''
 
@@ -80,7 +180,8 @@ class VoxelSelector(object):
             the pial and white surface.
         n2v: dict
             Mapping from center nodes to surrounding voxels (and their distances).
-            Usually this is the output from volsurf.node2voxels.
+            Usually this is the output from volsurf.node2voxels. It is
+            converted to an array-based representation.
         distance_metric: str
             Distance measure used to define distances between nodes on the surface.
             Currently supports 'dijkstra' and 'euclidean'
@@ -108,8 +209,56 @@ class VoxelSelector(object):
         self._optimizer = _RadiusOptimizer(initradius_mm)
         self._distance_metric = distance_metric # }
         self._surf = distance_surf                     # } save input
+        if not isinstance(n2v, _NodeVoxelArrays):
+            n2v = _NodeVoxelArrays.from_dict(n2v, distance_surf.nvertices)
         self._n2v = n2v                       # }
         self._outside_node_margin = outside_node_margin
+        self._precomputed_n2d = None
+
+    def precompute_distances(self, srcs):
+        '''
+        Computes distances around multiple center nodes at once
+
+        Parameters
+        ----------
+        srcs: list of int or numpy array
+            Indices of center nodes for which distances to surrounding
+            nodes (within the initial radius) are computed at once. These
+            distances are used by subsequent calls of disc_voxel_attributes
+            for these center nodes (until the next call of this function).
+
+        Notes
+        -----
+        This only applies to the 'dijkstra' distance metric, as computing
+        Dijkstra distances for all nodes together is much faster than
+        computing them for one node at a time.
+        '''
+        if not self._distance_metric.lower().startswith('d') \
+                or not externals.exists('scipy'):
+            return
+
+        srcs = np.asarray(srcs).ravel()
+        n2d = self._surf.dijkstra_distances(srcs,
+                                            maxdistance=self._initradius_mm)
+        self._precomputed_n2d = (dict((src, i) for i, src in enumerate(srcs)),
+                                 self._initradius_mm, n2d)
+
+    def _circlearound_n2d(self, src, radius):
+        '''Distances from a center node to surrounding nodes, if possible
+        taken from distances computed by precompute_distances'''
+        if self._precomputed_n2d is not None:
+            src2row, maxradius, n2d = self._precomputed_n2d
+            if src in src2row and radius <= maxradius:
+                row = src2row[src]
+                start, stop = n2d.indptr[row:row + 2]
+                nodes = n2d.indices[start:stop]
+                distances = n2d.data[start:stop]
+                if radius < maxradius:
+                    keep = distances <= radius
+                    nodes, distances = nodes[keep], distances[keep]
+                return dict(zip(nodes.tolist(), distances.tolist()))
+
+        return self._surf.circlearound_n2d(src, radius, self._distance_metric)
 
     def _select_approx(self, voxprops, count=None):
         '''
@@ -219,8 +368,7 @@ class VoxelSelector(object):
         n2v = self._n2v
         outside_node_margin = self._outside_node_margin
 
-        def node_in_vol(nd):
-            return nd in n2v and n2v[nd] is not None
+        node_in_vol = n2v.is_inside
 
         if not node_in_vol(src) and not outside_node_margin is True:
             skip = True
@@ -230,10 +378,7 @@ class VoxelSelector(object):
                         debug("SVS", "")
                         debug("SVS", "node %s is outside - considering all other "
                                      "nodes that may be inside" % (src,))
-                    for nd in n2v:
-                        if node_in_vol(nd):
-                            skip = False
-                            break
+                    skip = not np.any(n2v.inside)
                 else:
                     node_distances = dist_surf.circlearound_n2d(src,
                                                 radius=outside_node_margin,
@@ -244,7 +389,7 @@ class VoxelSelector(object):
                         debug("SVS", "node %s is outside - considering %d distances"
                                     " to other nodes that may be inside." % ((src,), len(node_distances)))
                     for nd, d in node_distances.iteritems():
-                        if nd in n2v and n2v[nd] is not None and d <= outside_node_margin:
+                        if node_in_vol(nd) and d <= outside_node_margin:
                             if __debug__:
                                 debug("SVS", "node #%s is distance %s <= %s from #%d "
                                       " and kept" %
@@ -271,8 +416,7 @@ class VoxelSelector(object):
                 # multiple nodes occupy exactly the same spatial location
                 around_n2d = {src:0.}
             else:
-                around_n2d = dist_surf.circlearound_n2d(src, radius_mm,
-                                               self._distance_metric)
+                around_n2d = self._circlearound_n2d(src, radius_mm)
 
             allvxdist = self.nodes2voxel_attributes(around_n2d, n2v)
 
@@ -326,7 +470,7 @@ class VoxelSelector(object):
             A mapping from node indices to distances (to a center node)
             Usually this is the output from surf.circlearound_n2d and thus
             only contains voldata for voxels surrounding a single center node
-        n2v: dict
+        n2v: dict or _NodeVoxelArrays
             A mapping from nodes to surrounding voxel indices and distances.
             n2v[i]=v2d is a dict mapping node i to a dict v2d, which in turn
             maps voxel indices to distances to the center node (i.e. v2d[j]=d
@@ -351,6 +495,9 @@ class VoxelSelector(object):
 
         '''
 
+        if isinstance(n2v, _NodeVoxelArrays) and distancesummary is min:
+            return n2v.voxel_attributes(n2d)
+
         # mapping from voxel indices to all distances
         v2dps = collections.defaultdict(set)
 
@@ -394,7 +541,8 @@ def voxel_selection(vol_surf_mapping, radius, source_surf=None, source_surf_node
                     distance_metric='dijkstra',
                     eta_step=10, nproc=None,
                     outside_node_margin=None,
-                    results_backend=None, tmp_prefix='tmpvoxsel'):
+                    results_backend=None, tmp_prefix='tmpvoxsel',
+                    sparse=False):
 
     """
     Voxel selection for multiple center nodes on the surface
@@ -427,251 +575,476 @@ def voxel_selection(vol_surf_mapping, radius, source_surf=None, source_surf_node
         distance from any node within the volume are still assigned
         associated voxels. If outside_node_margin is True, then a node is
         always assigned voxels regardless of its position in the volume.
-    results_backend : 'native' or 'hdf5' or None (default).
+    results_backend : 'memmap' or 'native' or 'hdf5' or None (default).
         Specifies the way results are provided back from a processing block
         in case of nproc > 1. 'native' is pickling/unpickling of results by
         pprocess, while 'hdf5' would use h5save/h5load functionality.
-        'hdf5' might be more time and memory efficient in some cases.
-        If None, then 'hdf5' if used if available, else 'native'.
+        'memmap' stores results as NumPy arrays that are memory-mapped when
+        combining the results of all blocks.  'hdf5' and 'memmap' might be
+        more time and memory efficient in some cases.
+        If None, then 'hdf5' is used if available, else 'native'.
     tmp_prefix : str, optional
-        If specified -- serves as a prefix for temporary files storage
-        if results_backend == 'hdf5'.  Thus can specify the directory to use
-        (trailing file path separator is not added automagically).
+        Prefix of the temporary directory used to share the surface and
+        the mapping from nodes to voxels with child processes, and to store
+        their results, in case of nproc > 1.  Thus can specify the directory
+        to use (trailing file path separator is not added automagically).
+    sparse: bool
+        If True a volume_mask_dict.SparseVolumeMaskDictionary is returned,
+        rather than a volume_mask_dict.VolumeMaskDictionary.
 
     Returns
     -------
     sel: volume_mask_dict.VolumeMaskDictionary
         Voxel selection results, that associates, which each node, the indices
         of the surrounding voxels.
-    """
-
-    # construct the intermediate surface, which is used
-    # to measure distances
-    intermediate_surf = (vol_surf_mapping.pial_surface * .5) + \
-                        (vol_surf_mapping.white_surface * .5)
-
-    if source_surf is None:
-        source_surf = intermediate_surf
-    else:
-        source_surf = surf.from_any(source_surf)
-
-    if _debug():
-        debug('SVS', "Generated high-res intermediate surface: "
-              "%d nodes, %d faces" %
-              (intermediate_surf.nvertices, intermediate_surf.nfaces))
-        debug('SVS', "Mapping source to high-res surface:"
-              " %d nodes, %d faces" %
-              (source_surf.nvertices, source_surf.nfaces))
-
-
-    if distance_metric[0].lower() == 'e' and outside_node_margin:
-        # euclidean distance: identity mapping
-        # this is *slow*
-        n = source_surf.nvertices
-        xyz = source_surf.vertices
-        src2intermediate = dict((i, tuple(xyz[i])) for i in xrange(n))
-    else:
-        # find a mapping from nodes in source_surf to those in
-        # intermediate surface
-        src2intermediate = source_surf.map_to_high_resolution_surf(\
-                                                        intermediate_surf)
 
-    # if no sources are given, then visit all ndoes
-    if source_surf_nodes is None:
-        source_surf_nodes = np.arange(source_surf.nvertices)
-
-    n = len(source_surf_nodes)
+    Notes
+    -----
+    To run voxel selection several times with different radii or center
+    nodes for the same surfaces and volume, use IncrementalVoxelSelection
+    instead, which reuses results from earlier runs.
+    """
+    selection = IncrementalVoxelSelection(vol_surf_mapping,
+                                          source_surf=source_surf,
+                                          distance_metric=distance_metric,
+                                          outside_node_margin=outside_node_margin,
+                                          nproc=nproc,
+                                          results_backend=results_backend,
+                                          tmp_prefix=tmp_prefix,
+                                          eta_step=eta_step)
+
+    return selection(radius, source_surf_nodes=source_surf_nodes,
+                     sparse=sparse)
+
+
+class IncrementalVoxelSelection(object):
+    '''Voxel selection for multiple center nodes that reuses earlier results
+
+    The mapping from nodes to voxels is computed only once, and voxel
+    selection results are kept for each center node. When called again
+    with other center nodes or another radius, only center nodes without
+    usable earlier results are processed: results for a metric radius
+    (float) are derived from those for a larger metric radius, and results
+    for a number of voxels (int) are reused for the same number of voxels.
+
+    With multiple processes, the surface and the mapping from nodes to
+    voxels are shared with child processes through memory-mapped files.
+    Each child process returns the results for its center nodes in flat
+    arrays, which are copied into the output once.
+    '''
 
-    if _debug():
-        debug('SVS',
-              "Performing surface-based voxel selection"
-              " for %d centers" % n)
+    def __init__(self, vol_surf_mapping, source_surf=None,
+                 distance_metric='dijkstra', outside_node_margin=None,
+                 nproc=None, results_backend=None, tmp_prefix='tmpvoxsel',
+                 eta_step=10):
+        '''
+        Parameters
+        ----------
+        vol_surf_mapping: volsurf.VolSurfMapping
+            Contains gray and white matter surface, and volume geometry
+        source_surf: surf.Surface or None
+            Surface used to compute distance between nodes. If omitted, it is
+            the average of the gray and white surfaces.
+        distance_metric: str
+            Distance metric between nodes. 'euclidean' or 'dijksta' (default)
+        outside_node_margin: float or True or None (default)
+            See voxel_selection.
+        nproc: int or None
+            Number of parallel threads. None means as many threads as the
+            system supports. The pprocess is required for parallel threads;
+            if it cannot be used, then a single thread is used.
+        results_backend : 'memmap' or 'native' or 'hdf5' or None (default).
+            See voxel_selection.
+        tmp_prefix : str, optional
+            See voxel_selection.
+        eta_step: int
+            Report progress every eta_step (default: 10).
+        '''
+        # construct the intermediate surface, which is used
+        # to measure distances
+        intermediate_surf = (vol_surf_mapping.pial_surface * .5) + \
+                            (vol_surf_mapping.white_surface * .5)
 
-    # visit in random order, for for better ETA estimate
-    visitorder = list(np.random.permutation(len(source_surf_nodes)))
+        if source_surf is None:
+            source_surf = intermediate_surf
+        else:
+            source_surf = surf.from_any(source_surf)
 
-    # construct mapping from nodes to enclosing voxels
-    n2v = vol_surf_mapping.get_node2voxels_mapping()
+        if _debug():
+            debug('SVS', "Generated high-res intermediate surface: "
+                  "%d nodes, %d faces" %
+                  (intermediate_surf.nvertices, intermediate_surf.nfaces))
+            debug('SVS', "Mapping source to high-res surface:"
+                  " %d nodes, %d faces" %
+                  (source_surf.nvertices, source_surf.nfaces))
+
+        if distance_metric[0].lower() == 'e' and outside_node_margin:
+            # euclidean distance: identity mapping
+            # this is *slow*
+            n = source_surf.nvertices
+            xyz = source_surf.vertices
+            src2intermediate = dict((i, tuple(xyz[i])) for i in xrange(n))
+        else:
+            # find a mapping from nodes in source_surf to those in
+            # intermediate surface
+            src2intermediate = source_surf.map_to_high_resolution_surf(\
+                                                            intermediate_surf)
 
-    if __debug__:
-        debug('SVS', "Generated mapping from nodes"
-              " to intersecting voxels")
+        # construct mapping from nodes to enclosing voxels
+        n2v = _NodeVoxelArrays.from_dict(
+                                vol_surf_mapping.get_node2voxels_mapping(),
+                                intermediate_surf.nvertices)
 
-    # build voxel selector
-    voxel_selector = VoxelSelector(radius, intermediate_surf, n2v,
-                                   distance_metric,
-                                   outside_node_margin=outside_node_margin)
+        if __debug__:
+            debug('SVS', "Generated mapping from nodes"
+                  " to intersecting voxels")
 
-    if _debug():
-        debug('SVS', "Instantiated voxel selector (radius %r)" % radius)
+        if nproc is not None and nproc > 1 and not externals.exists('pprocess'):
+            raise RuntimeError("The 'pprocess' module is required for "
+                               "multiprocess searchlights. Please either "
+                               "install python-pprocess, or reduce `nproc` "
+                               "to 1 (got nproc=%i) or set to default None"
+                               % nproc)
 
+        if nproc is None:
+            if externals.exists('pprocess'):
+                try:
+                    import pprocess
+                    nproc = pprocess.get_number_of_cores() or 1
+                    if _debug() :
+                        debug("SVS", 'Using pprocess with %d cores' % nproc)
+                except:
+                    if _debug():
+                        debug("SVS", 'pprocess not available')
+
+            if nproc is None:
+                # importing pprocess failed - so use a single core
+                nproc = 1
+                debug("SVS", 'Using %d cores - pprocess not available' % nproc)
 
-    # structure to keep output data. Initialize with None, then
-    # make a sparse_attributes instance when we know what the attributes are
-    node2volume_attributes = None
+        if results_backend == 'hdf5':
+            externals.exists('h5py', raise_=True)
+        elif results_backend is None:
+            if externals.exists('h5py') \
+                    and externals.versions['hdf5'] >= '1.8.7':
+                results_backend = 'hdf5'
+            else:
+                results_backend = 'native'
 
-    attribute_mapper = voxel_selector.disc_voxel_indices_and_attributes
+        if not results_backend in ('memmap', 'native', 'hdf5'):
+            raise ValueError('Illegal results backend %r' % results_backend)
 
-    srcs_order = [source_surf_nodes[node] for node in visitorder]
-    src_trg_nodes = [(src, src2intermediate[src]) for src in srcs_order]
+        self._vol_surf_mapping = vol_surf_mapping
+        self._intermediate_surf = intermediate_surf
+        self._source_surf = source_surf
+        self._src2intermediate = src2intermediate
+        self._n2v = n2v
+        self._distance_metric = distance_metric
+        self._outside_node_margin = outside_node_margin
+        self._nproc = nproc
+        self._results_backend = results_backend
+        self._tmp_prefix = tmp_prefix
+        self._eta_step = eta_step
 
-    if nproc is not None and nproc > 1 and not externals.exists('pprocess'):
-        raise RuntimeError("The 'pprocess' module is required for "
-                           "multiprocess searchlights. Please either "
-                           "install python-pprocess, or reduce `nproc` "
-                           "to 1 (got nproc=%i) or set to default None"
-                           % nproc)
+        # results for each center node computed so far, and whether these
+        # were for a fixed metric radius
+        self._cache = None
+        self._cache_fixedradius = None
 
-    if nproc is None:
-        if externals.exists('pprocess'):
-            try:
-                import pprocess
-                nproc = pprocess.get_number_of_cores() or 1
-                if _debug() :
-                    debug("SVS", 'Using pprocess with %d cores' % nproc)
-            except:
-                if _debug():
-                    debug("SVS", 'pprocess not available')
+    def __call__(self, radius, source_surf_nodes=None, sparse=False):
+        '''Voxel selection for multiple center nodes
 
-        if nproc is None:
-            # importing pprocess failed - so use a single core
-            nproc = 1
-            debug("SVS", 'Using %d cores - pprocess not available' % nproc)
+        Parameters
+        ----------
+        radius: int or float
+            Size of searchlight. If an integer, then it indicates the number
+            of voxels. If a float, then it indicates the radius of the disc
+        source_surf_nodes: list of int or numpy array or None
+            Indices of nodes in source_surf that serve as searchlight center.
+            By default every node serves as a searchlight center.
+        sparse: bool
+            If True a volume_mask_dict.SparseVolumeMaskDictionary is
+            returned, rather than a volume_mask_dict.VolumeMaskDictionary.
 
-    # get the the voxel selection parameters
-    parameter_dict = vol_surf_mapping.get_parameter_dict()
-    parameter_dict.update(dict(radius=radius,
-                               outside_node_margin=outside_node_margin,
-                               distance_metric=distance_metric),
-                               source_nvertices=source_surf.nvertices)
+        Returns
+        -------
+        sel: volume_mask_dict.VolumeMaskDictionary
+            Voxel selection results, that associates, which each node, the
+            indices of the surrounding voxels.
+        '''
+        tp = type(radius)
+        if not tp in (int, float):
+            raise TypeError("Illegal type for radius: expected int or float")
+        fixedradius = tp is float
 
+        # if no sources are given, then visit all ndoes
+        if source_surf_nodes is None:
+            source_surf_nodes = np.arange(self._source_surf.nvertices)
+        srcs = np.unique(np.asarray(source_surf_nodes, dtype=np.int64))
+        n = len(srcs)
 
-    init_output = lambda: volume_mask_dict.VolumeMaskDictionary(
-                                    vol_surf_mapping.volgeom,
-                                    intermediate_surf,
-                                    meta=parameter_dict)
+        if n == 0:
+            warning('No voxels associated with any of %d nodes' % n)
+            return None
 
-    if nproc > 1:
-        if results_backend == 'hdf5':
-            externals.exists('h5py', raise_=True)
-        elif results_backend is None:
-            if externals.exists('h5py') and externals.versions['hdf5'] >= '1.8.7':
-                results_backend = 'hdf5'
+        if self._cache_fixedradius != fixedradius:
+            self._cache = None
+        self._cache_fixedradius = fixedradius
+        cache = self._cache
+
+        # see which center nodes have usable results already
+        usable = np.zeros((n,), dtype=np.bool_)
+        if cache is not None:
+            rows = np.minimum(np.searchsorted(cache['keys'], srcs),
+                              len(cache['keys']) - 1)
+            cached_radius = cache['radius'][rows]
+            if fixedradius:
+                # only the node itself for radius zero
+                usable = (cached_radius >= radius) & \
+                            ((radius > 0) | (cached_radius == 0))
             else:
-                results_backend = 'native'
-        if _debug():
-            debug('SVS', "Using '%s' backend" % (results_backend,))
+                usable = cached_radius == radius
+            # whether a node is skipped does not depend on the radius
+            usable |= cache['counts'][rows] < 0
+            usable &= cache['keys'][rows] == srcs
 
-        if not results_backend in ('native', 'hdf5'):
-            raise ValueError('Illegal results backend %r' % results_backend)
+        if _debug():
+            debug('SVS', "Performing surface-based voxel selection "
+                  "for %d centers (%d from earlier results)" %
+                  (n, np.sum(usable)))
+
+        if not np.all(usable):
+            new = self._compute(radius, srcs[~usable])
+            new['radius'] = np.zeros((len(new['keys']),)) + radius
+            if cache is not None:
+                keep = ~np.in1d(cache['keys'], new['keys'])
+                new = _concatenate_blocks([
+                                _take_rows(cache, np.nonzero(keep)[0]), new])
+            cache = self._cache = _take_rows(new, np.argsort(new['keys']))
+
+        result = _take_rows(cache, np.searchsorted(cache['keys'], srcs))
+        if fixedradius:
+            result = _select_within_radius(result, radius)
+
+        return self._as_volume_mask_dict(radius, result, sparse)
+
+    def _compute(self, radius, srcs):
+        '''Helper: voxel selection for center nodes'''
+        # visit in random order, for for better ETA estimate
+        visitorder = np.random.permutation(len(srcs))
+        src_trg_nodes = [(srcs[i], self._src2intermediate[srcs[i]])
+                         for i in visitorder]
+        selector_args = (radius, self._distance_metric,
+                         self._outside_node_margin)
+        nproc = self._nproc
+        backend = self._results_backend
+
+        if nproc == 1 or len(src_trg_nodes) < 2:
+            return _voxel_selection_block(
+                            (self._intermediate_surf, self._n2v),
+                            selector_args, src_trg_nodes,
+                            eta_step=self._eta_step, results_backend='native')
 
         import pprocess
-        n_srcs = len(src_trg_nodes)
-        blocks = np.array_split(np.arange(n_srcs), nproc)
+        blocks = np.array_split(np.arange(len(src_trg_nodes)), nproc)
 
-        results = pprocess.Map(limit=nproc)
-        reducer = results.manage(pprocess.MakeParallel(_reduce_mapper))
+        # geometry and results are exchanged through files in this directory
+        tmp_dir, tmp_base = osp.split(self._tmp_prefix)
+        tmpdir = tempfile.mkdtemp(prefix=tmp_base, dir=tmp_dir or None)
+        try:
+            _save_geometry(tmpdir, self._intermediate_surf, self._n2v)
 
-        if __debug__:
-            debug('SVS', "Starting %d child processes", (len(blocks),))
+            results = pprocess.Map(limit=nproc)
+            reducer = results.manage(pprocess.MakeParallel(
+                                                    _voxel_selection_block))
 
-        for i, block in enumerate(blocks):
-            empty_dict = init_output()
+            if __debug__:
+                debug('SVS', "Starting %d child processes", (len(blocks),))
 
-            src_trg = []
-            for idx in block:
-                src_trg.append(src_trg_nodes[idx])
+            for i, block in enumerate(blocks):
+                src_trg = [src_trg_nodes[idx] for idx in block]
 
-            if _debug():
-                debug('SVS', "  starting block %d/%d: %d centers" %
-                            (i + 1, nproc, len(src_trg)), cr=True)
-
-            reducer(empty_dict, attribute_mapper, src_trg,
-                    eta_step=eta_step, proc_id='%d' % (i + 1,),
-                    results_backend=results_backend, tmp_prefix=tmp_prefix)
-        if _debug():
-            debug('SVS', '')
-            debug('SVS', 'Started all %d child processes' % (len(blocks)))
-            tstart = time.time()
-
-        node2volume_attributes = None
-        for i, result in enumerate(results):
-            if result is None:
-                continue
-
-            if results_backend == 'hdf5':
-                result_fn = result
-                result = h5load(result_fn)
-                os.remove(result_fn)
-
-            if node2volume_attributes is None:
-                # first time we have actual results.
-                # Use as a starting point
-                node2volume_attributes = result
                 if _debug():
-                    debug('SVS', '')
-                    debug('SVS', "Merging results from %d child "
-                                 "processes using '%s' backend" %
-                                 (len(blocks), results_backend))
-            else:
-                # merge new with current data
-                node2volume_attributes.merge(result)
+                    debug('SVS', "  starting block %d/%d: %d centers" %
+                                (i + 1, nproc, len(src_trg)), cr=True)
+
+                reducer(tmpdir, selector_args, src_trg,
+                        eta_step=self._eta_step, proc_id='%d' % (i + 1,),
+                        results_backend=backend,
+                        tmp_prefix=osp.join(tmpdir, 'block%d' % i))
             if _debug():
-                debug('SVS', "  merged result block %d/%d" % (i + 1, nproc),
-                                cr=True)
+                debug('SVS', '')
+                debug('SVS', 'Started all %d child processes' % (len(blocks)))
+                tstart = time.time()
 
-        if _debug():
-            telapsed = time.time() - tstart
-            debug('SVS', "")
-            debug('SVS', 'Merged results from %d child processed - '
-                         'took %s' %
-                         (len(blocks), seconds2prettystring(telapsed)))
+            result = _concatenate_blocks([_load_block(r, backend)
+                                          for r in results if r is not None])
 
-    else:
-        empty_dict = init_output()
-        node2volume_attributes = _reduce_mapper(empty_dict,
-                                                attribute_mapper,
-                                                src_trg_nodes,
-                                                eta_step=eta_step)
-        debug('SVS', "")
-
-    if _debug():
-        if node2volume_attributes is None:
-            msgs = ["Voxel selection completed: none of %d nodes have "
-                    "voxels associated" % len(visitorder)]
+            if _debug():
+                telapsed = time.time() - tstart
+                debug('SVS', "")
+                debug('SVS', "Combined results from %d child processes "
+                             "using '%s' backend - took %s" %
+                             (len(blocks), backend,
+                              seconds2prettystring(telapsed)))
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+        return result
+
+    def _as_volume_mask_dict(self, radius, result, sparse):
+        '''Helper: convert results to a VolumeMaskDictionary'''
+        vol_surf_mapping = self._vol_surf_mapping
+        vg = vol_surf_mapping.volgeom
+
+        # get the the voxel selection parameters
+        parameter_dict = vol_surf_mapping.get_parameter_dict()
+        parameter_dict.update(dict(radius=radius,
+                                   outside_node_margin=self._outside_node_margin,
+                                   distance_metric=self._distance_metric),
+                                   source_nvertices=self._source_surf.nvertices)
+
+        selected = result['counts'] >= 0
+        result = _take_rows(result, np.nonzero(selected)[0])
+        keys = result['keys']
+        indptr = _counts2indptr(result['counts'])
+        aux_labels = (CENTER_DISTANCES, GREY_MATTER_POSITION)
+
+        if sparse:
+            indices = result[LINEAR_VOXEL_INDICES]
+            sel = volume_mask_dict.SparseVolumeMaskDictionary(vg,
+                                self._intermediate_surf, meta=parameter_dict,
+                                keys=keys, indptr=indptr, indices=indices,
+                                aux=dict((label, result[label])
+                                         for label in aux_labels))
         else:
-            nvox_selected = np.sum(node2volume_attributes.get_mask() != 0)
-            vg = vol_surf_mapping.volgeom
+            def split(arr):
+                return dict(zip(keys.tolist(), np.split(arr, indptr[1:-1])))
+
+            indices = result[LINEAR_VOXEL_INDICES].astype(np.int)
+            sel = volume_mask_dict.VolumeMaskDictionary(vg,
+                                self._intermediate_surf, meta=parameter_dict,
+                                src2nbr=split(indices),
+                                src2aux=dict((label, split(result[label]))
+                                             for label in aux_labels))
 
+        if _debug():
+            nvox_selected = np.sum(sel.get_mask() != 0)
             msgs = ["Voxel selection completed: %d / %d nodes have "
-                    "voxels associated" %
-                    (len(node2volume_attributes.keys()), len(visitorder)),
+                    "voxels associated" % (len(keys), len(selected)),
                     "Selected %d / %d  voxels (%.0f%%) in the mask at least once" %
                     (nvox_selected, vg.nvoxels_mask,
                      100. * nvox_selected / vg.nvoxels_mask)]
+            for msg in msgs:
+                debug("SVS", msg)
+
+        return sel
+
+
+# arrays with a value for each center node and for each voxel, respectively,
+# in results of _voxel_selection_block
+_BLOCK_ROW_FIELDS = ('keys', 'counts', 'radius')
+_BLOCK_DATA_FIELDS = (LINEAR_VOXEL_INDICES, CENTER_DISTANCES,
+                      GREY_MATTER_POSITION)
+
+
+def _counts2indptr(counts):
+    '''Helper: offsets of rows with counts elements; -1 counts as 0'''
+    indptr = np.zeros((len(counts) + 1,), dtype=np.int64)
+    np.cumsum(np.maximum(counts, 0), out=indptr[1:])
+    return indptr
+
+
+def _take_rows(block, rows):
+    '''Helper: results for a subset of center nodes'''
+    indptr = _counts2indptr(block['counts'])
+    taken = dict((field, np.asarray(block[field])[rows])
+                 for field in _BLOCK_ROW_FIELDS if field in block)
+    for field in _BLOCK_DATA_FIELDS:
+        taken[field] = volume_mask_dict._csr_gather(indptr, block[field], rows)
+    return taken
+
+
+def _concatenate_blocks(blocks):
+    '''Helper: results for all center nodes in a list of results'''
+    return dict((field, np.concatenate([b[field] for b in blocks]))
+                for field in _BLOCK_ROW_FIELDS + _BLOCK_DATA_FIELDS
+                if all(field in b for b in blocks))
+
+
+def _select_within_radius(block, radius):
+    '''Helper: results restricted to voxels within a metric radius'''
+    counts = block['counts']
+    lengths = np.maximum(counts, 0)
+    # distances are stored as float32
+    keep = block[CENTER_DISTANCES] <= np.float32(radius)
+    rows = np.repeat(np.arange(len(counts)), lengths)
+    selected = dict((field, block[field]) for field in _BLOCK_ROW_FIELDS
+                    if field in block)
+    selected['counts'] = np.where(counts < 0, -1,
+                            np.bincount(rows[keep], minlength=len(counts)))
+    for field in _BLOCK_DATA_FIELDS:
+        selected[field] = block[field][keep]
+    return selected
+
+
+def _save_geometry(dirname, distance_surf, n2v):
+    '''Helper: store surface and mapping from nodes to voxels in a directory
+    so that they can be memory-mapped by _load_geometry'''
+    np.save(osp.join(dirname, 'vertices.npy'), distance_surf.vertices)
+    np.save(osp.join(dirname, 'faces.npy'), distance_surf.faces)
+    n2v.save(dirname)
+
+
+def _load_geometry(dirname):
+    '''Helper: load geometry stored by _save_geometry'''
+    distance_surf = surf.Surface(
+                        np.load(osp.join(dirname, 'vertices.npy'),
+                                mmap_mode='r'),
+                        np.load(osp.join(dirname, 'faces.npy'), mmap_mode='r'),
+                        check=False)
+    return distance_surf, _NodeVoxelArrays.load(dirname)
+
+
+def _load_block(result, results_backend):
+    '''Helper: results returned by _voxel_selection_block'''
+    if results_backend == 'native':
+        return result
+    elif results_backend == 'hdf5':
+        return h5load(result)
+    else:
+        return dict((field, np.load('%s_%s.npy' % (result, field),
+                                    mmap_mode='r'))
+                    for field in _BLOCK_ROW_FIELDS[:2] + _BLOCK_DATA_FIELDS)
 
-        for msg in msgs:
-            debug("SVS", msg)
-
-
-    if node2volume_attributes is None:
-        warning('No voxels associated with any of %d nodes' %
-                        len(visitorder))
-    return node2volume_attributes
 
-def _reduce_mapper(node2volume_attributes, attribute_mapper,
-                   src_trg_indices, eta_step=1, proc_id=None,
-                   results_backend='native', tmp_prefix='tmpvoxsel'):
+def _voxel_selection_block(geometry, selector_args, src_trg_indices,
+                           eta_step=1, proc_id=None, results_backend='native',
+                           tmp_prefix='tmpvoxsel'):
     '''applies voxel selection to a list of src_trg_indices
-    results are added to node2volume_attributes.
+
+    geometry is either a tuple with the distance surface and the
+    _NodeVoxelArrays, or a directory from which these are memory-mapped;
+    selector_args are the radius, distance metric and outside node margin.
+    Results are returned as a dict with the keys and number of voxels
+    (-1 if a node is skipped) for each center node, and concatenated
+    voxel indices and attributes. Unless results_backend is 'native',
+    they are stored in files starting with tmp_prefix, which is returned.
     '''
 
     if not src_trg_indices:
         return None
 
-    if not results_backend in ('native', 'hdf5'):
+    if not results_backend in ('memmap', 'native', 'hdf5'):
         raise ValueError('Illegal results backend %r' % results_backend)
 
+    if isinstance(geometry, basestring):
+        geometry = _load_geometry(geometry)
+    distance_surf, n2v = geometry
+    radius, distance_metric, outside_node_margin = selector_args
+    voxel_selector = VoxelSelector(radius, distance_surf, n2v,
+                                   distance_metric,
+                                   outside_node_margin=outside_node_margin)
 
     def _pat(index, xs=src_trg_indices, f=max):
         try:
@@ -692,11 +1065,24 @@ def _reduce_mapper(node2volume_attributes, attribute_mapper,
     bar = ProgressBar()
     n = len(src_trg_indices)
 
+    keys = np.zeros((n,), dtype=np.int64)
+    counts = np.zeros((n,), dtype=np.int64)
+    data = dict((field, []) for field in _BLOCK_DATA_FIELDS)
+
     for i, (src, trg) in enumerate(src_trg_indices):
-        idxs, misc_attrs = attribute_mapper(trg)
+        if i % _PRECOMPUTE_NCENTERS == 0:
+            voxel_selector.precompute_distances(
+                    [t for _, t in src_trg_indices[i:i + _PRECOMPUTE_NCENTERS]])
 
-        if idxs is not None:
-            node2volume_attributes.add(int(src), idxs, misc_attrs)
+        attrs = voxel_selector.disc_voxel_attributes(trg)
+
+        keys[i] = src
+        if attrs:
+            counts[i] = len(attrs[LINEAR_VOXEL_INDICES])
+            for field in _BLOCK_DATA_FIELDS:
+                data[field].append(attrs[field])
+        else:
+            counts[i] = -1
 
         if _debug() and eta_step and (i % eta_step == 0 or i == n - 1):
             msg = bar(float(i + 1) / n, progresspat % (src, trg))
@@ -704,14 +1090,23 @@ def _reduce_mapper(node2volume_attributes, attribute_mapper,
                 msg += ' (#%s)' % proc_id
             debug('SVS', msg, cr=True)
 
-    if results_backend == 'hdf5':
-        tmp_postfix = ('__tmp__%d_%s.h5py' %
-                                 (hash(time.time()), proc_id))
-        tmp_fn = tmp_prefix + tmp_postfix
-        h5save(tmp_fn, node2volume_attributes)
+    block = dict(keys=keys, counts=counts)
+    for field, dtype in zip(_BLOCK_DATA_FIELDS,
+                            (np.int32, np.float32, np.float32)):
+        block[field] = np.concatenate(data[field]) if data[field] \
+                            else np.zeros((0,), dtype=dtype)
+
+    if results_backend == 'native':
+        return block
+    elif results_backend == 'hdf5':
+        tmp_fn = tmp_prefix + '.h5py'
+        h5save(tmp_fn, block)
         return tmp_fn
     else:
-        return node2volume_attributes
+        for field, arr in block.iteritems():
+            np.save('%s_%s.npy' % (tmp_prefix, field), arr)
+        return tmp_prefix
+
 
 def _debug():
     return __debug__ and 'SVS' in debug.active
@@ -725,7 +1120,7 @@ def run_voxel_selection(radius, volume, white_surf, pial_surf,
                          nsteps=10, eta_step=1, nproc=None,
                          outside_node_margin=None,
                          results_backend=None, tmp_prefix='tmpvoxsel',
-                         node_voxel_mapping='maximal'):
+                         node_voxel_mapping='maximal', sparse=False):
 
     """
     Voxel selection wrapper for multiple center nodes on the surface
@@ -782,16 +1177,14 @@ def run_voxel_selection(radius, volume, white_surf, pial_surf,
         distance from any node within the volume are still assigned
         associated voxels. If outside_node_margin is True, then a node is
         always assigned voxels regardless of its position in the volume.
-    results_backend : 'native' or 'hdf5' or None (default).
+    results_backend : 'memmap' or 'native' or 'hdf5' or None (default).
         Specifies the way results are provided back from a processing block
-        in case of nproc > 1. 'native' is pickling/unpickling of results by
-        pprocess, while 'hdf5' would use h5save/h5load functionality.
-        'hdf5' might be more time and memory efficient in some cases.
-        If None, then 'hdf5' if used if available, else 'native'.
+        in case of nproc > 1 (see voxel_selection).
+        If None, then 'hdf5' is used if available, else 'native'.
     tmp_prefix : str, optional
-        If specified -- serves as a prefix for temporary files storage
-        if results_backend == 'hdf5'.  Thus can specify the directory to use
-        (trailing file path separator is not added automagically).
+        Prefix of the temporary directory used to exchange data with child
+        processes in case of nproc > 1.  Thus can specify the directory to
+        use (trailing file path separator is not added automagically).
     node_voxel_mapping: 'minimal' or 'maximal' or 'minimal_lowres'
         If 'minimal' then each voxel is associated with at most one node.
         If 'maximal' it is associated with as many nodes that contain the
@@ -799,7 +1192,9 @@ def run_voxel_selection(radius, volume, white_surf, pial_surf,
         If 'minimal_lowres' then each voxel is associated with at most one
         node, and each node that is mapped onto has a corresponding node
         (at the same spatial location) in source_surf.
-
+    sparse: bool
+        If True a volume_mask_dict.SparseVolumeMaskDictionary is returned,
+        rather than a volume_mask_dict.VolumeMaskDictionary.
 
     Returns
     -------
@@ -827,7 +1222,7 @@ def run_voxel_selection(radius, volume, white_surf, pial_surf,
                           eta_step=eta_step, nproc=nproc,
                           outside_node_margin=outside_node_margin,
                           results_backend=results_backend,
-                          tmp_prefix=tmp_prefix)
+                          tmp_prefix=tmp_prefix, sparse=sparse)
 
     return sel
 
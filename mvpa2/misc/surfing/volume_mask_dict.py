@@ -21,11 +21,14 @@ and __getstate__ - have to flag somehow whether this mapping was present.
 
 __docformat__ = 'restructuredtext'
 
+import os
+import os.path as osp
+import cPickle
 from collections import Mapping
 
 import numpy as np
 
-from mvpa2.base import externals
+from mvpa2.base import externals, warning
 from mvpa2.misc.surfing import volgeom
 
 from mvpa2.support.utils import deprecated
@@ -121,7 +124,7 @@ class VolumeMaskDictionary(Mapping):
 
     def __str__(self):
         return '%s(%d centers, volgeom=%s)' % (self.__class__.__name__,
-                                               len(self._src2nbr),
+                                               len(self),
                                                self._volgeom)
 
     def add(self, src, nbrs, aux=None):
@@ -920,6 +923,431 @@ class VolumeMaskDictionary(Mapping):
 
         return trgs[i / src_xyz.shape[0]]
 
+    def to_sparse(self):
+        """Convert to a compact array-based representation
+
+        Returns
+        -------
+        sparse: SparseVolumeMaskDictionary
+            read-only instance with the same masks, auxiliary information
+            and meta data as the current instance.
+        """
+        keys = sorted(self.keys())
+        nbrs = [self._src2nbr[k] for k in keys]
+        aux = dict((label, [self._src2aux[label][k] for k in keys])
+                   for label in self.aux_keys())
+        return SparseVolumeMaskDictionary.from_arrays(
+                        self._volgeom, self._source, keys, nbrs, aux=aux,
+                        meta=self._meta)
+
+
+
+def _csr_gather(indptr, data, rows):
+    '''Helper: concatenation of data[indptr[r]:indptr[r+1]] for all r in rows
+    '''
+    starts = indptr[rows]
+    lengths = indptr[np.asarray(rows) + 1] - starts
+    offsets = np.cumsum(lengths) - lengths
+    idxs = np.arange(np.sum(lengths)) \
+                - np.repeat(offsets - starts, lengths)
+    return data[idxs]
+
+
+def _smallest_int_dtype(maxval):
+    '''Helper: int32 if it can represent maxval, int64 otherwise'''
+    return np.int32 if maxval < np.iinfo(np.int32).max else np.int64
+
+
+class SparseVolumeMaskDictionary(VolumeMaskDictionary):
+    """Compact read-only collection of 3D volume masks.
+
+    Rather than a dictionary with an array for each mask, all masks are
+    stored in flat arrays in compressed sparse row (CSR) layout: the voxel
+    indices of the i-th mask (in sorted order of keys) are
+    ``indices[indptr[i]:indptr[i + 1]]``, and auxiliary information is
+    stored in the same way.  The inverse mapping from voxels to masks
+    (used by `target2sources`, `get_targets` and `get_mask`) is stored as
+    well, so it is not computed on first use.
+
+    Compared to `VolumeMaskDictionary` this requires much less memory for
+    whole-brain voxel selection results, and instances can be stored with
+    `save` and memory-mapped from disk with `load_sparse` without
+    reading all data.  Instances are typically created from a
+    `VolumeMaskDictionary` using `VolumeMaskDictionary.to_sparse`.
+    """
+
+    # names of arrays stored by save()
+    _array_names = ('keys', 'indptr', 'indices',
+                    'targets', 'target_indptr', 'target_sources')
+
+    def __init__(self, vg, source, meta=None, keys=None, indptr=None,
+                 indices=None, aux=None, aux_indptr=None, target_index=None):
+        """Initialize a SparseVolumeMaskDictionary from arrays
+
+        Parameters
+        ----------
+        vg: volgeom.VolGeom or fmri_dataset-like or str
+            data structure that contains volume geometry information.
+        source: Surface.surf or numpy.ndarray or None
+            structure that contains the geometric information of
+            (the centers of) each mask.
+        meta: dict or None
+            Optional meta data stored with this instance.
+        keys: numpy.ndarray
+            Sorted keys (int or str) of the masks.
+        indptr: numpy.ndarray
+            Vector with len(keys)+1 offsets into indices.
+        indices: numpy.ndarray
+            Linear voxel indices of all masks.
+        aux: dict or None
+            Mapping from auxiliary labels to arrays with values for all masks.
+        aux_indptr: dict or None
+            Mapping from auxiliary labels to offsets into the corresponding
+            values in aux. Labels that are not present (the typical case)
+            have one value for each voxel and share indptr.
+        target_index: tuple or None
+            Inverse mapping (targets, target_indptr, target_sources), with
+            target_sources[target_indptr[i]:target_indptr[i + 1]] the
+            positions (in keys) of the masks containing voxel targets[i].
+            If None it is computed.
+        """
+        self._volgeom = volgeom.from_any(vg)
+        self._source = source
+        self._meta = meta
+
+        if keys is None:
+            keys = np.zeros((0,), dtype=np.int)
+            indptr = np.zeros((1,), dtype=np.int64)
+            indices = np.zeros((0,), dtype=np.int32)
+
+        if len(indptr) != len(keys) + 1 or indptr[-1] != len(indices):
+            raise ValueError("indptr does not match keys and indices")
+        if np.any(keys[1:] <= keys[:-1]):
+            raise ValueError("keys must be unique and sorted")
+
+        self._keys = keys
+        self._indptr = indptr
+        self._indices = indices
+        self._aux = dict() if aux is None else aux
+        self._aux_indptr = dict() if aux_indptr is None else aux_indptr
+
+        if target_index is None:
+            target_index = self._compute_target_index()
+        self._targets, self._target_indptr, self._target_sources = \
+                                                            target_index
+
+    @classmethod
+    def from_arrays(cls, vg, source, keys, nbrs, aux=None, meta=None):
+        """Build an instance from a list of masks
+
+        Parameters
+        ----------
+        vg: volgeom.VolGeom or fmri_dataset-like or str
+            data structure that contains volume geometry information.
+        source: Surface.surf or numpy.ndarray or None
+            structure that contains the geometric information of
+            (the centers of) each mask.
+        keys: list of int or list of str
+            keys of the masks.
+        nbrs: list of numpy.ndarray
+            linear voxel indices for each key.
+        aux: dict or None
+            mapping from auxiliary labels to a list of values for each key.
+            For each key, the number of values should be either the number
+            of voxels in the mask or one.
+        meta: dict or None
+            Optional meta data stored with this instance.
+        """
+        vg = volgeom.from_any(vg)
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        keys_arr = np.asarray([keys[i] for i in order])
+
+        def as_csr(values, dtype=None):
+            values = [np.asarray(values[i], dtype=dtype).ravel()
+                      for i in order]
+            lengths = np.asarray([len(v) for v in values], dtype=np.int64)
+            indptr = np.zeros((len(values) + 1,), dtype=np.int64)
+            np.cumsum(lengths, out=indptr[1:])
+            if values:
+                dtype = np.find_common_type([v.dtype for v in values], [])
+                if dtype == np.dtype('O'):
+                    raise TypeError('Elements have different types')
+                data = np.concatenate(values).astype(dtype, copy=False)
+            else:
+                data = np.zeros((0,), dtype=dtype)
+            return indptr, data
+
+        indptr, indices = as_csr(nbrs, _smallest_int_dtype(vg.nvoxels))
+
+        aux_data = dict()
+        aux_indptr = dict()
+        for label, values in (aux or dict()).iteritems():
+            if len(values) != len(keys):
+                raise ValueError("Expected %d values for %r, found %d" %
+                                        (len(keys), label, len(values)))
+            try:
+                a_indptr, aux_data[label] = as_csr(values)
+            except TypeError:
+                raise TypeError('Elements for auxilery attribute "%s" '
+                                'have different types' % label)
+
+            lengths = np.diff(a_indptr)
+            if not np.all((lengths == np.diff(indptr)) | (lengths == 1)):
+                raise ValueError('size mismatch for auxiliary attribute %r'
+                                        % label)
+            if not np.array_equal(a_indptr, indptr):
+                aux_indptr[label] = a_indptr
+
+        return cls(vg, source, meta=meta, keys=keys_arr, indptr=indptr,
+                   indices=indices, aux=aux_data, aux_indptr=aux_indptr)
+
+    def _compute_target_index(self):
+        '''Helper to compute the mapping from voxels to mask positions'''
+        indices = self._indices
+        contains = self.volgeom.contains_lin(np.asarray(indices))
+        if not np.all(contains):
+            raise ValueError("Target not in volume: %s" %
+                                    indices[np.nonzero(~contains)[0][0]])
+
+        # stable sort, so that sources are ordered for each target
+        order = np.argsort(indices, kind='mergesort')
+        sources = np.repeat(np.arange(len(self._keys),
+                                      dtype=_smallest_int_dtype(len(self._keys))),
+                            np.diff(self._indptr))[order]
+
+        targets, starts = np.unique(indices[order], return_index=True)
+        target_indptr = np.append(starts, len(indices)).astype(np.int64)
+
+        return targets, target_indptr, sources
+
+    def __repr__(self, prefixes=None):
+        prefixes_ = ['vg=%r' % self._volgeom,
+                     'source=%r' % self._source]
+        if self._meta is not None:
+            prefixes_.append('meta=%r' % self._meta)
+        prefixes_.append('keys=<%d>, indices=<%d>' % (len(self._keys),
+                                                     len(self._indices)))
+        if self._aux:
+            prefixes_.append('aux=(%s)' % ', '.join('%s=<...>' % k
+                                                    for k in self._aux))
+        return "%s(%s)" % (self.__class__.__name__, ','.join(prefixes_))
+
+    def _key2row(self, key):
+        '''Helper: position of key in self._keys'''
+        try:
+            i = np.searchsorted(self._keys, key)
+            if i < len(self._keys) and self._keys[i] == key:
+                return i
+        except (TypeError, ValueError):
+            # key of a type not comparable with the keys
+            pass
+        raise KeyError(key)
+
+    def _keys2rows(self, keys=None):
+        '''Helper: positions of keys in self._keys (all if keys is None)'''
+        if keys is None:
+            return np.arange(len(self._keys))
+
+        keys = np.asarray(list(keys))
+        rows = np.searchsorted(self._keys, keys)
+        rows = np.minimum(rows, max(len(self._keys) - 1, 0))
+        found = np.zeros(rows.shape, dtype=np.bool_)
+        if len(self._keys):
+            eq = self._keys[rows] == keys
+            if isinstance(eq, np.ndarray):
+                # otherwise keys of a type not comparable with the keys
+                found = eq
+        if not np.all(found):
+            missing = keys[~found]
+            raise KeyError('%d keys (including "%s") not present' %
+                                        (len(missing), missing[0]))
+        return rows
+
+    def _raise_read_only(self):
+        raise TypeError("%s is read-only; add masks to a VolumeMaskDictionary "
+                        "and convert using to_sparse() instead" %
+                        self.__class__.__name__)
+
+    def add(self, src, nbrs, aux=None):
+        self._raise_read_only()
+
+    def merge(self, other):
+        self._raise_read_only()
+
+    def to_sparse(self):
+        return self
+
+    def get(self, src):
+        i = self._key2row(src)
+        return self._indices[self._indptr[i]:self._indptr[i + 1]].tolist()
+
+    def get_aux(self, src, label):
+        if not label in self._aux:
+            raise ValueError("%s not in %r" % (label, self.aux_keys()))
+        i = self._key2row(src)
+        indptr = self._aux_indptr.get(label, self._indptr)
+        return self._aux[label][indptr[i]:indptr[i + 1]].tolist()
+
+    def aux_keys(self):
+        return self._aux.keys()
+
+    def target2sources(self, nbr):
+        if type(nbr) in (list, tuple):
+            return map(self.target2sources, nbr)
+
+        i = np.searchsorted(self._targets, nbr)
+        if i == len(self._targets) or self._targets[i] != nbr:
+            return None
+
+        rows = self._target_sources[self._target_indptr[i]:
+                                    self._target_indptr[i + 1]]
+        return set(self._keys[rows].tolist())
+
+    def get_targets(self):
+        return self._targets.tolist()
+
+    def _get_linear_voxel_indices(self, keys=None):
+        '''Helper: sorted unique linear voxel indices in masks for keys'''
+        if keys is None:
+            return np.asarray(self._targets)
+        rows = self._keys2rows(keys)
+        return np.unique(_csr_gather(self._indptr, self._indices, rows))
+
+    def get_mask(self, keys=None):
+        m_lin = np.zeros((self.volgeom.nvoxels,), dtype=np.int8)
+        m_lin[self._get_linear_voxel_indices(keys)] = 1
+        return np.reshape(m_lin, self.volgeom.shape[:3])
+
+    def get_voxel_indices(self, keys=None):
+        lin = self._get_linear_voxel_indices(keys)
+        return map(tuple, self.volgeom.lin2ijk(lin))
+
+    def get_dataset_feature_mask(self, ds, keys=None):
+        vg = self.volgeom
+        # voxels outside the volume are mapped to nvoxels
+        ds_lin = vg.ijk2lin(ds.fa.voxel_indices)
+
+        selected = np.zeros((vg.nvoxels + 1,), dtype=np.bool_)
+        selected[self._get_linear_voxel_indices(keys)] = True
+        in_ds = np.zeros_like(selected)
+        in_ds[ds_lin] = True
+
+        not_in_ds = np.nonzero(selected & ~in_ds)[0]
+        if len(not_in_ds):
+            raise ValueError('Found %d voxel indices selected that were '
+                             'not in dataset, first one is %s' %
+                                (len(not_in_ds),
+                                 tuple(vg.lin2ijk(not_in_ds[:1])[0])))
+
+        return selected[ds_lin]
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __keys__(self):
+        return self._keys.tolist()
+
+    def __contains__(self, key):
+        try:
+            self._key2row(key)
+        except KeyError:
+            return False
+        return True
+
+    def _get_arrays(self):
+        '''Helper: all arrays, with names as used by save()'''
+        arrays = dict(zip(self._array_names,
+                          (self._keys, self._indptr, self._indices,
+                           self._targets, self._target_indptr,
+                           self._target_sources)))
+        for i, label in enumerate(sorted(self._aux)):
+            arrays['aux%d' % i] = self._aux[label]
+            if label in self._aux_indptr:
+                arrays['aux_indptr%d' % i] = self._aux_indptr[label]
+        return arrays
+
+    def _set_arrays(self, arrays, aux_labels):
+        '''Helper: inverse of _get_arrays'''
+        (self._keys, self._indptr, self._indices, self._targets,
+         self._target_indptr, self._target_sources) = \
+                    [arrays[name] for name in self._array_names]
+        self._aux = dict()
+        self._aux_indptr = dict()
+        for i, label in enumerate(sorted(aux_labels)):
+            self._aux[label] = arrays['aux%d' % i]
+            if 'aux_indptr%d' % i in arrays:
+                self._aux_indptr[label] = arrays['aux_indptr%d' % i]
+
+    def __reduce__(self):
+        return (self.__class__,
+                (self._volgeom, self._source),
+                self.__getstate__())
+
+    def __getstate__(self):
+        return dict(meta=self._meta, aux_labels=sorted(self._aux),
+                    arrays=self._get_arrays())
+
+    def __setstate__(self, s):
+        self._meta = s['meta']
+        self._set_arrays(s['arrays'], s['aux_labels'])
+
+    def save(self, dirname):
+        """Store in a directory, so that it can be memory-mapped
+
+        Parameters
+        ----------
+        dirname: str
+            Name of the output directory, which is created if it does not
+            exist. Each array is stored in a separate .npy file, and
+            volume geometry, source and meta data in a pickle.
+        """
+        if not osp.isdir(dirname):
+            os.makedirs(dirname)
+
+        for name, arr in self._get_arrays().iteritems():
+            np.save(osp.join(dirname, name + '.npy'), np.asarray(arr))
+
+        with open(osp.join(dirname, _SPARSE_HEADER), 'wb') as f:
+            cPickle.dump(dict(volgeom=self._volgeom, source=self._source,
+                              meta=self._meta, aux_labels=sorted(self._aux)),
+                         f, protocol=2)
+
+
+_SPARSE_HEADER = 'header.pkl'
+
+
+def load_sparse(dirname, mmap_mode='r'):
+    """Load a SparseVolumeMaskDictionary stored with its save() method
+
+    Parameters
+    ----------
+    dirname: str
+        directory used when saving.
+    mmap_mode: None or str
+        Mode with which arrays are memory-mapped (see numpy.load). With the
+        default 'r' data is only read from disk when accessed.
+
+    Returns
+    -------
+    vmd: SparseVolumeMaskDictionary
+    """
+    with open(osp.join(dirname, _SPARSE_HEADER), 'rb') as f:
+        header = cPickle.load(f)
+
+    arrays = dict()
+    for fn in os.listdir(dirname):
+        name, ext = osp.splitext(fn)
+        if ext == '.npy':
+            arrays[name] = np.load(osp.join(dirname, fn), mmap_mode=mmap_mode)
+
+    vmd = SparseVolumeMaskDictionary.__new__(SparseVolumeMaskDictionary)
+    vmd._volgeom = header['volgeom']
+    vmd._source = header['source']
+    vmd.__setstate__(dict(meta=header['meta'],
+                          aux_labels=header['aux_labels'],
+                          arrays=arrays))
+    return vmd
+
 
 def _dict_with_arrays2array_tuple(d):
     '''Helper: converts to a more efficient tuple-based representation
@@ -1038,14 +1466,18 @@ def from_any(s):
     Parameters
     ----------
     s: basestring or volume_mask_dict.VolumeMaskDictionary
-        if a string it is assumed to be a file name and loaded using h5load. If
-        a volume_mask_dict.VolumeMaskDictionary then it is returned.
+        if a string it is assumed to be a file name and loaded using h5load,
+        or a directory with a SparseVolumeMaskDictionary which is loaded
+        using load_sparse. If a volume_mask_dict.VolumeMaskDictionary then
+        it is returned.
 
     Returns
     -------
     r: volume_mask_dict.VolumeMaskDictionary
     """
     if isinstance(s, basestring):
+        if osp.isdir(s):
+            return load_sparse(s)
         vs = h5load(s)
         return from_any(vs)
     elif isinstance(s, VolumeMaskDictionary):
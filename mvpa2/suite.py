@@ -17,10 +17,21 @@ or
 
   import mvpa2.suite
 
+The latter is fast, since all names are only imported on first access
+(e.g. `mvpa2.suite.Dataset`).  Which module provides which name is only
+determined once per environment (by importing all of them, as done by
+``from mvpa2.suite import *``) and cached on disk (see
+`mvpa2.base.externals.get_cache_filename`).  Externals a name depends on
+are still checked upon its first access.  Set `lazy` in section `suite` of
+the configuration to `no` (e.g. MVPA_SUITE_LAZY=no) to always import
+everything.
 """
 
 __docformat__ = 'restructuredtext'
 
+import os
+import sys
+from types import ModuleType as _ModuleType
 
 from mvpa2 import *
 
@@ -32,253 +43,354 @@ __sdebug.__doc__ = "Shortcut to output debug messages for suite imports"
 
 __sdebug('base')
 from mvpa2.base import *
-from mvpa2.base.attributes import *
-from mvpa2.base.collections import *
-from mvpa2.base.constraints import *
-from mvpa2.base.config import *
-from mvpa2.base.dataset import *
-from mvpa2.base.externals import *
-from mvpa2.base.info import *
-from mvpa2.base.types import *
-from mvpa2.base.verbosity import *
-from mvpa2.base.param import *
-from mvpa2.base.state import *
-from mvpa2.base.node import *
-from mvpa2.base.learner import *
-from mvpa2.base.progress import *
-
-__sdebug('h5py')
-if externals.exists('h5py'):
-    from mvpa2.base.hdf5 import *
-
-__sdebug('reportlab')
-if externals.exists('reportlab'):
-    from mvpa2.base.report import *
-else:
-    from mvpa2.base.report_dummy import Report
 
-__sdebug('algorithms')
-from mvpa2.algorithms.hyperalignment import *
-if externals.exists('scipy'):
+# Everything the suite provides, in order of import (later ones take
+# precedence): externals which have to be present (or a function deciding
+# whether to import), and the import statement
+_SUITE_IMPORTS = [
+    # base
+    (None, 'from mvpa2.base.attributes import *'),
+    (None, 'from mvpa2.base.collections import *'),
+    (None, 'from mvpa2.base.constraints import *'),
+    (None, 'from mvpa2.base.config import *'),
+    (None, 'from mvpa2.base.dataset import *'),
+    (None, 'from mvpa2.base.externals import *'),
+    (None, 'from mvpa2.base.info import *'),
+    (None, 'from mvpa2.base.types import *'),
+    (None, 'from mvpa2.base.verbosity import *'),
+    (None, 'from mvpa2.base.param import *'),
+    (None, 'from mvpa2.base.state import *'),
+    (None, 'from mvpa2.base.node import *'),
+    (None, 'from mvpa2.base.learner import *'),
+    (None, 'from mvpa2.base.progress import *'),
+    ('h5py', 'from mvpa2.base.hdf5 import *'),
+    ('reportlab', 'from mvpa2.base.report import *'),
+    (lambda: not externals.exists('reportlab'),
+     'from mvpa2.base.report_dummy import Report'),
+    # algorithms
+    (None, 'from mvpa2.algorithms.hyperalignment import *'),
     # Some pieces do not demand scipy, but for now let's just do this way
-    from mvpa2.algorithms.searchlight_hyperalignment import *
-    from mvpa2.algorithms.group_clusterthr import *
-
-__sdebug('clfs')
-from mvpa2 import clfs
-__sdebug('clfs distance')
-from mvpa2.clfs.distance import *
-__sdebug('clfs base')
-from mvpa2.clfs.base import *
-__sdebug('clfs meta')
-from mvpa2.clfs.meta import *
-__sdebug('clfs kNN')
-from mvpa2.clfs.knn import *
-__sdebug('clfs lars')
-if externals.exists('lars'):
-    from mvpa2.clfs.lars import *
-__sdebug('clfs enet')
-if externals.exists('elasticnet'):
-    from mvpa2.clfs.enet import *
-__sdebug('clfs glmnet')
-if externals.exists('glmnet'):
-    from mvpa2.clfs.glmnet import *
-__sdebug('clfs skl')
-if externals.exists('skl'):
-    if externals.versions['skl'] >= '0.9':
-        import sklearn as skl
-    else:
-        import scikits.learn as skl
-    from mvpa2.clfs.skl import *
-__sdebug('clfs smlr')
-from mvpa2.clfs.smlr import *
-from mvpa2.clfs.blr import *
-from mvpa2.clfs.gnb import *
-from mvpa2.clfs.stats import *
-from mvpa2.clfs.similarity import *
-if externals.exists('libsvm') or externals.exists('shogun'):
-    __sdebug('clfs svm')
-    from mvpa2.clfs.svm import *
-from mvpa2.clfs.transerror import *
-__sdebug('clfs warehouse')
-from mvpa2.clfs.warehouse import *
-
-__sdebug('kernels')
-from mvpa2 import kernels
-from mvpa2.kernels.base import *
-from mvpa2.kernels.np import *
-if externals.exists('libsvm'):
-    from mvpa2.kernels.libsvm import *
-if externals.exists('shogun'):
-    from mvpa2.kernels.sg import *
-
-__sdebug('datasets')
-from mvpa2 import datasets
-from mvpa2.datasets import *
-# just to make testsuite happy
-from mvpa2.datasets.base import *
-from mvpa2.datasets.formats import *
-from mvpa2.datasets.miscfx import *
-from mvpa2.datasets.eep import *
-from mvpa2.datasets.eventrelated import *
-if externals.exists('nibabel') :
-    from mvpa2.datasets.mri import *
-    from mvpa2.datasets.gifti import map2gifti, gifti_dataset
-from mvpa2.datasets.sources import *
-from mvpa2.datasets.sources.native import *
-from mvpa2.datasets.sources.bids import *
-from mvpa2.datasets.sources.openfmri import *
-from mvpa2.datasets import niml
-from mvpa2.datasets.niml import from_niml, to_niml
-from mvpa2.datasets import eeglab
-from mvpa2.datasets.eeglab import eeglab_dataset
-if externals.exists('scipy') :
-    from mvpa2.datasets import cosmo
-    from mvpa2.datasets.cosmo import map2cosmo, cosmo_dataset, \
-                                     CosmoQueryEngine, CosmoSearchlight
-
-
-__sdebug('generators')
-from mvpa2.generators.base import *
-from mvpa2.generators.partition import *
-from mvpa2.generators.splitters import *
-from mvpa2.generators.permutation import *
-from mvpa2.generators.resampling import *
-
-__sdebug('featsel')
-from mvpa2 import featsel
-from mvpa2.featsel.base import *
-from mvpa2.featsel.helpers import *
-from mvpa2.featsel.ifs import *
-from mvpa2.featsel.rfe import *
-
-__sdebug('mappers')
-from mvpa2 import mappers
-#from mvpa2.mappers import *
-from mvpa2.mappers.base import *
-from mvpa2.mappers.slicing import *
-from mvpa2.mappers.flatten import *
-from mvpa2.mappers.shape import *
-from mvpa2.mappers.prototype import *
-from mvpa2.mappers.projection import *
-from mvpa2.mappers.staticprojection import *
-from mvpa2.mappers.svd import *
-from mvpa2.mappers.procrustean import *
-from mvpa2.mappers.boxcar import *
-from mvpa2.mappers.fx import *
-from mvpa2.mappers.fxy import *
-from mvpa2.mappers.som import *
-from mvpa2.mappers.zscore import *
-if externals.exists('scipy'):
-    from mvpa2.mappers.detrend import *
-    from mvpa2.mappers.filters import *
-if externals.exists('mdp'):
-    from mvpa2.mappers.mdp_adaptor import *
-if externals.exists('mdp ge 2.4'):
-    from mvpa2.mappers.lle import *
-from mvpa2.mappers.glm import *
-from mvpa2.mappers.skl_adaptor import *
-
-__sdebug('measures')
-from mvpa2 import measures
-from mvpa2.measures.anova import *
-if externals.exists('statsmodels'):
-    from mvpa2.measures.statsmodels_adaptor import *
-from mvpa2.measures.irelief import *
-from mvpa2.measures.base import *
-from mvpa2.measures.fx import *
-from mvpa2.measures.noiseperturbation import *
-from mvpa2.misc.neighborhood import *
-from mvpa2.measures.searchlight import *
-from mvpa2.measures.gnbsearchlight import *
-from mvpa2.measures.nnsearchlight import *
-from mvpa2.measures.corrstability import *
-from mvpa2.measures.winner import *
-
-__sdebug('misc')
-from mvpa2.support.copy import *
-from mvpa2.misc.fx import *
-from mvpa2.misc.attrmap import *
-from mvpa2.misc.errorfx import *
-from mvpa2.misc.cmdline import *
-from mvpa2.misc.data_generators import *
-from mvpa2.misc.exceptions import *
-from mvpa2.misc import *
-from mvpa2.misc.io import *
-from mvpa2.misc.io.base import *
-from mvpa2.misc.io.meg import *
-from mvpa2.misc.fsl import *
-from mvpa2.misc.bv import *
-from mvpa2.misc.bv.base import *
-from mvpa2.misc.support import *
-from mvpa2.misc.transformers import *
-from mvpa2.misc.dcov import dCOV, dcorcoef
-
-__sdebug("nibabel")
-if externals.exists("nibabel"):
-    from mvpa2.misc.fsl.melodic import *
-
-if externals.exists("pylab"):
-    from mvpa2.viz import *
-    from mvpa2.misc.plot import *
-    from mvpa2.misc.plot.erp import *
-    from mvpa2.misc.plot.scatter import *
-    if externals.exists(['griddata', 'scipy']):
-        from mvpa2.misc.plot.topo import *
-    from mvpa2.misc.plot.lightbox import plot_lightbox
-
-    if externals.exists(['matplotlib', 'griddata']):
-        from mvpa2.misc.plot.flat_surf import \
-                FlatSurfacePlotter, curvature_from_any
-
-__sdebug("scipy dependents")
-if externals.exists("scipy"):
-    from mvpa2.support.scipy.stats import scipy
-    from mvpa2.measures.corrcoef import *
-    from mvpa2.measures.rsa import *
-    from mvpa2.clfs.ridge import *
-    from mvpa2.clfs.plr import *
-    from mvpa2.misc.stats import *
-    from mvpa2.clfs.gpr import *
-    from mvpa2.support.nipy import *
-
-__sdebug("mappers wavelet")
-if externals.exists("pywt"):
-    from mvpa2.mappers.wavelet import *
-
-__sdebug("pylab")
-if externals.exists("pylab"):
-    import pylab as pl
-
-__sdebug("atlases")
-if externals.exists("lxml") and externals.exists("nibabel"):
-    from mvpa2.atlases import *
-
-__sdebug("surface searchlight")
-from mvpa2.misc.surfing.queryengine import SurfaceVerticesQueryEngine, \
-                                           SurfaceVoxelsQueryEngine, \
-                                           SurfaceQueryEngine, \
-                                           disc_surface_queryengine
-
-from mvpa2.misc.surfing import surf_voxel_selection, volgeom, \
-                                volsurf, volume_mask_dict
-
-from mvpa2.misc.surfing.volume_mask_dict import VolumeMaskDictionary
-
-__sdebug("nibabel afni")
-from mvpa2.support.nibabel import afni_niml_dset, afni_suma_1d, \
-                                  afni_suma_spec, surf_fs_asc, surf, \
-				                  surf_caret, \
-                                  afni_niml_roi, afni_niml_annot
-if externals.exists('nibabel'):
-    from mvpa2.support.nibabel import surf_gifti
-
-
-__sdebug("cmdline")
-if externals.exists("nibabel") and externals.exists("scipy") \
-        and externals.exists('ctypes') \
-        and externals.exists('h5py'):
-    from mvpa2.cmdline.cmd_ttest import *
+    ('scipy', 'from mvpa2.algorithms.searchlight_hyperalignment import *'),
+    ('scipy', 'from mvpa2.algorithms.group_clusterthr import *'),
+    # clfs
+    (None, 'from mvpa2 import clfs'),
+    (None, 'from mvpa2.clfs.distance import *'),
+    (None, 'from mvpa2.clfs.base import *'),
+    (None, 'from mvpa2.clfs.meta import *'),
+    (None, 'from mvpa2.clfs.knn import *'),
+    ('lars', 'from mvpa2.clfs.lars import *'),
+    ('elasticnet', 'from mvpa2.clfs.enet import *'),
+    ('glmnet', 'from mvpa2.clfs.glmnet import *'),
+    (lambda: externals.exists('skl') and externals.versions['skl'] >= '0.9',
+     'import sklearn as skl'),
+    (lambda: externals.exists('skl') and externals.versions['skl'] < '0.9',
+     'import scikits.learn as skl'),
+    ('skl', 'from mvpa2.clfs.skl import *'),
+    (None, 'from mvpa2.clfs.smlr import *'),
+    (None, 'from mvpa2.clfs.blr import *'),
+    (None, 'from mvpa2.clfs.gnb import *'),
+    (None, 'from mvpa2.clfs.stats import *'),
+    (None, 'from mvpa2.clfs.similarity import *'),
+    (lambda: externals.exists('libsvm') or externals.exists('shogun'),
+     'from mvpa2.clfs.svm import *'),
+    (None, 'from mvpa2.clfs.transerror import *'),
+    (None, 'from mvpa2.clfs.warehouse import *'),
+    # kernels
+    (None, 'from mvpa2 import kernels'),
+    (None, 'from mvpa2.kernels.base import *'),
+    (None, 'from mvpa2.kernels.np import *'),
+    ('libsvm', 'from mvpa2.kernels.libsvm import *'),
+    ('shogun', 'from mvpa2.kernels.sg import *'),
+    # datasets
+    (None, 'from mvpa2 import datasets'),
+    (None, 'from mvpa2.datasets import *'),
+    # just to make testsuite happy
+    (None, 'from mvpa2.datasets.base import *'),
+    (None, 'from mvpa2.datasets.formats import *'),
+    (None, 'from mvpa2.datasets.miscfx import *'),
+    (None, 'from mvpa2.datasets.eep import *'),
+    (None, 'from mvpa2.datasets.eventrelated import *'),
+    ('nibabel', 'from mvpa2.datasets.mri import *'),
+    ('nibabel', 'from mvpa2.datasets.gifti import map2gifti, gifti_dataset'),
+    (None, 'from mvpa2.datasets.sources import *'),
+    (None, 'from mvpa2.datasets.sources.native import *'),
+    (None, 'from mvpa2.datasets.sources.bids import *'),
+    (None, 'from mvpa2.datasets.sources.openfmri import *'),
+    (None, 'from mvpa2.datasets import niml'),
+    (None, 'from mvpa2.datasets.niml import from_niml, to_niml'),
+    (None, 'from mvpa2.datasets import eeglab'),
+    (None, 'from mvpa2.datasets.eeglab import eeglab_dataset'),
+    ('scipy', 'from mvpa2.datasets import cosmo'),
+    ('scipy', 'from mvpa2.datasets.cosmo import map2cosmo, cosmo_dataset, '
+              'CosmoQueryEngine, CosmoSearchlight'),
+    # generators
+    (None, 'from mvpa2.generators.base import *'),
+    (None, 'from mvpa2.generators.partition import *'),
+    (None, 'from mvpa2.generators.splitters import *'),
+    (None, 'from mvpa2.generators.permutation import *'),
+    (None, 'from mvpa2.generators.resampling import *'),
+    # featsel
+    (None, 'from mvpa2 import featsel'),
+    (None, 'from mvpa2.featsel.base import *'),
+    (None, 'from mvpa2.featsel.helpers import *'),
+    (None, 'from mvpa2.featsel.ifs import *'),
+    (None, 'from mvpa2.featsel.rfe import *'),
+    # mappers
+    (None, 'from mvpa2 import mappers'),
+    (None, 'from mvpa2.mappers.base import *'),
+    (None, 'from mvpa2.mappers.slicing import *'),
+    (None, 'from mvpa2.mappers.flatten import *'),
+    (None, 'from mvpa2.mappers.shape import *'),
+    (None, 'from mvpa2.mappers.prototype import *'),
+    (None, 'from mvpa2.mappers.projection import *'),
+    (None, 'from mvpa2.mappers.staticprojection import *'),
+    (None, 'from mvpa2.mappers.svd import *'),
+    (None, 'from mvpa2.mappers.procrustean import *'),
+    (None, 'from mvpa2.mappers.boxcar import *'),
+    (None, 'from mvpa2.mappers.fx import *'),
+    (None, 'from mvpa2.mappers.fxy import *'),
+    (None, 'from mvpa2.mappers.som import *'),
+    (None, 'from mvpa2.mappers.zscore import *'),
+    ('scipy', 'from mvpa2.mappers.detrend import *'),
+    ('scipy', 'from mvpa2.mappers.filters import *'),
+    ('mdp', 'from mvpa2.mappers.mdp_adaptor import *'),
+    ('mdp ge 2.4', 'from mvpa2.mappers.lle import *'),
+    (None, 'from mvpa2.mappers.glm import *'),
+    (None, 'from mvpa2.mappers.skl_adaptor import *'),
+    # measures
+    (None, 'from mvpa2 import measures'),
+    (None, 'from mvpa2.measures.anova import *'),
+    ('statsmodels', 'from mvpa2.measures.statsmodels_adaptor import *'),
+    (None, 'from mvpa2.measures.irelief import *'),
+    (None, 'from mvpa2.measures.base import *'),
+    (None, 'from mvpa2.measures.fx import *'),
+    (None, 'from mvpa2.measures.noiseperturbation import *'),
+    (None, 'from mvpa2.misc.neighborhood import *'),
+    (None, 'from mvpa2.measures.searchlight import *'),
+    (None, 'from mvpa2.measures.gnbsearchlight import *'),
+    (None, 'from mvpa2.measures.nnsearchlight import *'),
+    (None, 'from mvpa2.measures.corrstability import *'),
+    (None, 'from mvpa2.measures.winner import *'),
+    # misc
+    (None, 'from mvpa2.support.copy import *'),
+    (None, 'from mvpa2.misc.fx import *'),
+    (None, 'from mvpa2.misc.attrmap import *'),
+    (None, 'from mvpa2.misc.errorfx import *'),
+    (None, 'from mvpa2.misc.cmdline import *'),
+    (None, 'from mvpa2.misc.data_generators import *'),
+    (None, 'from mvpa2.misc.exceptions import *'),
+    (None, 'from mvpa2.misc import *'),
+    (None, 'from mvpa2.misc.io import *'),
+    (None, 'from mvpa2.misc.io.base import *'),
+    (None, 'from mvpa2.misc.io.meg import *'),
+    (None, 'from mvpa2.misc.fsl import *'),
+    (None, 'from mvpa2.misc.bv import *'),
+    (None, 'from mvpa2.misc.bv.base import *'),
+    (None, 'from mvpa2.misc.support import *'),
+    (None, 'from mvpa2.misc.transformers import *'),
+    (None, 'from mvpa2.misc.dcov import dCOV, dcorcoef'),
+    # nibabel
+    ('nibabel', 'from mvpa2.misc.fsl.melodic import *'),
+    # pylab
+    ('pylab', 'from mvpa2.viz import *'),
+    ('pylab', 'from mvpa2.misc.plot import *'),
+    ('pylab', 'from mvpa2.misc.plot.erp import *'),
+    ('pylab', 'from mvpa2.misc.plot.scatter import *'),
+    (['pylab', 'griddata', 'scipy'], 'from mvpa2.misc.plot.topo import *'),
+    ('pylab', 'from mvpa2.misc.plot.lightbox import plot_lightbox'),
+    (['pylab', 'matplotlib', 'griddata'],
+     'from mvpa2.misc.plot.flat_surf import FlatSurfacePlotter, '
+     'curvature_from_any'),
+    # scipy dependents
+    ('scipy', 'from mvpa2.support.scipy.stats import scipy'),
+    ('scipy', 'from mvpa2.measures.corrcoef import *'),
+    ('scipy', 'from mvpa2.measures.rsa import *'),
+    ('scipy', 'from mvpa2.clfs.ridge import *'),
+    ('scipy', 'from mvpa2.clfs.plr import *'),
+    ('scipy', 'from mvpa2.misc.stats import *'),
+    ('scipy', 'from mvpa2.clfs.gpr import *'),
+    ('scipy', 'from mvpa2.support.nipy import *'),
+    # mappers wavelet
+    ('pywt', 'from mvpa2.mappers.wavelet import *'),
+    # pylab
+    ('pylab', 'import pylab as pl'),
+    # atlases
+    (['lxml', 'nibabel'], 'from mvpa2.atlases import *'),
+    # surface searchlight
+    (None, 'from mvpa2.misc.surfing.queryengine import '
+           'SurfaceVerticesQueryEngine, SurfaceVoxelsQueryEngine, '
+           'SurfaceQueryEngine, disc_surface_queryengine'),
+    (None, 'from mvpa2.misc.surfing import surf_voxel_selection, volgeom, '
+           'volsurf, volume_mask_dict'),
+    (None, 'from mvpa2.misc.surfing.volume_mask_dict import '
+           'VolumeMaskDictionary'),
+    # nibabel afni
+    (None, 'from mvpa2.support.nibabel import afni_niml_dset, afni_suma_1d, '
+           'afni_suma_spec, surf_fs_asc, surf, surf_caret, afni_niml_roi, '
+           'afni_niml_annot'),
+    ('nibabel', 'from mvpa2.support.nibabel import surf_gifti'),
+    # cmdline
+    (['nibabel', 'scipy', 'ctypes', 'h5py'],
+     'from mvpa2.cmdline.cmd_ttest import *'),
+    ]
+
+
+def _parse_import(statement):
+    """Module and imported names of an import statement
+
+    Returns the name of the module, and a list with tuples of the name
+    in the suite and the attribute of the module (None for the module
+    itself), or None for all public names of the module.
+    """
+    words = statement.replace(',', ' ').split()
+    if words[0] == 'import':
+        # import module as name
+        return words[1], [(words[-1], None)]
+
+    module, names = words[1], words[3:]
+    if names == ['*']:
+        return module, None
+
+    pairs = []
+    while names:
+        if len(names) > 2 and names[1] == 'as':
+            pairs.append((names[2], names[0]))
+            names = names[3:]
+        else:
+            pairs.append((names[0], names[0]))
+            names = names[1:]
+    return module, pairs
+
+
+def _import_attribute(module, attr):
+    """Import module and return its attribute (or itself if attr is None)"""
+    __import__(module)
+    mod = sys.modules[module]
+    if attr is None:
+        return mod
+    try:
+        return getattr(mod, attr)
+    except AttributeError:
+        # submodule which was not imported yet
+        return _import_attribute('%s.%s' % (module, attr), None)
+
+
+def _check_condition(condition):
+    """Whether the externals required by an entry of the suite are present
+    """
+    if condition is None:
+        return True
+    elif callable(condition):
+        return condition()
+    return externals.exists(condition)
+
+
+def _import_all(namespace):
+    """Import everything the suite provides into namespace
+
+    Returns
+    -------
+    dict
+      Mapping from each name to the module and attribute it was
+      imported from, and the position of its entry in `_SUITE_IMPORTS`.
+    """
+    index = {}
+    for i, (condition, statement) in enumerate(_SUITE_IMPORTS):
+        if not _check_condition(condition):
+            continue
+
+        __sdebug(statement)
+        module, names = _parse_import(statement)
+        if names is None:
+            mod = _import_attribute(module, None)
+            public = getattr(mod, '__all__', None)
+            if public is None:
+                public = [k for k in mod.__dict__ if not k.startswith('_')]
+            names = [(name, name) for name in public]
+        for name, attr in names:
+            namespace[name] = _import_attribute(module, attr)
+            index[name] = (module, attr, i)
+    return index
+
+
+def _get_module_mtimes():
+    """Modification times of all imported PyMVPA modules"""
+    mtimes = []
+    for name, mod in sys.modules.items():
+        filename = getattr(mod, '__file__', None)
+        if filename and (name == 'mvpa2' or name.startswith('mvpa2.')):
+            filename = filename[:-1] if filename[-4:] in ('.pyc', '.pyo') \
+                                     else filename
+            try:
+                mtimes.append((filename, os.stat(filename).st_mtime))
+            except OSError:
+                pass
+    return sorted(mtimes)
+
+
+def _load_index():
+    """Cached index of names, if none of the modules changed since then"""
+    cached = externals._load_cache('suite')
+    if cached is None:
+        return None
+    index, mtimes = cached
+    if any(len(v) != 3 for v in index.itervalues()):
+        # index of an older version
+        return None
+    for filename, mtime in mtimes:
+        try:
+            if os.stat(filename).st_mtime != mtime:
+                return None
+        except OSError:
+            return None
+    return index
+
+
+class _LazySuite(_ModuleType):
+    """mvpa2.suite which imports the modules providing a name on first access
+    """
+
+    def __init__(self, module, index):
+        """
+        Parameters
+        ----------
+        module : module
+          Original mvpa2.suite module, with everything imported eagerly.
+        index : dict
+          Mapping from names to the module and attribute providing them,
+          and the position of their entry in `_SUITE_IMPORTS`.
+        """
+        _ModuleType.__init__(self, module.__name__, module.__doc__)
+        # names imported later on take precedence
+        self.__dict__.update((k, v) for k, v in module.__dict__.iteritems()
+                             if not k in index)
+        # keep the original module alive, or its globals would be wiped
+        self.__dict__['_module'] = module
+        self.__dict__['_index'] = index
+        self.__dict__['__all__'] = sorted(
+            set(index).union(k for k in module.__dict__
+                             if not k.startswith('_')))
+
+    def __dir__(self):
+        return sorted(set(self.__dict__).union(self._index))
+
+    def __getattr__(self, name):
+        try:
+            module, attr, i = self._index[name]
+        except KeyError:
+            raise AttributeError("'module' object has no attribute '%s'"
+                                 % name)
+        # run the same checks as an eager import, since some have side
+        # effects (e.g. choosing the matplotlib backend), and the
+        # environment might differ from the one the index was built in
+        if not _check_condition(_SUITE_IMPORTS[i][0]):
+            raise AttributeError("'module' object has no attribute '%s' "
+                                 "(missing externals)" % name)
+        if __debug__:
+            debug('SUITE', "%s from %s" % (name, module))
+        value = _import_attribute(module, attr)
+        setattr(self, name, value)
+        return value
 
 
 __sdebug("ipython goodies")
@@ -295,7 +407,11 @@ def suite_stats(scope_dict=None):
     if scope_dict is None:
         scope_dict = {}
 
-    scope_dict = scope_dict or globals()
+    if not scope_dict:
+        # including names which were not imported yet
+        suite = sys.modules[__name__]
+        scope_dict = dict((k, getattr(suite, k)) for k in
+                          set(dir(suite)).union(getattr(suite, '_index', ())))
     import types
     # Compatibility layer for Python3
     try:
@@ -387,4 +503,16 @@ def suite_stats(scope_dict=None):
 
     return EnvironmentStatistics(scope_dict)
 
+
+if cfg.getboolean('suite', 'lazy', default='yes'):
+    _index = _load_index()
+    if _index is None:
+        # import everything and remember which module provided what
+        _index = _import_all(globals())
+        externals._save_cache('suite', (_index, _get_module_mtimes()))
+    else:
+        sys.modules[__name__] = _LazySuite(sys.modules[__name__], _index)
+else:
+    _import_all(globals())
+
 __sdebug("THE END of mvpa2.suite imports")
@@ -18,9 +18,104 @@ import os, collections, datetime, time, heapq, math
 
 import numpy as np
 
+from mvpa2.base import externals
+
 _COORD_EPS = 1e-14  # maximum allowed difference between coordinates
 # in order to be considered equal
 
+_BLOCK_NBYTES = 2 ** 26  # maximum size of intermediate (dense) arrays
+
+
+class SpatialIndex(object):
+    '''Spatial index (KD-tree) for nearest-neighbour queries on coordinates
+
+    Coordinates that are not finite (such as NaN for nodes that are not
+    part of a surface) are never returned by any query.
+
+    Parameters
+    ----------
+    coordinates : numpy.ndarray
+        Px3 array with coordinates.
+    '''
+
+    def __init__(self, coordinates):
+        from scipy.spatial import cKDTree
+
+        c = np.asarray(coordinates, dtype=np.float_)
+        if len(c.shape) != 2 or c.shape[1] != 3:
+            raise ValueError("Expected Px3 array for coordinates")
+
+        self._idxs = np.nonzero(np.all(np.isfinite(c), 1))[0]
+        self._tree = cKDTree(c[self._idxs]) if len(self._idxs) else None
+
+    def nearest(self, coords, k=1, max_distance=None):
+        '''Finds the nearest coordinates
+
+        Parameters
+        ----------
+        coords : numpy.ndarray
+            Qx3 array with coordinates for which neighbours are found.
+        k : int
+            Number of neighbours for each element in coords.
+        max_distance : float or None
+            If not None, only neighbours within this distance are returned.
+
+        Returns
+        -------
+        distances : numpy.ndarray
+            Q (if k==1) or QxK array with distances to the k nearest
+            coordinates, sorted by distance. Missing neighbours (because of
+            max_distance, or if there are fewer than k coordinates) have
+            a distance of infinity.
+        idxs : numpy.ndarray
+            Array (of the same shape as distances) with the indices of the
+            nearest coordinates; missing neighbours have index -1.
+        '''
+        coords = np.reshape(np.asarray(coords, dtype=np.float_), (-1, 3))
+        shape = (len(coords),) if k == 1 else (len(coords), k)
+
+        if self._tree is None:
+            return np.zeros(shape) + np.inf, np.zeros(shape, dtype=np.int_) - 1
+
+        if max_distance is None:
+            max_distance = np.inf
+
+        ds, idxs = self._tree.query(coords, k=k,
+                                    distance_upper_bound=max_distance)
+        ds = np.reshape(ds, shape)
+        idxs = np.reshape(idxs, shape)
+
+        # not found (cKDTree reports this as infinite distance)
+        missing = ~np.isfinite(ds)
+        idxs[missing] = 0
+        idxs = self._idxs[idxs]
+        idxs[missing] = -1
+        return ds, idxs
+
+    def within_radius(self, coords, radius):
+        '''Finds all coordinates within a radius
+
+        Parameters
+        ----------
+        coords : numpy.ndarray
+            Qx3 array with coordinates.
+        radius : float
+            Maximum distance.
+
+        Returns
+        -------
+        idxs : list of numpy.ndarray
+            Q sorted arrays with the indices of coordinates within distance
+            radius of each element in coords.
+        '''
+        coords = np.reshape(np.asarray(coords, dtype=np.float_), (-1, 3))
+
+        if self._tree is None:
+            return [np.zeros((0,), dtype=np.int_) for _ in coords]
+
+        return [np.sort(self._idxs[np.asarray(i, dtype=np.int_)])
+                for i in self._tree.query_ball_point(coords, radius)]
+
 class Surface(object):
     '''Cortical surface mesh
 
@@ -259,6 +354,59 @@ class Surface(object):
 
         return dict(self._nbrs)  # make a copy
 
+    @property
+    def adjacency(self):
+        '''Sparse adjacency matrix with the (Euclidean) length of the edges
+
+        Returns
+        -------
+        adj : scipy.sparse.csr_matrix
+            PxP matrix (P==self.nvertices) so that adj[i,j]=d means that
+            nodes i and j are connected by an edge of length d. It holds
+            that adj[i,j]=adj[j,i].
+
+        Note
+        ----
+        This function computes adj if called for the first time, otherwise
+        it caches the results and returns these immediately on the next call'''
+
+        if not hasattr(self, '_adj'):
+            from scipy import sparse
+
+            nv, f, v = self._nv, self._f, self._v
+            p = f.ravel()
+            q = f[:, [1, 2, 0]].ravel()
+
+            # each edge in both directions, but only once
+            pq = np.unique(np.hstack((p * nv + q, q * nv + p)))
+            p, q = pq // nv, pq % nv
+
+            d = np.sum((v[p] - v[q]) ** 2, 1) ** .5
+            self._adj = sparse.csr_matrix((d, (p, q)), shape=(nv, nv))
+
+        return self._adj
+
+    @property
+    def spatial_index(self):
+        '''Spatial index of the vertex coordinates
+
+        Returns
+        -------
+        index : SpatialIndex
+            KD-tree of the vertices, for fast nearest-node and radius
+            queries.
+
+        Note
+        ----
+        This function computes the index if called for the first time,
+        otherwise it caches the results and returns these immediately on
+        the next call'''
+
+        if not hasattr(self, '_spatial_index'):
+            self._spatial_index = SpatialIndex(self._v)
+
+        return self._spatial_index
+
     def circlearound_n2d(self, src, radius, metric='euclidean'):
         '''Finds the distances from a center node to surrounding nodes.
 
@@ -283,9 +431,19 @@ class Surface(object):
         shortmetric = metric.lower()[0]  # only take first letter - for now
 
         if shortmetric == 'e':
-            ds = self.euclidean_distance(src)
-            c = dict((nd, d) for (nd, d) in zip(xrange(self._nv), ds)
-                     if d <= radius)
+            if externals.exists('scipy'):
+                # only consider nodes near src, with a small margin in case
+                # of rounding differences
+                src_coord = np.reshape(self._get_coordinate(src), (1, 3))
+                nds = self.spatial_index.within_radius(src_coord,
+                                        radius * (1 + 1e-8) + _COORD_EPS)[0]
+                ds = self.euclidean_distance(src, nds)
+                c = dict((nd, d) for (nd, d) in zip(nds.tolist(), ds)
+                         if d <= radius)
+            else:
+                ds = self.euclidean_distance(src)
+                c = dict((nd, d) for (nd, d) in zip(xrange(self._nv), ds)
+                         if d <= radius)
 
         elif shortmetric == 'd':
             c = self.dijkstra_distance(src, maxdistance=radius)
@@ -354,6 +512,133 @@ class Surface(object):
 
         return fdist
 
+    def dijkstra_distances(self, srcs=None, maxdistance=None):
+        '''Computes Dijkstra distances from many nodes to surrounding nodes
+
+        Parameters
+        ----------
+        srcs : array-like of int or None
+            Indices of center (source) nodes. If None, all nodes are used.
+        maxdistance: float (default: None)
+            Maximum distance for a node to qualify as a 'surrounding' node.
+            If 'maxdistance is None' then the distances to all nodes are
+            returned.
+
+        Returns
+        -------
+        dist : scipy.sparse.csr_matrix
+            NxP matrix (N==len(srcs), P==self.nvertices) so that the i-th
+            row contains the distances from node srcs[i] to its surrounding
+            nodes (i.e. the same as dijkstra_distance(srcs[i]).
+            Distances of zero (e.g. from each node to itself) are stored
+            explicitly, so the stored elements of each row are exactly the
+            surrounding nodes.
+
+        Note
+        ----
+        Distances are computed with scipy.sparse.csgraph on the adjacency
+        matrix. Nodes are processed in blocks of nearby nodes, each on the
+        sub-graph of nodes within a Euclidean distance of maxdistance, which
+        is much faster than calling dijkstra_distance for each node.
+        '''
+        from scipy import sparse
+        from scipy.sparse.csgraph import dijkstra
+
+        nv = self._nv
+        if srcs is None:
+            srcs = np.arange(nv)
+        else:
+            srcs = np.asarray(srcs, dtype=np.int_).ravel()
+        n = len(srcs)
+
+        adj = self.adjacency
+
+        if maxdistance is None or not np.isfinite(maxdistance) \
+                    or n == 0 or nv == 0:
+            # all nodes can be reached, so no need to look for nearby nodes
+            blocks = [(np.arange(n), None)]
+        else:
+            blocks = self._get_nearby_nodes_blocks(srcs, maxdistance)
+
+        limit = np.inf if maxdistance is None else maxdistance
+        rows, cols, data = [], [], []
+        for block_pos, block_nodes in blocks:
+            if block_nodes is None:
+                block_adj = adj
+                block_srcs = srcs[block_pos]
+            else:
+                block_adj = adj[block_nodes][:, block_nodes]
+                block_srcs = np.searchsorted(block_nodes, srcs[block_pos])
+
+            # keep dense output of dijkstra reasonably sized
+            step = max(1, _BLOCK_NBYTES // (8 * block_adj.shape[0] or 1))
+            for i in xrange(0, len(block_pos), step):
+                d = dijkstra(block_adj, indices=block_srcs[i:i + step],
+                             limit=limit)
+                # nodes beyond the limit (or unreachable) are at infinity
+                r, c = np.nonzero(np.isfinite(d))
+                data.append(d[r, c])
+                rows.append(block_pos[i:i + step][r])
+                if block_nodes is not None:
+                    c = block_nodes[c]
+                cols.append(c)
+
+        rows = np.hstack(rows)
+        cols = np.hstack(cols)
+        data = np.hstack(data)
+        order = np.lexsort((cols, rows))
+        indptr = np.hstack(([0], np.cumsum(np.bincount(rows, minlength=n))))
+        return sparse.csr_matrix((data[order], cols[order], indptr),
+                                 shape=(n, nv))
+
+    def _get_nearby_nodes_blocks(self, srcs, maxdistance):
+        '''Groups nodes into blocks of nearby nodes
+
+        Returns
+        -------
+        blocks: list of tuple
+            Tuples (positions, nodes) with the positions of a block of nodes
+            in srcs and the sorted indices of all nodes within a Euclidean
+            distance of maxdistance from any node in the block.
+        '''
+        v = self._v
+        nv = self._nv
+
+        # boxes at least as large as maxdistance, but not so small that
+        # there are many more boxes than nodes
+        extent = np.max(v, 0) - np.min(v, 0)
+        box_size = max(maxdistance,
+                       (np.prod(extent + _COORD_EPS) * 64. / nv) ** (1. / 3))
+
+        boxes = np.floor(self.coordinates_to_box_indices(box_size)) \
+                                                        .astype(np.int_) + 1
+        # linear box indices (with a margin of one box on either side)
+        dims = np.max(boxes, 0) + 2
+        box_ids = np.ravel_multi_index(boxes.T, dims)
+        box_order = np.argsort(box_ids, kind='mergesort')
+        sorted_box_ids = box_ids[box_order]
+
+        src_box_ids = box_ids[srcs]
+        src_order = np.argsort(src_box_ids, kind='mergesort')
+        uboxes, starts = np.unique(src_box_ids[src_order], return_index=True)
+        stops = np.hstack((starts[1:], [len(srcs)]))
+
+        # offsets to the 27 boxes around (and including) a box
+        offsets = np.array([np.ravel_multi_index(o, dims)
+                            for o in np.ndindex(3, 3, 3)]) \
+                  - np.ravel_multi_index((1, 1, 1), dims)
+
+        blocks = []
+        for ubox, start, stop in zip(uboxes, starts, stops):
+            around = ubox + offsets
+            lo = np.searchsorted(sorted_box_ids, around, side='left')
+            hi = np.searchsorted(sorted_box_ids, around, side='right')
+            nodes = np.sort(np.hstack([box_order[l:h]
+                                       for l, h in zip(lo, hi)]))
+            blocks.append((src_order[start:stop], nodes))
+
+        return blocks
+
     def dijkstra_shortest_path(self, src, maxdistance=None):
         '''Computes Dijkstra shortest path from one node to surrounding nodes.
 
@@ -508,16 +793,7 @@ class Surface(object):
             "src" to node "j".
         '''
 
-        if type(src) is tuple and len(src) == 3:
-            src = np.asarray(src)
-
-        if isinstance(src, np.ndarray):
-            if src.shape not in ((1, 3), (3,), (3, 1)):
-                raise ValueError("Illegal shape: should have 3 elements")
-
-            src_coord = src if src.shape == (1, 3) else np.reshape(src, (1, 3))
-        else:
-            src_coord = self._v[src]
+        src_coord = self._get_coordinate(src)
 
         if trg is None:
             delta = self._v - src_coord
@@ -529,6 +805,19 @@ class Surface(object):
         d = np.power(ss, .5)
         return d
 
+    def _get_coordinate(self, src):
+        '''Helper: coordinates of a node, or of a 1x3 array or triple'''
+        if type(src) is tuple and len(src) == 3:
+            src = np.asarray(src)
+
+        if isinstance(src, np.ndarray):
+            if src.shape not in ((1, 3), (3,), (3, 1)):
+                raise ValueError("Illegal shape: should have 3 elements")
+
+            return src if src.shape == (1, 3) else np.reshape(src, (1, 3))
+        else:
+            return self._v[src]
+
     def nearest_node_index(self, src_coords, node_mask_indices=None):
         '''Computes index of nearest node to src
 
@@ -563,6 +852,14 @@ class Surface(object):
         all_idxs = np.arange(self.nvertices)
         masked_idxs = all_idxs[node_mask_indices] if use_mask else all_idxs
 
+        if externals.exists('scipy'):
+            index = SpatialIndex(v) if use_mask else self.spatial_index
+            _, minidxs = index.nearest(src_coords)
+            if np.any(minidxs < 0):
+                raise ValueError("No nearest node for %d coordinates" %
+                                 np.sum(minidxs < 0))
+            return masked_idxs[minidxs]
+
         n = src_coords.shape[0]
         idxs = np.zeros((n,), dtype=np.int)
         for i in xrange(n):
@@ -1393,8 +1690,27 @@ class Surface(object):
             raise ValueError("Other surface has fewer nodes (%d) than "
                              "this one (%d)" % (nx, ny))
 
+        if externals.exists('scipy'):
+            # nearest nodes in highres for all nodes at once.
+            # nodes with NaN coordinates are not mapped
+            idxs = np.nonzero(np.all(np.isfinite(x), 1))[0]
+            ds, nearest = highres.spatial_index.nearest(x[idxs])
 
-        # use a fast approach
+            if np.any(nearest < 0):
+                i = idxs[np.nonzero(nearest < 0)[0][0]]
+                raise ValueError("Empty sequence: is center %d (%r)"
+                                 " illegal?" % (i, (x[i],)))
+
+            if epsilon is not None:
+                too_far = np.nonzero(~(ds < epsilon))[0]
+                if len(too_far):
+                    raise ValueError("Not found for node %i: %s > %s" %
+                                     (idxs[too_far[0]], ds[too_far[0]],
+                                      epsilon))
+
+            return dict(zip(idxs.tolist(), nearest.tolist()))
+
+        # without a spatial index use a fast approach
         # slice up the high and low res in smaller boxes
         # and index them, so that when finding the nearest coordinates
         # it only requires to consider a limited number of nodes
@@ -1531,6 +1847,42 @@ class Surface(object):
         # space for output
         high2high_in_low = dict()
 
+        if externals.exists('scipy'):
+            is_center = np.zeros((highres_surf.nvertices,), dtype=np.bool_)
+            is_center[list(highres_center_set)] = True
+            todo = np.asarray(sorted(highres_indices), dtype=np.int_)
+
+            while len(todo):
+                # distances for all remaining nodes at once, restricted to
+                # allowed nodes
+                ds = highres_surf.dijkstra_distances(todo, maxdistance=radius)
+                rows = np.repeat(np.arange(len(todo)), np.diff(ds.indptr))
+                cols, data = ds.indices, ds.data
+                keep = is_center[cols]
+                rows, cols, data = rows[keep], cols[keep], data[keep]
+
+                # nearest node for each row (the lowest index in case of ties)
+                order = np.lexsort((cols, data, rows))
+                rows, cols, data = rows[order], cols[order], data[order]
+                first = np.ones((len(rows),), dtype=np.bool_)
+                first[1:] = rows[1:] != rows[:-1]
+
+                for row, col, d in zip(rows[first], cols[first], data[first]):
+                    high2high_in_low[int(todo[row])] = (int(col), float(d))
+
+                mapped = np.zeros((len(todo),), dtype=np.bool_)
+                mapped[rows] = True
+                todo = todo[~mapped]
+
+                radius *= 2
+
+                if len(todo) and radius > max_radius:
+                    # safety mechanism to avoid endless loop
+                    raise RuntimeError("Radius increased to %d - too big" %
+                                       radius)
+
+            return high2high_in_low
+
         # continue increasing radius until all high-res nodes
         # have been mapped to a low-res node
         while set(high2high_in_low) != highres_indices:
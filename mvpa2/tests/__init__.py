@@ -112,6 +112,7 @@ def collect_unit_tests(verbosity=1):
         'test_verbosity',
         'test_report',
         'test_cmdline',
+        'test_benchmarks',
         'test_args',
         'test_meg',
         # Classifiers (longer tests)
@@ -194,6 +195,7 @@ def collect_nose_tests(verbosity=1):
         'test_eepdataset',
         'test_erdataset',
         'test_datasrcs',
+        'test_datasetcache',
 
         # Classifiers
         'test_multiclf',
@@ -248,6 +250,7 @@ def collect_nose_tests(verbosity=1):
 
         # Misc
         'test_cmdline_ttest',
+        'test_cmdline_searchlight',
         'test_lib_afni',
         'test_misc_scatter',
         'test_misc',
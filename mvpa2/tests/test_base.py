@@ -34,3 +34,100 @@ def test_wtf(filename):
         raise AssertionError(
             'Testing of loading from a stored a file has failed: %r'
             % (e,))
+
+
+@with_tempfile(suffix='.json')
+def test_tracing(filename):
+    import gc
+    import json
+    from mvpa2.base.tracing import tracer
+    from mvpa2.testing.datasets import datasets
+    from mvpa2.measures.base import CrossValidation
+    from mvpa2.generators.partition import NFoldPartitioner
+    from mvpa2.clfs.gnb import GNB
+
+    ds = datasets['uni2small']
+    clf = GNB()
+    cv = CrossValidation(clf, NFoldPartitioner())
+    nfolds = len(ds.sa['chunks'].unique)
+
+    assert_false(tracer.active)
+    tracer.reset()
+    tracer.enable(memory=True)
+    try:
+        cv(ds)
+    finally:
+        tracer.disable()
+    # nothing is recorded while disabled
+    cv(ds)
+
+    stats = tracer.get_stats()
+    cvstats = tracer.get_stats(cv)
+    assert_equal(cvstats['name'], 'CrossValidation')
+    assert_equal(cvstats['calls'], 1)
+    assert_true(cvstats['wall'] >= cvstats['self'] >= 0)
+    # the cross-validation called a transfer measure, which called the
+    # classifier and the error function
+    assert_equal(len(cvstats['children']), 1)
+    tmstats = stats[list(cvstats['children'])[0]]
+    assert_equal(tmstats['name'], 'TransferMeasure')
+    assert_equal(tmstats['calls'], nfolds)
+    assert_true(tmstats['wall'] <= cvstats['wall'])
+    assert_equal(len(tmstats['children']), 3)
+    assert_equal(tracer.get_stats(clf)['calls'], nfolds)
+    assert_equal(tracer.get_stats(clf, 'train')['name'], 'GNB.train')
+    assert_equal(tracer.get_stats(clf, 'train')['calls'], nfolds)
+    if tracer.memory:
+        assert_true(cvstats['peak_mem_mb'] >= 0)
+
+    folded = dict(l.rsplit(' ', 1) for l in tracer.get_folded_stacks())
+    assert_true('CrossValidation;TransferMeasure;GNB.train' in folded)
+
+    tracer.save_chrome_trace(filename)
+    events = json.load(open(filename))['traceEvents']
+    assert_equal(len(events), 1 + 4 * nfolds)
+    assert_equal(events[-1]['name'], 'CrossValidation')
+    assert_equal(events[-1]['ph'], 'X')
+
+    # records of deleted nodes are not attributed to new ones
+    key = (tracer._get_serial(clf), 'call')
+    assert_true(key in stats)
+    del clf, cv
+    gc.collect()
+    assert_equal(tracer.get_stats(GNB()), None)
+
+    # calls in other threads are separate roots, which are forgotten once
+    # completed
+    from multiprocessing.pool import ThreadPool
+    clf = GNB()
+    clf.train(ds)
+    tracer.enable()
+    try:
+        pool = ThreadPool(2)
+        try:
+            pool.map(clf, [ds] * 4)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        tracer.disable()
+    assert_equal(tracer.get_stats(clf)['calls'], 4)
+    assert_equal(tracer._stacks, {})
+
+    tracer.reset()
+    assert_equal(tracer.get_stats(), {})
+
+
+def test_thread_map():
+    from mvpa2.base.parallel import thread_map
+    items = range(10)
+    for nproc in (1, 3, 20):
+        assert_equal(thread_map(lambda x: x ** 2, items, nproc),
+                     [x ** 2 for x in items])
+        assert_equal(thread_map(lambda x: x, [], nproc), [])
+
+    def fail(x):
+        if x == 5:
+            raise ValueError(x)
+        return x
+    assert_raises(ValueError, thread_map, fail, items, 3)
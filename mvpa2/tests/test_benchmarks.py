@@ -0,0 +1,65 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the PyMVPA package for the
+#   copyright and license terms.
+#
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Unit tests for PyMVPA benchmarks infrastructure"""
+
+from mvpa2.testing import *
+
+from mvpa2.benchmarks import Benchmark, get_benchmarks, run_benchmarks, \
+        save_results, load_results, compare_results
+
+
+def test_benchmark_params():
+    calls = []
+    bm = Benchmark('test', lambda x: calls.append(x),
+                   setup=lambda a, b: (a, b),
+                   params=dict(a=[1, 2], b=['x', 'y', 'z']))
+    psets = bm.get_param_sets()
+    assert_equal(len(psets), 6)
+    assert_true(dict(a=2, b='y') in psets)
+    assert_equal(bm.get_param_sets(quick=True), [dict(a=1, b='x')])
+    # overrides only apply to known parameters
+    assert_equal(bm.get_param_sets(dict(a=[5], c=[1]), quick=True),
+                 [dict(a=5, b='x')])
+    res = bm.run(dict(a=1, b='y'), repeat=2)
+    assert_equal(calls, [(1, 'y'), (1, 'y')])
+    assert_equal(res['name'], 'test')
+    assert_equal(len(res['times']), 2)
+    assert_equal(res['time'], min(res['times']))
+    assert_true('peak_mem_mb' in res)
+    # external dependencies
+    assert_equal(Benchmark('test', len, requires=['libsvm']).is_available(),
+                 externals.exists('libsvm'))
+
+
+def test_registered_benchmarks():
+    names = [bm.name for bm in get_benchmarks()]
+    for name in ('searchlight', 'gnbsearchlight', 'crossval_smlr',
+                 'crossval_knn', 'mcnulldist', 'h5save', 'h5load',
+                 'fmri_dataset', 'vstack', 'zscore', 'voxel_selection',
+                 'hyperalignment', 'suite_import'):
+        assert_true(name in names)
+    assert_equal([bm.name for bm in get_benchmarks(['crossval_s*'])],
+                 ['crossval_smlr', 'crossval_svm'])
+
+
+@with_tempfile('.json')
+def test_run_benchmarks(fname):
+    results = run_benchmarks(['vstack', 'zscore'], quick=True, repeat=1,
+                             params=dict(nfeatures=[10]))
+    assert_equal([r['name'] for r in results['results']],
+                 ['vstack', 'zscore'])
+    assert_equal(results['results'][0]['params'],
+                 dict(nfeatures=10, ndatasets=10))
+    assert_true('numpy' in results['environment'])
+    save_results(results, fname)
+    loaded = load_results(fname)
+    comparison = compare_results(loaded, results)
+    assert_equal(len(comparison), 2)
+    assert_equal(comparison[0][:2], ('vstack', 'ndatasets=10,nfeatures=10'))
+    assert_array_almost_equal([c[-1] for c in comparison], [1, 1])
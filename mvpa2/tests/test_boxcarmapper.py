@@ -169,3 +169,36 @@ def test_datasetmapping():
     # feature axis should match
     assert_equal(ds.shape[1:], bflatrev.shape[1:])
 
+
+
+def test_boxcar_view():
+    data = np.arange(120).reshape(20, 3, 2)
+    ds = Dataset(data, sa={'time': np.arange(20)}, fa={'fid': np.arange(3)})
+    for sp, shared in (([0, 4, 8, 12], True),
+                       ([5], True),
+                       ([2, 2, 2], True),
+                       ([0, 3, 11], False),
+                       ([9, 4, 0], False)):
+        bcm = BoxcarMapper(sp, 4, offset=1)
+        bcm.train(data)
+        vbcm = BoxcarMapper(sp, 4, offset=1, view=True)
+        vbcm.train(data)
+        trans = bcm.forward(data)
+        vtrans = vbcm.forward(data)
+        # identical result, with or without a view
+        assert_array_equal(trans, vtrans)
+        assert_array_equal(trans, [data[s + 1:s + 5] for s in sp])
+        assert_false(np.may_share_memory(trans, data))
+        assert_equal(np.may_share_memory(vtrans, data), shared)
+        if shared:
+            # no way to modify the input data through the view
+            assert_false(vtrans.flags.writeable)
+        # same for datasets, including attributes
+        mds = bcm.forward(ds)
+        vmds = vbcm.forward(ds)
+        assert_array_equal(mds.samples, vmds.samples)
+        assert_array_equal(mds.sa.time, vmds.sa.time)
+        assert_array_equal(vmds.fa.fid, [ds.fa.fid] * 4)
+        # and back
+        assert_array_equal(bcm.reverse(mds).samples,
+                           vbcm.reverse(vmds).samples)
@@ -0,0 +1,71 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the PyMVPA package for the
+#   copyright and license terms.
+#
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Unit tests for PyMVPA cmdline searchlight"""
+
+from mvpa2.testing import *
+skip_if_no_external('h5py')
+
+import argparse
+import numpy as np
+from os.path import join as pjoin
+
+from mvpa2.base.hdf5 import h5save
+from mvpa2.datasets import Dataset
+from mvpa2.misc.data_generators import normal_feature_dataset
+from mvpa2.cmdline import cmd_searchlight, cmd_searchlight_merge
+
+
+def _run_cmd(cmd, args):
+    parser = argparse.ArgumentParser()
+    cmd.setup_parser(parser)
+    return cmd.run(parser.parse_args(args))
+
+
+@with_tempfile()
+def test_split_searchlight(tmpdir):
+    ds = normal_feature_dataset(perlabel=10, nlabels=2, nfeatures=60,
+                                nchunks=5)
+    ds = Dataset.from_wizard(ds.samples.reshape(len(ds), 4, 5, 3),
+                             mask=np.ones((4, 5, 3), dtype=bool),
+                             targets=ds.targets, chunks=ds.chunks,
+                             space='voxel_indices')
+    ds.fa['roi'] = np.arange(ds.nfeatures) % 3 != 1
+    dsfn = pjoin(tmpdir, 'ds.hdf5')
+    h5save(dsfn, ds, mkdir=True)
+    slargs = ['-i', dsfn, '--payload', 'cv', '--neighbors', '1',
+              '--cv-learner', 'GNB(common_variance=True)',
+              '--cv-partitioner', 'oddeven:chunks']
+    for roiargs in ([], ['--roi-attr', 'roi']):
+        full = _run_cmd(cmd_searchlight,
+                        slargs + roiargs + ['-o', pjoin(tmpdir, 'full')])
+        parts = [_run_cmd(cmd_searchlight,
+                          slargs + roiargs + ['--split', '%i/3' % k,
+                                              '-o', pjoin(tmpdir, 'p%i' % k)])
+                 for k in (1, 2, 3)]
+        # each ROI center is in exactly one shard, in turn
+        assert_true(all(p.nfeatures for p in parts))
+        assert_array_equal(parts[1].fa.center_ids,
+                           full.fa.center_ids[1::3])
+        assert_equal(sorted(np.hstack([p.fa.center_ids for p in parts])),
+                     list(full.fa.center_ids))
+        # any order of the partial results
+        merged = _run_cmd(cmd_searchlight_merge,
+                          ['-i'] + [pjoin(tmpdir, 'p%i.hdf5' % k)
+                                    for k in (3, 1, 2)]
+                          + ['-o', pjoin(tmpdir, 'merged')])
+        assert_datasets_equal(merged, full)
+        assert_equal(merged.a.keys(), ['mapper'])
+        assert_equal(repr(merged.a.mapper), repr(full.a.mapper))
+        # all shards are needed
+        assert_raises(ValueError, cmd_searchlight._merge_split_results,
+                      parts[:2])
+        assert_raises(ValueError, cmd_searchlight._merge_split_results,
+                      parts + parts[:1])
+        assert_raises(ValueError, cmd_searchlight._merge_split_results,
+                      [full])
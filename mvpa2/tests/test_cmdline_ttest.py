@@ -91,3 +91,43 @@ class TestCmdlineTtest(unittest.TestCase):
             for mask in self.maskfn:
                 for outfn in self.outfn:
                     self.run_ttest(data, outfn, stat, alternative, mask)
+
+
+@reseed_rng()
+@with_tempfile()
+def test_cmdline_ttest_streaming(tempfile):
+    class FakeArg(object):
+        chance_level = 0.5
+        alternative = 'greater'
+        stat = 't'
+        mask = ''
+        isample = 1
+        permutations = 0
+        nproc = 2
+
+    data = np.random.normal(0.6, 0.1, size=(5, 2, 10))
+    data[:, :, :2] = 0
+    data[:2, 1, 3] = np.nan
+    args = FakeArg()
+    args.data = []
+    for i, d in enumerate(data):
+        fn = '%s_%i.hdf5' % (tempfile, i)
+        h5save(fn, Dataset(d))
+        args.data.append(fn)
+    args.output = tempfile + '_out.hdf5'
+    t = run(args)
+    assert_equal(t.shape, (1, 10))
+    expected = ttest_1samp(data[:, 1], popmean=0.5, alternative='greater',
+                           mask=~np.isnan(data[:, 1]))[0]
+    # no values -> out of mask
+    expected[:2] = 0
+    assert_array_almost_equal(t.samples[0], expected)
+    # permutation-based p-values
+    args.permutations = 20
+    args.stat = 'p'
+    p = run(args)
+    assert_array_equal(p.samples[0, :2], 0)
+    assert_true(np.all(p.samples[0, 2:] >= 1. / 21))
+    # 5 observations allow for 32 distinct sign flips, hence only few
+    # permutations should yield a larger t
+    assert_true(np.all(p.samples[0, [2, 4, 5, 6, 7, 8, 9]] < 0.2))
@@ -0,0 +1,94 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the PyMVPA package for the
+#   copyright and license terms.
+#
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Unit tests for the cache of preprocessed datasets"""
+
+import os
+from os.path import join as pathjoin
+
+import numpy as np
+
+from mvpa2.testing import *
+from mvpa2.testing.datasets import datasets
+
+from mvpa2.datasets.base import Dataset, preprocessed_dataset
+from mvpa2.datasets.cache import DatasetCache
+from mvpa2.mappers.zscore import ZScoreMapper
+
+
+_ncalls = []
+
+
+def _load_txt(fname):
+    _ncalls.append(fname)
+    return np.loadtxt(fname)
+
+
+@sweepargs(backend=('hdf5', 'npy'))
+@with_tempfile()
+def test_dataset_cache(tempdir, backend):
+    os.makedirs(tempdir)
+    if backend == 'hdf5':
+        skip_if_no_external('h5py')
+    src = pathjoin(tempdir, 'data.txt')
+    np.savetxt(src, np.random.normal(size=(6, 3)))
+    cachedir = pathjoin(tempdir, 'cache')
+    cache = DatasetCache(cachedir, backend=backend)
+    del _ncalls[:]
+
+    def load(**kwargs):
+        return preprocessed_dataset(src, _load_txt, Dataset,
+                                    preproc_ds=ZScoreMapper(chunks_attr=None,
+                                                            auto_train=True),
+                                    add_sa=dict(targets=range(6)),
+                                    cache=cache, **kwargs)
+    ds = load()
+    assert_equal(len(_ncalls), 1)
+    ds_ = load()
+    # nothing was loaded again
+    assert_equal(len(_ncalls), 1)
+    assert_array_almost_equal(ds.samples, ds_.samples)
+    assert_array_equal(ds_.sa.targets, range(6))
+    # in-place modification does not alter the cache
+    ds_.samples[:] = 0
+    assert_array_almost_equal(load().samples, ds.samples)
+    assert_equal(len(_ncalls), 1)
+
+    # changed arguments -> miss
+    load(fa=dict(fid=range(3)))
+    assert_equal(len(_ncalls), 2)
+    # changed content of the source file -> miss
+    np.savetxt(src, np.random.normal(size=(6, 3)) + 10)
+    os.utime(src, (0, 0))
+    ds__ = load()
+    assert_equal(len(_ncalls), 3)
+    assert_false(np.allclose(ds__.samples, ds.samples))
+
+    # eviction of least recently used entries
+    assert_equal(len(os.listdir(cachedir)), 3 * (1 + (backend == 'npy')))
+    cache.evict(max_size=cache.size - 1)
+    assert_equal(len(os.listdir(cachedir)), 2 * (1 + (backend == 'npy')))
+    load()
+    assert_equal(len(_ncalls), 3)
+    cache.clear()
+    assert_equal(os.listdir(cachedir), [])
+    assert_equal(cache.size, 0)
+
+
+def test_dataset_cache_keys():
+    cache = DatasetCache(os.curdir, backend='npy')
+    zs = ZScoreMapper(chunks_attr=None)
+    key = cache.get_key(preprocessed_dataset, 'x', preproc_ds=zs)
+    # training does not affect the key of a mapper
+    zs.train(datasets['uni2small'])
+    assert_equal(key, cache.get_key(preprocessed_dataset, 'x', preproc_ds=zs))
+    assert_not_equal(
+        key, cache.get_key(preprocessed_dataset, 'x', preproc_ds=ZScoreMapper()))
+    assert_not_equal(
+        key, cache.get_key(preprocessed_dataset, 'y', preproc_ds=zs))
+    assert_raises(ValueError, DatasetCache, os.curdir, backend='bogus')
@@ -21,6 +21,7 @@ from mvpa2.base import cfg
 from mvpa2.base.externals import versions
 from mvpa2.base.types import is_datasetlike
 from mvpa2.base.dataset import DatasetError, vstack, hstack, all_equal, \
+                                DatasetStacker, \
                                 stack_by_unique_feature_attribute, \
                                 stack_by_unique_sample_attribute
 from mvpa2.datasets.base import dataset_wizard, Dataset, HollowSamples
@@ -501,6 +502,55 @@ def test_stack_add_attributes():
                 assert_array_equal(col['ok'].value, COL(data0)['ok'].value)
                 assert_array_equal(col['ok'].value, COL(data1)['ok'].value)
 
+def test_dataset_stacker():
+    def get_datasets(nfeatures=3):
+        dss = []
+        for i in range(5):
+            ds = Dataset(np.random.normal(size=(i + 1, nfeatures)),
+                         sa={'fold': [i] * (i + 1),
+                             # growing string length
+                             'name': ['x' * (i + 1)] * (i + 1)},
+                         fa={'same': np.arange(nfeatures),
+                             'differ': np.arange(nfeatures) + i % 2})
+            ds.a['same'] = np.arange(4)
+            ds.a['differ'] = i % 2
+            if i > 1:
+                ds.a['late'] = 'late'
+            dss.append(ds)
+        return dss
+
+    dss = get_datasets()
+    # stacking features works on the transposed datasets
+    tdss = [Dataset(ds.samples.T, sa=ds.fa.copy(), fa=ds.sa.copy(),
+                    a=ds.a.copy()) for ds in dss]
+    for a in (None, 0, 2, -1, 'drop_nonunique', 'uniques', 'all'):
+        for strategy in ('update', 'drop_nonunique'):
+            for axis, dss_, xstack, kw in (
+                    ('samples', dss, vstack, 'fa'),
+                    ('features', tdss, hstack, 'sa')):
+                stacker = DatasetStacker(axis=axis, a=a, attrs=strategy)
+                for ds in dss_:
+                    stacker.append(ds)
+                assert_equal(len(stacker), len(dss_))
+                assert_datasets_equal(stacker.get(),
+                                      xstack(dss_, a=a, **{kw: strategy}))
+    # non-unique attributes are detected on the fly
+    stacker = DatasetStacker(a='unique')
+    stacker.append(dss[0])
+    assert_raises(DatasetError, stacker.append, dss[1])
+
+    stacker = DatasetStacker()
+    assert_raises(ValueError, stacker.get)
+    stacker.append(dss[0])
+    assert_raises(ValueError, stacker.append, get_datasets(nfeatures=2)[0])
+    # mismatching attributes
+    ds = dss[1].copy()
+    del ds.sa['name']
+    assert_raises(ValueError, stacker.append, ds)
+    stacker.reset()
+    assert_equal(len(stacker), 0)
+
+
 def test_unique_stack():
     data = Dataset(np.reshape(np.arange(24), (4, 6)),
                         sa=dict(x=[0, 1, 0, 1]),
@@ -118,6 +118,40 @@ def test_erdataset():
     assert_equal(evds.shape, (len(evs), 1 * ds.nfeatures))
     assert_equal(np.unique(evds.samples[1]), 68)
 
+def test_boxcar_event_samples_realtime():
+    from mvpa2.datasets.eventrelated import _values2idx
+    from mvpa2.misc.support import value2idx
+    tvec = np.array([0., 1., 1., 2.5, 4., 7.])
+    values = np.array([-1., 0., 0.5, 1., 1.8, 3.25, 7., 9.])
+    for solv in ('floor', 'ceil', 'round'):
+        # matches the scalar implementation, regardless of the order
+        for t in (tvec, tvec[::-1]):
+            assert_array_equal(_values2idx(values, t, solv),
+                               [value2idx(v, t, solv) for v in values])
+    ds = dataset_wizard(np.repeat(np.arange(20), 3).reshape(20, 3),
+                        targets=1, chunks=1)
+    ds.sa['time'] = np.arange(20) * 2.0
+    evs = [dict(onset=3.1, duration=4.0, cond='a'),
+           dict(onset=20., duration=5.0, cond='b')]
+    evds = extract_boxcar_event_samples(ds, evs, time_attr='time',
+                                        match='closest')
+    # the input events are not modified
+    assert_equal(evs[0], dict(onset=3.1, duration=4.0, cond='a'))
+    assert_array_equal(evds.sa.onset, [3.1, 20.])
+    assert_array_equal(evds.sa.orig_onset, [3.1, 20.])
+    assert_array_almost_equal(evds.sa.orig_offset, [-0.9, 0.])
+    assert_array_equal(evds.sa.cond, ['a', 'b'])
+    assert_array_equal(evds.sa.event_onsetidx, [2, 10])
+    # boxlength is the maximum over all events
+    assert_array_equal(evds.samples[:, ::3], [[2, 3, 4], [10, 11, 12]])
+    # views lead to the same result
+    vevds = extract_boxcar_event_samples(ds, evs, time_attr='time',
+                                         match='closest', boxcar_view=True,
+                                         event_mapper=FxMapper('features',
+                                                               np.mean))
+    assert_array_equal(vevds.samples, evds.samples.reshape(2, 3, 3).mean(axis=1))
+
+
 def test_hrf_modeling():
     skip_if_no_external('nibabel')
     skip_if_no_external('nipy') # ATM relies on NiPy's GLM implementation
@@ -85,6 +85,67 @@ class TestExternals(unittest.TestCase):
 
         externals._KNOWN.pop('checker2')
 
+    def test_externals_cache(self):
+        import os
+        import sys
+        import shutil
+        from tempfile import mkdtemp
+
+        tmpdir = mkdtemp()
+        cached_results = externals._cached_results
+        try:
+            externals._cached_results = {}
+            cfg.add_section('externals')
+            cfg.set('externals', 'cache dir', tmpdir)
+            self.assertTrue(externals.get_cache_filename('externals')
+                            .startswith(tmpdir))
+            # results of checks are not stored unless enabled
+            externals.exists('numpy', force=True)
+            self.assertEqual(os.listdir(tmpdir), [])
+
+            cfg.set('externals', 'cache', 'yes')
+            externals._cached_results = {}
+
+            # results are stored for other sessions
+            externals.exists('numpy', force=True)
+            externals.exists('running ipython env', force=True)
+            externals.exists('liblapack.so', force=True)
+            self.assertEqual(externals._load_cache('externals'),
+                             {'numpy': True})
+
+            # ... which just use them
+            cfg.remove_section('externals')
+            cfg.add_section('externals')
+            cfg.set('externals', 'cache', 'yes')
+            externals._use_cached_results({'numpy': True,
+                                           'running ipython env': True})
+            self.assertTrue(cfg.getboolean('externals', 'have numpy'))
+            self.assertFalse(cfg.has_option('externals',
+                                            'have running ipython env'))
+
+            # but not if the environment changed
+            cfg.set('externals', 'cache dir', tmpdir)
+            externals._save_cache('test', [1, 2])
+            self.assertEqual(externals._load_cache('test'), [1, 2])
+            sys.path.append(tmpdir)
+            try:
+                self.assertEqual(externals._load_cache('test'), None)
+            finally:
+                sys.path.remove(tmpdir)
+            ld_path = os.environ.get('LD_LIBRARY_PATH')
+            os.environ['LD_LIBRARY_PATH'] = tmpdir
+            try:
+                self.assertEqual(externals._load_cache('test'), None)
+            finally:
+                if ld_path is None:
+                    del os.environ['LD_LIBRARY_PATH']
+                else:
+                    os.environ['LD_LIBRARY_PATH'] = ld_path
+            self.assertEqual(externals._load_cache('test'), [1, 2])
+        finally:
+            externals._cached_results = cached_results
+            shutil.rmtree(tmpdir)
+
     def test_absent_external_version(self):
         # should not blow, just return None
         if externals.exists('shogun'):
@@ -15,7 +15,8 @@ skip_if_no_external('scipy')
 import numpy as np
 
 from mvpa2.datasets import Dataset, vstack
-from mvpa2.mappers.filters import FFTResampleMapper, iir_filter
+from mvpa2.mappers.filters import FFTResampleMapper, IIRFilterMapper, \
+        iir_filter
 
 def test_resample():
     time = np.linspace(0, 2*np.pi, 100)
@@ -76,3 +77,76 @@ def test_iirfilter():
     assert_equal(len(ds.fa), len(mds.fa))
     assert_array_equal(ds.fa.fid, mds.fa.fid)
     assert_array_equal(ds.sa.sid, mds.sa.sid)
+
+
+def test_resample_blocks():
+    time = np.linspace(0, 2*np.pi, 100)
+    samples = np.vstack([np.sin(time * i) for i in xrange(1, 12)]).T
+    ds = Dataset(samples, sa={'time': time})
+    rds = FFTResampleMapper(10, position_attr='time').forward(ds)
+    for kwargs in (dict(block_size=3), dict(nproc=2),
+                   dict(block_size=4, nproc=3)):
+        bds = FFTResampleMapper(10, position_attr='time', **kwargs).forward(ds)
+        assert_array_almost_equal(rds.samples, bds.samples)
+        assert_array_almost_equal(rds.sa.time, bds.sa.time)
+    # float32 is preserved with blocks
+    bds = FFTResampleMapper(10, block_size=5).forward(
+        Dataset(samples.astype('float32')))
+    assert_equal(bds.samples.dtype, np.float32)
+    assert_array_almost_equal(rds.samples, bds.samples, decimal=5)
+
+
+def test_iirfilter_blocks():
+    from scipy import signal
+    samples = np.random.randn(500, 11)
+    b, a = signal.butter(4, 0.2)
+    ref = IIRFilterMapper(b, a).forward(samples)
+    for kwargs in (dict(block_size=3), dict(nproc=2),
+                   dict(block_size=4, nproc=3)):
+        assert_array_almost_equal(
+            ref, IIRFilterMapper(b, a, **kwargs).forward(samples))
+    # in-place, float32 preserving
+    fsamples = samples.astype('float32')
+    filtered = IIRFilterMapper(b, a, inplace=True, block_size=5).forward(
+        fsamples)
+    assert_true(filtered is fsamples)
+    assert_array_almost_equal(ref, fsamples, decimal=4)
+    # but never in-place for integer data
+    isamples = (samples * 100).astype(int)
+    filtered = IIRFilterMapper(b, a, inplace=True).forward(isamples)
+    assert_equal(filtered.dtype, np.float64)
+    # only along samples
+    assert_raises(ValueError,
+                  IIRFilterMapper(b, a, axis=1, block_size=2).forward, samples)
+    # need a proper filter specification
+    assert_raises(ValueError, IIRFilterMapper, b)
+    if externals.versions['scipy'] < '0.18':
+        return
+    sos = signal.butter(4, 0.2, output='sos')
+    assert_raises(ValueError, IIRFilterMapper, b, a, sos=sos)
+    assert_array_almost_equal(
+        IIRFilterMapper(sos=sos, block_size=3, nproc=2).forward(samples),
+        signal.sosfiltfilt(sos, samples, axis=0))
+    # zero-phase filters of both kinds agree
+    assert_array_almost_equal(
+        IIRFilterMapper(sos=sos, padlen=100).forward(samples)[50:-50],
+        IIRFilterMapper(b, a, padlen=100).forward(samples)[50:-50],
+        decimal=3)
+
+
+def test_filters_old_state():
+    # instances stored by earlier versions know nothing about blocks
+    from scipy import signal
+    samples = np.random.randn(100, 3)
+    rm = FFTResampleMapper(10)
+    ref = rm.forward(samples)
+    del rm._FFTResampleMapper__block_size
+    del rm._FFTResampleMapper__nproc
+    assert_array_almost_equal(ref, rm.forward(samples))
+    b, a = signal.butter(4, 0.2)
+    fm = IIRFilterMapper(b, a)
+    ref = fm.forward(samples)
+    for k in ('block_size', 'nproc', 'inplace'):
+        del fm.params[k]
+    del fm._IIRFilterMapper__sos
+    assert_array_almost_equal(ref, fm.forward(samples))
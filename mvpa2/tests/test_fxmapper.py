@@ -14,6 +14,7 @@ from mvpa2.measures.anova import OneWayAnova
 
 import numpy as np
 from mvpa2.mappers.fx import *
+from mvpa2.mappers.fx import _uniquemerge2literal
 from mvpa2.datasets.base import dataset_wizard, Dataset
 
 from mvpa2.testing.tools import *
@@ -236,8 +237,60 @@ def test_fx_native_calls(f):
             assert_array_equal(dsm1.fa.nonbogus_targets, dsm2.fa.nonbogus_targets)
 
 
+def _last(x):
+    return x[-1]
+
+
+@sweepargs(fx=(np.mean, np.sum, np.max, np.min, np.std, np.median, _last))
+def test_grouped_reducers(fx):
+    # vectorized group-wise reductions must match applying fx to each group
+    if fx is _last:
+        # arbitrary functions are applied via apply_along_axis
+        reffx = lambda x, axis: np.take(x, -1, axis=axis)
+    else:
+        reffx = fx
+    rng = np.random.RandomState(4)
+    nsamples = 60
+    for samples in (rng.normal(size=(nsamples, 4)).astype('float32'),
+                    rng.randint(0, 10, size=(nsamples, 4))):
+        ds = Dataset(samples,
+                     sa={'targets': rng.choice(['a', 'bb', 'c'], nsamples),
+                         # leave out some combinations
+                         'chunks': rng.randint(0, 6, nsamples),
+                         'onsets': np.arange(nsamples)},
+                     fa={'roi': [1, 0, 1, 2]})
+        ds.init_origids('samples')
+        for order in ('uattrs', 'occurrence'):
+            for axis, uattrs in (('samples', ['targets', 'chunks']),
+                                 ('features', ['roi'])):
+                mds = FxMapper(axis, fx, uattrs=uattrs, order=order)(ds)
+                groups = []
+                for ids in set(zip(*[ds.get_attr(a)[0].value
+                                     for a in uattrs])):
+                    selector = np.logical_and.reduce(
+                        [ds.get_attr(a)[0].value == v
+                         for a, v in zip(uattrs, ids)])
+                    groups.append((np.flatnonzero(selector)[0]
+                                   if order == 'occurrence' else ids[::-1],
+                                   selector))
+                groups = [sel for key, sel in sorted(groups)]
+                if axis == 'samples':
+                    target = [reffx(ds.samples[g], axis=0) for g in groups]
+                    col, mcol = ds.sa, mds.sa
+                else:
+                    target = np.transpose([reffx(ds.samples[:, g], axis=1)
+                                           for g in groups])
+                    col, mcol = ds.fa, mds.fa
+                assert_equal(mds.samples.dtype, np.asanyarray(target).dtype)
+                assert_array_almost_equal(mds.samples, target, decimal=5)
+                for attr in col:
+                    assert_array_equal(
+                        mcol[attr].value,
+                        [_uniquemerge2literal(col[attr].value[g])[0]
+                         for g in groups])
+
+
 def test_uniquemerge2literal():
-    from mvpa2.mappers.fx import _uniquemerge2literal
     assert_equal(_uniquemerge2literal(range(3)), ['0+1+2'])
     assert_equal(_uniquemerge2literal(
         np.arange(6).reshape(2, 3)), ['[0 1 2]+[3 4 5]'])
@@ -472,6 +472,72 @@ def test_permute_chunks():
     assert_raises(ValueError, permutation, ds)
 
 
+@reseed_rng()
+def test_attrpermute_indices():
+    ds = give_data()
+    ds.sa['ids'] = range(len(ds))
+    ds.fa['ids'] = range(ds.nfeatures)
+
+    permutation = AttributePermutator('ids', count=20, assure=True)
+    idx = permutation.generate_indices(ds)
+    assert_equal(idx.shape, (20, len(ds)))
+    assert_equal(idx.dtype, np.int32)
+    for row in idx:
+        assert_array_equal(np.sort(row), ds.sa.ids)
+        assert_false(np.all(row == ds.sa.ids))
+    # seeded generation is reproducible
+    permutation = AttributePermutator('ids', count=5, rng=1)
+    assert_array_equal(permutation.generate_indices(ds),
+                       permutation.generate_indices(ds))
+    assert_equal(permutation.generate_indices(ds, count=3).shape,
+                 (3, len(ds)))
+    # feature attributes
+    idx = AttributePermutator('fa.ids').generate_indices(ds, 4)
+    assert_equal(idx.shape, (4, ds.nfeatures))
+
+    # chunk-wise
+    idx = AttributePermutator('ids', limit='chunks').generate_indices(ds, 10)
+    for row in idx:
+        assert_array_equal(ds.chunks[row], ds.chunks)
+    # only a single chunk
+    idx = AttributePermutator('ids', limit={'chunks': 3}).generate_indices(
+        ds, 10)
+    assert_array_equal(idx[:, :30], np.tile(range(30), (10, 1)))
+    assert_array_equal(idx[:, 40:], np.tile(range(40, len(ds)), (10, 1)))
+    assert_true(np.all((idx[:, 30:40] >= 30) & (idx[:, 30:40] < 40)))
+    # implausible assure
+    permutation = AttributePermutator('targets', limit='ids', assure=True)
+    assert_raises(RuntimeError, permutation.generate_indices, ds, 2)
+
+    # uattrs -- unique remappings of targets within each chunk
+    idx = AttributePermutator('targets', limit='chunks', strategy='uattrs',
+                              assure=True).generate_indices(ds, 10)
+    for row in idx:
+        assert_array_equal(ds.chunks[row], ds.chunks)
+        ptargets = ds.targets[row]
+        assert_false(np.all(ptargets == ds.targets))
+        for c in ds.UC:
+            chunk_idx = ds.C == c
+            assert_equal(len(set(zip(ds.targets[chunk_idx],
+                                     ptargets[chunk_idx]))),
+                         len(set(ds.targets[chunk_idx])))
+
+    # whole chunks get swapped
+    ds.sa['targets'] = range(len(ds))
+    idx = AttributePermutator('targets', chunk_attr='chunks',
+                              strategy='chunks').generate_indices(ds, 10)
+    for row in idx:
+        assert_array_equal(np.sort(row), range(len(ds)))
+        for c in ds.UC:
+            chunk_idx = ds.C == c
+            assert_equal(len(np.unique(ds.chunks[row[chunk_idx]])), 1)
+            assert_array_equal(np.diff(row[chunk_idx]), 1)
+    assert_raises(ValueError, AttributePermutator('targets', strategy='chunks')
+                  .generate_indices, ds)
+    assert_raises(ValueError, AttributePermutator('targets', strategy='bogus')
+                  .generate_indices, ds)
+
+
 def test_factorialpartitioner():
     # Test against sifter and chainmap implemented in test_usecases
     # -- code below copied from test_usecases --
@@ -54,7 +54,7 @@ def test_glm_mapper():
     assert_equal(bold.nfeatures, 2)
     assert('model' in bold.sa)
     reg_names = ['model']
-    implementations = []
+    implementations = [OLSGLMMapper]
     if externals.exists('nipy'):
         implementations.append(NiPyGLMMapper)
     if externals.exists('statsmodels'):
@@ -102,3 +102,149 @@ def test_glm_mapper():
     # should really have very similar results, independent of actual model fit details
     assert(np.corrcoef(ds1.samples.ravel(), ds2.samples.ravel())[0,1] > 0.99)
 
+
+
+def test_ols_glm_mapper():
+    bold = get_bold()
+    trend = np.linspace(-1, 1, len(bold))
+    X = np.vstack((bold.sa.model, trend, np.ones(len(bold)))).T
+    beta = np.linalg.lstsq(X, bold.samples, rcond=-1)[0]
+    resid = bold.samples - np.dot(X, beta)
+    mse = (resid ** 2).sum(axis=0) / (len(X) - X.shape[1])
+    cov = np.linalg.inv(np.dot(X.T, X))
+    kwargs = dict(add_regs=(('trend', trend),), add_constant=True,
+                  block_size=1)
+    pest = OLSGLMMapper(['model'], return_model=True, **kwargs)(bold)
+    assert_array_almost_equal(pest.samples, beta)
+    assert_array_almost_equal(pest.a.model.get_mse(), mse)
+    # t-statistics
+    tstat = OLSGLMMapper(['model'], stat='t', **kwargs)(bold)
+    assert_array_almost_equal(
+        tstat.samples, beta / np.sqrt(np.diag(cov)[:, None] * mse))
+    # only the first feature contains signal
+    assert_true(tstat.samples[0, 0] > 5)
+    # contrasts, with weights either for all regressors or by name
+    con = OLSGLMMapper(['model'], stat='t',
+                       contrasts=[('model', {'model': 1}),
+                                  ('model-trend', [1, -1, 0])],
+                       **kwargs)(bold)
+    assert_array_equal(con.sa.regressor_names, ['model', 'model-trend'])
+    assert_array_almost_equal(con.samples[0], tstat.samples[0])
+    effect = OLSGLMMapper(['model'], contrasts={'model-trend': [1, -1, 0]},
+                          **kwargs)(bold)
+    assert_array_almost_equal(effect.samples[0], beta[0] - beta[1])
+    assert_raises(ValueError, OLSGLMMapper(['model'],
+                                           contrasts={'c': {'bogus': 1}}),
+                  bold)
+    # AR(1) model yields estimates from prewhitened data
+    ar1 = OLSGLMMapper(['model'], noise_model='ar1', return_model=True,
+                       **kwargs)(bold)
+    for i, rho in enumerate(ar1.a.model.rho):
+        w = np.array([np.sqrt(1 - rho ** 2)] + [1] * (len(X) - 1))
+        Xw = X.copy()
+        Xw[1:] -= rho * X[:-1]
+        yw = bold.samples[:, i].copy()
+        yw[1:] -= rho * bold.samples[:-1, i]
+        assert_array_almost_equal(
+            ar1.samples[:, i],
+            np.linalg.lstsq(Xw * w[:, None], yw * w, rcond=-1)[0])
+
+
+def test_ols_glm_mapper_lss():
+    # many trials and fewer samples than a model with all of them needs
+    ntrials, nsamples = 30, 50
+    onsets = np.linspace(0, nsamples - 5, ntrials).astype(int)
+    trials = np.zeros((nsamples, ntrials))
+    for i, onset in enumerate(onsets):
+        trials[onset:onset + 3, i] = [.5, 1, .5]
+    trial_names = ['trial%02i' % i for i in xrange(ntrials)]
+    ds = Dataset(np.random.randn(nsamples, 4),
+                 sa=dict(zip(trial_names, trials.T)))
+    groups = np.arange(ntrials) % 3
+    for lss_groups in (None, groups):
+        lss = OLSGLMMapper(trial_names, add_constant=True, lss=trial_names,
+                           lss_groups=lss_groups, block_size=3)(ds)
+        assert_equal(lss.shape, (ntrials, ds.nfeatures))
+        assert_array_equal(lss.sa.regressor_names, trial_names)
+        if lss_groups is None:
+            lss_groups = np.zeros(ntrials)
+        # compare with a separate model fit for each trial
+        for i in xrange(ntrials):
+            others = [trials[:, (lss_groups == g) & (np.arange(ntrials) != i)]
+                      .sum(axis=1) for g in np.unique(lss_groups)]
+            X = np.vstack([trials[:, i]] + others + [np.ones(nsamples)]).T
+            assert_array_almost_equal(
+                lss.samples[i],
+                np.linalg.lstsq(X, ds.samples, rcond=-1)[0][0])
+    # with an AR(1) noise model, each separate model is fit to prewhitened
+    # design and data
+    lss = OLSGLMMapper(trial_names, add_constant=True, lss=trial_names,
+                       noise_model='ar1', return_model=True)(ds)
+    for j, rho in enumerate(lss.a.model.rho):
+        w = np.array([np.sqrt(1 - rho ** 2)] + [1] * (nsamples - 1))
+        yw = ds.samples[:, j].copy()
+        yw[1:] -= rho * ds.samples[:-1, j]
+        for i in xrange(ntrials):
+            others = trials[:, np.arange(ntrials) != i].sum(axis=1)
+            X = np.vstack((trials[:, i], others, np.ones(nsamples))).T
+            Xw = X.copy()
+            Xw[1:] -= rho * X[:-1]
+            assert_array_almost_equal(
+                lss.samples[i, j],
+                np.linalg.lstsq(Xw * w[:, None], yw * w, rcond=-1)[0][0])
+    # only for parameter estimates
+    assert_raises(ValueError,
+                  OLSGLMMapper(trial_names, lss=trial_names, stat='t'), ds)
+    assert_raises(ValueError,
+                  OLSGLMMapper(trial_names, lss=['bogus']), ds)
+
+
+def test_fit_event_hrf_model_ols():
+    skip_if_no_external('nipy')
+    from mvpa2.datasets.eventrelated import fit_event_hrf_model
+
+    ds = Dataset(np.random.randn(60, 4),
+                 sa=dict(time_coords=np.arange(60) * 2.))
+    events = [dict(onset=onset, duration=2., targets=targets, trial=i)
+              for i, (onset, targets) in enumerate(zip(range(4, 100, 8),
+                                                       ['a', 'b'] * 6))]
+    kwargs = dict(time_attr='time_coords',
+                  design_kwargs=dict(drift_model='blank'), glm_backend='ols')
+    for noise_model in ('ols', 'ar1'):
+        # full model with one regressor per trial
+        full = fit_event_hrf_model(ds, events, condition_attr='trial',
+                                   glmfit_kwargs=dict(model=noise_model),
+                                   return_model=True, **kwargs)
+        assert_equal(sorted(full.sa.trial), range(len(events)))
+        design = zip(['glm_label_%i' % i for i in full.sa.trial],
+                     full.sa.regressors) \
+                 + zip(full.a.add_regs.sa.regressor_names,
+                       full.a.add_regs.sa.regressors)
+        # single-trial estimates of separate models, with trials referred
+        # to by their label
+        lss = fit_event_hrf_model(ds, events, condition_attr='trial',
+                                  glmfit_kwargs=dict(
+                                      model=noise_model,
+                                      lss=range(len(events))),
+                                  return_model=True, **kwargs)
+        assert_equal(lss.shape, (len(events), ds.nfeatures))
+        assert_equal(list(lss.sa.trial), range(len(events)))
+        assert_false('regressors' in lss.sa)
+        assert_array_equal(lss.a.model.rho, full.a.model.rho)
+        expected = OLSGLMMapper([], add_regs=design,
+                                lss=['glm_label_%i' % i
+                                     for i in xrange(len(events))],
+                                noise_model=noise_model)(ds)
+        assert_array_almost_equal(lss.samples, expected.samples)
+
+    # contrasts between conditions, referred to by their label
+    cons = fit_event_hrf_model(ds, events, condition_attr='targets',
+                               glmfit_kwargs=dict(
+                                   contrasts={'a-b': {'a': 1, 'b': -1}}),
+                               **kwargs)
+    assert_array_equal(cons.sa.contrasts, ['a-b'])
+    betas = fit_event_hrf_model(ds, events, condition_attr='targets',
+                                **kwargs)
+    assert_array_equal(betas.sa.targets, ['a', 'b'])
+    assert_array_almost_equal(cons.samples[0],
+                              betas.samples[0] - betas.samples[1])
@@ -427,6 +427,69 @@ def test_ca_col(f, backend):
     if backend != 'pickle':
         assert_true(col_.ca1 is col_)
 
+@with_tempfile()
+def test_columnar_dataset_list(f):
+    from mvpa2.datasets.base import Dataset
+    from mvpa2.base.dataset import vstack
+    mapper = BoxcarMapper([0], 1)
+    dss = []
+    for i in xrange(20):
+        ds = Dataset(np.random.normal(size=(i % 3 + 1, 4)).astype(np.float32),
+                     sa=dict(targets=['t%i' % j for j in xrange(i % 3 + 1)]),
+                     fa=dict(center_ids=np.arange(4) + i,
+                             const=np.ones(4)),
+                     a=dict(mapper=mapper, roi_sizes=i))
+        dss.append(ds)
+    # a list containing a dataset twice must not be stored in columnar form
+    # but still load fine
+    for obj, columnar in ((dss, True), (dss + [dss[0]], False)):
+        h5save(f, obj)
+        hdf = h5py.File(f, 'r')
+        assert_equal('is_columnar' in hdf.attrs, columnar)
+        hdf.close()
+        dss_ = h5load(f)
+        assert_equal(len(dss_), len(obj))
+        for ds, ds_ in zip(obj, dss_):
+            assert_equal(type(ds_), Dataset)
+            assert_array_equal(ds.samples, ds_.samples)
+            assert_equal(ds.samples.dtype, ds_.samples.dtype)
+            assert_array_equal(ds.sa.targets, ds_.sa.targets)
+            assert_array_equal(ds.fa.center_ids, ds_.fa.center_ids)
+            assert_array_equal(ds.fa.const, ds_.fa.const)
+            assert_equal(ds.a.roi_sizes, ds_.a.roi_sizes)
+            assert_equal(type(ds_.a.roi_sizes), int)
+        # the shared mapper is reconstructed only once
+        ok_(dss_[0].a.mapper is dss_[1].a.mapper)
+        if not columnar:
+            ok_(dss_[0] is dss_[-1])
+
+    # loading as a single stacked dataset
+    h5save(f, dss)
+    stacked = h5load(f, stacked=True)
+    vstacked = vstack(dss)
+    assert_array_equal(stacked.samples, vstacked.samples)
+    assert_array_equal(stacked.sa.targets, vstacked.sa.targets)
+    assert_equal(sorted(stacked.fa.keys()), ['const'])
+    assert_equal(sorted(stacked.fa.keys()), sorted(vstacked.fa.keys()))
+
+    # heterogeneous lists are stored item by item
+    h5save(f, [dss[0], dss[1][:, :2]])
+    hdf = h5py.File(f, 'r')
+    ok_(not 'is_columnar' in hdf.attrs)
+    hdf.close()
+    assert_equal(h5load(f)[1].nfeatures, 2)
+
+    # datasets referenced again after the columnar list are stored only once
+    h5save(f, [dss, dss[3], {'first': dss[0]}])
+    hdf = h5py.File(f, 'r')
+    ok_('is_columnar' in hdf['items']['0'].attrs)
+    # just a reference
+    ok_(not '1' in hdf['items'])
+    hdf.close()
+    dss_, ds3_, d_ = h5load(f)
+    ok_(ds3_ is dss_[3])
+    ok_(d_['first'] is dss_[0])
+
 # regression tests for datasets which have been previously saved
 
 def test_reg_load_hyperalignment_example_hdf5():
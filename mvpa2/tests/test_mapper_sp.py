@@ -122,3 +122,39 @@ def test_polydetrend():
     # but if done inplace that is no longer true
     poly_detrend(ds, chunks_attr='chunks', polyord=1, space='time')
     assert_array_equal(ds, mds)
+
+
+def test_polydetrend_cached_design():
+    from mvpa2.mappers import detrend
+    rng = np.random.RandomState(3)
+    # interleaved chunks of different length and with additional regressor
+    chunks = np.array([0, 1, 2] * 8 + [0] * 4)
+    ds = Dataset(rng.normal(size=(len(chunks), 7)),
+                 sa={'chunks': chunks, 'motion': rng.normal(size=len(chunks))})
+    for kwargs in (dict(polyord=2),
+                   dict(chunks_attr='chunks', polyord=[1, 2, 0]),
+                   dict(chunks_attr='chunks', polyord=1, opt_regs=['motion'])):
+        dm = PolyDetrendMapper(**kwargs)
+        mds = dm.forward(ds)
+        regs = dm._regs
+        target = ds.samples - np.dot(regs, np.linalg.lstsq(regs, ds.samples,
+                                                           rcond=-1)[0])
+        assert_array_almost_equal(mds.samples, target)
+
+    # factorization of chunks with identical structure is shared across
+    # datasets, e.g. runs of the same length for different subjects
+    ds1 = dataset_wizard(rng.normal(size=(20, 3)), chunks=np.repeat([0, 1], 10))
+    ds2 = dataset_wizard(rng.normal(size=(10, 5)), chunks=[3] * 10)
+    dm1 = PolyDetrendMapper(chunks_attr='chunks', polyord=2)
+    dm1.train(ds1)
+    dm2 = PolyDetrendMapper(chunks_attr='chunks', polyord=2)
+    dm2.train(ds2)
+    ok_(dm1._design[0][2] is dm1._design[1][2])
+    ok_(dm1._design[0][2] is dm2._design[0][2])
+    assert_array_almost_equal(dm2.forward(ds2).samples.sum(axis=0), 0)
+
+    # mappers trained by earlier versions do not store the design
+    dm = PolyDetrendMapper(chunks_attr='chunks', polyord=1, opt_regs=['motion'])
+    target = dm.forward(ds).samples
+    del dm._design
+    assert_array_almost_equal(dm.forward(ds).samples, target)
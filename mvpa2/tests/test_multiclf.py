@@ -25,6 +25,8 @@ from mvpa2.generators.splitters import Splitter
 from mvpa2.clfs.meta import CombinedClassifier, \
      BinaryClassifier, MulticlassClassifier, \
      MaximalVote
+from mvpa2.clfs.gnb import GNB
+from mvpa2.clfs.knn import kNN
 from mvpa2.measures.base import TransferMeasure, CrossValidation
 from mvpa2.mappers.fx import mean_sample, BinaryFxNode
 from mvpa2.misc.errorfx import mean_mismatch_error
@@ -216,3 +218,56 @@ def test_multiclass_without_combiner():
             assert_array_equal(cm.stats['P'], len(ds))
             # and number of sets should be equal number of chunks here
             assert_equal(len(cm.sets), len(ds.UC))
+
+
+def test_maximal_vote():
+    class _Predictor(object):
+        def __init__(self, predictions):
+            self.ca = GNB().ca
+            self.ca.predictions = predictions
+    mv = MaximalVote(enable_ca=['estimates'])
+    # BinaryClassifier might provide multiple labels for a sample
+    predictions = mv([_Predictor(['b', 'a', 'c', ('a', 'c')]),
+                      _Predictor(['b', 'c', 'c', 'a']),
+                      _Predictor(['a', 'c', ('a', 'b'), 'b'])], None)
+    # ties are resolved by taking the first in sorted order
+    assert_equal(predictions, ['b', 'c', 'c', 'a'])
+    assert_equal(mv.ca.estimates, [{'a': 1, 'b': 2},
+                                   {'a': 1, 'c': 2},
+                                   {'a': 1, 'b': 1, 'c': 2},
+                                   {'a': 2, 'b': 1, 'c': 1}])
+    # labels of different types are not mixed up
+    assert_equal(mv([_Predictor([1, 1]), _Predictor(['1', '1']),
+                     _Predictor(np.array([1, 2]))], None), [1, 1])
+    # ... and labels are returned as provided by the classifiers
+    for label in (np.int16(3), np.float32(.5), u'a', 3L):
+        predictions = mv([_Predictor([label] * 2)] * 2, None)
+        assert_equal(predictions, [label] * 2)
+        assert_equal([type(p) for p in predictions], [type(label)] * 2)
+        assert_equal([type(l) for l in mv.ca.estimates[0]], [type(label)])
+
+
+def test_multiclass_classifier_nproc():
+    ds = datasets['uni4small']
+    mclf = MulticlassClassifier(GNB(), enable_ca=['raw_predictions'])
+    mclf_p = MulticlassClassifier(GNB(), nproc=3,
+                                  enable_ca=['raw_predictions'])
+    assert_equal(mclf_p.params.nproc, 3)
+    for clf in mclf, mclf_p:
+        clf.train(ds)
+    ok_(all(clf.trained for clf in mclf_p.clfs))
+    assert_equal(mclf_p.predict(ds), mclf.predict(ds))
+    assert_equal(mclf_p.ca.raw_predictions, mclf.ca.raw_predictions)
+
+    # slaves mapping literal targets, and retraining
+    ds = ds.copy()
+    ds.sa.targets = ['L%s' % t for t in ds.targets]
+    results = []
+    for nproc in (1, 3):
+        mclf = MulticlassClassifier(kNN(k=3), nproc=nproc)
+        mclf.train(ds)
+        predictions = mclf.predict(ds)
+        ok_(set(predictions).issubset(ds.sa['targets'].unique))
+        mclf.train(ds[::-1])
+        results.append((predictions, mclf.predict(ds)))
+    assert_equal(results[0], results[1])
@@ -462,3 +462,48 @@ def test_4d_mask():
     bold2 = fmri_dataset(bold, mask=mask4d)
     assert_equal(bold1.shape, bold2.shape)
     assert_raises(ValueError, fmri_dataset, bold, mask=mask4df)
+
+
+def test_fmri_dataset_streaming():
+    import nibabel
+    import mvpa2.datasets.mri as mri
+    bold = pathjoin(pymvpa_dataroot, 'bold.nii.gz')
+    mask = pathjoin(pymvpa_dataroot, 'mask.nii.gz')
+    img = nibabel.load(bold)
+    # reference computed from the fully loaded data
+    data = np.rollaxis(img.get_data(), -1)
+    maskdata = nibabel.load(mask).get_data() != 0
+    ref = data[:, maskdata]
+
+    # force reading in multiple slabs
+    orig_slab_nbytes = mri._SLAB_NBYTES
+    mri._SLAB_NBYTES = int(np.prod(img.shape[:3])) * 8 * 7
+    try:
+        ds = fmri_dataset(bold, mask=mask)
+        assert_array_equal(ds.samples, ref)
+        assert_equal(ds.samples.dtype, ref.dtype)
+        assert_array_equal(ds.fa.voxel_indices, np.transpose(maskdata.nonzero()))
+        ds32 = fmri_dataset(bold, mask=mask, dtype='float32')
+        assert_equal(ds32.samples.dtype, np.float32)
+        assert_array_almost_equal(ds32.samples, ref)
+        # reverse mapping still works
+        assert_equal(map2nifti(ds32).shape, img.shape)
+        # no mask
+        dsfull = fmri_dataset(img)
+        assert_array_equal(dsfull.samples, data.reshape(len(data), -1))
+
+        # multiple runs, loaded in parallel
+        run1 = nibabel.Nifti1Image(img.get_data()[..., :10], img.affine)
+        run2 = nibabel.Nifti1Image(img.get_data()[..., 10:25], img.affine)
+        for nproc in (1, 2):
+            dsruns = fmri_dataset([run1, run2], mask=mask, targets=1,
+                                  runs_as_chunks=True, nproc=nproc)
+            assert_array_equal(dsruns.samples, ref[:25])
+            assert_array_equal(dsruns.sa.chunks, [0] * 10 + [1] * 15)
+            assert_array_equal(dsruns.sa.targets, [1] * 25)
+            assert_array_equal(dsruns.sa.time_indices, np.arange(25))
+    finally:
+        mri._SLAB_NBYTES = orig_slab_nbytes
+    assert_raises(ValueError, fmri_dataset, bold, runs_as_chunks=True)
+    assert_raises(ValueError, fmri_dataset, [bold], chunks=1,
+                  runs_as_chunks=True)
@@ -828,6 +828,45 @@ class SearchlightTests(unittest.TestCase):
         res_gnb_sl_ = gnb_sl_(ds)
         assert_datasets_equal(res_gnb_sl, res_gnb_sl_)
 
+    def test_collected_results_and_roi_fa(self):
+        ds = datasets['3dsmall'].copy(deep=True)[:, :13]
+        ds.fa['voxel_indices'] = ds.fa.myspace
+        cv = CrossValidation(GNB(), OddEvenPartitioner())
+        measures = [cv,
+                    CrossValidation(GNB(), OddEvenPartitioner(),
+                                    errorfx=None),
+                    lambda x: np.mean(x.samples),
+                    # mixes integer and float results -> falls back
+                    lambda x: x.nfeatures if x.nfeatures % 2 else 0.5,
+                    # multi-dimensional samples -> falls back
+                    lambda x: x.nfeatures * np.ones((2, 1, 3)),
+                    # feature attributes -> falls back
+                    lambda x: Dataset([[1.]], fa={'n': [x.nfeatures]})]
+        for m in measures:
+            # custom postprocessing forces the per-ROI results to be stacked
+            sl_ref = sphere_searchlight(m, radius=1,
+                                        results_postproc_fx=lambda x: x)
+            sl_ref.ca.enable(['roi_sizes', 'roi_feature_ids'])
+            res_ref = sl_ref(ds)
+            for kwargs in ({}, {'roi_fa': []}):
+                sl = sphere_searchlight(m, radius=1, **kwargs)
+                sl.ca.enable(['roi_sizes', 'roi_feature_ids'])
+                res = sl(ds)
+                assert_datasets_equal(res, res_ref)
+                assert_equal(sorted(res.a.keys()), sorted(res_ref.a.keys()))
+                for ca in ('roi_sizes', 'roi_feature_ids', 'roi_center_ids'):
+                    assert_equal(sl.ca[ca].value, sl_ref.ca[ca].value)
+
+        # feature attributes are available in the ROI datasets only if
+        # requested
+        def fa_names(x):
+            return ','.join(sorted(x.fa.keys()))
+        res = sphere_searchlight(fa_names, radius=1, roi_fa='voxel_indices')(ds)
+        assert_array_equal(res.samples, [['voxel_indices'] * ds.nfeatures])
+        res = sphere_searchlight(fa_names, radius=1)(ds)
+        assert_array_equal(res.samples,
+                           [[fa_names(ds)] * ds.nfeatures])
+
 
 def suite():  # pragma: no cover
     return unittest.makeSuite(SearchlightTests)
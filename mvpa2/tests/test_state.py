@@ -16,7 +16,7 @@ import numpy as np
 from mvpa2.base import externals
 
 from mvpa2.base.state import ConditionalAttribute, ClassWithCollections, \
-     ParameterCollection, _def_sep
+     ParameterCollection, ConditionalAttributesCollection, _def_sep
 from mvpa2.base.param import *
 from mvpa2.misc.exceptions import UnknownStateError
 
@@ -332,6 +332,33 @@ class StateTests(unittest.TestCase):
             self.assertEqual(sv.name, sv_dc.name)
             self.assertEqual(sv._instance_index, sv_dc._instance_index)
 
+    def test_deep_copying_collections(self):
+        # instances get deep copies of the class' collections
+        class TestClassMutable(ClassWithCollections):
+            plist = Parameter([1, 2], doc="mutable default")
+            state1 = ConditionalAttribute(enabled=False)
+
+        obj1 = TestClassMutable(enable_ca=['state1'])
+        obj2 = TestClassMutable()
+        obj1.params.plist.append(3)
+        self.assertEqual(obj2.params.plist, [1, 2])
+        self.assertEqual(TestClassMutable().params.plist, [1, 2])
+        self.assertTrue(obj2.params['plist'].is_default)
+        self.assertEqual(obj1.ca.name, 'ca')
+        self.assertTrue(obj1.ca.is_enabled('state1'))
+        self.assertFalse(obj2.ca.is_enabled('state1'))
+
+        obj1.ca.state1 = np.arange(3)
+        obj3 = copy.deepcopy(obj1)
+        self.assertTrue(obj3.ca is not obj1.ca)
+        self.assertTrue(isinstance(obj3.ca, ConditionalAttributesCollection))
+        self.assertEqual(obj3.ca.name, 'ca')
+        self.assertEqual(obj3.params.plist, [1, 2, 3])
+        self.assertTrue(obj3.ca.is_enabled('state1'))
+        obj3.ca.state1[0] = 10
+        self.assertEqual(obj1.ca.state1[0], 0)
+        self.assertEqual(obj3.ca['state1'].__doc__, obj1.ca['state1'].__doc__)
+
 def suite():  # pragma: no cover
     return unittest.makeSuite(StateTests)
 
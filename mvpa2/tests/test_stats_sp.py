@@ -15,7 +15,8 @@ from scipy.stats import f_oneway
 from mvpa2.tests.test_stats import *
 
 from mvpa2.clfs.stats import match_distribution, rv_semifrozen
-from mvpa2.misc.stats import chisquare, binomial_proportion_ci
+from mvpa2.misc.stats import chisquare, binomial_proportion_ci, \
+        ttest_1samp, StreamingTTest1Samp
 from mvpa2.misc.attrmap import AttributeMap
 from mvpa2.generators.permutation import AttributePermutator
 from mvpa2.misc.data_generators import simple_hrf_dataset
@@ -426,6 +427,47 @@ def test_binomial_proportion_ci():
     vec = binomial_proportion_ci(1000, [600,100,900])
     assert_equal(vec.shape, (2, 3))
 
+@reseed_rng()
+def test_streaming_ttest_1samp():
+    data = np.random.normal(0.3, size=(12, 5, 4))
+    # varying number of observations per feature
+    data[:3, 0, 0] = np.nan
+    data[1:, 0, 1] = np.nan
+    data[:, 0, 2] = np.nan
+    mask = ~np.isnan(data)
+    for alternative in ('two-sided', 'greater', 'less'):
+        t, p = ttest_1samp(data, popmean=0.1, mask=mask,
+                           alternative=alternative)
+        for kwargs in (dict(), dict(block_size=3), dict(nproc=3)):
+            tt = StreamingTTest1Samp(popmean=0.1, alternative=alternative,
+                                     nperm=10, seed=1, **kwargs)
+            assert_raises(RuntimeError, tt.ttest)
+            for obs in data:
+                tt.update(obs)
+            assert_equal(tt.nobs, len(data))
+            st, sp = tt.ttest()
+            assert_equal(st.shape, data.shape[1:])
+            assert_array_almost_equal(st, t)
+            assert_array_almost_equal(sp, p)
+            # no test without at least two observations
+            assert_true(np.all(np.isnan(st[0, 1:3])))
+            null = tt.null_dist()
+            assert_equal(null.shape, (10,) + data.shape[1:])
+            pp = tt.perm_prob()
+            assert_true(np.all((pp[mask.sum(axis=0) > 1] > 0)
+                               & (pp[mask.sum(axis=0) > 1] <= 1)))
+            assert_true(np.all(np.isnan(pp[0, 1:3])))
+    # null distribution matches t-tests on sign-flipped data
+    rng = np.random.RandomState(1)
+    signs = np.array([rng.randint(0, 2, 10) * 2. - 1 for obs in data])
+    flipped = (data - 0.1) * signs[:, 3, None, None]
+    assert_array_almost_equal(null[3], ttest_1samp(flipped, mask=mask)[0])
+    # shape mismatch
+    assert_raises(ValueError, tt.update, data[0, 0])
+    assert_raises(ValueError, StreamingTTest1Samp(popmean=[1, 2]).update,
+                  data[0])
+
+
 def suite():  # pragma: no cover
     """Create the suite"""
     return unittest.makeSuite(StatsTestsScipy)
@@ -25,6 +25,70 @@ class SuiteTest(unittest.TestCase):
         except Exception, e: # pragma: no cover - should not be hit if ok_
             self.fail(msg="Cannot import everything from mvpa2.suite: %s" % e)
 
+    def test_suite_lazy(self):
+        # fresh interpreters, with the names of the suite known from the
+        # previous run
+        import os
+        import shutil
+        import subprocess
+        from tempfile import mkdtemp
+
+        heavy = ['mvpa2.clfs.warehouse', 'mvpa2.clfs.gnb',
+                 'mvpa2.measures.searchlight']
+        code = "import mvpa2.suite as mv; import sys; " \
+               "print 'SUITE', type(mv).__name__, " \
+               "any(m in sys.modules for m in %r), " \
+               "mv.Dataset is mv.datasets.base.Dataset, " \
+               "'clfswh' in dir(mv)" % (heavy,)
+
+        def run(**env):
+            env = dict(os.environ, MVPA_EXTERNALS_CACHE_DIR=tmpdir, **env)
+            out = subprocess.Popen([sys.executable, '-c', code], env=env,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE).communicate()[0]
+            # there might be other output (e.g. warnings) as well
+            line = [l for l in out.splitlines() if l.startswith('SUITE ')]
+            kind, loaded, same, listed = line[-1].split()[1:]
+            self.assertEqual((same, listed), ('True', 'True'))
+            return kind, loaded == 'True'
+
+        tmpdir = mkdtemp()
+        try:
+            # first run imports everything
+            self.assertEqual(run(), ('module', True))
+            self.assertEqual(run(MVPA_SUITE_LAZY='no'), ('module', True))
+            # heavy modules are only imported on demand, regardless of
+            # caching of externals tests
+            self.assertEqual(run(), ('_LazySuite', False))
+            self.assertEqual(run(MVPA_EXTERNALS_CACHE='yes'),
+                             ('_LazySuite', False))
+            self.assertEqual(run(MVPA_EXTERNALS_CACHE='no'),
+                             ('_LazySuite', False))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_suite_lazy_externals(self):
+        # names are only provided if their externals are present upon access
+        import mvpa2.suite as mv
+        from mvpa2.base import cfg
+        from mvpa2.base.externals import versions
+        suite = sys.modules['mvpa2.suite']
+        module = getattr(suite, '_module', suite)
+        statements = [s for c, s in module._SUITE_IMPORTS]
+        index = {'pl': ('pylab', None, statements.index('import pylab as pl')),
+                 'Dataset': ('mvpa2.datasets.base', 'Dataset', 0)}
+        lazy = module._LazySuite(module, index)
+        have_pylab = cfg.get('externals', 'have pylab', default=None)
+        cfg.set('externals', 'have pylab', 'no')
+        try:
+            self.assertRaises(AttributeError, getattr, lazy, 'pl')
+            self.assertTrue(lazy.Dataset is mv.Dataset)
+        finally:
+            if have_pylab is None:
+                cfg.remove_option('externals', 'have pylab')
+            else:
+                cfg.set('externals', 'have pylab', have_pylab)
+
     def test_docstrings(self):
         #import mvpa2.suite as mv
         from mvpa2.suite import suite_stats
@@ -143,6 +143,28 @@ class SurfTests(unittest.TestCase):
         for k, v in some_ds.iteritems():
             assert_true(abs(v - ds2[k]) < eps)
 
+        if externals.exists('scipy'):
+            # adjacency has the same edges as the neighbors
+            adj = s.adjacency
+            nbrs = s.neighbors
+            assert_equal(adj.nnz, sum(len(v) for v in nbrs.itervalues()))
+            for i, j in ((0, 2), (52, 53), (100, 101)):
+                assert_almost_equal(adj[i, j], nbrs[i].get(j, 0))
+
+            # distances for many nodes at once
+            srcs = [2, 0, 2, 77, s.nvertices - 1]
+            for maxdistance in (None, 0, .5, 2.):
+                dist = s.dijkstra_distances(srcs, maxdistance)
+                assert_equal(dist.shape, (len(srcs), s.nvertices))
+                for i, src in enumerate(srcs):
+                    n2d = s.dijkstra_distance(src, maxdistance)
+                    row = dist[i]
+                    assert_equal(sorted(row.indices), sorted(n2d))
+                    for k, v in zip(row.indices, row.data):
+                        assert_almost_equal(v, n2d[k])
+            # source itself is stored
+            assert_equal(s.dijkstra_distances([2], 0).nnz, 1)
+
         # test I/O (through ascii files)
         surf.write(temp_fn, s, overwrite=True)
         s2 = surf.read(temp_fn)
@@ -198,6 +220,47 @@ class SurfTests(unittest.TestCase):
         assert_array_equal(s2.nodes_on_border(),
                            np.asarray(is_on_border))
 
+    @reseed_rng()
+    def test_surf_spatial_index(self):
+        if not externals.exists('scipy'):
+            raise SkipTest
+
+        s = surf.generate_sphere(20) * 10
+        v = s.vertices.copy()
+        v[5] = np.nan  # node that is not part of the surface
+        s = surf.Surface(v, s.faces)
+
+        xyz = np.random.normal(size=(50, 3)) * 10
+        ds = np.sum((xyz[:, np.newaxis, :] - v[np.newaxis]) ** 2, 2) ** .5
+        ds[:, 5] = np.inf
+
+        # index is cached
+        si = s.spatial_index
+        assert_true(si is s.spatial_index)
+
+        nearest_ds, nearest_idxs = si.nearest(xyz)
+        assert_array_equal(nearest_idxs, np.argmin(ds, 1))
+        assert_array_almost_equal(nearest_ds, np.min(ds, 1))
+        assert_array_equal(s.nearest_node_index(xyz), np.argmin(ds, 1))
+
+        # only a subset of nodes
+        mask = np.arange(0, s.nvertices, 3)
+        assert_array_equal(s.nearest_node_index(xyz, mask),
+                           mask[np.argmin(ds[:, mask], 1)])
+
+        # nothing nearby
+        _, idxs = si.nearest(xyz, max_distance=1e-8)
+        assert_array_equal(idxs, -1)
+
+        for i, r in enumerate(si.within_radius(xyz, 5.)):
+            assert_array_equal(r, np.nonzero(ds[i] <= 5.)[0])
+
+        # same results as brute force
+        for r in (0., 2., 5., 30.):
+            n2d = s.circlearound_n2d(10, r)
+            assert_equal(set(n2d),
+                         set(np.nonzero(s.euclidean_distance(10) <= r)[0]))
+
 
 
     def test_surf_normalized(self):
@@ -603,6 +666,74 @@ class SurfTests(unittest.TestCase):
                                  i in sel[ii] and
                                  vg.contains_lin(lin_min))
 
+    @with_tempfile('.vmd', 'sparse')
+    def test_sparse_volume_mask_dict(self, fn):
+        sh = (10, 10, 10)
+        msk = np.zeros(sh)
+        msk[::2] = 1
+        vg = volgeom.VolGeom(sh, np.identity(4), mask=msk)
+
+        outer = surf.generate_sphere(10) * 5. + 5
+        inner = surf.generate_sphere(10) * 2.5 + 5
+
+        sel = surf_voxel_selection.run_voxel_selection(4., vg, inner, outer)
+        sp = sel.to_sparse()
+        assert_true(isinstance(sp, volume_mask_dict.VolumeMaskDictionary))
+        assert_true(sp.to_sparse() is sp)
+        assert_equal(len(sp), len(sel))
+        assert_equal(sorted(sp.keys()), sorted(sel.keys()))
+        assert_equal(set(sp.aux_keys()), set(sel.aux_keys()))
+        for k in sel.keys():
+            assert_true(k in sp)
+            assert_equal(sp[k], sel[k])
+            for label in sel.aux_keys():
+                assert_equal(sp.get_aux(k, label), sel.get_aux(k, label))
+        assert_false(-1 in sp)
+        assert_raises(KeyError, lambda: sp[-1])
+        assert_raises(TypeError, sp.add, -1, [0])
+
+        # inverse mapping
+        targets = sel.get_targets()
+        assert_equal(sp.get_targets(), targets)
+        for t in targets + [1]:
+            assert_equal(sp.target2sources(t), sel.target2sources(t))
+
+        # masks
+        keys = sel.keys()[::3]
+        for ks in (None, keys):
+            assert_array_equal(sp.get_mask(ks), sel.get_mask(ks))
+            assert_equal(sorted(sp.get_voxel_indices(ks)),
+                         sorted(sel.get_voxel_indices(ks)))
+        assert_raises(KeyError, sp.get_mask, [-1])
+
+        ds = fmri_dataset(vg.get_masked_nifti_image())
+        assert_array_equal(sp.get_dataset_feature_mask(ds, keys),
+                           sel.get_dataset_feature_mask(ds, keys))
+        assert_raises(ValueError, sp.get_dataset_feature_mask,
+                      ds[:, ds.fa.voxel_indices[:, 0] < 4])
+
+        # storage; arrays are memory-mapped after loading
+        sp.save(fn)
+        sp_copy = volume_mask_dict.from_any(fn)
+        assert_true(isinstance(sp_copy._indices, np.memmap))
+        assert_equal(sp, sp_copy)
+        assert_equal(sp_copy.target2sources(targets[0]),
+                     sel.target2sources(targets[0]))
+
+        if externals.exists('h5py'):
+            h5save(fn + '.h5py', sp)
+            assert_equal(h5load(fn + '.h5py'), sp)
+
+        # masks with a single auxiliary value
+        vmd = volume_mask_dict.VolumeMaskDictionary(vg, None)
+        vmd.add(3, [2, 4], dict(foo=[1., 2.], bar=[1]))
+        vmd.add(1, [4], dict(foo=[3.], bar=[2]))
+        sp = vmd.to_sparse()
+        assert_equal(sp.keys(), [1, 3])
+        assert_equal(sp.get_aux(3, 'bar'), [1])
+        assert_equal(sp.get_aux(3, 'foo'), [1., 2.])
+        assert_equal(sp.target2sources(4), set([1, 3]))
+
     def test_surf_voxel_selection(self):
         vol_shape = (10, 10, 10)
         vol_affine = np.identity(4)
@@ -841,7 +972,7 @@ class SurfTests(unittest.TestCase):
 
         radius = 50
 
-        backends = ['native', 'hdf5']
+        backends = ['native', 'hdf5', 'memmap', None]
 
         for i, backend in enumerate(backends):
             if backend == 'hdf5' and not externals.exists('h5py'):
@@ -855,6 +986,49 @@ class SurfTests(unittest.TestCase):
             else:
                 assert_equal(sel0, sel)
 
+    def test_incremental_voxel_selection(self):
+        sh = (10, 10, 10)
+        msk = np.zeros(sh)
+        msk[::2] = 1
+        vg = volgeom.VolGeom(sh, np.identity(4), mask=msk)
+
+        outer = surf.generate_sphere(10) * 5. + 5
+        inner = surf.generate_sphere(10) * 2.5 + 5
+        vsm = volsurf.VolSurfMaximalMapping(vg, inner, outer)
+
+        def assert_same_selection(p, q):
+            assert_equal(sorted(p.keys()), sorted(q.keys()))
+            for k in p.keys():
+                assert_equal(p[k], q[k])
+                for label in p.aux_keys():
+                    assert_equal(p.get_aux(k, label), q.get_aux(k, label))
+
+        def select(radius, nodes=None, **kwargs):
+            return surf_voxel_selection.voxel_selection(vsm, radius,
+                                    source_surf_nodes=nodes, nproc=1,
+                                    outside_node_margin=2., **kwargs)
+
+        selection = surf_voxel_selection.IncrementalVoxelSelection(vsm,
+                                    nproc=1, outside_node_margin=2.)
+        nodes = np.arange(0, outer.nvertices, 3)
+        # smaller radii are derived from larger ones, more nodes and
+        # larger radii are computed
+        for radius, ns in ((4., nodes), (2., nodes), (0., nodes),
+                           (3., None), (5., nodes[:10]),
+                           (10, nodes), (10, None), (8, nodes)):
+            sel = selection(radius, ns)
+            assert_same_selection(sel, select(radius, ns))
+            assert_equal(sel.meta, select(radius, ns).meta)
+
+        sel = selection(3., sparse=True)
+        assert_true(isinstance(sel,
+                               volume_mask_dict.SparseVolumeMaskDictionary))
+        assert_same_selection(sel, select(3.))
+        assert_equal(sel, select(3., sparse=True))
+
+        assert_raises(TypeError, selection, '3')
+        assert_raises(ValueError, select, 3., results_backend='foo')
+
     def test_agreement_surface_volume(self):
         '''test agreement between volume-based and surface-based
         searchlights when using euclidean measure'''
@@ -986,6 +1160,96 @@ class SurfTests(unittest.TestCase):
             assert_true('SurfaceQueryEngine' in '%s' % qe)
             assert_true('SurfaceQueryEngine' in '%r' % qe)
 
+    @reseed_rng()
+    @with_tempfile('.npz', '_qe')
+    def test_surf_queryengine_precompute(self, fn):
+        if not externals.exists('scipy'):
+            raise SkipTest
+
+        from mvpa2.clfs.gnb import GNB
+        from mvpa2.measures.gnbsearchlight import GNBSearchlight
+        from mvpa2.generators.partition import NFoldPartitioner
+
+        s = surf.generate_sphere(10) * 10
+        nv = s.nvertices
+        # some nodes without, and some with multiple features
+        node_indices = np.random.randint(nv, size=2 * nv)
+        ds = Dataset(np.random.normal(size=(12, 2 * nv)),
+                     sa=dict(targets=[0, 1] * 6,
+                             chunks=np.repeat(np.arange(3), 4)),
+                     fa=dict(node_indices=node_indices))
+        center_ids = np.arange(0, nv, 3)
+
+        for distance_metric in ('euclidean', 'dijkstra'):
+            qe = queryengine.SurfaceQueryEngine(s, 4., distance_metric)
+            qe_pre = queryengine.SurfaceQueryEngine(s, 4., distance_metric,
+                                                    precompute=True)
+            qe.train(ds)
+            qe_pre.train(ds)
+            assert_false(qe.prefers_bulk_queries)
+            assert_true(qe_pre.prefers_bulk_queries)
+            assert_true(queryengine.SurfaceQueryEngine(
+                                s, 4., distance_metric,
+                                nproc=2).prefers_bulk_queries)
+
+            expected = [sorted(qe.query_byid(i)) for i in xrange(nv)]
+            assert_equal([sorted(qe_pre.query_byid(i)) for i in xrange(nv)],
+                         expected)
+
+            # neighborhoods are kept when training again
+            nbrs = qe_pre._neighborhoods
+            qe_pre.untrain()
+            qe_pre.train(ds)
+            assert_true(qe_pre._neighborhoods is nbrs)
+
+            # same as computing them in one go, for any subset of vertices
+            assert_array_equal(
+                    qe.compute_neighborhoods(center_ids).toarray(),
+                    nbrs.toarray()[center_ids])
+
+            for q in (qe, qe_pre):
+                m = q.query_byids_sparse(center_ids).toarray()
+                assert_equal(m.shape, (ds.nfeatures, len(center_ids)))
+                assert_equal([np.nonzero(col)[0].tolist() for col in m.T],
+                             [expected[i] for i in center_ids])
+            assert_raises(KeyError, qe.query_byids_sparse, [nv])
+
+            # store and reload
+            qe_pre.save_neighborhoods(fn)
+            qe_loaded = queryengine.SurfaceQueryEngine(s, 4., distance_metric)
+            qe_loaded.load_neighborhoods(fn)
+            qe_loaded.train(ds)
+            assert_equal([sorted(qe_loaded.query_byid(i)) for i in xrange(nv)],
+                         expected)
+            assert_raises(ValueError, queryengine.SurfaceQueryEngine(
+                                s, 3., distance_metric).load_neighborhoods, fn)
+
+            # ring query engine uses the precomputed neighborhoods as well
+            kwargs = dict(surface=s, radius=4., inner_radius=2.,
+                          distance_metric=distance_metric)
+            ring = queryengine.SurfaceRingQueryEngine(**kwargs)
+            ring_pre = queryengine.SurfaceRingQueryEngine(precompute=True,
+                                                          **kwargs)
+            ring.train(ds)
+            ring_pre.train(ds)
+            ring_expected = [sorted(ring.query_byid(i)) for i in center_ids]
+            assert_equal([sorted(ring_pre.query_byid(i)) for i in center_ids],
+                         ring_expected)
+            m = ring_pre.query_byids_sparse(center_ids).toarray()
+            assert_equal([np.nonzero(col)[0].tolist() for col in m.T],
+                         ring_expected)
+
+            # GNB searchlight consumes the sparse matrix directly
+            results = []
+            for q, indexsum in ((qe, 'fancy'), (qe_pre, 'sparse')):
+                sl = GNBSearchlight(GNB(), NFoldPartitioner(), q,
+                                    indexsum=indexsum,
+                                    enable_ca=['roi_sizes', 'roi_feature_ids'])
+                results.append((sl(ds).samples, list(sl.ca.roi_sizes),
+                                map(sorted, sl.ca.roi_feature_ids)))
+            assert_array_equal(results[0][0], results[1][0])
+            assert_equal(results[0][1:], results[1][1:])
+
     def test_surf_ring_queryengine(self):
         s = surf.generate_plane((0, 0, 0), (0, 1, 0), (0, 0, 1), 4, 5)
         # add second layer
@@ -22,7 +22,8 @@ from mvpa2.generators.permutation import AttributePermutator
 from mvpa2.generators.splitters import Splitter
 
 from mvpa2.clfs.meta import MulticlassClassifier
-from mvpa2.clfs.transerror import ConfusionMatrix, ConfusionBasedError
+from mvpa2.clfs.transerror import ConfusionMatrix, ConfusionBasedError, \
+     confusion_counts, confusion_stats
 from mvpa2.measures.base import CrossValidation, TransferMeasure
 
 from mvpa2.clfs.stats import MCNullDist
@@ -183,6 +184,75 @@ class ErrorsTests(unittest.TestCase):
         assert_equal(len(cm1.sets), 2)  # and now 2
         assert_array_equal(cm1(p + ['ho', 'aa'], t + ['ho', 'aa']), cm1.matrix)
 
+    def test_confusion_counts(self):
+        targets = np.array([0, 0, 1, 1, 2, 2])
+        # e.g. predictions for different permutations
+        predictions = np.array([[0, 0, 1, 1, 2, 2],
+                                [0, 1, 1, 1, 0, 2],
+                                [2, 2, 2, 2, 2, 2]])
+        counts, labels = confusion_counts(predictions, targets)
+        assert_equal(labels, [0, 1, 2])
+        assert_equal(counts.shape, (3, 3, 3))
+        for p, c in zip(predictions, counts):
+            assert_array_equal(ConfusionMatrix(labels=labels)(p, targets), c)
+            assert_array_equal(confusion_counts(p, targets)[0], c)
+        # custom order of labels and unknown labels
+        counts, labels = confusion_counts(predictions, targets,
+                                          labels=[2, 1, 0])
+        assert_array_equal(counts[2], [[2, 2, 2], [0, 0, 0], [0, 0, 0]])
+        assert_raises(ValueError, confusion_counts, predictions, targets,
+                      labels=[0, 1])
+
+        stats = confusion_stats(counts)
+        assert_array_almost_equal(stats['ACC'], [1, 4 / 6., 2 / 6.])
+        assert_equal(stats['TPR'].shape, (3, 3))
+        assert_array_equal(stats['TP'], [[2, 2, 2], [1, 2, 1], [2, 0, 0]])
+        assert_array_almost_equal(stats['TPR'][1], [.5, 1, .5])
+        assert_array_almost_equal(stats['PPV'][1], [1, 2 / 3., .5])
+        # the same as for individual matrices
+        for i, c in enumerate(counts):
+            single = confusion_stats(c)
+            for k in ('TP', 'FP', 'TPR', 'MCC', 'F1', 'ACC'):
+                assert_array_almost_equal(stats[k][i], single[k])
+
+    def test_confusion_matrix_incremental(self):
+        # encoding of sets is reused while adding new ones
+        rng = np.random.RandomState(1)
+        cm = ConfusionMatrix()
+        sets = []
+        for i in xrange(5):
+            sets.append((rng.randint(0, 3, 10), rng.randint(0, 4, 10)))
+            cm.add(*sets[-1])
+            assert_array_equal(cm.matrix,
+                               ConfusionMatrix(sets=list(sets)).matrix)
+            assert_equal(cm.set_matrices.shape, (i + 1,) + cm.matrix.shape)
+            assert_array_equal(cm.set_matrices.sum(axis=0), cm.matrix)
+        assert_equal(cm.matrix.sum(), 50)
+        # previously seen labels are kept, but not the sets
+        cm.reset()
+        cm.add(np.array([1, 2]), np.array([1, 1]))
+        assert_equal(len(cm.set_matrices), 1)
+        assert_equal(cm.matrix.sum(), 2)
+        assert_equal(cm.matrix[1, 1], 1)
+
+    def test_confusion_matrix_old_state(self):
+        # instances stored by earlier versions lack the per-set matrices
+        # and encodings
+        sets = [(np.array([1, 2, 2]), np.array([1, 2, 1])),
+                (np.array([1, 1, 2]), np.array([1, 1, 2]))]
+        cm = ConfusionMatrix(sets=sets)
+        cm.compute()
+        state = cm.__dict__.copy()
+        for k in ('encoded', 'matrices', 'stats_computed', 'ROC'):
+            del state['_ConfusionMatrix__' + k]
+        state['ROC'] = None
+        old = ConfusionMatrix.__new__(ConfusionMatrix)
+        old.__setstate__(state)
+        assert_array_equal(old.matrix, cm.matrix)
+        assert_array_equal(old.set_matrices, cm.set_matrices)
+        old.add(np.array([2]), np.array([2]))
+        assert_equal(old.matrix.sum(), 7)
+
     @sweepargs(l_clf=clfswh['linear', 'svm'])
     def test_confusion_based_error(self, l_clf):
         train = datasets['uni2medium']
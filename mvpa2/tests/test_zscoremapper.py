@@ -203,4 +203,69 @@ def test_zscore_withoutchunks():
     zscore(ds, chunks_attr=None)
     assert(np.any(ds.samples != np.arange(32).reshape((8,-1))))
     ds_summary = ds.summary()
-    assert(ds_summary is not None)
\ No newline at end of file
+    assert(ds_summary is not None)
+
+def test_zscore_many_chunks():
+    # chunk-wise z-scoring with lots of small interleaved chunks has to match
+    # z-scoring each chunk separately
+    rng = np.random.RandomState(1)
+    samples = rng.normal(loc=3., size=(60, 4)).astype('float32')
+    chunks = np.repeat(np.arange(12), 5)
+    rng.shuffle(chunks)
+    ds = dataset_wizard(samples, targets=np.arange(60) % 3, chunks=chunks)
+
+    target = samples.copy()
+    for c in np.unique(chunks):
+        chunk = chunks == c
+        target[chunk] = (samples[chunk] - samples[chunk].mean(axis=0)) \
+                        / samples[chunk].std(axis=0)
+
+    zm = ZScoreMapper()
+    zm.train(ds)
+    zds = zm.forward(ds)
+    # float32 data stays float32
+    assert_equal(zds.samples.dtype, np.float32)
+    assert_array_almost_equal(zds.samples, target, decimal=5)
+    # in-place z-scoring gives the same
+    zscore(ds)
+    assert_array_equal(ds.samples, zds.samples)
+
+    # estimation from a subset of samples
+    ds = dataset_wizard(samples.copy(), targets=np.arange(60) % 3,
+                        chunks=chunks)
+    zds = ZScoreMapper(param_est=('targets', [0, 1]), auto_train=True)(ds)
+    for c in np.unique(chunks):
+        chunk = chunks == c
+        est = samples[chunk & (ds.targets != 2)]
+        assert_array_almost_equal(
+            zds.samples[chunk],
+            (samples[chunk] - est.mean(axis=0)) / est.std(axis=0), decimal=5)
+
+    # chunks without parameters are detected
+    zm = ZScoreMapper()
+    zm.train(ds[chunks < 6])
+    assert_raises(RuntimeError, zm.forward, ds)
+
+
+def test_zscore_partial_train():
+    rng = np.random.RandomState(2)
+    ds = dataset_wizard(rng.normal(size=(40, 3)) * 10,
+                        targets=np.arange(40) % 2,
+                        chunks=np.arange(40) % 4)
+    for kwargs in (dict(), dict(chunks_attr=None),
+                   dict(param_est=('targets', [1]))):
+        zm = ZScoreMapper(**kwargs)
+        zm.train(ds)
+        zp = ZScoreMapper(**kwargs)
+        # portions with partially overlapping sets of chunks
+        for portion in (slice(0, 7), slice(7, 30), slice(30, None)):
+            zp.partial_train(ds[portion])
+            ok_(zp.is_trained)
+        assert_array_almost_equal(zp.forward(ds), zm.forward(ds))
+        # regular training starts from scratch
+        zp.train(ds[:20])
+        zm.train(ds[:20])
+        assert_array_almost_equal(zp.forward(ds[:20]), zm.forward(ds[:20]))
+
+    # nothing to estimate with fixed parameters
+    assert_raises(RuntimeError, ZScoreMapper(params=(0, 1)).partial_train, ds)
@@ -193,6 +193,7 @@ def setup_package():
                      'mvpa2.algorithms',
                      'mvpa2.atlases',
                      'mvpa2.base',
+                     'mvpa2.benchmarks',
                      'mvpa2.clfs',
                      'mvpa2.clfs.libsmlrc',
                      'mvpa2.clfs.libsvmc',